@@ -0,0 +1,214 @@
+"""Shared rate limiting and retry policy for Datastream API calls."""
+
+import email.utils
+import logging
+import random
+import threading
+import time
+
+try:
+  from google3.google.cloud.datastream import datastream  # pylint: disable=g-import-not-at-top
+except ModuleNotFoundError:
+  import datastream  # pytype: disable=import-error  pylint: disable=g-import-not-at-top
+
+
+# Datastream allows 6000 requests per minute per project by default; stay
+# comfortably under it so several bulk scripts can share a project.
+DEFAULT_QPS = 50.0
+DEFAULT_BURST = 20
+
+DEFAULT_MAX_RETRIES = 6
+DEFAULT_INITIAL_BACKOFF = 1.0
+DEFAULT_MAX_BACKOFF = 64.0
+
+RETRYABLE_STATUS_CODES = frozenset([429, 500, 502, 503, 504])
+# A create which failed with 5xx may still have been applied, and retrying it
+# then fails with 409, so only quota errors are retried for non-idempotent
+# calls.
+NON_IDEMPOTENT_RETRYABLE_STATUS_CODES = frozenset([429])
+
+_default_rate_limiter = None
+_default_rate_limiter_lock = threading.Lock()
+
+
+class TokenBucketRateLimiter(object):
+  """Thread-safe token bucket shared by every caller of the Datastream API.
+
+  Tokens refill continuously at `qps` up to `burst`. When the server reports
+  quota exhaustion the whole bucket is paused, so every thread backs off
+  together instead of each one discovering the 429 on its own.
+  """
+
+  def __init__(self, qps=None, burst=None, clock=None, sleep=None):
+    """Initialize the TokenBucketRateLimiter.
+
+    Args:
+      qps: Sustained requests per second allowed through the bucket.
+      burst: Maximum number of tokens which can accumulate while idle.
+      clock: A monotonic clock returning seconds, used for testing.
+      sleep: A sleep function taking seconds, used for testing.
+    """
+    self.qps = float(qps or DEFAULT_QPS)
+    self.burst = float(burst or DEFAULT_BURST)
+    self._clock = clock or time.monotonic
+    self._sleep = sleep or time.sleep
+
+    self._lock = threading.Lock()
+    self._tokens = self.burst
+    self._last_refill = self._clock()
+    self._paused_until = 0.0
+
+  def _Refill(self, now):
+    elapsed = max(0.0, now - self._last_refill)
+    self._tokens = min(self.burst, self._tokens + elapsed * self.qps)
+    self._last_refill = now
+
+  def Acquire(self, tokens=1):
+    """Block until `tokens` are available, then consume them.
+
+    Args:
+      tokens: The number of tokens the call costs.
+    Returns:
+      The number of seconds spent waiting.
+    """
+    waited = 0.0
+    while True:
+      with self._lock:
+        now = self._clock()
+        self._Refill(now)
+        if now < self._paused_until:
+          delay = self._paused_until - now
+        elif self._tokens >= tokens:
+          self._tokens -= tokens
+          return waited
+        else:
+          delay = (tokens - self._tokens) / self.qps
+
+      self._sleep(delay)
+      waited += delay
+
+  def Pause(self, seconds):
+    """Stop handing out tokens for `seconds`, eg. after a 429 response."""
+    with self._lock:
+      now = self._clock()
+      self._paused_until = max(self._paused_until, now + seconds)
+      self._tokens = 0.0
+      self._last_refill = now
+
+
+def GetDefaultRateLimiter():
+  """Return the process wide limiter shared by all resource managers."""
+  global _default_rate_limiter
+  with _default_rate_limiter_lock:
+    if _default_rate_limiter is None:
+      _default_rate_limiter = TokenBucketRateLimiter()
+    return _default_rate_limiter
+
+
+def _GetRetryAfter(exc):
+  """Return the Retry-After delay in seconds from an HttpError, or None."""
+  response = getattr(exc, "response", None) or {}
+  retry_after = response.get("retry-after") or response.get("Retry-After")
+  if not retry_after:
+    return None
+
+  try:
+    return max(0.0, float(retry_after))
+  except ValueError:
+    pass
+
+  try:
+    retry_time = email.utils.parsedate_to_datetime(retry_after)
+  except (TypeError, ValueError):
+    return None
+  return max(0.0, retry_time.timestamp() - time.time())
+
+
+def _GetStatusCode(exc):
+  try:
+    return exc.status_code
+  except (AttributeError, KeyError, TypeError, ValueError):
+    return None
+
+
+class RetryPolicy(object):
+  """Retry transient Datastream API failures with exponential backoff."""
+
+  def __init__(self,
+               max_retries=None,
+               initial_backoff=None,
+               max_backoff=None,
+               retryable_status_codes=None,
+               sleep=None):
+    """Initialize the RetryPolicy.
+
+    Args:
+      max_retries: The number of retries after the first attempt.
+      initial_backoff: The backoff in seconds before the first retry.
+      max_backoff: The upper bound in seconds for any single backoff.
+      retryable_status_codes: HTTP status codes which should be retried.
+      sleep: A sleep function taking seconds, used for testing.
+    """
+    self.max_retries = (
+        DEFAULT_MAX_RETRIES if max_retries is None else max_retries)
+    self.initial_backoff = initial_backoff or DEFAULT_INITIAL_BACKOFF
+    self.max_backoff = max_backoff or DEFAULT_MAX_BACKOFF
+    self.retryable_status_codes = (
+        retryable_status_codes or RETRYABLE_STATUS_CODES)
+    self._sleep = sleep or time.sleep
+
+  def GetBackoff(self, attempt, exc=None):
+    """Return the seconds to wait before retry number `attempt` (from 0)."""
+    retry_after = _GetRetryAfter(exc) if exc is not None else None
+    if retry_after is not None:
+      return min(retry_after, self.max_backoff)
+
+    # Full jitter keeps concurrent callers from retrying in lockstep.
+    ceiling = min(self.max_backoff, self.initial_backoff * (2 ** attempt))
+    return random.uniform(0, ceiling)
+
+  def Call(self, method, request, rate_limiter=None, idempotent=True):
+    """Run `method(request)` with rate limiting and retries.
+
+    The apitools client should be built with num_retries=0, so that every
+    attempt is made here and goes through the rate limiter.
+
+    Args:
+      method: A bound apitools service method, eg. `Streams.List`.
+      request: The request message to supply to the method.
+      rate_limiter: An optional TokenBucketRateLimiter to acquire from
+          before every attempt.
+      idempotent: Whether the call can be repeated safely; calls which are
+          not, such as Create, are only retried on 429.
+    Returns:
+      The response from the method.
+    Raises:
+      datastream.HttpError: When the error is not retryable or retries
+          are exhausted.
+    """
+    retryable_status_codes = (
+        self.retryable_status_codes if idempotent else
+        self.retryable_status_codes & NON_IDEMPOTENT_RETRYABLE_STATUS_CODES)
+    attempt = 0
+    while True:
+      if rate_limiter:
+        rate_limiter.Acquire()
+
+      try:
+        return method(request)
+      except datastream.HttpError as exc:
+        status_code = _GetStatusCode(exc)
+        if (status_code not in retryable_status_codes or
+            attempt >= self.max_retries):
+          raise
+
+        backoff = self.GetBackoff(attempt, exc)
+        logging.warning(
+            "Datastream call failed with HTTP %s, retry %d/%d in %.1fs",
+            status_code, attempt + 1, self.max_retries, backoff)
+        if status_code == 429 and rate_limiter:
+          # Quota is per project, so hold back every caller, not just us.
+          rate_limiter.Pause(backoff)
+        else:
+          self._sleep(backoff)
+        attempt += 1
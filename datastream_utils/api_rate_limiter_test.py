@@ -0,0 +1,107 @@
+"""Tests for google3.experimental.dhercher.datastream_utils.api_rate_limiter."""
+
+import mock
+
+from google3.experimental.dhercher.datastream_utils import api_rate_limiter
+from google3.google.cloud.datastream import datastream
+from google3.testing.pybase import googletest
+
+
+class FakeClock(object):
+
+  def __init__(self):
+    self.now = 0.0
+
+  def __call__(self):
+    return self.now
+
+  def sleep(self, seconds):
+    self.now += seconds
+
+
+def _http_error(status, retry_after=None):
+  response = {"status": str(status)}
+  if retry_after is not None:
+    response["retry-after"] = str(retry_after)
+  return datastream.HttpError(response, b"", "https://datastream")
+
+
+class TokenBucketRateLimiterTest(googletest.TestCase):
+
+  def test_burst_then_throttle(self):
+    clock = FakeClock()
+    limiter = api_rate_limiter.TokenBucketRateLimiter(
+        qps=10, burst=2, clock=clock, sleep=clock.sleep)
+
+    self.assertEqual(limiter.Acquire(), 0.0)
+    self.assertEqual(limiter.Acquire(), 0.0)
+    self.assertAlmostEqual(limiter.Acquire(), 0.1)
+    self.assertAlmostEqual(clock.now, 0.1)
+
+  def test_pause_blocks_until_expiry(self):
+    clock = FakeClock()
+    limiter = api_rate_limiter.TokenBucketRateLimiter(
+        qps=10, burst=2, clock=clock, sleep=clock.sleep)
+
+    limiter.Pause(5)
+    limiter.Acquire()
+    self.assertGreaterEqual(clock.now, 5.0)
+
+
+class RetryPolicyTest(googletest.TestCase):
+
+  def test_retries_unavailable(self):
+    sleep = mock.Mock()
+    policy = api_rate_limiter.RetryPolicy(max_retries=3, sleep=sleep)
+    method = mock.Mock(side_effect=[_http_error(503), _http_error(503), "ok"])
+
+    self.assertEqual(policy.Call(method, "request"), "ok")
+    self.assertEqual(method.call_count, 3)
+    self.assertEqual(sleep.call_count, 2)
+
+  def test_honors_retry_after(self):
+    sleep = mock.Mock()
+    policy = api_rate_limiter.RetryPolicy(sleep=sleep)
+    method = mock.Mock(side_effect=[_http_error(503, retry_after=7), "ok"])
+
+    policy.Call(method, "request")
+    sleep.assert_called_once_with(7.0)
+
+  def test_quota_error_pauses_limiter(self):
+    limiter = mock.create_autospec(
+        api_rate_limiter.TokenBucketRateLimiter, instance=True)
+    policy = api_rate_limiter.RetryPolicy(sleep=mock.Mock())
+    method = mock.Mock(side_effect=[_http_error(429, retry_after=3), "ok"])
+
+    policy.Call(method, "request", rate_limiter=limiter)
+    limiter.Pause.assert_called_once_with(3.0)
+    self.assertEqual(limiter.Acquire.call_count, 2)
+
+  def test_does_not_retry_client_errors(self):
+    policy = api_rate_limiter.RetryPolicy(sleep=mock.Mock())
+    method = mock.Mock(side_effect=_http_error(404))
+
+    with self.assertRaises(datastream.HttpError):
+      policy.Call(method, "request")
+    self.assertEqual(method.call_count, 1)
+
+  def test_gives_up_after_max_retries(self):
+    policy = api_rate_limiter.RetryPolicy(max_retries=2, sleep=mock.Mock())
+    method = mock.Mock(side_effect=_http_error(503))
+
+    with self.assertRaises(datastream.HttpError):
+      policy.Call(method, "request")
+    self.assertEqual(method.call_count, 3)
+
+
+  def test_non_idempotent_calls_only_retry_quota_errors(self):
+    policy = api_rate_limiter.RetryPolicy(sleep=mock.Mock())
+    method = mock.Mock(side_effect=[_http_error(429), _http_error(503), "ok"])
+
+    with self.assertRaises(datastream.HttpError):
+      policy.Call(method, "request", idempotent=False)
+    self.assertEqual(method.call_count, 2)
+
+
+if __name__ == "__main__":
+  googletest.main()
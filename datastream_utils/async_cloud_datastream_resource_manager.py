@@ -0,0 +1,319 @@
+"""Asyncio counterpart of the Cloud Datastream resource manager."""
+
+import asyncio
+import concurrent.futures
+import functools
+import logging
+import threading
+import time
+
+try:
+  from google3.google.cloud.datastream import datastream  # pylint: disable=g-import-not-at-top
+except ModuleNotFoundError:
+  import datastream  # pytype: disable=import-error  pylint: disable=g-import-not-at-top
+
+try:
+  from google3.experimental.dhercher.datastream_utils import cloud_datastream_resource_manager  # pylint: disable=g-import-not-at-top
+  from google3.experimental.dhercher.datastream_utils import connection_profile_registry  # pylint: disable=g-import-not-at-top
+  from google3.experimental.dhercher.datastream_utils import resource_ledger  # pylint: disable=g-import-not-at-top
+except ModuleNotFoundError:
+  import cloud_datastream_resource_manager  # pytype: disable=import-error  pylint: disable=g-import-not-at-top
+  import connection_profile_registry  # pytype: disable=import-error  pylint: disable=g-import-not-at-top
+  import resource_ledger  # pytype: disable=import-error  pylint: disable=g-import-not-at-top
+
+
+# Blocking apitools calls are short, the waits between them are not, so a
+# small pool is enough to keep hundreds of operations moving.
+DEFAULT_MAX_WORKERS = 32
+DEFAULT_POLL_INTERVAL = 5
+DEFAULT_OPERATION_TIMEOUT = 120
+
+_default_executor = None
+_default_executor_lock = threading.Lock()
+
+
+def GetDefaultExecutor():
+  """Return the bounded executor shared by all async resource managers."""
+  global _default_executor
+  with _default_executor_lock:
+    if _default_executor is None:
+      _default_executor = concurrent.futures.ThreadPoolExecutor(
+          max_workers=DEFAULT_MAX_WORKERS,
+          thread_name_prefix="datastream-async")
+    return _default_executor
+
+
+class _NonBlockingResourceManager(
+    cloud_datastream_resource_manager.CloudDatastreamResourceManager):
+  """Resource manager which returns operations instead of waiting on them."""
+
+  def _WaitForCompletion(self, response, timeout=120):
+    return response
+
+
+class AsyncCloudDatastreamResourceManager(object):
+  """Asyncio resource manager to start a CDC stream from Cloud Datastream.
+
+  Accepts the same arguments as CloudDatastreamResourceManager. Blocking API
+  calls run on a bounded executor and operations are polled with
+  asyncio.sleep, so one event loop can drive many streams at once.
+  """
+
+  def __init__(self, *args, executor=None, poll_interval=None, **kwargs):
+    """Initialize the AsyncCloudDatastreamResourceManager.
+
+    Args:
+      *args: Positional arguments for CloudDatastreamResourceManager.
+      executor: The concurrent.futures.Executor used for blocking calls,
+          defaults to one shared by all async managers.
+      poll_interval: Seconds to sleep between operation status checks.
+      **kwargs: Keyword arguments for CloudDatastreamResourceManager.
+    """
+    self.manager = _NonBlockingResourceManager(*args, **kwargs)
+    self._executor = executor or GetDefaultExecutor()
+    self._poll_interval = (
+        DEFAULT_POLL_INTERVAL if poll_interval is None else poll_interval)
+    # The apitools client wraps a single httplib2.Http, which is not
+    # thread-safe, so calls for one manager are serialized (waits are not).
+    self._client_lock = threading.Lock()
+
+  def Describe(self):
+    return "Manage a stream from Cloud Datastream with asyncio."
+
+  def _RunLocked(self, func, *args):
+    with self._client_lock:
+      return func(*args)
+
+  async def _Run(self, func, *args):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        self._executor, functools.partial(self._RunLocked, func, *args))
+
+  async def _RunAndWait(self, func, *args):
+    operation = await self._Run(func, *args)
+    return await self.WaitForCompletion(operation)
+
+  async def WaitForCompletion(self, operation, timeout=None):
+    """Poll an operation without blocking the event loop.
+
+    Args:
+      operation: The Operation returned by a Datastream API call.
+      timeout: Seconds to wait before giving up on the operation.
+    Returns:
+      The most recently fetched Operation.
+    """
+    timeout = DEFAULT_OPERATION_TIMEOUT if timeout is None else timeout
+    start = time.time()
+    while not operation.done:
+      await asyncio.sleep(self._poll_interval)
+      operation = await self._Run(
+          self.manager._Call,  # pylint: disable=protected-access
+          self.manager.client.projects_locations_operations.Get,
+          datastream.DatastreamProjectsLocationsOperationsGetRequest(
+              name=operation.name))
+
+      if time.time() - start > timeout:
+        logging.warning("Timed out waiting for operation completion %s",
+                        operation.name)
+        break
+
+    return operation
+
+  async def _IsRecordedAsCreated(self, full_name):
+    """Return whether the ledger shows the resource was created.
+
+    A resource left in CREATING by a crash is checked through its operation.
+    """
+    ledger = self.manager.ledger
+    entry = ledger.Get(full_name) if ledger else None
+    if not entry:
+      return False
+    if entry.state == resource_ledger.STATE_CREATED:
+      return True
+    if entry.state != resource_ledger.STATE_CREATING:
+      return False
+    if not entry.operation_name:
+      return await self._Run(self.manager._AdoptResource, entry)  # pylint: disable=protected-access
+
+    operation = await self.WaitForCompletion(
+        datastream.Operation(name=entry.operation_name, done=False))
+    state = resource_ledger.GetOperationState(operation)
+    await self._Run(self.manager._MarkResource, full_name, state)  # pylint: disable=protected-access
+    return state == resource_ledger.STATE_CREATED
+
+  async def _CreateAndRecord(self, full_name, func, *args):
+    """Run a create call, wait for it and record the outcome in the ledger."""
+    operation = await self._RunAndWait(func, *args)
+    # The non-blocking manager records the operation while it still runs.
+    await self._Run(self.manager._MarkResource, full_name,  # pylint: disable=protected-access
+                    resource_ledger.GetOperationState(operation))
+    return operation
+
+  async def _SetUpConnectionProfile(self, fingerprint, full_name, create,
+                                    *args):
+    """Reuse a shared profile or create one, returning the shared name."""
+    manager = self.manager
+    shared = await self._Run(manager._FindSharedConnectionProfile,  # pylint: disable=protected-access
+                             fingerprint)
+    if shared:
+      logging.info("Reusing Connection Profile %r", shared)
+    elif await self._IsRecordedAsCreated(full_name):
+      logging.info("Connection Profile %r already exists", full_name)
+    else:
+      await self._CreateAndRecord(full_name, create, *args)
+    await self._Run(manager._ShareConnectionProfile, fingerprint,  # pylint: disable=protected-access
+                    shared or full_name)
+    return shared
+
+  async def SetUp(self):
+    """Create and start all resources for a CDC Datastream.
+
+    Both connection profiles are created concurrently, then the stream is
+    created and started. Like the blocking manager, profiles in the
+    registry are reused and resources the ledger shows as created are not
+    created again.
+    """
+    manager = self.manager
+    logging.info("Setting up Source and GCS Connection Profiles")
+    source_fingerprint = manager._GetSourceFingerprint()  # pylint: disable=protected-access
+    dest_fingerprint = connection_profile_registry.GcsFingerprint(
+        manager.gcs_bucket_name, manager.gcs_root_path,
+        manager.datastream_parent)
+    shared_source_cp, shared_dest_cp = await asyncio.gather(
+        self._SetUpConnectionProfile(
+            source_fingerprint, manager.full_source_connection_name,
+            manager._CreateDatabaseConnectionProfile),  # pylint: disable=protected-access
+        self._SetUpConnectionProfile(
+            dest_fingerprint, manager.full_dest_connection_name,
+            manager._CreateGcsConnectionProfile,  # pylint: disable=protected-access
+            manager.dest_connection_name, manager.gcs_bucket_name,
+            manager.gcs_root_path))
+    manager._shared_source_cp = shared_source_cp  # pylint: disable=protected-access
+    manager._shared_dest_cp = shared_dest_cp  # pylint: disable=protected-access
+
+    if await self._IsRecordedAsCreated(manager.full_stream_name):
+      logging.info("Stream already exists on Datastream")
+    else:
+      logging.info("Creating stream on Datastream")
+      stream_op_result = await self._CreateAndRecord(
+          manager.full_stream_name,
+          manager._CreateStream,  # pylint: disable=protected-access
+          manager.stream_name,
+          manager.full_source_connection_name,
+          manager.full_dest_connection_name,
+          manager.datastream_export_file_format)
+
+      if stream_op_result.error:
+        raise ValueError(str(stream_op_result))
+
+    logging.info("Starting CDC stream on Datastream")
+    result = await self._RunAndWait(
+        manager._UpdateStreamState,  # pylint: disable=protected-access
+        manager.full_stream_name,
+        datastream.Stream.StateValueValuesEnum.RUNNING)
+
+    if result.error:
+      raise ValueError(str(result.error))
+
+  async def Resume(self, run_id):
+    """Finish a SetUp interrupted by a crash, using the ledger.
+
+    Args:
+      run_id: The suffixed stream name of the interrupted run.
+    """
+    self.manager._SelectRun(run_id)  # pylint: disable=protected-access
+    await self.SetUp()
+
+  async def TearDown(self):
+    """Stop and delete the stream, then delete both connection profiles.
+
+    The profiles are only deleted once the stream delete has finished, and a
+    delete which finishes with an error raises ValueError. With a ledger, the resources recorded for this run are deleted instead.
+    Connection profiles still used by another stream in the registry are
+    kept.
+    """
+    manager = self.manager
+    released = (await self._Run(manager.cp_registry.Release,
+                                manager.full_stream_name)
+                if manager.cp_registry else [])
+    if manager.ledger:
+      entries = manager.ledger.GetLiveResources(run_id=manager.stream_name)
+      streams = [entry.name for entry in entries
+                 if entry.kind == resource_ledger.KIND_STREAM]
+      cp_names = [entry.name for entry in entries
+                  if entry.kind == resource_ledger.KIND_CONNECTION_PROFILE]
+    else:
+      streams = [manager.full_stream_name]
+      cp_names = [manager.full_source_connection_name,
+                  manager.full_dest_connection_name]
+    await asyncio.gather(*[self._StopAndDeleteStream(name)
+                           for name in streams])
+
+    cp_names += [name for name in released if name not in cp_names]
+    await asyncio.gather(*[self._DeleteUnusedConnectionProfile(name)
+                           for name in cp_names])
+
+  async def _DeleteResource(self, full_name, method, request):
+    """Issue a delete call, wait for it and record it in the ledger."""
+    manager = self.manager
+    operation = await self._Run(manager._Call, method, request)  # pylint: disable=protected-access
+    await self._Run(manager._MarkResource, full_name,  # pylint: disable=protected-access
+                    resource_ledger.STATE_DELETING, operation)
+    operation = await self.WaitForCompletion(operation)
+    if operation.error:
+      raise ValueError(str(operation.error))
+    await self._Run(manager._MarkResource, full_name,  # pylint: disable=protected-access
+                    resource_ledger.GetDeleteOperationState(operation))
+    return operation
+
+  async def _StopAndDeleteStream(self, stream_name):
+    manager = self.manager
+    try:
+      await self._RunAndWait(
+          manager._UpdateStreamState,  # pylint: disable=protected-access
+          stream_name,
+          datastream.Stream.StateValueValuesEnum.PAUSED)
+    except datastream.HttpError as e:
+      if e.status_code == 404:
+        await self._Run(manager._MarkResource, stream_name,  # pylint: disable=protected-access
+                        resource_ledger.STATE_DELETED)
+      logging.exception("There was an issue stopping Datastream stream %r.",
+                        stream_name)
+      return None
+
+    return await self._DeleteResource(
+        stream_name, manager.client.projects_locations_streams.Delete,
+        datastream.DatastreamProjectsLocationsStreamsDeleteRequest(
+            name=stream_name))
+
+  async def _DeleteUnusedConnectionProfile(self, cp_name):
+    """Delete a profile unless the registry shows it is still shared."""
+    manager = self.manager
+    registry = manager.cp_registry
+    if registry and not await self._Run(registry.CanDelete, cp_name):
+      logging.info("Keeping shared connection profile %r", cp_name)
+      return None
+
+    try:
+      operation = await self._DeleteResource(
+          cp_name, manager.client.projects_locations_connectionProfiles.Delete,
+          datastream.DatastreamProjectsLocationsConnectionProfilesDeleteRequest(
+              name=cp_name))
+    except datastream.HttpError as e:
+      if e.status_code == 404:
+        await self._Run(manager._MarkResource, cp_name,  # pylint: disable=protected-access
+                        resource_ledger.STATE_DELETED)
+      logging.exception("Unable to delete connection profile %r.", cp_name)
+      return None
+    if registry:
+      await self._Run(registry.Remove, cp_name)
+    return operation
+
+  async def ListStreams(self):
+    await self._Run(self.manager.ListStreams)
+
+  async def ListConnectionProfiles(self):
+    return await self._Run(self.manager._ListConnectionProfiles)  # pylint: disable=protected-access
+
+  async def ListPrivateConnections(self):
+    return await self._Run(self.manager._ListPrivateConnections)  # pylint: disable=protected-access
@@ -0,0 +1,206 @@
+"""Tests for google3.experimental.dhercher.datastream_utils.async_cloud_datastream_resource_manager."""
+
+import asyncio
+import mock
+
+from google3.experimental.dhercher.datastream_utils import async_cloud_datastream_resource_manager
+from google3.experimental.dhercher.datastream_utils import resource_ledger
+from google3.google.cloud.datastream import datastream
+from google3.testing.pybase import googletest
+
+_EX_ORACLE_CP = {
+    "hostname": "127.0.0.1",
+    "username": "oracle",
+    "databaseService": "XE",
+    "password": "oracle",
+    "port": 1521
+}
+
+
+def _operation(done=True, name="operations/op"):
+  return datastream.Operation(done=done, name=name)
+
+
+class AsyncCloudDatastreamResourceManagerTest(googletest.TestCase):
+
+  def _get_manager(self, client_mock, **kwargs):
+    return (async_cloud_datastream_resource_manager
+            .AsyncCloudDatastreamResourceManager(
+                1234567890, "bucket-name",
+                client=client_mock, oracle_cp=_EX_ORACLE_CP,
+                poll_interval=0, **kwargs))
+
+  def test_wait_polls_until_done(self):
+    client_mock = mock.MagicMock()
+    client_mock.projects_locations_operations.Get.side_effect = [
+        _operation(done=False), _operation(done=True)]
+    rm = self._get_manager(client_mock)
+
+    result = asyncio.run(rm.WaitForCompletion(_operation(done=False)))
+
+    self.assertTrue(result.done)
+    self.assertEqual(client_mock.projects_locations_operations.Get.call_count,
+                     2)
+
+  def test_full_flow(self):
+    client_mock = mock.MagicMock()
+    client_mock.projects_locations_connectionProfiles.Create.return_value = (
+        _operation(done=False))
+    client_mock.projects_locations_streams.Create.return_value = _operation()
+    client_mock.projects_locations_streams.Patch.return_value = _operation()
+    client_mock.projects_locations_operations.Get.return_value = _operation()
+    client_mock.projects_locations_streams.Delete.return_value = _operation()
+    client_mock.projects_locations_connectionProfiles.Delete.return_value = (
+        _operation())
+    rm = self._get_manager(client_mock)
+
+    asyncio.run(rm.SetUp())
+    asyncio.run(rm.TearDown())
+
+    self.assertEqual(
+        client_mock.projects_locations_connectionProfiles.Create.call_count, 2)
+    self.assertEqual(
+        client_mock.projects_locations_operations.Get.call_count, 2)
+    self.assertEqual(
+        client_mock.projects_locations_connectionProfiles.Delete.call_count, 2)
+    client_mock.projects_locations_streams.Delete.assert_called_once()
+
+  def test_ledger_records_completed_operations(self):
+    client_mock = mock.MagicMock()
+    client_mock.projects_locations_connectionProfiles.Create.return_value = (
+        _operation(done=False))
+    client_mock.projects_locations_streams.Create.return_value = (
+        _operation(done=False))
+    client_mock.projects_locations_streams.Patch.return_value = _operation()
+    client_mock.projects_locations_operations.Get.return_value = _operation()
+    client_mock.projects_locations_streams.Delete.return_value = _operation()
+    client_mock.projects_locations_connectionProfiles.Delete.return_value = (
+        _operation())
+    ledger = resource_ledger.ResourceLedger(":memory:")
+    rm = self._get_manager(client_mock, ledger=ledger)
+
+    asyncio.run(rm.SetUp())
+
+    manager = rm.manager
+    entries = ledger.GetLiveResources(run_id=manager.stream_name)
+    self.assertEqual(
+        sorted(e.name for e in entries),
+        sorted([manager.full_source_connection_name,
+                manager.full_dest_connection_name, manager.full_stream_name]))
+    self.assertTrue(all(e.state == resource_ledger.STATE_CREATED
+                        for e in entries))
+
+    # Running SetUp again creates nothing new.
+    asyncio.run(rm.SetUp())
+    self.assertEqual(
+        client_mock.projects_locations_connectionProfiles.Create.call_count, 2)
+    client_mock.projects_locations_streams.Create.assert_called_once()
+
+    asyncio.run(rm.TearDown())
+    client_mock.projects_locations_streams.Delete.assert_called_once()
+    self.assertEqual(
+        client_mock.projects_locations_connectionProfiles.Delete.call_count, 2)
+    self.assertEmpty(ledger.GetLiveResources(run_id=manager.stream_name))
+
+  def _get_torn_down_manager(self, stream_delete):
+    """Return a set up manager whose deletes do not finish at once."""
+    client_mock = mock.MagicMock()
+    client_mock.projects_locations_connectionProfiles.Create.return_value = (
+        _operation())
+    client_mock.projects_locations_streams.Create.return_value = _operation()
+    client_mock.projects_locations_streams.Patch.return_value = _operation()
+    events = []
+
+    def _delete(name, request):
+      events.append("delete " + request.name)
+      return _operation(done=False, name=name)
+
+    def _get(request):
+      events.append("get " + request.name)
+      if request.name == "operations/stream":
+        return stream_delete
+      return _operation(name=request.name)
+
+    client_mock.projects_locations_streams.Delete.side_effect = (
+        lambda request: _delete("operations/stream", request))
+    client_mock.projects_locations_connectionProfiles.Delete.side_effect = (
+        lambda request: _delete("operations/cp", request))
+    client_mock.projects_locations_operations.Get.side_effect = _get
+    ledger = resource_ledger.ResourceLedger(":memory:")
+    rm = self._get_manager(client_mock, ledger=ledger)
+    asyncio.run(rm.SetUp())
+    return rm, client_mock, events
+
+  def test_teardown_waits_for_stream_delete(self):
+    rm, client_mock, events = self._get_torn_down_manager(
+        _operation(name="operations/stream"))
+
+    asyncio.run(rm.TearDown())
+
+    manager = rm.manager
+    self.assertEqual(events[:2], ["delete " + manager.full_stream_name,
+                                  "get operations/stream"])
+    self.assertCountEqual(events[2:], [
+        "delete " + manager.full_source_connection_name,
+        "delete " + manager.full_dest_connection_name,
+        "get operations/cp", "get operations/cp"])
+    self.assertEqual(
+        client_mock.projects_locations_connectionProfiles.Delete.call_count, 2)
+    self.assertEmpty(manager.ledger.GetLiveResources(
+        run_id=manager.stream_name))
+
+  def test_teardown_raises_on_failed_stream_delete(self):
+    failed = _operation(name="operations/stream")
+    failed.error = datastream.Status(code=9, message="stream is in use")
+    rm, client_mock, _ = self._get_torn_down_manager(failed)
+
+    with self.assertRaisesRegex(ValueError, "stream is in use"):
+      asyncio.run(rm.TearDown())
+
+    manager = rm.manager
+    client_mock.projects_locations_connectionProfiles.Delete.assert_not_called()
+    self.assertEqual(manager.ledger.Get(manager.full_stream_name).state,
+                     resource_ledger.STATE_DELETING)
+
+  def test_resume_adopts_resources_without_operation(self):
+    client_mock = mock.MagicMock()
+    client_mock.projects_locations_connectionProfiles.Create.return_value = (
+        _operation())
+    client_mock.projects_locations_connectionProfiles.Get.side_effect = (
+        datastream.HttpError({"status": 404}, "", ""))
+    client_mock.projects_locations_streams.Patch.return_value = _operation()
+    ledger = resource_ledger.ResourceLedger(":memory:")
+    rm = self._get_manager(client_mock, ledger=ledger, add_uid_suffix=False)
+    manager = rm.manager
+    # A crash after sending the create calls, before their operations.
+    for name, kind in (
+        (manager.full_source_connection_name,
+         resource_ledger.KIND_CONNECTION_PROFILE),
+        (manager.full_stream_name, resource_ledger.KIND_STREAM)):
+      ledger.Record(name, kind, resource_ledger.STATE_CREATING,
+                    run_id=manager.stream_name)
+
+    asyncio.run(rm.Resume(manager.stream_name))
+
+    client_mock.projects_locations_streams.Get.assert_called_once()
+    client_mock.projects_locations_streams.Create.assert_not_called()
+    self.assertEqual(
+        client_mock.projects_locations_connectionProfiles.Create.call_count, 2)
+    self.assertEqual(ledger.Get(manager.full_stream_name).state,
+                     resource_ledger.STATE_CREATED)
+
+  def test_concurrent_managers(self):
+    client_mock = mock.MagicMock()
+    client_mock.projects_locations_connectionProfiles.List.return_value = (
+        datastream.ListConnectionProfilesResponse())
+    managers = [self._get_manager(client_mock) for _ in range(20)]
+
+    async def _list_all():
+      return await asyncio.gather(
+          *[rm.ListConnectionProfiles() for rm in managers])
+
+    self.assertLen(asyncio.run(_list_all()), 20)
+
+
+if __name__ == "__main__":
+  googletest.main()
@@ -1,5 +1,6 @@
 """Utilities to start and manage a CDC stream from Cloud Datastream."""
 
+import functools
 import logging
 import time
 from typing import List, Tuple
@@ -10,6 +11,36 @@ try:
 except ModuleNotFoundError:
   import datastream  # pytype: disable=import-error  pylint: disable=g-import-not-at-top
 
+try:
+  from google3.experimental.dhercher.datastream_utils import api_rate_limiter  # pylint: disable=g-import-not-at-top
+except ModuleNotFoundError:
+  import api_rate_limiter  # pytype: disable=import-error  pylint: disable=g-import-not-at-top
+
+try:
+  from google3.experimental.dhercher.datastream_utils import connection_profile_registry  # pylint: disable=g-import-not-at-top
+except ModuleNotFoundError:
+  import connection_profile_registry  # pytype: disable=import-error  pylint: disable=g-import-not-at-top
+
+try:
+  from google3.experimental.dhercher.datastream_utils import fast_decode  # pylint: disable=g-import-not-at-top
+except ModuleNotFoundError:
+  import fast_decode  # pytype: disable=import-error  pylint: disable=g-import-not-at-top
+
+try:
+  from google3.experimental.dhercher.datastream_utils import gcs_purge  # pylint: disable=g-import-not-at-top
+except ModuleNotFoundError:
+  import gcs_purge  # pytype: disable=import-error  pylint: disable=g-import-not-at-top
+
+try:
+  from google3.experimental.dhercher.datastream_utils import pooled_http  # pylint: disable=g-import-not-at-top
+except ModuleNotFoundError:
+  import pooled_http  # pytype: disable=import-error  pylint: disable=g-import-not-at-top
+
+try:
+  from google3.experimental.dhercher.datastream_utils import resource_ledger  # pylint: disable=g-import-not-at-top
+except ModuleNotFoundError:
+  import resource_ledger  # pytype: disable=import-error  pylint: disable=g-import-not-at-top
+
 
 DEFAULT_REGION = "us-central1"
 
@@ -25,6 +56,11 @@ DEFAULT_STREAM_NAME = "datastream-test"
 DEFAULT_SOURCE_CP_NAME = "oracle-cp"
 DEFAULT_DEST_CP_NAME = "gcs-cp"
 
+# Operations are polled after 0.25s, then twice as long each time up to 5s,
+# so short operations such as FetchErrors return quickly.
+DEFAULT_POLL_INTERVAL = 0.25
+MAX_POLL_INTERVAL = 5
+
 
 class CloudDatastreamResourceManager(object):
   """Resource manager to start a CDC stream from Cloud Datastream.
@@ -53,6 +89,13 @@ class CloudDatastreamResourceManager(object):
       datastream_api_url=None,
       datastream_export_file_format=None,
       private_connection_name=None,
+      rate_limiter=None,
+      retry_policy=None,
+      ledger=None,
+      cp_registry=None,
+      object_store=None,
+      poll_interval=None,
+      sleep=None,
   ):
     """Initialize the CloudDatastreamResourceManager.
 
@@ -60,7 +103,9 @@ class CloudDatastreamResourceManager(object):
       project_number: The GCP Project number identifying your project.
       gcs_bucket_name: The GCS bucket name without gs:// added.
       region: The GCP region where DataStream is deployed.
-      client: The Datastream client to be used.
+      client: The Datastream client to be used. It is not changed, so it
+          should be built with num_retries=0 for RetryPolicy to make every
+          retry through the rate limiter.
       authorized_http: An authorized http to be supplied
           to the Datastream client.
       stream_name: The name or prefix of the stream.
@@ -77,6 +122,18 @@ class CloudDatastreamResourceManager(object):
           use if required
           (eg. projects/<project-id>/locations/<loc>/
           privateConnections/<private-conn-name>).
+      rate_limiter: The TokenBucketRateLimiter applied to every API call,
+          defaults to the limiter shared by the whole process.
+      retry_policy: The RetryPolicy used for retryable API errors.
+      ledger: An optional ResourceLedger recording every resource created,
+          used by TearDown and Resume instead of deriving names.
+      cp_registry: An optional ConnectionProfileRegistry used to reuse
+          existing connection profiles with matching settings.
+      object_store: The store used to purge GCS data on TearDown, defaults
+          to a gcs_purge.GcsObjectStore on the client's http.
+      poll_interval: Seconds before the first operation status check, which
+          doubles up to MAX_POLL_INTERVAL between later checks.
+      sleep: A time.sleep replacement, for tests.
     """
     self.project_number = project_number
     self.region = region or DEFAULT_REGION
@@ -96,13 +153,33 @@ class CloudDatastreamResourceManager(object):
     self.datastream_export_file_format = (
         datastream_export_file_format or DEFAULT_DATASTREAM_EXPORT_FILEFORMAT
         )
+    self.rate_limiter = (
+        rate_limiter or api_rate_limiter.GetDefaultRateLimiter())
+    self.retry_policy = retry_policy or api_rate_limiter.RetryPolicy()
+    self.ledger = ledger
+    self.cp_registry = cp_registry
+    self.object_store = object_store
+    self.poll_interval = (
+        DEFAULT_POLL_INTERVAL if poll_interval is None else poll_interval)
+    self._sleep = sleep or time.sleep
+    # Full names of shared connection profiles reused instead of created.
+    self._shared_source_cp = None
+    self._shared_dest_cp = None
+    self._listed_cp_fingerprints = None
     if client:
       self.client = client
     else:
       logging.info("Creating DataStream Client with Authorized HTTP")
       api_url = datastream_api_url or DATASTREAM_URL
+      # Default to a per-thread transport so the client can be shared by
+      # worker threads.
       self.client = datastream.DatastreamV1alpha1(
-          url=api_url, http=authorized_http, get_credentials=True)
+          url=api_url,
+          http=authorized_http or pooled_http.ThreadLocalHttp(),
+          get_credentials=True)
+      # RetryPolicy makes every retry, through the rate limiter; apitools'
+      # own retries would bypass it and delay the 429 backoff.
+      self.client.num_retries = 0
 
   @property
   def datastream_parent(self):
@@ -134,6 +211,8 @@ class CloudDatastreamResourceManager(object):
 
   @property
   def full_source_connection_name(self):
+    if self._shared_source_cp:
+      return self._shared_source_cp
     return (
         self.datastream_parent +
         "/connectionProfiles/" +
@@ -146,6 +225,8 @@ class CloudDatastreamResourceManager(object):
 
   @property
   def full_dest_connection_name(self):
+    if self._shared_dest_cp:
+      return self._shared_dest_cp
     return (
         self.datastream_parent +
         "/connectionProfiles/" +
@@ -173,24 +254,48 @@ class CloudDatastreamResourceManager(object):
     - Create a stream that reads from source into destination
     - Start the stream
     """
-    logging.info("Setting up Source Connection Profile")
-    # Create the Oracle Connection Profile
-    self._CreateDatabaseConnectionProfile()
-
-    logging.info("Setting up GCS Connection Profile")
-    self._CreateGcsConnectionProfile(
-        self.dest_connection_name,
-        bucket_name=self.gcs_bucket_name,
-        root_path=self.gcs_root_path)
-
-    logging.info("Creating stream on Datastream")
-    stream_op_result = self._CreateStream(self.stream_name,
-                                          self.full_source_connection_name,
-                                          self.full_dest_connection_name,
-                                          self.datastream_export_file_format)
+    source_fingerprint = self._GetSourceFingerprint()
+    self._shared_source_cp = self._FindSharedConnectionProfile(
+        source_fingerprint)
+    if self._shared_source_cp:
+      logging.info("Reusing Source Connection Profile %r",
+                   self._shared_source_cp)
+    elif self._IsRecordedAsCreated(self.full_source_connection_name):
+      logging.info("Source Connection Profile already exists")
+    else:
+      logging.info("Setting up Source Connection Profile")
+      # Create the Oracle Connection Profile
+      self._CreateDatabaseConnectionProfile()
+    self._ShareConnectionProfile(source_fingerprint,
+                                 self.full_source_connection_name)
+
+    dest_fingerprint = connection_profile_registry.GcsFingerprint(
+        self.gcs_bucket_name, self.gcs_root_path, self.datastream_parent)
+    self._shared_dest_cp = self._FindSharedConnectionProfile(dest_fingerprint)
+    if self._shared_dest_cp:
+      logging.info("Reusing GCS Connection Profile %r", self._shared_dest_cp)
+    elif self._IsRecordedAsCreated(self.full_dest_connection_name):
+      logging.info("GCS Connection Profile already exists")
+    else:
+      logging.info("Setting up GCS Connection Profile")
+      self._CreateGcsConnectionProfile(
+          self.dest_connection_name,
+          bucket_name=self.gcs_bucket_name,
+          root_path=self.gcs_root_path)
+    self._ShareConnectionProfile(dest_fingerprint,
+                                 self.full_dest_connection_name)
+
+    if self._IsRecordedAsCreated(self.full_stream_name):
+      logging.info("Stream already exists on Datastream")
+    else:
+      logging.info("Creating stream on Datastream")
+      stream_op_result = self._CreateStream(self.stream_name,
+                                            self.full_source_connection_name,
+                                            self.full_dest_connection_name,
+                                            self.datastream_export_file_format)
 
-    if stream_op_result.error:
-      raise ValueError(str(stream_op_result))
+      if stream_op_result.error:
+        raise ValueError(str(stream_op_result))
 
     logging.info("Starting CDC stream on Datastream")
     result = self._UpdateStreamState(
@@ -199,18 +304,86 @@ class CloudDatastreamResourceManager(object):
     if result.error:
       raise ValueError(str(result.error))
 
-  def TearDown(self):
+  def TearDown(self, purge_gcs=False, purge_checkpoint_path=None):
     """Stop and delete all resources started in SetUp.
 
     In this order:
     - Stop stream, then delete it
     - Delete destination GCS Connection Profile
     - Delete source Database Connection Profile
+    - Optionally delete the data the stream wrote under gcs_root_path
+
+    With a ledger, the resources recorded for this run are deleted instead.
+    Connection profiles still used by another stream in the registry are
+    kept.
+
+    Args:
+      purge_gcs: Whether to delete every object under gcs_root_path.
+      purge_checkpoint_path: An optional file used to resume an interrupted
+          purge.
     """
-    self._StopAndDeleteStream(self.full_stream_name)
+    released = (self.cp_registry.Release(self.full_stream_name)
+                if self.cp_registry else [])
+
+    if self.ledger:
+      handled = {entry.name for entry in self.ledger.GetLiveResources(
+          run_id=self.stream_name,
+          kind=resource_ledger.KIND_CONNECTION_PROFILE)}
+      self.TearDownFromLedger(run_id=self.stream_name)
+    else:
+      self._StopAndDeleteStream(self.full_stream_name)
+      handled = {self.full_source_connection_name,
+                 self.full_dest_connection_name}
+      self._DeleteUnusedConnectionProfile(self.full_source_connection_name)
+      self._DeleteUnusedConnectionProfile(self.full_dest_connection_name)
+
+    for cp_name in released:
+      if cp_name not in handled:
+        self._DeleteUnusedConnectionProfile(cp_name)
+
+    if purge_gcs:
+      self.PurgeGcsData(checkpoint_path=purge_checkpoint_path)
+
+  def PurgeGcsData(self, checkpoint_path=None):
+    """Delete every object the stream wrote under gcs_root_path."""
+    store = self.object_store or gcs_purge.GcsObjectStore(
+        self.gcs_bucket_name, self.client.http)
+    logging.info("Purging %s", self.gcs_location)
+    return gcs_purge.GcsPurger(
+        store, self.gcs_root_path, checkpoint_path=checkpoint_path).Purge()
+
+  def TearDownFromLedger(self, run_id=None):
+    """Delete every live resource in the ledger, streams first.
+
+    Args:
+      run_id: Only delete resources from this run (a suffixed stream name),
+          or from every run when None.
+    """
+    entries = self.ledger.GetLiveResources(run_id=run_id)
+    for entry in entries:
+      if entry.kind == resource_ledger.KIND_STREAM:
+        self._StopAndDeleteStream(entry.name)
 
-    self._DeleteConnectionProfile(self.full_source_connection_name)
-    self._DeleteConnectionProfile(self.full_dest_connection_name)
+    for entry in entries:
+      if entry.kind == resource_ledger.KIND_CONNECTION_PROFILE:
+        self._DeleteUnusedConnectionProfile(entry.name)
+
+  def Resume(self, run_id):
+    """Finish a SetUp interrupted by a crash, using the ledger.
+
+    Args:
+      run_id: The suffixed stream name of the interrupted run.
+    """
+    self._SelectRun(run_id)
+    self.SetUp()
+
+  def _SelectRun(self, run_id):
+    """Name the resources after those of an earlier run."""
+    prefix = self._stream_name + "-"
+    if run_id != self._stream_name and not run_id.startswith(prefix):
+      raise ValueError("Run %r does not match stream prefix %r" %
+                       (run_id, self._stream_name))
+    self._suffix = run_id[len(prefix):]
 
   def Describe(self):
     return "Manage a stream from Cloud Datastream."
@@ -228,21 +401,174 @@ class CloudDatastreamResourceManager(object):
       logging.info(stream_cp_source_log)
       logging.info(stream_cp_dest_log)
 
+  def _Call(self, method, request, idempotent=True):
+    """Run a Datastream API method with rate limiting and retries."""
+    return self.retry_policy.Call(method, request,
+                                  rate_limiter=self.rate_limiter,
+                                  idempotent=idempotent)
+
+  def _RecordResource(self, kind, full_name, state, operation=None):
+    if self.ledger:
+      self.ledger.Record(full_name, kind, state, run_id=self.stream_name,
+                         operation_name=getattr(operation, "name", None))
+
+  def _MarkResource(self, full_name, state, operation=None):
+    """Update the state of a resource that may already be in the ledger."""
+    entry = self.ledger.Get(full_name) if self.ledger else None
+    if entry:
+      self.ledger.Record(full_name, entry.kind, state,
+                         operation_name=getattr(operation, "name", None))
+
+  def _IsRecordedAsCreated(self, full_name):
+    """Return whether the ledger shows the resource was created.
+
+    A resource left in CREATING by a crash is checked through its operation.
+    """
+    entry = self.ledger.Get(full_name) if self.ledger else None
+    if not entry:
+      return False
+    if entry.state == resource_ledger.STATE_CREATED:
+      return True
+    if entry.state != resource_ledger.STATE_CREATING:
+      return False
+    if not entry.operation_name:
+      return self._AdoptResource(entry)
+
+    response = self._WaitForCompletion(
+        datastream.Operation(name=entry.operation_name, done=False))
+    state = resource_ledger.GetOperationState(response)
+    self._MarkResource(full_name, state)
+    return state == resource_ledger.STATE_CREATED
+
+  def _AdoptResource(self, entry):
+    """Look up a resource whose create call may have been sent.
+
+    A crash before the create operation was recorded leaves no operation to
+    check, so the resource itself is looked up by name.
+    """
+    get_methods = {
+        resource_ledger.KIND_STREAM: self._GetStream,
+        resource_ledger.KIND_CONNECTION_PROFILE: self._GetConnectionProfile,
+    }
+    if entry.kind not in get_methods:
+      return False
+    try:
+      get_methods[entry.kind](entry.name)
+    except datastream.HttpError as e:
+      if e.status_code == 404:
+        return False
+      raise
+
+    logging.info("Adopting %s %r created before a crash", entry.kind,
+                 entry.name)
+    self._MarkResource(entry.name, resource_ledger.STATE_CREATED)
+    return True
+
+  def _CreateResource(self, kind, full_name, method, request):
+    """Issue a create call and wait for it, recording it in the ledger."""
+    self._RecordResource(kind, full_name, resource_ledger.STATE_CREATING)
+    try:
+      response = self._Call(method, request, idempotent=False)
+    except datastream.HttpError:
+      self._RecordResource(kind, full_name, resource_ledger.STATE_FAILED)
+      raise
+    self._RecordResource(kind, full_name, resource_ledger.STATE_CREATING,
+                         response)
+    response = self._WaitForCompletion(response)
+    self._RecordResource(kind, full_name,
+                         resource_ledger.GetOperationState(response))
+    return response
+
+  def _GetSourceFingerprint(self):
+    if not self.cp_registry:
+      return None
+    if self.oracle_cp:
+      return connection_profile_registry.OracleFingerprint(
+          self.oracle_cp, self.private_connection_name,
+          self.datastream_parent)
+    if self.mysql_cp:
+      return connection_profile_registry.MysqlFingerprint(
+          self.getMysqlConnectionProfile(), self.private_connection_name,
+          self.datastream_parent)
+    return None
+
+  def _FindSharedConnectionProfile(self, fingerprint):
+    """Return the name of an existing profile to reuse, or None.
+
+    Profiles the registry does not know yet are looked up in a single listing
+    and adopted as shared but not owned, so they are never deleted.
+    """
+    if not self.cp_registry or not fingerprint:
+      return None
+
+    name = self.cp_registry.Lookup(fingerprint)
+    if name is None:
+      if self._listed_cp_fingerprints is None:
+        self._listed_cp_fingerprints = {}
+        for cp in self._ListAllConnectionProfiles():
+          self._listed_cp_fingerprints.setdefault(
+              connection_profile_registry.FingerprintConnectionProfile(
+                  cp, self.datastream_parent),
+              cp.name)
+      name = self._listed_cp_fingerprints.get(fingerprint)
+      if name is None:
+        return None
+      self.cp_registry.Register(fingerprint, name, owned=False)
+    return name
+
+  def _ShareConnectionProfile(self, fingerprint, cp_name):
+    """Register a profile and count this stream as one of its users."""
+    if not self.cp_registry or not fingerprint:
+      return
+    if self.cp_registry.Lookup(fingerprint) is None:
+      self.cp_registry.Register(fingerprint, cp_name)
+    self.cp_registry.AddReference(cp_name, self.full_stream_name)
+
+  def _DeleteUnusedConnectionProfile(self, cp_name):
+    """Delete a profile unless the registry shows it is still shared."""
+    if self.cp_registry and not self.cp_registry.CanDelete(cp_name):
+      logging.info("Keeping shared connection profile %r", cp_name)
+      return None
+
+    response = self._DeleteConnectionProfile(cp_name)
+    if self.cp_registry and response is not None:
+      self.cp_registry.Remove(cp_name)
+    return response
+
   def _UpdateStreamState(self, stream_name, state):
     request = datastream.DatastreamProjectsLocationsStreamsPatchRequest(
         name=stream_name,
         stream=datastream.Stream(state=state),
         updateMask="state")
 
-    response = self.client.projects_locations_streams.Patch(request)
+    response = self._Call(self.client.projects_locations_streams.Patch, request)
     return self._WaitForCompletion(response)
 
+  def _DeleteResource(self, full_name, method, request):
+    """Issue a delete call and wait for it, recording it in the ledger.
+
+    Raises:
+      ValueError: The delete operation finished with an error; the ledger
+          keeps the resource as DELETING.
+    """
+    response = self._Call(method, request)
+    self._MarkResource(full_name, resource_ledger.STATE_DELETING, response)
+    response = self._WaitForCompletion(response)
+    if response.error:
+      raise ValueError(str(response.error))
+    self._MarkResource(full_name,
+                       resource_ledger.GetDeleteOperationState(response))
+    return response
+
   def _WaitForCompletion(self, response, timeout=120):
     # After requesting an operation, we need to wait for its completion
     start = time.time()
+    interval = self.poll_interval
     while not response.done:
-      time.sleep(5)
-      response = self.client.projects_locations_operations.Get(
+      self._sleep(interval)
+      interval = min(interval * 2, MAX_POLL_INTERVAL)
+      response = self._Call(
+          self.client.projects_locations_operations.Get,
           datastream.DatastreamProjectsLocationsOperationsGetRequest(
               name=response.name))
 
@@ -253,15 +579,21 @@ class CloudDatastreamResourceManager(object):
 
     return response
 
-  def _DeleteConnectionProfile(self, cp_name):
+  def _DeleteConnectionProfile(self, cp_name, ignore_errors=True):
+    """Delete a connection profile, logging errors unless told otherwise."""
     delete_req = (
         datastream.DatastreamProjectsLocationsConnectionProfilesDeleteRequest(
             name=cp_name))
 
     try:
-      return self.client.projects_locations_connectionProfiles.Delete(
+      return self._DeleteResource(
+          cp_name, self.client.projects_locations_connectionProfiles.Delete,
           delete_req)
-    except datastream.HttpError:
+    except datastream.HttpError as e:
+      if e.status_code == 404:
+        self._MarkResource(cp_name, resource_ledger.STATE_DELETED)
+      if not ignore_errors:
+        raise
       logging.exception("Unable to delete connection profile %r.",
                         cp_name)
       return None
@@ -270,33 +602,184 @@ class CloudDatastreamResourceManager(object):
     try:
       self._UpdateStreamState(stream_name,
                               datastream.Stream.StateValueValuesEnum.PAUSED)
-    except datastream.HttpError:
+    except datastream.HttpError as e:
+      if e.status_code == 404:
+        self._MarkResource(stream_name, resource_ledger.STATE_DELETED)
       logging.exception("There was an issue stopping Datastream stream %r.",
                         stream_name)
       return None
 
+    return self._DeleteStream(stream_name)
+
+  def _DeleteStream(self, stream_name):
     delete_request = datastream.DatastreamProjectsLocationsStreamsDeleteRequest(
         name=stream_name)
 
-    return self.client.projects_locations_streams.Delete(delete_request)
+    return self._DeleteResource(
+        stream_name, self.client.projects_locations_streams.Delete,
+        delete_request)
+
+  def _GetStream(self, stream_name):
+    request = datastream.DatastreamProjectsLocationsStreamsGetRequest(
+        name=stream_name)
+    return self._Call(self.client.projects_locations_streams.Get, request)
 
-  def _ListStreams(self):
+  def _GetConnectionProfile(self, cp_name):
+    request = (
+        datastream.DatastreamProjectsLocationsConnectionProfilesGetRequest(
+            name=cp_name))
+    return self._Call(self.client.projects_locations_connectionProfiles.Get,
+                      request)
+
+  def _ListStreams(self, page_token=None):
     request = (
         datastream.DatastreamProjectsLocationsStreamsListRequest(
-            parent=self.datastream_parent))
-    return self.client.projects_locations_streams.List(request)
+            parent=self.datastream_parent, pageToken=page_token))
+    return self._Call(self.client.projects_locations_streams.List, request)
+
+  def _ListAllPages(self, list_method, field):
+    """Return every item of a paginated List call, following all pages."""
+    items = []
+    page_token = None
+    while True:
+      response = list_method(page_token=page_token)
+      items.extend(getattr(response, field) or ())
+      page_token = response.nextPageToken
+      if not page_token:
+        return items
+
+  def _ListAllStreams(self):
+    """Return every stream in the parent, following all pages."""
+    return self._ListAllPages(self._ListStreams, "streams")
+
+  def _FetchErrors(self, stream_name):
+    """Return the errors reported by FetchErrors for a stream.
 
-  def _ListConnectionProfiles(self):
+    Args:
+      stream_name: The full resource name of the stream.
+    Returns:
+      A list of datastream.Error messages.
+    """
+    request = datastream.DatastreamProjectsLocationsStreamsFetchErrorsRequest(
+        stream=stream_name,
+        fetchErrorsRequest=datastream.FetchErrorsRequest())
+    response = self._WaitForCompletion(
+        self._Call(self.client.projects_locations_streams.FetchErrors,
+                   request))
+    if not response.done or response.error or not response.response:
+      return []
+
+    value = datastream.encoding.MessageToPyValue(response.response)
+    return [datastream.encoding.PyValueToMessage(datastream.Error, error)
+            for error in value.get("errors", ())]
+
+  def _ListConnectionProfiles(self, page_token=None):
     request = (
         datastream.DatastreamProjectsLocationsConnectionProfilesListRequest(
-            parent=self.datastream_parent))
-    return self.client.projects_locations_connectionProfiles.List(request)
+            parent=self.datastream_parent, pageToken=page_token))
+    return self._Call(
+        self.client.projects_locations_connectionProfiles.List, request)
+
+  def _ListAllConnectionProfiles(self):
+    return self._ListAllPages(self._ListConnectionProfiles,
+                              "connectionProfiles")
 
-  def _ListPrivateConnections(self):
+  def _ListPrivateConnections(self, page_token=None):
     request = (
         datastream.DatastreamProjectsLocationsPrivateConnectionsListRequest(
-            parent=self.datastream_parent))
-    return self.client.projects_locations_privateConnections.List(request)
+            parent=self.datastream_parent, pageToken=page_token))
+    return self._Call(
+        self.client.projects_locations_privateConnections.List, request)
+
+  def _ListAllPrivateConnections(self):
+    return self._ListAllPages(self._ListPrivateConnections,
+                              "privateConnections")
+
+  def _ListOperations(self, page_token=None):
+    request = datastream.DatastreamProjectsLocationsOperationsListRequest(
+        name=self.datastream_parent, pageToken=page_token)
+    return self._Call(self.client.projects_locations_operations.List, request)
+
+  def _ListAllOperations(self):
+    return self._ListAllPages(self._ListOperations, "operations")
+
+  def _CancelOperation(self, operation_name):
+    request = datastream.DatastreamProjectsLocationsOperationsCancelRequest(
+        name=operation_name,
+        cancelOperationRequest=datastream.CancelOperationRequest())
+    return self._Call(self.client.projects_locations_operations.Cancel,
+                      request)
+
+  def _DeleteOperation(self, operation_name):
+    request = datastream.DatastreamProjectsLocationsOperationsDeleteRequest(
+        name=operation_name)
+    return self._Call(self.client.projects_locations_operations.Delete,
+                      request)
+
+  def _DeletePrivateConnection(self, private_connection_name):
+    request = (
+        datastream.DatastreamProjectsLocationsPrivateConnectionsDeleteRequest(
+            name=private_connection_name))
+    return self._DeleteResource(
+        private_connection_name,
+        self.client.projects_locations_privateConnections.Delete, request)
+
+  def _ListStreamObjects(self, stream_name, page_token=None,
+                         use_fast_decode=False, filter_expression=None,
+                         page_size=None):
+    """Return one page of the objects in a stream.
+
+    Args:
+      stream_name: The full resource name of the stream.
+      page_token: The nextPageToken from a previous page, if any.
+      use_fast_decode: Whether to return fast_decode records instead of a
+          ListStreamObjectsResponse message.
+      filter_expression: An optional server side filter for the objects.
+      page_size: The maximum number of objects to return (up to 1000).
+    Returns:
+      A ListStreamObjectsResponse or ListStreamObjectsRecord.
+    """
+    request = datastream.DatastreamProjectsLocationsStreamsObjectsListRequest(
+        parent=stream_name, pageToken=page_token, filter=filter_expression,
+        pageSize=page_size)
+    service = self.client.projects_locations_streams_objects
+    if not use_fast_decode:
+      return self._Call(service.List, request)
+
+    content = self._Call(
+        functools.partial(fast_decode.CallForJson, service, "List"), request)
+    return fast_decode.DecodeListStreamObjectsResponse(content)
+
+  def _DiscoverConnectionProfile(self, connection_profile_name,
+                                 oracle_rdbms=None, recursive=True,
+                                 use_fast_decode=False):
+    """Return the catalog discovered through a connection profile.
+
+    Args:
+      connection_profile_name: The full resource name of the profile.
+      oracle_rdbms: An optional OracleRdbms to limit discovery to.
+      recursive: Whether to discover all children of the supplied objects.
+      use_fast_decode: Whether to return fast_decode records instead of a
+          DiscoverConnectionProfileResponse message.
+    Returns:
+      A DiscoverConnectionProfileResponse or DiscoverConnectionProfileRecord.
+    """
+    request = (
+        datastream.DatastreamProjectsLocationsConnectionProfilesDiscoverRequest(
+            parent=self.datastream_parent,
+            discoverConnectionProfileRequest=(
+                datastream.DiscoverConnectionProfileRequest(
+                    connectionProfileName=connection_profile_name,
+                    oracleRdbms=oracle_rdbms,
+                    recursive=recursive))))
+    service = self.client.projects_locations_connectionProfiles
+    if not use_fast_decode:
+      return self._Call(service.Discover, request)
+
+    content = self._Call(
+        functools.partial(fast_decode.CallForJson, service, "Discover"),
+        request)
+    return fast_decode.DecodeDiscoverConnectionProfileResponse(content)
 
   def _CreateDatabaseConnectionProfile(self):
     if self.oracle_cp:
@@ -329,13 +812,7 @@ class CloudDatastreamResourceManager(object):
         displayName=name,
         mysqlProfile=datastream.MysqlProfile(**mysql_cp),
         noConnectivity=datastream.NoConnectivitySettings())
-    request = (
-        datastream.DatastreamProjectsLocationsConnectionProfilesCreateRequest(
-            parent=self.datastream_parent,
-            connectionProfileId=name,
-            connectionProfile=connection_profile))
-    response = self.client.projects_locations_connectionProfiles.Create(request)
-    return self._WaitForCompletion(response)
+    return self._CreateConnectionProfile(name, connection_profile)
 
   def _CreateOracleConnectionProfile(self, name, oracle_cp):
     logging.info(
@@ -349,13 +826,7 @@ class CloudDatastreamResourceManager(object):
         oracleProfile=datastream.OracleProfile(**oracle_cp),
         noConnectivity=no_conn,
         privateConnectivity=private_conn)
-    request = (
-        datastream.DatastreamProjectsLocationsConnectionProfilesCreateRequest(
-            parent=self.datastream_parent,
-            connectionProfileId=name,
-            connectionProfile=connection_profile))
-    response = self.client.projects_locations_connectionProfiles.Create(request)
-    return self._WaitForCompletion(response)
+    return self._CreateConnectionProfile(name, connection_profile)
 
   def _CreateGcsConnectionProfile(self, name, bucket_name, root_path):
     connection_profile = datastream.ConnectionProfile(
@@ -363,14 +834,19 @@ class CloudDatastreamResourceManager(object):
         gcsProfile=datastream.GcsProfile(bucketName=bucket_name,
                                          rootPath=root_path),
         noConnectivity=datastream.NoConnectivitySettings())
+    return self._CreateConnectionProfile(name, connection_profile)
+
+  def _CreateConnectionProfile(self, name, connection_profile):
+    """Create a ConnectionProfile message under the parent and wait for it."""
     request = (
         datastream.DatastreamProjectsLocationsConnectionProfilesCreateRequest(
             parent=self.datastream_parent,
             connectionProfileId=name,
-            connectionProfile=connection_profile,
-        ))
-    response = self.client.projects_locations_connectionProfiles.Create(request)
-    return self._WaitForCompletion(response)
+            connectionProfile=connection_profile))
+    return self._CreateResource(
+        resource_ledger.KIND_CONNECTION_PROFILE,
+        self.datastream_parent + "/connectionProfiles/" + name,
+        self.client.projects_locations_connectionProfiles.Create, request)
 
   def _get_source_config(self):
     if self.oracle_cp:
@@ -483,17 +959,21 @@ class CloudDatastreamResourceManager(object):
         sourceConfig=self._get_source_config(),
         backfillAll=datastream.BackfillAllStrategy(),
     )
+    return self._CreateStreamFromMessage(name, stream)
 
+  def _CreateStreamFromMessage(self, name, stream):
+    """Create a Stream message under the parent and wait for it."""
     request = (
         datastream.DatastreamProjectsLocationsStreamsCreateRequest(
             parent=self.datastream_parent, streamId=name, stream=stream))
 
-    response = self.client.projects_locations_streams.Create(request)
-
-    response = self._WaitForCompletion(response)
+    response = self._CreateResource(
+        resource_ledger.KIND_STREAM,
+        self.datastream_parent + "/streams/" + name,
+        self.client.projects_locations_streams.Create, request)
 
     logging.debug("Stream creation response: %r", response)
-    if not response.error:
+    if response.done and not response.error:
       logging.info("SUCCESS: Created stream %r", name)
     return response
 
@@ -501,5 +981,5 @@ class CloudDatastreamResourceManager(object):
     request = datastream.DatastreamProjectsLocationsStreamsStartRequest(
         name=stream_name)
 
-    response = self.client.projects_locations_streams.Start(request)
+    response = self._Call(self.client.projects_locations_streams.Start, request)
     return self._WaitForCompletion(response)
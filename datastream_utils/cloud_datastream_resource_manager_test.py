@@ -1,9 +1,14 @@
 """Tests for google3.cloud.dataflow.testing.integration.teleport.environment.cloud_datastream_resource_manager."""
 
 import logging
+import os
+
 import mock
 
 from google3.experimental.dhercher.datastream_utils import cloud_datastream_resource_manager
+from google3.experimental.dhercher.datastream_utils import connection_profile_registry
+from google3.experimental.dhercher.datastream_utils import gcs_purge
+from google3.experimental.dhercher.datastream_utils import resource_ledger
 from google3.google.cloud.datastream import datastream
 from google3.testing.pybase import googletest
 
@@ -36,6 +41,39 @@ class CloudDatastreamResourceManagerTest(googletest.TestCase):
     self.assertStartsWith(rm.gcs_location,
                           "gs://bucket-name/rootprefix/")
 
+  @mock.patch.object(cloud_datastream_resource_manager.datastream,
+                     "DatastreamV1alpha1")
+  def test_apitools_retries_are_disabled(self, client_class):
+    client_class.return_value = mock.MagicMock(num_retries=5)
+    rm = cloud_datastream_resource_manager.CloudDatastreamResourceManager(
+        1234567890, "bucket-name", authorized_http=mock.MagicMock(),
+        oracle_cp=_EX_ORACLE_CP)
+    self.assertEqual(rm.client.num_retries, 0)
+
+    # A client passed in is left as the caller built it.
+    client_mock = mock.MagicMock(num_retries=5)
+    cloud_datastream_resource_manager.CloudDatastreamResourceManager(
+        1234567890, "bucket-name",
+        client=client_mock, oracle_cp=_EX_ORACLE_CP)
+    self.assertEqual(client_mock.num_retries, 5)
+
+  def test_wait_for_completion_backs_off(self):
+    client_mock = mock.MagicMock()
+    client_mock.projects_locations_operations.Get.side_effect = [
+        datastream.Operation(done=False, name="operations/op")] * 3 + [
+            datastream.Operation(done=True, name="operations/op")]
+    sleep = mock.Mock()
+    rm = cloud_datastream_resource_manager.CloudDatastreamResourceManager(
+        1234567890, "bucket-name", client=client_mock,
+        oracle_cp=_EX_ORACLE_CP, sleep=sleep)
+
+    response = rm._WaitForCompletion(
+        datastream.Operation(done=False, name="operations/op"))
+
+    self.assertTrue(response.done)
+    self.assertEqual([c[0][0] for c in sleep.call_args_list],
+                     [0.25, 0.5, 1.0, 2.0])
+
   def test_create_cps(self):
     client_mock = mock.MagicMock()
     rm = cloud_datastream_resource_manager.CloudDatastreamResourceManager(
@@ -55,6 +93,22 @@ class CloudDatastreamResourceManagerTest(googletest.TestCase):
         client=client_mock, oracle_cp=_EX_ORACLE_CP)
     logging.warning(rm._ListConnectionProfiles())
 
+  def test_list_stream_objects_fast_decode(self):
+    client_mock = mock.MagicMock()
+    rm = cloud_datastream_resource_manager.CloudDatastreamResourceManager(
+        1234567890, "bucket-name",
+        client=client_mock, oracle_cp=_EX_ORACLE_CP)
+
+    content = '{"streamObjects": [{"name": "o1"}], "nextPageToken": "t"}'
+    with mock.patch.object(cloud_datastream_resource_manager.fast_decode,
+                           "CallForJson", return_value=content):
+      response = rm._ListStreamObjects(rm.full_stream_name,
+                                       use_fast_decode=True)
+
+    self.assertEqual(response.nextPageToken, "t")
+    self.assertEqual(response.streamObjects[0].name, "o1")
+    client_mock.projects_locations_streams_objects.List.assert_not_called()
+
   def test_create_stream(self):
     client_mock = mock.create_autospec(datastream.DatastreamV1alpha1,
                                        instance=True)
@@ -134,6 +188,167 @@ class CloudDatastreamResourceManagerTest(googletest.TestCase):
     rm.SetUp()
     rm.TearDown()
 
+  def test_ledger_records_and_tears_down(self):
+    client_mock = mock.MagicMock()
+    done = datastream.Operation(done=True, name="operations/op")
+    client_mock.projects_locations_connectionProfiles.Create.return_value = done
+    client_mock.projects_locations_streams.Create.return_value = done
+    client_mock.projects_locations_streams.Patch.return_value = done
+    client_mock.projects_locations_streams.Delete.return_value = done
+    client_mock.projects_locations_connectionProfiles.Delete.return_value = (
+        done)
+    ledger = resource_ledger.ResourceLedger(":memory:")
+    rm = cloud_datastream_resource_manager.CloudDatastreamResourceManager(
+        1234567890, "bucket-name",
+        client=client_mock, oracle_cp=_EX_ORACLE_CP, ledger=ledger)
+
+    rm.SetUp()
+
+    entries = ledger.GetLiveResources(run_id=rm.stream_name)
+    self.assertEqual(
+        sorted(e.name for e in entries),
+        sorted([rm.full_source_connection_name, rm.full_dest_connection_name,
+                rm.full_stream_name]))
+    self.assertTrue(all(e.state == resource_ledger.STATE_CREATED
+                        for e in entries))
+
+    # A new process resumes the run without creating anything again.
+    resumed = (
+        cloud_datastream_resource_manager.CloudDatastreamResourceManager(
+            1234567890, "bucket-name",
+            client=client_mock, oracle_cp=_EX_ORACLE_CP, ledger=ledger))
+    resumed.Resume(rm.stream_name)
+    self.assertEqual(
+        client_mock.projects_locations_connectionProfiles.Create.call_count, 2)
+    self.assertEqual(resumed.full_stream_name, rm.full_stream_name)
+
+    resumed.TearDown()
+    client_mock.projects_locations_streams.Delete.assert_called_once()
+    self.assertEqual(
+        client_mock.projects_locations_connectionProfiles.Delete.call_count, 2)
+    self.assertEmpty(ledger.GetLiveResources(run_id=rm.stream_name))
+    self.assertEqual(ledger.Get(rm.full_stream_name).state,
+                     resource_ledger.STATE_DELETED)
+
+  def test_resume_adopts_resources_without_operation(self):
+    client_mock = mock.MagicMock()
+    done = datastream.Operation(done=True, name="operations/op")
+    client_mock.projects_locations_connectionProfiles.Create.return_value = done
+    client_mock.projects_locations_connectionProfiles.Get.side_effect = (
+        datastream.HttpError({"status": 404}, "", ""))
+    client_mock.projects_locations_streams.Patch.return_value = done
+    ledger = resource_ledger.ResourceLedger(":memory:")
+    rm = cloud_datastream_resource_manager.CloudDatastreamResourceManager(
+        1234567890, "bucket-name", client=client_mock,
+        oracle_cp=_EX_ORACLE_CP, add_uid_suffix=False, ledger=ledger)
+    # A crash after sending the create calls, before their operations.
+    for name, kind in (
+        (rm.full_source_connection_name,
+         resource_ledger.KIND_CONNECTION_PROFILE),
+        (rm.full_stream_name, resource_ledger.KIND_STREAM)):
+      ledger.Record(name, kind, resource_ledger.STATE_CREATING,
+                    run_id=rm.stream_name)
+
+    rm.Resume(rm.stream_name)
+
+    client_mock.projects_locations_streams.Get.assert_called_once()
+    client_mock.projects_locations_streams.Create.assert_not_called()
+    self.assertEqual(
+        client_mock.projects_locations_connectionProfiles.Create.call_count, 2)
+    self.assertEqual(ledger.Get(rm.full_stream_name).state,
+                     resource_ledger.STATE_CREATED)
+
+  def test_registry_shares_connection_profiles(self):
+    client_mock = mock.MagicMock()
+    done = datastream.Operation(done=True, name="operations/op")
+    client_mock.projects_locations_connectionProfiles.Create.return_value = done
+    client_mock.projects_locations_connectionProfiles.List.return_value = (
+        datastream.ListConnectionProfilesResponse())
+    client_mock.projects_locations_streams.Create.return_value = done
+    client_mock.projects_locations_streams.Patch.return_value = done
+    client_mock.projects_locations_streams.Delete.return_value = done
+    client_mock.projects_locations_connectionProfiles.Delete.return_value = done
+    registry = connection_profile_registry.ConnectionProfileRegistry(
+        ":memory:")
+    managers = [
+        cloud_datastream_resource_manager.CloudDatastreamResourceManager(
+            1234567890, "bucket-name", client=client_mock,
+            oracle_cp=_EX_ORACLE_CP, add_uid_suffix=False,
+            stream_name=stream_name, source_cp_name=stream_name + "-src",
+            target_cp_name=stream_name + "-gcs", cp_registry=registry)
+        for stream_name in ("first", "second")]
+
+    for rm in managers:
+      rm.SetUp()
+
+    self.assertEqual(
+        client_mock.projects_locations_connectionProfiles.Create.call_count, 2)
+    self.assertEqual(managers[1].full_source_connection_name,
+                     managers[0].full_source_connection_name)
+    self.assertEqual(managers[1].full_dest_connection_name,
+                     managers[0].full_dest_connection_name)
+    self.assertEqual(client_mock.projects_locations_streams.Create.call_count,
+                     2)
+
+    managers[0].TearDown()
+    client_mock.projects_locations_connectionProfiles.Delete.assert_not_called()
+
+    managers[1].TearDown()
+    self.assertEqual(
+        client_mock.projects_locations_connectionProfiles.Delete.call_count, 2)
+
+  def test_registry_keeps_scopes_apart(self):
+    client_mock = mock.MagicMock()
+    done = datastream.Operation(done=True, name="operations/op")
+    client_mock.projects_locations_connectionProfiles.Create.return_value = done
+    client_mock.projects_locations_connectionProfiles.List.return_value = (
+        datastream.ListConnectionProfilesResponse())
+    client_mock.projects_locations_streams.Create.return_value = done
+    client_mock.projects_locations_streams.Patch.return_value = done
+    registry = connection_profile_registry.ConnectionProfileRegistry(
+        ":memory:")
+    managers = [
+        cloud_datastream_resource_manager.CloudDatastreamResourceManager(
+            project_number, "bucket-name", region=region, client=client_mock,
+            oracle_cp=_EX_ORACLE_CP, add_uid_suffix=False,
+            cp_registry=registry)
+        for project_number, region in ((1234567890, "us-central1"),
+                                       (1234567890, "europe-west1"),
+                                       (987654321, "us-central1"))]
+
+    for rm in managers:
+      rm.SetUp()
+
+    # Each scope gets its own profiles, even with identical settings.
+    self.assertEqual(
+        client_mock.projects_locations_connectionProfiles.Create.call_count, 6)
+    self.assertLen({rm.full_source_connection_name for rm in managers}, 3)
+    self.assertLen({rm.full_dest_connection_name for rm in managers}, 3)
+    for rm in managers:
+      self.assertStartsWith(rm.full_source_connection_name,
+                            rm.datastream_parent + "/")
+
+  def test_tear_down_purges_gcs_data(self):
+    root = self.create_tempdir().full_path
+    for name in ("rootprefix/run/a.avro", "rootprefix/other/b.avro"):
+      os.makedirs(os.path.dirname(os.path.join(root, name)), exist_ok=True)
+      open(os.path.join(root, name), "w").close()
+    store = gcs_purge.LocalObjectStore(root)
+    client_mock = mock.MagicMock()
+    done = datastream.Operation(done=True, name="operations/op")
+    client_mock.projects_locations_streams.Patch.return_value = done
+    client_mock.projects_locations_streams.Delete.return_value = done
+    client_mock.projects_locations_connectionProfiles.Delete.return_value = done
+    rm = cloud_datastream_resource_manager.CloudDatastreamResourceManager(
+        1234567890, "bucket-name", client=client_mock,
+        oracle_cp=_EX_ORACLE_CP, gcs_root_path="/rootprefix/run/",
+        add_uid_suffix=False, object_store=store)
+
+    rm.TearDown(purge_gcs=True)
+
+    self.assertEqual(store.ListPage("rootprefix/")[0],
+                     ["rootprefix/other/b.avro"])
+
 
 if __name__ == "__main__":
   googletest.main()
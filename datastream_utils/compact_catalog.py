@@ -0,0 +1,140 @@
+"""Compact, column-oriented storage for discovered Oracle catalogs.
+
+A discovered catalog normally holds one OracleColumn message per column,
+which costs a few hundred bytes of Python objects each. CompactOracleCatalog
+keeps each table's columns as parallel arrays (interned strings plus typed
+arrays for the numeric and boolean fields) and only builds OracleColumn
+messages when they are asked for.
+"""
+
+import array
+import sys
+
+try:
+  from google3.google.cloud.datastream import datastream  # pylint: disable=g-import-not-at-top
+except ModuleNotFoundError:
+  import datastream  # pytype: disable=import-error  pylint: disable=g-import-not-at-top
+
+
+# Stored in place of None, which typed arrays cannot hold.
+_NULL_INT = -(2 ** 31)
+_NULL_BOOL = 2
+
+_INT_FIELDS = ("length", "ordinalPosition", "precision", "scale")
+_BOOL_FIELDS = ("nullable", "primaryKey")
+
+
+def _Intern(value):
+  return sys.intern(value) if value is not None else None
+
+
+class CompactOracleColumns(object):
+  """The columns of one table, stored field by field."""
+
+  __slots__ = (
+      ("columnName", "dataType", "encoding") + _INT_FIELDS + _BOOL_FIELDS)
+
+  def __init__(self):
+    self.columnName = []
+    self.dataType = []
+    self.encoding = []
+    for field in _INT_FIELDS:
+      setattr(self, field, array.array("i"))
+    for field in _BOOL_FIELDS:
+      setattr(self, field, bytearray())
+
+  def __len__(self):
+    return len(self.columnName)
+
+  def Append(self, column):
+    """Add a column from an OracleColumn message or OracleColumnRecord."""
+    self.columnName.append(_Intern(column.columnName))
+    self.dataType.append(_Intern(column.dataType))
+    self.encoding.append(_Intern(column.encoding))
+    for field in _INT_FIELDS:
+      value = getattr(column, field)
+      getattr(self, field).append(_NULL_INT if value is None else value)
+    for field in _BOOL_FIELDS:
+      value = getattr(column, field)
+      getattr(self, field).append(_NULL_BOOL if value is None else int(value))
+
+  def GetValue(self, field, index):
+    """Return a single field of a column, with None for unset values."""
+    value = getattr(self, field)[index]
+    if field in _INT_FIELDS:
+      return None if value == _NULL_INT else value
+    if field in _BOOL_FIELDS:
+      return None if value == _NULL_BOOL else bool(value)
+    return value
+
+  def GetColumn(self, index):
+    """Return the column at `index` as an OracleColumn message."""
+    return datastream.OracleColumn(
+        **{field: self.GetValue(field, index) for field in self.__slots__})
+
+  def GetColumns(self):
+    return [self.GetColumn(index) for index in range(len(self))]
+
+  def GetIndex(self, column_name):
+    """Return the position of `column_name`, or None if it is not present."""
+    try:
+      return self.columnName.index(column_name)
+    except ValueError:
+      return None
+
+
+class CompactOracleCatalog(object):
+  """A discovered Oracle catalog keyed by (schema, table)."""
+
+  def __init__(self):
+    self._tables = {}
+
+  def __len__(self):
+    return len(self._tables)
+
+  def __contains__(self, schema_table):
+    return schema_table in self._tables
+
+  @classmethod
+  def FromOracleRdbms(cls, oracle_rdbms):
+    """Build a catalog from an OracleRdbms message or fast_decode record."""
+    catalog = cls()
+    catalog.AddOracleRdbms(oracle_rdbms)
+    return catalog
+
+  def AddOracleRdbms(self, oracle_rdbms):
+    for schema in oracle_rdbms.oracleSchemas or ():
+      for table in schema.oracleTables or ():
+        self.AddTable(schema.schemaName, table.tableName,
+                      table.oracleColumns or ())
+
+  def AddTable(self, schema_name, table_name, columns):
+    """Add or replace a table from an iterable of columns."""
+    compact_columns = CompactOracleColumns()
+    for column in columns:
+      compact_columns.Append(column)
+    self._tables[(_Intern(schema_name), _Intern(table_name))] = compact_columns
+    return compact_columns
+
+  def GetTableNames(self):
+    """Return the (schema, table) pairs in the catalog."""
+    return list(self._tables)
+
+  def GetCompactColumns(self, schema_name, table_name):
+    return self._tables[(schema_name, table_name)]
+
+  def GetColumns(self, schema_name, table_name):
+    """Return a table's columns as OracleColumn messages."""
+    return self._tables[(schema_name, table_name)].GetColumns()
+
+  def ToOracleRdbms(self):
+    """Return the whole catalog as an OracleRdbms message."""
+    schema_tables = {}
+    for (schema_name, table_name), columns in self._tables.items():
+      schema_tables.setdefault(schema_name, []).append(
+          datastream.OracleTable(tableName=table_name,
+                                 oracleColumns=columns.GetColumns()))
+
+    return datastream.OracleRdbms(oracleSchemas=[
+        datastream.OracleSchema(schemaName=schema_name, oracleTables=tables)
+        for schema_name, tables in schema_tables.items()])
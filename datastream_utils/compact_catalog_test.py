@@ -0,0 +1,61 @@
+"""Tests for google3.experimental.dhercher.datastream_utils.compact_catalog."""
+
+from google3.experimental.dhercher.datastream_utils import compact_catalog
+from google3.google.cloud.datastream import datastream
+from google3.testing.pybase import googletest
+
+_COLUMNS = [
+    datastream.OracleColumn(columnName="ID", dataType="NUMBER", precision=10,
+                            scale=0, nullable=False, primaryKey=True,
+                            ordinalPosition=1),
+    datastream.OracleColumn(columnName="NAME", dataType="VARCHAR2",
+                            length=255, encoding="AL32UTF8", nullable=True,
+                            ordinalPosition=2),
+]
+
+
+class CompactOracleCatalogTest(googletest.TestCase):
+
+  def test_round_trip_columns(self):
+    catalog = compact_catalog.CompactOracleCatalog()
+    catalog.AddTable("HR", "EMPLOYEES", _COLUMNS)
+
+    self.assertEqual(catalog.GetColumns("HR", "EMPLOYEES"), _COLUMNS)
+
+  def test_unset_values_stay_unset(self):
+    catalog = compact_catalog.CompactOracleCatalog()
+    columns = catalog.AddTable("HR", "EMPLOYEES", _COLUMNS)
+
+    self.assertIsNone(columns.GetValue("precision", 1))
+    self.assertIsNone(columns.GetValue("primaryKey", 1))
+    self.assertEqual(columns.GetValue("length", 1), 255)
+    self.assertEqual(columns.GetIndex("NAME"), 1)
+    self.assertIsNone(columns.GetIndex("MISSING"))
+
+  def test_oracle_rdbms_round_trip(self):
+    oracle_rdbms = datastream.OracleRdbms(oracleSchemas=[
+        datastream.OracleSchema(schemaName="HR", oracleTables=[
+            datastream.OracleTable(tableName="EMPLOYEES",
+                                   oracleColumns=_COLUMNS),
+            datastream.OracleTable(tableName="JOBS", oracleColumns=[])])])
+
+    catalog = compact_catalog.CompactOracleCatalog.FromOracleRdbms(
+        oracle_rdbms)
+
+    self.assertLen(catalog, 2)
+    self.assertIn(("HR", "JOBS"), catalog)
+    self.assertEqual(catalog.ToOracleRdbms(), oracle_rdbms)
+
+  def test_strings_are_interned(self):
+    catalog = compact_catalog.CompactOracleCatalog()
+    first = catalog.AddTable("HR", "A", _COLUMNS)
+    second = catalog.AddTable("HR", "B", [
+        datastream.OracleColumn(columnName="".join(["N", "AME"]),
+                                dataType="".join(["VARCHAR", "2"]))])
+
+    self.assertIs(first.dataType[1], second.dataType[0])
+    self.assertIs(first.columnName[1], second.columnName[0])
+
+
+if __name__ == "__main__":
+  googletest.main()
@@ -0,0 +1,125 @@
+"""Slim records for fleet-wide stream and stream object listings.
+
+A Stream message carries its full source and destination configs and label
+maps, and a StreamObject message its nested error details, so holding tens of
+thousands of them costs far more memory than the handful of fields listing
+and monitoring need. The records here keep only those fields, as interned
+strings and counts, and an Inventory can export them column by column for
+analysis.
+"""
+
+import array
+import csv
+import sys
+import threading
+
+try:
+  from google3.experimental.dhercher.datastream_utils import fast_decode  # pylint: disable=g-import-not-at-top
+except ModuleNotFoundError:
+  import fast_decode  # pytype: disable=import-error  pylint: disable=g-import-not-at-top
+
+
+def _Intern(value):
+  return sys.intern(value) if value is not None else None
+
+
+class StreamRecord(fast_decode.Record):
+  """The listing fields of a Stream."""
+
+  __slots__ = ("name", "displayName", "state", "sourceConnectionProfileName",
+               "destinationConnectionProfileName", "createTime", "updateTime",
+               "errorCount")
+
+
+class StreamObjectRecord(fast_decode.Record):
+  """The monitoring fields of a StreamObject, tagged with its stream."""
+
+  __slots__ = ("stream", "name", "displayName", "createTime", "updateTime",
+               "errorCount", "errorReasons")
+
+
+def StreamToRecord(stream):
+  """Return a StreamRecord for a Stream message."""
+  source_config = stream.sourceConfig
+  destination_config = stream.destinationConfig
+  return StreamRecord(
+      name=_Intern(stream.name),
+      displayName=_Intern(stream.displayName),
+      state=_Intern(str(stream.state)) if stream.state else None,
+      sourceConnectionProfileName=_Intern(
+          source_config.sourceConnectionProfileName)
+      if source_config else None,
+      destinationConnectionProfileName=_Intern(
+          destination_config.destinationConnectionProfileName)
+      if destination_config else None,
+      createTime=stream.createTime,
+      updateTime=stream.updateTime,
+      errorCount=len(stream.errors or ()))
+
+
+def StreamObjectToRecord(stream_object, stream_name=None):
+  """Return a StreamObjectRecord for a message or fast_decode record."""
+  errors = stream_object.errors or ()
+  return StreamObjectRecord(
+      stream=_Intern(stream_name),
+      name=_Intern(stream_object.name),
+      displayName=_Intern(stream_object.displayName),
+      createTime=stream_object.createTime,
+      updateTime=stream_object.updateTime,
+      errorCount=len(errors),
+      errorReasons=tuple(_Intern(error.reason) for error in errors
+                         if error.reason))
+
+
+class Inventory(object):
+  """Streams and stream objects from any number of listings.
+
+  Safe to fill from several threads.
+  """
+
+  def __init__(self):
+    self.streams = []
+    self.stream_objects = []
+    self._lock = threading.Lock()
+
+  def AddStreams(self, streams):
+    records = [StreamToRecord(stream) for stream in streams]
+    with self._lock:
+      self.streams.extend(records)
+    return records
+
+  def AddStreamObjects(self, stream_objects, stream_name=None):
+    records = [StreamObjectToRecord(stream_object, stream_name)
+               for stream_object in stream_objects]
+    with self._lock:
+      self.stream_objects.extend(records)
+    return records
+
+  @staticmethod
+  def ToColumns(records, record_type):
+    """Return {field: column} for records, with counts in int arrays."""
+    columns = {}
+    for field in record_type.__slots__:
+      values = [getattr(record, field) for record in records]
+      if field == "errorCount":
+        columns[field] = array.array("i", values)
+      elif field == "errorReasons":
+        columns[field] = [" ".join(reasons) for reasons in values]
+      else:
+        columns[field] = values
+    return columns
+
+  def GetStreamColumns(self):
+    return self.ToColumns(self.streams, StreamRecord)
+
+  def GetStreamObjectColumns(self):
+    return self.ToColumns(self.stream_objects, StreamObjectRecord)
+
+  @staticmethod
+  def WriteCsv(path, columns):
+    """Write columns from ToColumns as a CSV file with a header row."""
+    fields = list(columns)
+    with open(path, "w", newline="") as csv_file:
+      writer = csv.writer(csv_file)
+      writer.writerow(fields)
+      writer.writerows(zip(*(columns[field] for field in fields)))
@@ -0,0 +1,69 @@
+"""Tests for google3.experimental.dhercher.datastream_utils.compact_inventory."""
+
+import csv
+import os
+
+from google3.experimental.dhercher.datastream_utils import compact_inventory
+from google3.experimental.dhercher.datastream_utils import fast_decode
+from google3.google.cloud.datastream import datastream
+from google3.testing.pybase import googletest
+
+
+class CompactInventoryTest(googletest.TestCase):
+
+  def test_stream_to_record(self):
+    stream = datastream.Stream(
+        name="streams/ora",
+        displayName="ora",
+        state=datastream.Stream.StateValueValuesEnum.RUNNING,
+        errors=[datastream.Error(reason="A"), datastream.Error(reason="B")],
+        sourceConfig=datastream.SourceConfig(
+            sourceConnectionProfileName="cp/src",
+            oracleSourceConfig=datastream.OracleSourceConfig()),
+        destinationConfig=datastream.DestinationConfig(
+            destinationConnectionProfileName="cp/gcs"))
+
+    record = compact_inventory.StreamToRecord(stream)
+
+    self.assertEqual(record.state, "RUNNING")
+    self.assertEqual(record.sourceConnectionProfileName, "cp/src")
+    self.assertEqual(record.destinationConnectionProfileName, "cp/gcs")
+    self.assertEqual(record.errorCount, 2)
+    self.assertFalse(hasattr(record, "__dict__"))
+
+  def test_stream_objects_from_messages_and_records(self):
+    inventory = compact_inventory.Inventory()
+    inventory.AddStreamObjects([
+        datastream.StreamObject(name="objects/1", displayName="HR.JOBS",
+                                errors=[datastream.Error(reason="BAD")]),
+    ], stream_name="streams/ora")
+    inventory.AddStreamObjects([
+        fast_decode.StreamObjectRecord(name="objects/2",
+                                       displayName="HR.EMPLOYEES",
+                                       errors=[]),
+    ], stream_name="streams/ora")
+
+    columns = inventory.GetStreamObjectColumns()
+    self.assertEqual(columns["displayName"], ["HR.JOBS", "HR.EMPLOYEES"])
+    self.assertEqual(list(columns["errorCount"]), [1, 0])
+    self.assertEqual(columns["errorReasons"], ["BAD", ""])
+    # Repeated strings share a single object.
+    self.assertIs(inventory.stream_objects[0].stream,
+                  inventory.stream_objects[1].stream)
+
+  def test_write_csv(self):
+    inventory = compact_inventory.Inventory()
+    inventory.AddStreams([datastream.Stream(name="streams/ora")])
+    path = os.path.join(self.create_tempdir().full_path, "streams.csv")
+
+    inventory.WriteCsv(path, inventory.GetStreamColumns())
+
+    with open(path) as csv_file:
+      rows = list(csv.DictReader(csv_file))
+    self.assertLen(rows, 1)
+    self.assertEqual(rows[0]["name"], "streams/ora")
+    self.assertEqual(rows[0]["errorCount"], "0")
+
+
+if __name__ == "__main__":
+  googletest.main()
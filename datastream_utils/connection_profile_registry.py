@@ -0,0 +1,186 @@
+"""Share connection profiles with identical settings between streams.
+
+Connection profiles are fingerprinted by their parent (project and location)
+and the settings that decide where they connect (host, port, service and
+user for databases, bucket and root path for GCS), so one registry can serve
+several projects and regions. A SetUp whose profile fingerprint is already registered reuses that
+profile instead of creating a duplicate, and the registry counts the streams
+using each profile so TearDown only deletes a shared profile once its last
+stream is gone.
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+
+KIND_ORACLE = "oracle"
+KIND_MYSQL = "mysql"
+KIND_GCS = "gcs"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS profiles (
+  name TEXT PRIMARY KEY,
+  fingerprint TEXT NOT NULL,
+  owned INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS profiles_fingerprint ON profiles (fingerprint);
+CREATE TABLE IF NOT EXISTS refs (
+  name TEXT NOT NULL,
+  stream_name TEXT NOT NULL,
+  PRIMARY KEY (name, stream_name)
+);
+CREATE INDEX IF NOT EXISTS refs_stream_name ON refs (stream_name);
+"""
+
+
+def Fingerprint(kind, **fields):
+  """Return a stable hex digest of a profile kind and its identifying fields."""
+  canonical = json.dumps([kind, sorted(fields.items())], sort_keys=True)
+  return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def OracleFingerprint(oracle_cp, private_connection_name=None, parent=None):
+  return Fingerprint(
+      KIND_ORACLE,
+      parent=parent,
+      hostname=oracle_cp.get("hostname"),
+      port=oracle_cp.get("port"),
+      databaseService=oracle_cp.get("databaseService"),
+      username=oracle_cp.get("username"),
+      privateConnection=private_connection_name)
+
+
+def MysqlFingerprint(mysql_cp, private_connection_name=None, parent=None):
+  return Fingerprint(
+      KIND_MYSQL,
+      parent=parent,
+      hostname=mysql_cp.get("hostname"),
+      port=mysql_cp.get("port"),
+      username=mysql_cp.get("username"),
+      privateConnection=private_connection_name)
+
+
+def GcsFingerprint(bucket_name, root_path, parent=None):
+  return Fingerprint(KIND_GCS, parent=parent, bucketName=bucket_name,
+                     rootPath=root_path)
+
+
+def GetParent(name):
+  """Return the projects/*/locations/* parent of a full resource name."""
+  return "/".join(name.split("/")[:4])
+
+
+def FingerprintConnectionProfile(connection_profile, parent=None):
+  """Return the fingerprint of a ConnectionProfile message, or None.
+
+  Args:
+    connection_profile: A datastream.ConnectionProfile.
+    parent: The projects/*/locations/* it was listed in, defaults to the
+        parent in its name.
+  """
+  parent = parent or GetParent(connection_profile.name)
+  private_connection_name = (
+      connection_profile.privateConnectivity.privateConnectionName
+      if connection_profile.privateConnectivity else None)
+  if connection_profile.oracleProfile:
+    profile = connection_profile.oracleProfile
+    return OracleFingerprint(
+        {"hostname": profile.hostname, "port": profile.port,
+         "databaseService": profile.databaseService,
+         "username": profile.username},
+        private_connection_name, parent)
+  if connection_profile.mysqlProfile:
+    profile = connection_profile.mysqlProfile
+    return MysqlFingerprint(
+        {"hostname": profile.hostname, "port": profile.port,
+         "username": profile.username},
+        private_connection_name, parent)
+  if connection_profile.gcsProfile:
+    profile = connection_profile.gcsProfile
+    return GcsFingerprint(profile.bucketName, profile.rootPath, parent)
+  return None
+
+
+class ConnectionProfileRegistry(object):
+  """A SQLite backed map of fingerprints to profiles and their streams."""
+
+  def __init__(self, path):
+    """Initialize the ConnectionProfileRegistry.
+
+    Args:
+      path: The SQLite database file, or ":memory:" for a temporary registry.
+    """
+    self.path = path
+    self._lock = threading.Lock()
+    self._conn = sqlite3.connect(path, check_same_thread=False)
+    with self._lock, self._conn:
+      self._conn.executescript(_SCHEMA)
+
+  def Close(self):
+    with self._lock:
+      self._conn.close()
+
+  def Register(self, fingerprint, name, owned=True):
+    """Record a profile under its fingerprint.
+
+    Args:
+      fingerprint: The profile fingerprint.
+      name: The full resource name of the profile.
+      owned: Whether the toolkit created the profile and may delete it.
+          Profiles adopted from an existing listing are never deleted.
+    """
+    with self._lock, self._conn:
+      self._conn.execute(
+          "INSERT OR REPLACE INTO profiles (name, fingerprint, owned)"
+          " VALUES (?, ?, ?)", (name, fingerprint, int(owned)))
+
+  def Lookup(self, fingerprint):
+    """Return the name of a registered profile with this fingerprint."""
+    with self._lock:
+      row = self._conn.execute(
+          "SELECT name FROM profiles WHERE fingerprint = ?"
+          " ORDER BY owned DESC, name LIMIT 1", (fingerprint,)).fetchone()
+    return row[0] if row else None
+
+  def AddReference(self, name, stream_name):
+    with self._lock, self._conn:
+      self._conn.execute(
+          "INSERT OR IGNORE INTO refs (name, stream_name) VALUES (?, ?)",
+          (name, stream_name))
+
+  def GetReferenceCount(self, name):
+    with self._lock:
+      return self._conn.execute(
+          "SELECT COUNT(*) FROM refs WHERE name = ?", (name,)).fetchone()[0]
+
+  def Release(self, stream_name):
+    """Drop a stream's references and return the profiles it referenced."""
+    with self._lock, self._conn:
+      rows = self._conn.execute(
+          "SELECT name FROM refs WHERE stream_name = ? ORDER BY name",
+          (stream_name,)).fetchall()
+      self._conn.execute("DELETE FROM refs WHERE stream_name = ?",
+                         (stream_name,))
+    return [row[0] for row in rows]
+
+  def CanDelete(self, name):
+    """Return whether no stream uses a profile and the toolkit owns it.
+
+    Profiles the registry does not know about are not shared, so they can
+    always be deleted.
+    """
+    with self._lock:
+      row = self._conn.execute(
+          "SELECT owned FROM profiles WHERE name = ?", (name,)).fetchone()
+      references = self._conn.execute(
+          "SELECT COUNT(*) FROM refs WHERE name = ?", (name,)).fetchone()[0]
+    if references:
+      return False
+    return row is None or bool(row[0])
+
+  def Remove(self, name):
+    """Forget a deleted profile."""
+    with self._lock, self._conn:
+      self._conn.execute("DELETE FROM profiles WHERE name = ?", (name,))
+      self._conn.execute("DELETE FROM refs WHERE name = ?", (name,))
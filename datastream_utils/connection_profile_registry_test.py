@@ -0,0 +1,86 @@
+"""Tests for google3.experimental.dhercher.datastream_utils.connection_profile_registry."""
+
+from google3.experimental.dhercher.datastream_utils import connection_profile_registry
+from google3.google.cloud.datastream import datastream
+from google3.testing.pybase import googletest
+
+_ORACLE_CP = {
+    "hostname": "127.0.0.1",
+    "username": "oracle",
+    "databaseService": "XE",
+    "password": "oracle",
+    "port": 1521
+}
+_PARENT = "projects/123/locations/us-central1"
+
+
+class ConnectionProfileRegistryTest(googletest.TestCase):
+
+  def test_fingerprint_ignores_password(self):
+    other_password = dict(_ORACLE_CP, password="changed")
+    other_host = dict(_ORACLE_CP, hostname="10.0.0.1")
+
+    fingerprint = connection_profile_registry.OracleFingerprint(_ORACLE_CP)
+    self.assertEqual(
+        connection_profile_registry.OracleFingerprint(other_password),
+        fingerprint)
+    self.assertNotEqual(
+        connection_profile_registry.OracleFingerprint(other_host),
+        fingerprint)
+
+  def test_fingerprint_includes_parent(self):
+    self.assertNotEqual(
+        connection_profile_registry.GcsFingerprint("b", "/data/", _PARENT),
+        connection_profile_registry.GcsFingerprint(
+            "b", "/data/", "projects/123/locations/europe-west1"))
+
+  def test_fingerprint_connection_profile(self):
+    cp = datastream.ConnectionProfile(
+        name=_PARENT + "/connectionProfiles/oracle",
+        oracleProfile=datastream.OracleProfile(**_ORACLE_CP))
+    gcs_cp = datastream.ConnectionProfile(
+        name=_PARENT + "/connectionProfiles/gcs",
+        gcsProfile=datastream.GcsProfile(bucketName="b", rootPath="/data/"))
+
+    self.assertEqual(
+        connection_profile_registry.FingerprintConnectionProfile(cp),
+        connection_profile_registry.OracleFingerprint(_ORACLE_CP,
+                                                      parent=_PARENT))
+    self.assertEqual(
+        connection_profile_registry.FingerprintConnectionProfile(gcs_cp),
+        connection_profile_registry.GcsFingerprint("b", "/data/", _PARENT))
+    self.assertEqual(
+        connection_profile_registry.FingerprintConnectionProfile(
+            gcs_cp, "projects/p/locations/l"),
+        connection_profile_registry.GcsFingerprint(
+            "b", "/data/", "projects/p/locations/l"))
+
+  def test_reference_counts(self):
+    registry = connection_profile_registry.ConnectionProfileRegistry(
+        ":memory:")
+    fingerprint = connection_profile_registry.GcsFingerprint("b", "/data/")
+    registry.Register(fingerprint, "cp/gcs")
+    registry.AddReference("cp/gcs", "streams/a")
+    registry.AddReference("cp/gcs", "streams/b")
+
+    self.assertEqual(registry.Lookup(fingerprint), "cp/gcs")
+    self.assertEqual(registry.Release("streams/a"), ["cp/gcs"])
+    self.assertFalse(registry.CanDelete("cp/gcs"))
+    self.assertEqual(registry.Release("streams/b"), ["cp/gcs"])
+    self.assertTrue(registry.CanDelete("cp/gcs"))
+
+    registry.Remove("cp/gcs")
+    self.assertIsNone(registry.Lookup(fingerprint))
+    self.assertTrue(registry.CanDelete("cp/unknown"))
+
+  def test_adopted_profiles_are_never_deleted(self):
+    registry = connection_profile_registry.ConnectionProfileRegistry(
+        ":memory:")
+    registry.Register("fingerprint", "cp/existing", owned=False)
+
+    self.assertEqual(registry.GetReferenceCount("cp/existing"), 0)
+    self.assertFalse(registry.CanDelete("cp/existing"))
+
+
+if __name__ == "__main__":
+  googletest.main()
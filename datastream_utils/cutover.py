@@ -0,0 +1,245 @@
+"""Coordinate the steps of a cutover from Oracle to PostgreSQL.
+
+A cutover runs these steps in order, timing each one:
+- wait until replication lag is under a threshold
+- signal the application to start its write freeze
+- pause the stream and wait until it has drained every event to GCS
+- wait until the downstream apply reaches the final watermark
+- validate every table of the stream
+
+The measured freeze window runs from the freeze signal to the end of
+validation. Every external check (lag, freeze, watermark and validation) is a
+callable, so any monitoring or validation tool can be plugged in.
+"""
+
+import logging
+import shlex
+import subprocess
+import time
+
+try:
+  from google3.experimental.dhercher.datastream_utils import stream_maintenance  # pylint: disable=g-import-not-at-top
+  from google3.experimental.dhercher.datastream_utils import stream_object_tracker  # pylint: disable=g-import-not-at-top
+except ModuleNotFoundError:
+  import stream_maintenance  # pytype: disable=import-error  pylint: disable=g-import-not-at-top
+  import stream_object_tracker  # pytype: disable=import-error  pylint: disable=g-import-not-at-top
+
+
+DEFAULT_MAX_LAG = 60
+DEFAULT_POLL_INTERVAL = 5
+DEFAULT_LAG_TIMEOUT = 60 * 60
+DEFAULT_WATERMARK_TIMEOUT = 30 * 60
+
+STEP_LAG = "wait_for_lag"
+STEP_FREEZE = "freeze"
+STEP_DRAIN = "drain"
+STEP_WATERMARK = "wait_for_watermark"
+STEP_VALIDATE = "validate"
+
+
+def CommandOutputFloat(command):
+  """Return a callable running a shell command and parsing its output."""
+  def _Run():
+    output = subprocess.run(command, shell=True, check=True,
+                            stdout=subprocess.PIPE).stdout
+    return float(output.decode("utf-8").strip())
+  return _Run
+
+
+def CommandSucceeds(command):
+  """Return a callable reporting whether a shell command exits with 0."""
+  def _Run():
+    return subprocess.run(command, shell=True).returncode == 0
+  return _Run
+
+
+def CommandWithTables(command):
+  """Return a callable running a command for a list of tables.
+
+  A "{tables}" placeholder in the command is replaced by the comma separated
+  table names.
+  """
+  def _Run(tables):
+    formatted = command.replace("{tables}", shlex.quote(",".join(tables)))
+    return subprocess.run(formatted, shell=True).returncode == 0
+  return _Run
+
+
+class CutoverReport(object):
+  """Timings and outcome of a cutover."""
+
+  def __init__(self):
+    self.steps = []
+    self.freeze_started_at = None
+    self.freeze_seconds = None
+    self.changed_tables = []
+    self.validated_tables = []
+    self.error = None
+
+  @property
+  def succeeded(self):
+    return self.error is None
+
+  def AddStep(self, name, seconds):
+    self.steps.append((name, seconds))
+
+  def LogSummary(self):
+    for name, seconds in self.steps:
+      logging.info("Cutover step %s took %.1fs", name, seconds)
+    logging.info("Validated %d tables, %d changed",
+                 len(self.validated_tables), len(self.changed_tables))
+    if self.freeze_seconds is not None:
+      logging.info("Write freeze lasted %.1fs", self.freeze_seconds)
+    if self.error:
+      logging.error("Cutover failed: %s", self.error)
+
+
+class CutoverOrchestrator(object):
+  """Run the cutover steps in order against one stream."""
+
+  def __init__(self,
+               manager,
+               lag_fn=None,
+               freeze_fn=None,
+               watermark_fn=None,
+               validate_fn=None,
+               max_lag=None,
+               poll_interval=None,
+               lag_timeout=None,
+               watermark_timeout=None,
+               maintenance=None,
+               tracker=None,
+               clock=None,
+               sleep=None):
+    """Initialize the CutoverOrchestrator.
+
+    Args:
+      manager: The CloudDatastreamResourceManager of the stream.
+      lag_fn: Returns the current replication lag in seconds.
+      freeze_fn: Signals the application to start its write freeze,
+          returning whether it started.
+      watermark_fn: Returns whether the downstream apply has caught up.
+      validate_fn: Validates a list of "SCHEMA.TABLE" names, returning
+          whether they match.
+      max_lag: The lag in seconds under which the freeze may start.
+      poll_interval: Seconds between lag and watermark checks.
+      lag_timeout: Seconds to wait for the lag before giving up; the
+          freeze has not started at that point.
+      watermark_timeout: Seconds to wait for the downstream apply.
+      maintenance: The StreamMaintenance used to drain the stream.
+      tracker: The StreamObjectTracker listing the stream's tables.
+      clock: A function returning the current time in seconds.
+      sleep: A function sleeping for a number of seconds.
+    """
+    self.manager = manager
+    self.lag_fn = lag_fn
+    self.freeze_fn = freeze_fn
+    self.watermark_fn = watermark_fn
+    self.validate_fn = validate_fn
+    self.max_lag = DEFAULT_MAX_LAG if max_lag is None else max_lag
+    self.poll_interval = (
+        DEFAULT_POLL_INTERVAL if poll_interval is None else poll_interval)
+    self.lag_timeout = (
+        DEFAULT_LAG_TIMEOUT if lag_timeout is None else lag_timeout)
+    self.watermark_timeout = (
+        DEFAULT_WATERMARK_TIMEOUT
+        if watermark_timeout is None else watermark_timeout)
+    self._clock = clock or time.time
+    self._sleep = sleep or time.sleep
+    self.maintenance = maintenance or stream_maintenance.StreamMaintenance(
+        manager, stream_names=[manager.full_stream_name],
+        poll_interval=1, clock=self._clock, sleep=self._sleep)
+    self.tracker = tracker or stream_object_tracker.StreamObjectTracker(
+        manager, use_fast_decode=True, full_sync_interval=0)
+
+  def _WaitFor(self, check, timeout):
+    """Poll check() until it returns True; return False on timeout."""
+    deadline = self._clock() + timeout
+    while not check():
+      if self._clock() >= deadline:
+        return False
+      self._sleep(self.poll_interval)
+    return True
+
+  def _LagIsLow(self):
+    lag = self.lag_fn()
+    logging.info("Replication lag %.1fs (target %.1fs)", lag, self.max_lag)
+    return lag <= self.max_lag
+
+  def _Step(self, report, name, func):
+    start = self._clock()
+    try:
+      return func()
+    finally:
+      report.AddStep(name, self._clock() - start)
+
+  def _GetChangedTables(self):
+    changes = self.tracker.Poll()
+    return sorted({change.display_name for change in changes
+                   if change.change_type != stream_object_tracker.CHANGE_REMOVED
+                   and change.display_name})
+
+  def _GetAllTables(self):
+    return sorted({display_name for display_name, _, _
+                   in self.tracker.objects.values() if display_name})
+
+  def Run(self):
+    """Run the cutover and return a CutoverReport.
+
+    Failures are recorded on the report; once the freeze has started the
+    report always carries the freeze duration measured so far.
+    """
+    report = CutoverReport()
+    # Record the objects as they are now, so the final poll only returns
+    # the objects updated during the cutover.
+    self.tracker.Poll()
+
+    try:
+      lag_is_low = not self.lag_fn or self._Step(
+          report, STEP_LAG,
+          lambda: self._WaitFor(self._LagIsLow, self.lag_timeout))
+    except Exception as e:  # pylint: disable=broad-except
+      logging.exception("Replication lag check failed")
+      report.error = "Replication lag check failed: %s" % e
+      return report
+    if not lag_is_low:
+      report.error = "Replication lag did not drop below %ss" % self.max_lag
+      return report
+
+    report.freeze_started_at = self._clock()
+    try:
+      self._RunFrozenSteps(report)
+    except Exception as e:  # pylint: disable=broad-except
+      logging.exception("Cutover step failed")
+      report.error = str(e)
+    report.freeze_seconds = self._clock() - report.freeze_started_at
+    return report
+
+  def _RunFrozenSteps(self, report):
+    if self.freeze_fn and not self._Step(report, STEP_FREEZE, self.freeze_fn):
+      report.error = "Application write freeze did not start"
+      return
+
+    drain = self._Step(report, STEP_DRAIN, self.maintenance.Pause)
+    if drain.failures or drain.in_flight:
+      report.error = "Stream did not drain: %s" % drain.statuses
+      return
+
+    if self.watermark_fn and not self._Step(
+        report, STEP_WATERMARK,
+        lambda: self._WaitFor(self.watermark_fn, self.watermark_timeout)):
+      report.error = "Downstream apply did not reach the final watermark"
+      return
+
+    report.changed_tables = self._GetChangedTables()
+    if not self.validate_fn:
+      return
+    # updateTime follows object metadata and backfill state rather than row
+    # writes, so the changed tables cannot narrow the validation.
+    report.validated_tables = sorted(
+        set(self._GetAllTables()) | set(report.changed_tables))
+    if not report.validated_tables:
+      report.error = "No tables found to validate"
+    elif not self._Step(report, STEP_VALIDATE,
+                        lambda: self.validate_fn(report.validated_tables)):
+      report.error = "Validation failed"
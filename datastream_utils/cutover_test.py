@@ -0,0 +1,142 @@
+"""Tests for google3.experimental.dhercher.datastream_utils.cutover."""
+
+import mock
+
+from google3.experimental.dhercher.datastream_utils import cutover
+from google3.experimental.dhercher.datastream_utils import stream_maintenance
+from google3.experimental.dhercher.datastream_utils import stream_object_tracker
+from google3.testing.pybase import googletest
+
+
+class FakeClock(object):
+
+  def __init__(self):
+    self.now = 0.0
+
+  def __call__(self):
+    return self.now
+
+  def Sleep(self, seconds):
+    self.now += seconds
+
+
+def _Change(change_type, display_name):
+  return stream_object_tracker.StreamObjectChange(
+      change_type, "objects/" + display_name, display_name)
+
+
+class CutoverOrchestratorTest(googletest.TestCase):
+
+  def setUp(self):
+    super().setUp()
+    self.clock = FakeClock()
+
+    # By default the stream is still draining when Pause returns.
+    self.maintenance = mock.MagicMock()
+    def _pause():
+      self.clock.now += 20
+      return stream_maintenance.MaintenanceReport(
+          [stream_maintenance.DrainStatus("streams/s", started_at=0)])
+    self.maintenance.Pause.side_effect = _pause
+
+    self.tracker = mock.MagicMock()
+    self.tracker.Poll.side_effect = [
+        [_Change(stream_object_tracker.CHANGE_ADDED, "HR.JOBS")],
+        [_Change(stream_object_tracker.CHANGE_UPDATED, "HR.EMPLOYEES"),
+         _Change(stream_object_tracker.CHANGE_REMOVED, "HR.OLD")],
+    ]
+    self.tracker.objects = {"objects/1": ("HR.JOBS", None, None),
+                            "objects/2": ("HR.EMPLOYEES", None, None),
+                            "objects/3": ("HR.REGIONS", None, None)}
+
+  def _Orchestrator(self, **kwargs):
+    return cutover.CutoverOrchestrator(
+        mock.MagicMock(), max_lag=30, poll_interval=10,
+        maintenance=self.maintenance, tracker=self.tracker,
+        clock=self.clock, sleep=self.clock.Sleep, **kwargs)
+
+  def test_run_in_order(self):
+    lags = [120, 45, 10]
+    watermarks = [False, True]
+    self.maintenance.Pause.side_effect = None
+    drained = stream_maintenance.DrainStatus("streams/s", started_at=0)
+    drained.settled_at = 0
+    self.maintenance.Pause.return_value = (
+        stream_maintenance.MaintenanceReport([drained]))
+    validate = mock.MagicMock(return_value=True)
+
+    def _freeze():
+      self.clock.now += 1
+      return True
+
+    report = self._Orchestrator(
+        lag_fn=lambda: lags.pop(0),
+        freeze_fn=_freeze,
+        watermark_fn=lambda: watermarks.pop(0),
+        validate_fn=validate).Run()
+
+    self.assertTrue(report.succeeded, report.error)
+    self.assertEqual([name for name, _ in report.steps], [
+        cutover.STEP_LAG, cutover.STEP_FREEZE, cutover.STEP_DRAIN,
+        cutover.STEP_WATERMARK, cutover.STEP_VALIDATE])
+    self.assertEqual(dict(report.steps)[cutover.STEP_LAG], 20)
+    self.assertEqual(report.freeze_started_at, 20)
+    self.assertEqual(report.freeze_seconds, 11)
+    # Tables without a changed updateTime are validated too.
+    self.assertEqual(report.changed_tables, ["HR.EMPLOYEES"])
+    validate.assert_called_once_with(["HR.EMPLOYEES", "HR.JOBS", "HR.REGIONS"])
+
+  def test_lag_timeout_aborts_before_freeze(self):
+    freeze = mock.MagicMock()
+
+    report = self._Orchestrator(lag_fn=lambda: 300, freeze_fn=freeze,
+                                lag_timeout=60).Run()
+
+    self.assertFalse(report.succeeded)
+    self.assertIsNone(report.freeze_seconds)
+    freeze.assert_not_called()
+    self.maintenance.Pause.assert_not_called()
+
+  def test_lag_check_error_is_reported(self):
+    def _lag():
+      raise cutover.subprocess.CalledProcessError(1, "lag")
+
+    report = self._Orchestrator(lag_fn=_lag).Run()
+
+    self.assertIn("lag check failed", report.error)
+    self.maintenance.Pause.assert_not_called()
+
+  def test_failed_freeze_aborts(self):
+    report = self._Orchestrator(freeze_fn=lambda: False).Run()
+
+    self.assertIn("freeze did not start", report.error)
+    self.maintenance.Pause.assert_not_called()
+
+  def test_validates_all_tables_without_changes(self):
+    self.tracker.Poll.side_effect = [[], []]
+    self.tracker.objects = {"objects/1": ("HR.JOBS", None, None),
+                            "objects/2": ("HR.EMPLOYEES", None, None)}
+    drained = stream_maintenance.DrainStatus("streams/s", started_at=0)
+    drained.settled_at = 0
+    self.maintenance.Pause.side_effect = None
+    self.maintenance.Pause.return_value = (
+        stream_maintenance.MaintenanceReport([drained]))
+    validate = mock.MagicMock(return_value=True)
+
+    report = self._Orchestrator(validate_fn=validate).Run()
+
+    self.assertTrue(report.succeeded, report.error)
+    validate.assert_called_once_with(["HR.EMPLOYEES", "HR.JOBS"])
+
+  def test_undrained_stream_fails_with_freeze_duration(self):
+    validate = mock.MagicMock()
+
+    report = self._Orchestrator(validate_fn=validate).Run()
+
+    self.assertIn("did not drain", report.error)
+    self.assertEqual(report.freeze_seconds, 20)
+    validate.assert_not_called()
+
+
+if __name__ == "__main__":
+  googletest.main()
@@ -0,0 +1,212 @@
+"""Fast JSON decoding for large, read-heavy Datastream responses.
+
+apitools decodes every response into a tree of protorpc messages, which is
+slow and memory hungry for a large DiscoverConnectionProfileResponse or a
+full page of stream objects. The functions here fetch the raw JSON for a
+call and build lightweight __slots__ records instead. Records use the same
+attribute names as the messages they replace, so read-only callers can
+switch between the two.
+"""
+
+import json
+
+try:
+  from google3.google.cloud.datastream import datastream  # pylint: disable=g-import-not-at-top
+except ModuleNotFoundError:
+  import datastream  # pytype: disable=import-error  pylint: disable=g-import-not-at-top
+
+
+_SUCCESS_STATUS_CODES = (200, 201, 204)
+
+
+class Record(object):
+  """Base class for a slim, read-only view of a Datastream message."""
+
+  __slots__ = ()
+
+  def __init__(self, **kwargs):
+    for field in self.__slots__:
+      setattr(self, field, kwargs.get(field))
+
+  def __eq__(self, other):
+    if type(self) is not type(other):
+      return NotImplemented
+    return all(getattr(self, field) == getattr(other, field)
+               for field in self.__slots__)
+
+  def __repr__(self):
+    fields = ", ".join("%s=%r" % (field, getattr(self, field))
+                       for field in self.__slots__)
+    return "%s(%s)" % (type(self).__name__, fields)
+
+
+class ErrorRecord(Record):
+  __slots__ = ("details", "errorTime", "errorUuid", "message", "reason")
+
+
+class StreamObjectRecord(Record):
+  __slots__ = ("createTime", "displayName", "errors", "name", "updateTime")
+
+
+class ListStreamObjectsRecord(Record):
+  __slots__ = ("nextPageToken", "streamObjects", "unreachable")
+
+
+class OracleColumnRecord(Record):
+  __slots__ = ("columnName", "dataType", "encoding", "length", "nullable",
+               "ordinalPosition", "precision", "primaryKey", "scale")
+
+
+class OracleTableRecord(Record):
+  __slots__ = ("oracleColumns", "tableName")
+
+
+class OracleSchemaRecord(Record):
+  __slots__ = ("oracleTables", "schemaName")
+
+
+class OracleRdbmsRecord(Record):
+  __slots__ = ("oracleSchemas",)
+
+
+class MysqlColumnRecord(Record):
+  __slots__ = ("collation", "columnName", "dataType", "length", "nullable",
+               "ordinalPosition", "primaryKey")
+
+
+class MysqlTableRecord(Record):
+  __slots__ = ("mysqlColumns", "tableName")
+
+
+class MysqlDatabaseRecord(Record):
+  __slots__ = ("databaseName", "mysqlTables")
+
+
+class MysqlRdbmsRecord(Record):
+  __slots__ = ("mysqlDatabases",)
+
+
+class DiscoverConnectionProfileRecord(Record):
+  __slots__ = ("mysqlRdbms", "oracleRdbms")
+
+
+def CallForJson(service, method_name, request):
+  """Run an apitools service method and return the undecoded JSON body.
+
+  Args:
+    service: An apitools service, eg. client.projects_locations_streams.
+    method_name: The name of the method on the service, eg. "List".
+    request: The request message for the method.
+  Returns:
+    The response body as a str or bytes.
+  Raises:
+    datastream.HttpError: If the API returns an unsuccessful status.
+  """
+  method_config = service.GetMethodConfig(method_name)
+  http_request = service.PrepareHttpRequest(method_config, request)
+  client = service.client
+  http_response = datastream.http_wrapper.MakeRequest(
+      client.http, http_request,
+      # Retries are made by api_rate_limiter.RetryPolicy, through the limiter.
+      retries=0, max_retry_wait=client.max_retry_wait)
+
+  if http_response.status_code not in _SUCCESS_STATUS_CODES:
+    raise datastream.HttpError.FromResponse(
+        http_response, method_config=method_config, request=request)
+  return http_response.content or "{}"
+
+
+def _Decode(content):
+  if isinstance(content, bytes):
+    content = content.decode("utf-8")
+  return json.loads(content)
+
+
+def _DecodeErrors(errors):
+  return [
+      ErrorRecord(details=error.get("details"),
+                  errorTime=error.get("errorTime"),
+                  errorUuid=error.get("errorUuid"),
+                  message=error.get("message"),
+                  reason=error.get("reason"))
+      for error in errors or ()
+  ]
+
+
+def _DecodeStreamObject(stream_object):
+  return StreamObjectRecord(
+      createTime=stream_object.get("createTime"),
+      displayName=stream_object.get("displayName"),
+      errors=_DecodeErrors(stream_object.get("errors")),
+      name=stream_object.get("name"),
+      updateTime=stream_object.get("updateTime"))
+
+
+def DecodeListStreamObjectsResponse(content):
+  """Decode a ListStreamObjectsResponse body into records."""
+  response = _Decode(content)
+  return ListStreamObjectsRecord(
+      nextPageToken=response.get("nextPageToken"),
+      streamObjects=[_DecodeStreamObject(stream_object)
+                     for stream_object in response.get("streamObjects", ())],
+      unreachable=response.get("unreachable", []))
+
+
+def _DecodeOracleRdbms(rdbms):
+  if rdbms is None:
+    return None
+
+  schemas = []
+  for schema in rdbms.get("oracleSchemas", ()):
+    tables = []
+    for table in schema.get("oracleTables", ()):
+      columns = [
+          OracleColumnRecord(columnName=column.get("columnName"),
+                             dataType=column.get("dataType"),
+                             encoding=column.get("encoding"),
+                             length=column.get("length"),
+                             nullable=column.get("nullable"),
+                             ordinalPosition=column.get("ordinalPosition"),
+                             precision=column.get("precision"),
+                             primaryKey=column.get("primaryKey"),
+                             scale=column.get("scale"))
+          for column in table.get("oracleColumns", ())
+      ]
+      tables.append(OracleTableRecord(oracleColumns=columns,
+                                      tableName=table.get("tableName")))
+    schemas.append(OracleSchemaRecord(oracleTables=tables,
+                                      schemaName=schema.get("schemaName")))
+  return OracleRdbmsRecord(oracleSchemas=schemas)
+
+
+def _DecodeMysqlRdbms(rdbms):
+  if rdbms is None:
+    return None
+
+  databases = []
+  for database in rdbms.get("mysqlDatabases", ()):
+    tables = []
+    for table in database.get("mysqlTables", ()):
+      columns = [
+          MysqlColumnRecord(collation=column.get("collation"),
+                            columnName=column.get("columnName"),
+                            dataType=column.get("dataType"),
+                            length=column.get("length"),
+                            nullable=column.get("nullable"),
+                            ordinalPosition=column.get("ordinalPosition"),
+                            primaryKey=column.get("primaryKey"))
+          for column in table.get("mysqlColumns", ())
+      ]
+      tables.append(MysqlTableRecord(mysqlColumns=columns,
+                                     tableName=table.get("tableName")))
+    databases.append(MysqlDatabaseRecord(
+        databaseName=database.get("databaseName"), mysqlTables=tables))
+  return MysqlRdbmsRecord(mysqlDatabases=databases)
+
+
+def DecodeDiscoverConnectionProfileResponse(content):
+  """Decode a DiscoverConnectionProfileResponse body into records."""
+  response = _Decode(content)
+  return DiscoverConnectionProfileRecord(
+      mysqlRdbms=_DecodeMysqlRdbms(response.get("mysqlRdbms")),
+      oracleRdbms=_DecodeOracleRdbms(response.get("oracleRdbms")))
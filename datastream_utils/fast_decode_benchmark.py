@@ -0,0 +1,123 @@
+"""Benchmark fast_decode against the default apitools message decoder.
+
+Builds synthetic ListStreamObjectsResponse and
+DiscoverConnectionProfileResponse payloads and reports decode time and peak
+memory for both paths.
+"""
+
+import json
+import time
+import tracemalloc
+from typing import Sequence
+
+from absl import app
+from absl import flags
+
+import datastream
+import fast_decode
+
+flags.DEFINE_integer("stream-objects", 1000,
+                     "Stream objects in the ListStreamObjects payload")
+flags.DEFINE_integer("schemas", 20, "Schemas in the Discover payload")
+flags.DEFINE_integer("tables", 50, "Tables per schema in the Discover payload")
+flags.DEFINE_integer("columns", 20, "Columns per table in the Discover payload")
+flags.DEFINE_integer("iterations", 5, "Decode iterations per measurement")
+
+
+def _get_flag(field: str):
+  return flags.FLAGS.get_flag_value(field, None)
+
+
+def _stream_objects_payload(count):
+  stream = "projects/123/locations/us-central1/streams/bench"
+  stream_objects = []
+  for i in range(count):
+    stream_object = {
+        "name": "%s/objects/obj-%d" % (stream, i),
+        "displayName": "HR.TABLE_%d" % i,
+        "createTime": "2021-06-01T00:00:00.000000Z",
+        "updateTime": "2021-06-01T00:%02d:00.000000Z" % (i % 60),
+        "labels": {"schema": "HR"},
+    }
+    if i % 50 == 0:
+      stream_object["errors"] = [{
+          "reason": "BACKFILL_FAILED",
+          "errorUuid": "uuid-%d" % i,
+          "message": "Table could not be read.",
+          "errorTime": "2021-06-01T00:00:00Z",
+      }]
+    stream_objects.append(stream_object)
+  return json.dumps({"streamObjects": stream_objects,
+                     "nextPageToken": "token"})
+
+
+def _discover_payload(schemas, tables, columns):
+  oracle_schemas = []
+  for s in range(schemas):
+    oracle_tables = []
+    for t in range(tables):
+      oracle_columns = [{
+          "columnName": "COLUMN_%d" % c,
+          "dataType": "NUMBER" if c % 2 else "VARCHAR2",
+          "encoding": "AL32UTF8",
+          "length": 0 if c % 2 else 255,
+          "nullable": c != 0,
+          "ordinalPosition": c + 1,
+          "precision": 38 if c % 2 else 0,
+          "primaryKey": c == 0,
+          "scale": 0,
+      } for c in range(columns)]
+      oracle_tables.append({"tableName": "TABLE_%d" % t,
+                            "oracleColumns": oracle_columns})
+    oracle_schemas.append({"schemaName": "SCHEMA_%d" % s,
+                           "oracleTables": oracle_tables})
+  return json.dumps({"oracleRdbms": {"oracleSchemas": oracle_schemas}})
+
+
+def _measure(decode, payload, iterations):
+  """Return (seconds per decode, peak MiB allocated during one decode)."""
+  start = time.perf_counter()
+  for _ in range(iterations):
+    decode(payload)
+  elapsed = (time.perf_counter() - start) / iterations
+
+  tracemalloc.start()
+  result = decode(payload)
+  _, peak = tracemalloc.get_traced_memory()
+  tracemalloc.stop()
+  del result
+  return elapsed, peak / (1024 * 1024)
+
+
+def _report(name, payload, message_type, fast_decoder, iterations):
+  default_time, default_mem = _measure(
+      lambda content: datastream.JsonToMessage(message_type, content),
+      payload, iterations)
+  fast_time, fast_mem = _measure(fast_decoder, payload, iterations)
+
+  print("%s (%.1f MiB JSON)" % (name, len(payload) / (1024 * 1024)))
+  print("  %-10s %10s %12s" % ("decoder", "ms/decode", "peak MiB"))
+  print("  %-10s %10.1f %12.1f" % ("apitools", default_time * 1000,
+                                   default_mem))
+  print("  %-10s %10.1f %12.1f" % ("fast", fast_time * 1000, fast_mem))
+  print("  speedup %.1fx, memory %.1fx" % (default_time / fast_time,
+                                           default_mem / fast_mem))
+
+
+def main(unused_argv: Sequence[str] = None) -> None:
+  iterations = _get_flag("iterations")
+  _report("ListStreamObjectsResponse",
+          _stream_objects_payload(_get_flag("stream-objects")),
+          datastream.ListStreamObjectsResponse,
+          fast_decode.DecodeListStreamObjectsResponse,
+          iterations)
+  _report("DiscoverConnectionProfileResponse",
+          _discover_payload(_get_flag("schemas"), _get_flag("tables"),
+                            _get_flag("columns")),
+          datastream.DiscoverConnectionProfileResponse,
+          fast_decode.DecodeDiscoverConnectionProfileResponse,
+          iterations)
+
+
+if __name__ == "__main__":
+  app.run(main)
@@ -0,0 +1,92 @@
+"""Tests for google3.experimental.dhercher.datastream_utils.fast_decode."""
+
+import json
+import mock
+
+from google3.experimental.dhercher.datastream_utils import fast_decode
+from google3.google.cloud.datastream import datastream
+from google3.testing.pybase import googletest
+
+_STREAM_OBJECTS = json.dumps({
+    "streamObjects": [{
+        "name": "streams/s/objects/o1",
+        "displayName": "HR.EMPLOYEES",
+        "createTime": "2021-06-01T00:00:00Z",
+        "updateTime": "2021-06-01T00:01:00Z",
+        "labels": {"ignored": "yes"},
+        "errors": [{"reason": "BACKFILL_FAILED", "message": "failed"}],
+    }, {
+        "name": "streams/s/objects/o2",
+        "displayName": "HR.JOBS",
+    }],
+    "nextPageToken": "next",
+})
+
+_DISCOVER = json.dumps({
+    "oracleRdbms": {
+        "oracleSchemas": [{
+            "schemaName": "HR",
+            "oracleTables": [{
+                "tableName": "EMPLOYEES",
+                "oracleColumns": [{
+                    "columnName": "ID",
+                    "dataType": "NUMBER",
+                    "precision": 10,
+                    "scale": 0,
+                    "nullable": False,
+                    "primaryKey": True,
+                    "ordinalPosition": 1,
+                }],
+            }],
+        }],
+    },
+})
+
+
+class FastDecodeTest(googletest.TestCase):
+
+  def test_stream_objects_match_messages(self):
+    message = datastream.JsonToMessage(datastream.ListStreamObjectsResponse,
+                                       _STREAM_OBJECTS)
+    record = fast_decode.DecodeListStreamObjectsResponse(_STREAM_OBJECTS)
+
+    self.assertEqual(record.nextPageToken, message.nextPageToken)
+    self.assertLen(record.streamObjects, 2)
+    for fast, slow in zip(record.streamObjects, message.streamObjects):
+      for field in ("name", "displayName", "createTime", "updateTime"):
+        self.assertEqual(getattr(fast, field), getattr(slow, field))
+      self.assertEqual([e.reason for e in fast.errors],
+                       [e.reason for e in slow.errors])
+
+  def test_discover_matches_messages(self):
+    message = datastream.JsonToMessage(
+        datastream.DiscoverConnectionProfileResponse, _DISCOVER)
+    record = fast_decode.DecodeDiscoverConnectionProfileResponse(
+        _DISCOVER.encode("utf-8"))
+
+    self.assertIsNone(record.mysqlRdbms)
+    fast_column = (
+        record.oracleRdbms.oracleSchemas[0].oracleTables[0].oracleColumns[0])
+    slow_column = (
+        message.oracleRdbms.oracleSchemas[0].oracleTables[0].oracleColumns[0])
+    for field in fast_decode.OracleColumnRecord.__slots__:
+      self.assertEqual(getattr(fast_column, field),
+                       getattr(slow_column, field))
+
+  def test_records_have_no_dict(self):
+    record = fast_decode.StreamObjectRecord(name="o1")
+    self.assertFalse(hasattr(record, "__dict__"))
+    self.assertEqual(record, fast_decode.StreamObjectRecord(name="o1"))
+
+  def test_call_for_json_raises_http_error(self):
+    service = mock.MagicMock()
+    response = datastream.http_wrapper.Response(
+        info={"status": "503"}, content="{}", request_url="https://x")
+    with mock.patch.object(datastream.http_wrapper, "MakeRequest",
+                           return_value=response):
+      with self.assertRaises(datastream.HttpError):
+        fast_decode.CallForJson(service, "List", "request")
+
+
+if __name__ == "__main__":
+  googletest.main()
@@ -0,0 +1,257 @@
+"""Delete everything a stream wrote under a GCS prefix, quickly and resumably.
+
+The purger lists a prefix one page at a time and deletes each page with a
+pool of workers while the next page is being listed. After every page it
+writes a checkpoint with the next page token and running counts, so an
+interrupted purge resumes where it stopped instead of listing from the start.
+Objects whose delete fails are retried with a backoff; those which still
+fail are kept in the checkpoint and retried once the listing is done, and
+the purge is only done when none is left.
+
+Storage is reached through a small object store interface. GcsObjectStore
+talks to the GCS JSON API over the Datastream client's authorized http, and
+LocalObjectStore stands in for a bucket with a local directory in tests.
+"""
+
+import concurrent.futures
+import json
+import logging
+import os
+import time
+import urllib.parse
+
+try:
+  from google3.google.cloud.datastream import datastream  # pylint: disable=g-import-not-at-top
+except ModuleNotFoundError:
+  import datastream  # pytype: disable=import-error  pylint: disable=g-import-not-at-top
+
+
+GCS_API_URL = "https://storage.googleapis.com/storage/v1/"
+
+DEFAULT_MAX_WORKERS = 32
+DEFAULT_PAGE_SIZE = 1000
+DEFAULT_MAX_ATTEMPTS = 3
+# Seconds before the first retry of failed deletes, doubling after that.
+DEFAULT_RETRY_DELAY = 1
+
+
+class GcsObjectStore(object):
+  """List and delete objects in a bucket with the GCS JSON API."""
+
+  def __init__(self, bucket_name, http, api_url=None):
+    """Initialize the GcsObjectStore.
+
+    Args:
+      bucket_name: The bucket name without gs:// added.
+      http: An authorized, thread-safe http, eg. pooled_http.ThreadLocalHttp.
+      api_url: The GCS JSON API root URL.
+    """
+    self.bucket_name = bucket_name.replace("gs://", "")
+    self.http = http
+    self._objects_url = "%sb/%s/o" % (
+        api_url or GCS_API_URL, urllib.parse.quote(self.bucket_name, safe=""))
+
+  def _Request(self, method, url):
+    response = datastream.http_wrapper.MakeRequest(
+        self.http, datastream.http_wrapper.Request(url=url, http_method=method))
+    if response.status_code >= 300:
+      raise datastream.HttpError.FromResponse(response)
+    return response.content
+
+  def ListPage(self, prefix, page_token=None, page_size=None):
+    """Return (object names, next page token) for one page under prefix."""
+    query = {"prefix": prefix, "fields": "items(name),nextPageToken",
+             "maxResults": page_size or DEFAULT_PAGE_SIZE}
+    if page_token:
+      query["pageToken"] = page_token
+    content = self._Request(
+        "GET", self._objects_url + "?" + urllib.parse.urlencode(query))
+    if isinstance(content, bytes):
+      content = content.decode("utf-8")
+    response = json.loads(content or "{}")
+    return ([item["name"] for item in response.get("items", ())],
+            response.get("nextPageToken"))
+
+  def DeleteObject(self, name):
+    """Delete an object, treating one that is already gone as deleted."""
+    try:
+      self._Request("DELETE", "%s/%s" % (
+          self._objects_url, urllib.parse.quote(name, safe="")))
+    except datastream.HttpError as e:
+      if e.status_code != 404:
+        raise
+
+
+class LocalObjectStore(object):
+  """A local directory standing in for a bucket, for tests and dry runs.
+
+  Object names are paths relative to the root, with "/" separators, and
+  page tokens are the last name of the previous page, as names are listed
+  in sorted order.
+  """
+
+  def __init__(self, root):
+    self.root = root
+
+  def _AllNames(self):
+    for directory, _, files in os.walk(self.root):
+      for file_name in files:
+        path = os.path.relpath(os.path.join(directory, file_name), self.root)
+        yield path.replace(os.sep, "/")
+
+  def ListPage(self, prefix, page_token=None, page_size=None):
+    names = sorted(name for name in self._AllNames()
+                   if name.startswith(prefix) and
+                   (page_token is None or name > page_token))
+    page = names[:page_size or DEFAULT_PAGE_SIZE]
+    next_token = page[-1] if len(names) > len(page) else None
+    return page, next_token
+
+  def DeleteObject(self, name):
+    try:
+      os.remove(os.path.join(self.root, *name.split("/")))
+    except FileNotFoundError:
+      pass
+
+
+class PurgeProgress(object):
+  """Running counts of a purge, saved as its checkpoint."""
+
+  def __init__(self, prefix, page_token=None, deleted=0, failed=0,
+               pages=0, done=False, failed_names=None):
+    self.prefix = prefix
+    self.page_token = page_token
+    self.deleted = deleted
+    self.failed = failed
+    self.pages = pages
+    self.done = done
+    # Objects whose delete has failed so far, to be retried.
+    self.failed_names = list(failed_names or ())
+
+  @property
+  def listed(self):
+    """Whether every page under the prefix has been listed."""
+    return self.page_token is None and self.pages > 0
+
+  def ToDict(self):
+    return {"prefix": self.prefix, "page_token": self.page_token,
+            "deleted": self.deleted, "failed": self.failed,
+            "pages": self.pages, "done": self.done,
+            "failed_names": self.failed_names}
+
+
+class GcsPurger(object):
+  """Delete every object under a prefix in parallel batches."""
+
+  def __init__(self, store, prefix, max_workers=None, page_size=None,
+               checkpoint_path=None, max_attempts=None, clock=None,
+               sleep=None):
+    """Initialize the GcsPurger.
+
+    Args:
+      store: A GcsObjectStore or LocalObjectStore.
+      prefix: The object name prefix to purge, without a leading "/".
+      max_workers: The number of concurrent delete calls.
+      page_size: The number of objects listed, then deleted, per batch.
+      checkpoint_path: An optional JSON file recording progress, used to
+          resume an interrupted purge of the same prefix.
+      max_attempts: The number of times each batch of deletes is tried.
+      clock: A function returning the current time in seconds.
+      sleep: A function sleeping for a number of seconds.
+    """
+    if not prefix.strip("/"):
+      raise ValueError("Refusing to purge the whole bucket")
+    self.store = store
+    self.prefix = prefix.lstrip("/")
+    self.max_workers = max_workers or DEFAULT_MAX_WORKERS
+    self.page_size = page_size or DEFAULT_PAGE_SIZE
+    self.checkpoint_path = checkpoint_path
+    self.max_attempts = max_attempts or DEFAULT_MAX_ATTEMPTS
+    self._clock = clock or time.time
+    self._sleep = sleep or time.sleep
+
+  def _LoadProgress(self):
+    if self.checkpoint_path and os.path.exists(self.checkpoint_path):
+      with open(self.checkpoint_path) as checkpoint_file:
+        saved = json.load(checkpoint_file)
+      if saved.get("prefix") == self.prefix and not saved.get("done"):
+        logging.info("Resuming purge of %r after %d objects", self.prefix,
+                     saved.get("deleted", 0))
+        return PurgeProgress(**saved)
+    return PurgeProgress(self.prefix)
+
+  def _SaveProgress(self, progress):
+    if not self.checkpoint_path:
+      return
+    temp_path = self.checkpoint_path + ".tmp"
+    with open(temp_path, "w") as checkpoint_file:
+      json.dump(progress.ToDict(), checkpoint_file)
+    os.replace(temp_path, self.checkpoint_path)
+
+  def _TryDelete(self, name):
+    try:
+      self.store.DeleteObject(name)
+      return True
+    except Exception:  # pylint: disable=broad-except
+      logging.exception("Unable to delete %r", name)
+      return False
+
+  def _DeleteAll(self, pool, names):
+    """Delete names, retrying failures, and return those never deleted."""
+    failed = list(names)
+    for attempt in range(self.max_attempts):
+      if attempt:
+        self._sleep(DEFAULT_RETRY_DELAY * 2 ** (attempt - 1))
+      results = list(pool.map(self._TryDelete, failed))
+      failed = [name for name, ok in zip(failed, results) if not ok]
+      if not failed:
+        break
+    return failed
+
+  def _Record(self, progress, names, failed):
+    progress.deleted += len(names) - len(failed)
+    progress.failed_names.extend(failed)
+    progress.failed = len(progress.failed_names)
+
+  def Purge(self):
+    """Delete every object under the prefix and return a PurgeProgress."""
+    progress = self._LoadProgress()
+    start = self._clock()
+    deleted_at_start = progress.deleted
+
+    with concurrent.futures.ThreadPoolExecutor(
+        max_workers=self.max_workers) as pool, (
+            concurrent.futures.ThreadPoolExecutor(max_workers=1)) as lister:
+      next_page = (None if progress.listed else
+                   lister.submit(self.store.ListPage, self.prefix,
+                                 progress.page_token, self.page_size))
+      while next_page is not None:
+        names, page_token = next_page.result()
+        # List the next page while this one is deleted.
+        next_page = (lister.submit(self.store.ListPage, self.prefix,
+                                   page_token, self.page_size)
+                     if page_token else None)
+
+        self._Record(progress, names, self._DeleteAll(pool, names))
+        progress.pages += 1
+        progress.page_token = page_token
+        self._SaveProgress(progress)
+
+        elapsed = max(self._clock() - start, 1e-6)
+        logging.info("Purged %d objects under %r (%d failed, %.0f/s)",
+                     progress.deleted, self.prefix, progress.failed,
+                     (progress.deleted - deleted_at_start) / elapsed)
+
+      if progress.failed_names:
+        # Give objects which failed on earlier pages, or in an interrupted
+        # run, another try now that the listing is done.
+        retried, progress.failed_names = progress.failed_names, []
+        self._Record(progress, retried, self._DeleteAll(pool, retried))
+
+    progress.done = not progress.failed_names
+    if not progress.done:
+      logging.warning("%d objects under %r could not be deleted; run the "
+                      "purge again to retry them", progress.failed,
+                      self.prefix)
+    self._SaveProgress(progress)
+    return progress
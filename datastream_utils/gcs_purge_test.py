@@ -0,0 +1,130 @@
+"""Tests for google3.experimental.dhercher.datastream_utils.gcs_purge."""
+
+import json
+import os
+
+import mock
+
+from google3.experimental.dhercher.datastream_utils import gcs_purge
+from google3.testing.pybase import googletest
+
+
+class GcsPurgerTest(googletest.TestCase):
+
+  def setUp(self):
+    super().setUp()
+    self.root = self.create_tempdir().full_path
+    for index in range(25):
+      self._Write("data/run-1/HR_JOBS/%02d.avro" % index)
+    self._Write("data/run-2/keep.avro")
+    self.store = gcs_purge.LocalObjectStore(self.root)
+
+  def _Write(self, name):
+    path = os.path.join(self.root, *name.split("/"))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+      f.write("x")
+
+  def _Remaining(self, prefix):
+    names, _ = self.store.ListPage(prefix, page_size=1000)
+    return names
+
+  def test_purge_prefix(self):
+    progress = gcs_purge.GcsPurger(self.store, "/data/run-1/", max_workers=4,
+                                   page_size=10).Purge()
+
+    self.assertEqual(progress.deleted, 25)
+    self.assertEqual(progress.pages, 3)
+    self.assertTrue(progress.done)
+    self.assertEmpty(self._Remaining("data/run-1/"))
+    self.assertEqual(self._Remaining("data/"), ["data/run-2/keep.avro"])
+
+  def test_refuses_whole_bucket(self):
+    with self.assertRaises(ValueError):
+      gcs_purge.GcsPurger(self.store, "/")
+
+  def test_resume_from_checkpoint(self):
+    checkpoint = os.path.join(self.create_tempdir().full_path, "purge.json")
+    store = mock.MagicMock(wraps=self.store)
+    calls = []
+
+    def _list_then_fail(prefix, page_token=None, page_size=None):
+      calls.append(page_token)
+      if len(calls) == 3:
+        raise IOError("interrupted")
+      return self.store.ListPage(prefix, page_token, page_size)
+
+    store.ListPage.side_effect = _list_then_fail
+    with self.assertRaises(IOError):
+      gcs_purge.GcsPurger(store, "data/run-1/", page_size=10,
+                          checkpoint_path=checkpoint).Purge()
+    with open(checkpoint) as f:
+      saved = json.load(f)
+    self.assertFalse(saved["done"])
+
+    store.ListPage.side_effect = None
+    store.ListPage.reset_mock()
+    progress = gcs_purge.GcsPurger(store, "data/run-1/", page_size=10,
+                                   checkpoint_path=checkpoint).Purge()
+
+    self.assertEqual(store.ListPage.call_args_list[0][0][1],
+                     saved["page_token"])
+    self.assertEqual(progress.deleted, 25)
+    self.assertEmpty(self._Remaining("data/run-1/"))
+
+  def test_failed_deletes_are_retried(self):
+    store = mock.MagicMock(wraps=self.store)
+    attempts = []
+
+    def _fail_first_time(name):
+      attempts.append(name)
+      if attempts.count(name) == 1 and name.endswith("/03.avro"):
+        raise IOError("unavailable")
+      self.store.DeleteObject(name)
+
+    store.DeleteObject.side_effect = _fail_first_time
+    sleep = mock.Mock()
+    progress = gcs_purge.GcsPurger(store, "data/run-1/", page_size=10,
+                                   sleep=sleep).Purge()
+
+    self.assertTrue(progress.done)
+    self.assertEqual((progress.deleted, progress.failed), (25, 0))
+    sleep.assert_called_once_with(gcs_purge.DEFAULT_RETRY_DELAY)
+    self.assertEmpty(self._Remaining("data/run-1/"))
+
+  def test_objects_left_keep_the_purge_unfinished(self):
+    checkpoint = os.path.join(self.create_tempdir().full_path, "purge.json")
+    store = mock.MagicMock(wraps=self.store)
+    stuck = "data/run-1/HR_JOBS/03.avro"
+
+    def _fail_stuck(name):
+      if name == stuck:
+        raise IOError("permission denied")
+      self.store.DeleteObject(name)
+
+    store.DeleteObject.side_effect = _fail_stuck
+    progress = gcs_purge.GcsPurger(store, "data/run-1/", page_size=10,
+                                   checkpoint_path=checkpoint,
+                                   sleep=mock.Mock()).Purge()
+
+    self.assertFalse(progress.done)
+    self.assertEqual((progress.deleted, progress.failed), (24, 1))
+    with open(checkpoint) as f:
+      saved = json.load(f)
+    self.assertFalse(saved["done"])
+    self.assertEqual(saved["failed_names"], [stuck])
+
+    # A later run retries the object left without listing again.
+    store.DeleteObject.side_effect = None
+    store.ListPage.reset_mock()
+    progress = gcs_purge.GcsPurger(store, "data/run-1/", page_size=10,
+                                   checkpoint_path=checkpoint).Purge()
+
+    store.ListPage.assert_not_called()
+    self.assertTrue(progress.done)
+    self.assertEqual((progress.deleted, progress.failed), (25, 0))
+    self.assertEmpty(self._Remaining("data/run-1/"))
+
+
+if __name__ == "__main__":
+  googletest.main()
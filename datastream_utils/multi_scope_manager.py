@@ -0,0 +1,193 @@
+"""Manage Datastream resources across many projects and regions at once."""
+
+import concurrent.futures
+import logging
+
+try:
+  from google3.google.cloud.datastream import datastream  # pylint: disable=g-import-not-at-top
+except ModuleNotFoundError:
+  import datastream  # pytype: disable=import-error  pylint: disable=g-import-not-at-top
+
+try:
+  from google3.experimental.dhercher.datastream_utils import api_rate_limiter  # pylint: disable=g-import-not-at-top
+  from google3.experimental.dhercher.datastream_utils import cloud_datastream_resource_manager  # pylint: disable=g-import-not-at-top
+  from google3.experimental.dhercher.datastream_utils import compact_inventory  # pylint: disable=g-import-not-at-top
+  from google3.experimental.dhercher.datastream_utils import pooled_http  # pylint: disable=g-import-not-at-top
+except ModuleNotFoundError:
+  import api_rate_limiter  # pytype: disable=import-error  pylint: disable=g-import-not-at-top
+  import cloud_datastream_resource_manager  # pytype: disable=import-error  pylint: disable=g-import-not-at-top
+  import compact_inventory  # pytype: disable=import-error  pylint: disable=g-import-not-at-top
+  import pooled_http  # pytype: disable=import-error  pylint: disable=g-import-not-at-top
+
+
+DEFAULT_MAX_WORKERS = 16
+
+
+def ParseScopes(scopes_str):
+  """Parse "project:region,project:region" into (project, region) tuples.
+
+  A scope without a region uses the default region.
+  """
+  scopes = []
+  for scope in scopes_str.replace(",", " ").split():
+    project_number, _, region = scope.partition(":")
+    region = region or cloud_datastream_resource_manager.DEFAULT_REGION
+    scopes.append((project_number, region))
+  return scopes
+
+
+class ScopeResult(object):
+  """The outcome of one operation in one project and region."""
+
+  __slots__ = ("project_number", "region", "value", "error")
+
+  def __init__(self, project_number, region, value=None, error=None):
+    self.project_number = project_number
+    self.region = region
+    self.value = value
+    self.error = error
+
+  @property
+  def scope(self):
+    return "%s/%s" % (self.project_number, self.region)
+
+
+class MultiScopeReport(object):
+  """Merged per-scope results of a fan out operation."""
+
+  def __init__(self, results):
+    self.results = results
+
+  @property
+  def failures(self):
+    return [result for result in self.results if result.error is not None]
+
+  def GetRows(self):
+    """Yield (project_number, region, item) for every item in every scope."""
+    for result in self.results:
+      if result.error is not None or result.value is None:
+        continue
+      for item in result.value:
+        yield result.project_number, result.region, item
+
+  def LogFailures(self):
+    for result in self.failures:
+      logging.error("Scope %s failed: %s", result.scope, result.error)
+
+
+class MultiScopeResourceManager(object):
+  """Fan list, status and teardown operations out over project/region pairs.
+
+  Every scope gets its own CloudDatastreamResourceManager, but they share a
+  single Datastream client on a thread-safe pooled transport and a single
+  rate limiter, so the whole estate is bounded by one quota budget.
+  """
+
+  def __init__(self,
+               scopes,
+               client=None,
+               http_factory=None,
+               rate_limiter=None,
+               retry_policy=None,
+               max_workers=None,
+               datastream_api_url=None,
+               **manager_kwargs):
+    """Initialize the MultiScopeResourceManager.
+
+    Args:
+      scopes: An iterable of (project_number, region) tuples.
+      client: The Datastream client to share, built on a pooled transport if
+          not supplied.
+      http_factory: A callable returning a new httplib2.Http for each thread
+          of the pooled transport.
+      rate_limiter: The TokenBucketRateLimiter shared by every scope.
+      retry_policy: The RetryPolicy shared by every scope.
+      max_workers: The maximum number of scopes to work on concurrently.
+      datastream_api_url: The URL to use when calling DataStream.
+      **manager_kwargs: Arguments for each CloudDatastreamResourceManager,
+          eg. stream_name, source_cp_name, target_cp_name.
+    """
+    self.scopes = list(scopes)
+    self.max_workers = max_workers or DEFAULT_MAX_WORKERS
+    self.rate_limiter = (
+        rate_limiter or api_rate_limiter.GetDefaultRateLimiter())
+
+    if client:
+      self.client = client
+    else:
+      logging.info("Creating DataStream Client with pooled HTTP")
+      api_url = datastream_api_url or (
+          cloud_datastream_resource_manager.DATASTREAM_URL)
+      self.client = datastream.DatastreamV1alpha1(
+          url=api_url,
+          http=pooled_http.ThreadLocalHttp(http_factory),
+          get_credentials=True)
+
+    manager_kwargs.setdefault("gcs_bucket_name", "")
+    self.managers = {}
+    for project_number, region in self.scopes:
+      self.managers[(project_number, region)] = (
+          cloud_datastream_resource_manager.CloudDatastreamResourceManager(
+              project_number=project_number,
+              region=region,
+              client=self.client,
+              rate_limiter=self.rate_limiter,
+              retry_policy=retry_policy,
+              **manager_kwargs))
+
+  def _RunScope(self, scope, func):
+    project_number, region = scope
+    try:
+      return ScopeResult(project_number, region,
+                         value=func(self.managers[scope]))
+    except Exception as e:  # pylint: disable=broad-except
+      logging.exception("Operation failed in %s/%s", project_number, region)
+      return ScopeResult(project_number, region, error=e)
+
+  def FanOut(self, func):
+    """Run func(manager) for every scope in parallel.
+
+    Args:
+      func: A callable taking a CloudDatastreamResourceManager.
+    Returns:
+      A MultiScopeReport with one ScopeResult per scope, in scope order.
+    """
+    if not self.scopes:
+      return MultiScopeReport([])
+
+    workers = min(self.max_workers, len(self.scopes))
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+      results = list(pool.map(lambda scope: self._RunScope(scope, func),
+                              self.scopes))
+    return MultiScopeReport(results)
+
+  def ListStreams(self):
+    """Return a report of StreamRecords matching the stream prefix."""
+    def _List(manager):
+      return [compact_inventory.StreamToRecord(stream)
+              for stream in manager._ListAllStreams()  # pylint: disable=protected-access
+              if manager._stream_name in stream.name]  # pylint: disable=protected-access
+    return self.FanOut(_List)
+
+  def ListConnectionProfiles(self):
+    """Return a report of every page of connection profiles in each scope."""
+    return self.FanOut(
+        lambda manager: manager._ListAllConnectionProfiles())  # pylint: disable=protected-access
+
+  def TearDown(self):
+    """Tear down each scope's stream and connection profiles.
+
+    These are the resources each manager is named for: the exact names
+    given when add_uid_suffix is False, or those recorded for the run when
+    a ledger is supplied. Other resources sharing the prefix are left alone.
+    """
+    return self.FanOut(lambda manager: manager.TearDown())
+
+  def LogStreamStatus(self):
+    """Log the state and error count of every matching stream."""
+    report = self.ListStreams()
+    for project_number, region, stream in report.GetRows():
+      logging.info("%s\t%s\t%s\t%s\terrors=%d", project_number, region,
+                   stream.name, stream.state, stream.errorCount)
+    report.LogFailures()
+    return report
@@ -0,0 +1,73 @@
+"""Tests for google3.experimental.dhercher.datastream_utils.multi_scope_manager."""
+
+import mock
+
+from google3.experimental.dhercher.datastream_utils import multi_scope_manager
+from google3.google.cloud.datastream import datastream
+from google3.testing.pybase import googletest
+
+
+class MultiScopeResourceManagerTest(googletest.TestCase):
+
+  def test_parse_scopes(self):
+    self.assertEqual(
+        multi_scope_manager.ParseScopes("123:europe-west1, 456"),
+        [("123", "europe-west1"), ("456", "us-central1")])
+
+  def test_list_streams_merges_scopes(self):
+    client_mock = mock.MagicMock()
+
+    def _list(request):
+      if "456" in request.parent:
+        raise datastream.HttpError({"status": "403"}, b"", "url")
+      return datastream.ListStreamsResponse(streams=[
+          datastream.Stream(name=request.parent + "/streams/ora-1"),
+          datastream.Stream(name=request.parent + "/streams/other")])
+
+    client_mock.projects_locations_streams.List.side_effect = _list
+    manager = multi_scope_manager.MultiScopeResourceManager(
+        [("123", "us-central1"), ("123", "europe-west1"),
+         ("456", "us-central1")],
+        client=client_mock, stream_name="ora")
+
+    report = manager.ListStreams()
+
+    rows = list(report.GetRows())
+    self.assertEqual([(p, r) for p, r, _ in rows],
+                     [("123", "us-central1"), ("123", "europe-west1")])
+    self.assertTrue(all(s.name.endswith("/streams/ora-1") for _, _, s in rows))
+    self.assertLen(report.failures, 1)
+    self.assertEqual(report.failures[0].scope, "456/us-central1")
+
+  def test_list_connection_profiles_follows_pages(self):
+    client_mock = mock.MagicMock()
+
+    def _list(request):
+      if request.pageToken:
+        return datastream.ListConnectionProfilesResponse(connectionProfiles=[
+            datastream.ConnectionProfile(name="cp-2")])
+      return datastream.ListConnectionProfilesResponse(
+          connectionProfiles=[datastream.ConnectionProfile(name="cp-1")],
+          nextPageToken="next")
+
+    client_mock.projects_locations_connectionProfiles.List.side_effect = _list
+    manager = multi_scope_manager.MultiScopeResourceManager(
+        [("123", "us-central1")], client=client_mock)
+
+    rows = list(manager.ListConnectionProfiles().GetRows())
+    self.assertEqual([cp.name for _, _, cp in rows], ["cp-1", "cp-2"])
+
+  def test_managers_share_client_and_limiter(self):
+    client_mock = mock.MagicMock()
+    manager = multi_scope_manager.MultiScopeResourceManager(
+        [("123", "us-central1"), ("456", "us-east1")], client=client_mock)
+
+    scoped = list(manager.managers.values())
+    self.assertIs(scoped[0].client, scoped[1].client)
+    self.assertIs(scoped[0].rate_limiter, scoped[1].rate_limiter)
+    self.assertEqual(scoped[1].datastream_parent,
+                     "projects/456/locations/us-east1")
+
+
+if __name__ == "__main__":
+  googletest.main()
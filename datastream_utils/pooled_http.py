@@ -0,0 +1,42 @@
+"""A thread-safe HTTP transport for sharing one Datastream client."""
+
+import threading
+
+try:
+  from google3.google.cloud.datastream import datastream  # pylint: disable=g-import-not-at-top
+except ModuleNotFoundError:
+  import datastream  # pytype: disable=import-error  pylint: disable=g-import-not-at-top
+
+
+class ThreadLocalHttp(object):
+  """Stand-in for httplib2.Http which keeps one connection pool per thread.
+
+  httplib2.Http is not thread-safe, so an apitools client built on a single
+  instance cannot be used from several threads. This transport hands each
+  thread its own Http (and so its own keep-alive connections) while the
+  client, its credentials and the rate limiter are shared.
+  """
+
+  def __init__(self, http_factory=None):
+    """Initialize the ThreadLocalHttp.
+
+    Args:
+      http_factory: A callable returning a new httplib2.Http, defaults to the
+          apitools transport.
+    """
+    self._http_factory = http_factory or datastream.http_wrapper.GetHttp
+    self._local = threading.local()
+
+  def _GetHttp(self):
+    http = getattr(self._local, "http", None)
+    if http is None:
+      http = self._http_factory()
+      self._local.http = http
+    return http
+
+  @property
+  def connections(self):
+    return self._GetHttp().connections
+
+  def request(self, *args, **kwargs):
+    return self._GetHttp().request(*args, **kwargs)
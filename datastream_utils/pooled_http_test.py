@@ -0,0 +1,27 @@
+"""Tests for google3.experimental.dhercher.datastream_utils.pooled_http."""
+
+import threading
+import mock
+
+from google3.experimental.dhercher.datastream_utils import pooled_http
+from google3.testing.pybase import googletest
+
+
+class ThreadLocalHttpTest(googletest.TestCase):
+
+  def test_one_http_per_thread(self):
+    factory = mock.Mock(side_effect=lambda: mock.Mock(connections={}))
+    http = pooled_http.ThreadLocalHttp(factory)
+
+    http.request("https://a")
+    http.request("https://b")
+    thread = threading.Thread(target=http.request, args=("https://c",))
+    thread.start()
+    thread.join()
+
+    self.assertEqual(factory.call_count, 2)
+    self.assertEqual(http.connections, {})
+
+
+if __name__ == "__main__":
+  googletest.main()
@@ -0,0 +1,287 @@
+"""Find and delete Datastream resources left behind by aborted runs.
+
+The collector lists every stream, connection profile, private connection and
+operation in a project once, builds the reference graph
+stream -> connection profile -> private connection, and treats as orphaned
+any prefixed resource older than the minimum age that no live resource
+refers to. A stream is only collected when it has failed and the resource
+ledger shows this tool created it. Orphans are deleted concurrently, in
+dependency order, in batches.
+"""
+
+import calendar
+import concurrent.futures
+import logging
+import time
+
+try:
+  from google3.google.cloud.datastream import datastream  # pylint: disable=g-import-not-at-top
+except ModuleNotFoundError:
+  import datastream  # pytype: disable=import-error  pylint: disable=g-import-not-at-top
+
+try:
+  from google3.experimental.dhercher.datastream_utils import resource_ledger  # pylint: disable=g-import-not-at-top
+except ModuleNotFoundError:
+  import resource_ledger  # pytype: disable=import-error  pylint: disable=g-import-not-at-top
+
+
+KIND_STREAM = "stream"
+KIND_CONNECTION_PROFILE = "connectionProfile"
+KIND_PRIVATE_CONNECTION = "privateConnection"
+KIND_OPERATION = "operation"
+
+DEFAULT_MIN_AGE = 24 * 60 * 60
+DEFAULT_MAX_WORKERS = 16
+DEFAULT_BATCH_SIZE = 50
+
+# Only streams in these states can be abandoned. Running, paused and
+# created but not yet started streams are never collected.
+_ABANDONED_STREAM_STATES = frozenset((
+    datastream.Stream.StateValueValuesEnum.FAILED,
+    datastream.Stream.StateValueValuesEnum.FAILED_PERMANENTLY,
+))
+
+# Deletion order, so nothing is deleted while something still refers to it.
+_DELETE_ORDER = (KIND_STREAM, KIND_CONNECTION_PROFILE, KIND_PRIVATE_CONNECTION,
+                 KIND_OPERATION)
+
+
+def ParseTimestamp(timestamp):
+  """Return seconds since the epoch for an RFC 3339 UTC timestamp, or None."""
+  if not timestamp:
+    return None
+  seconds, _, fraction = timestamp.rstrip("Z").partition(".")
+  parsed = calendar.timegm(time.strptime(seconds, "%Y-%m-%dT%H:%M:%S"))
+  return parsed + (float("0." + fraction) if fraction else 0.0)
+
+
+def _ShortName(name):
+  return name.rsplit("/", 1)[-1]
+
+
+def _OperationCreateTime(operation):
+  if not operation.metadata:
+    return None
+  metadata = datastream.encoding.MessageToPyValue(operation.metadata)
+  return metadata.get("createTime")
+
+
+def _OperationTarget(operation):
+  if not operation.metadata:
+    return None
+  metadata = datastream.encoding.MessageToPyValue(operation.metadata)
+  return metadata.get("target")
+
+
+class GcCandidate(object):
+  """A resource the collector intends to delete."""
+
+  __slots__ = ("kind", "name", "create_time", "reason")
+
+  def __init__(self, kind, name, create_time=None, reason=None):
+    self.kind = kind
+    self.name = name
+    self.create_time = create_time
+    self.reason = reason
+
+  def __repr__(self):
+    return "GcCandidate(%s, %r, %s)" % (self.kind, self.name, self.reason)
+
+
+class ReferenceGraph(object):
+  """The resources in a project and which resources refer to them."""
+
+  def __init__(self, streams, connection_profiles, private_connections,
+               operations):
+    self.streams = {stream.name: stream for stream in streams}
+    self.connection_profiles = {cp.name: cp for cp in connection_profiles}
+    self.private_connections = {
+        pc.name: pc for pc in private_connections}
+    self.operations = list(operations)
+
+    # Referenced name -> names of the resources referring to it.
+    self.referrers = {}
+    for stream in self.streams.values():
+      if stream.sourceConfig:
+        self._AddReference(stream.sourceConfig.sourceConnectionProfileName,
+                           stream.name)
+      if stream.destinationConfig:
+        self._AddReference(
+            stream.destinationConfig.destinationConnectionProfileName,
+            stream.name)
+    for cp in self.connection_profiles.values():
+      if cp.privateConnectivity:
+        self._AddReference(cp.privateConnectivity.privateConnectionName,
+                           cp.name)
+
+  def _AddReference(self, name, referrer):
+    if name:
+      self.referrers.setdefault(name, set()).add(referrer)
+
+  def GetReferrers(self, name):
+    return self.referrers.get(name, set())
+
+
+class GcReport(object):
+  """The outcome of a garbage collection run."""
+
+  def __init__(self, candidates, dry_run):
+    self.candidates = candidates
+    self.dry_run = dry_run
+    self.deleted = []
+    self.failures = []
+
+  def GetCounts(self):
+    """Return {kind: number of candidates}."""
+    counts = {}
+    for candidate in self.candidates:
+      counts[candidate.kind] = counts.get(candidate.kind, 0) + 1
+    return counts
+
+  def LogSummary(self):
+    for candidate in self.candidates:
+      logging.info("%s%s %s (%s)", "[dry-run] " if self.dry_run else "",
+                   candidate.kind, candidate.name, candidate.reason)
+    for candidate, error in self.failures:
+      logging.error("Unable to delete %s %s: %s", candidate.kind,
+                    candidate.name, error)
+    logging.info("GC candidates: %s, deleted: %d, failed: %d",
+                 self.GetCounts(), len(self.deleted), len(self.failures))
+
+
+class GarbageCollector(object):
+  """Delete orphaned Datastream resources matching a prefix."""
+
+  def __init__(self, manager, prefixes=None, min_age=None, max_workers=None,
+               batch_size=None, clock=None, ledger=None):
+    """Initialize the GarbageCollector.
+
+    Args:
+      manager: The CloudDatastreamResourceManager used for API calls.
+      prefixes: Resource id prefixes eligible for collection, defaults to
+          the manager's stream and connection profile prefixes.
+      min_age: Seconds a resource must have existed before it is collected.
+      max_workers: The maximum number of concurrent delete calls.
+      batch_size: The number of deletes issued before waiting for them all.
+      clock: A function returning the current time in seconds.
+      ledger: The ResourceLedger of the streams this tool created, defaults
+          to the manager's ledger. Without a ledger no stream is collected.
+    """
+    self.manager = manager
+    self.ledger = ledger or manager.ledger
+    self.prefixes = tuple(prefixes or (
+        manager._stream_name, manager._source_cp_name,  # pylint: disable=protected-access
+        manager._target_cp_name))  # pylint: disable=protected-access
+    self.min_age = DEFAULT_MIN_AGE if min_age is None else min_age
+    self.max_workers = max_workers or DEFAULT_MAX_WORKERS
+    self.batch_size = batch_size or DEFAULT_BATCH_SIZE
+    self._clock = clock or time.time
+
+  def BuildReferenceGraph(self):
+    """List every resource in the project once and link them."""
+    return ReferenceGraph(
+        self.manager._ListAllStreams(),  # pylint: disable=protected-access
+        self.manager._ListAllConnectionProfiles(),  # pylint: disable=protected-access
+        self.manager._ListAllPrivateConnections(),  # pylint: disable=protected-access
+        self.manager._ListAllOperations())  # pylint: disable=protected-access
+
+  def _IsEligible(self, name, create_time):
+    """Return whether a resource matches a prefix and is old enough."""
+    if not _ShortName(name).startswith(self.prefixes):
+      return False
+    created = ParseTimestamp(create_time)
+    return created is not None and self._clock() - created >= self.min_age
+
+  def _IsAbandonedStream(self, stream):
+    """Return whether a failed stream is a live resource in the ledger."""
+    if stream.state not in _ABANDONED_STREAM_STATES:
+      return False
+    entry = self.ledger.Get(stream.name) if self.ledger else None
+    return bool(entry and entry.kind == resource_ledger.KIND_STREAM and
+                entry.state in resource_ledger.LIVE_STATES)
+
+  def FindOrphans(self, graph):
+    """Return the GcCandidates in a reference graph, in deletion order."""
+    if not self.ledger:
+      logging.warning("No resource ledger, streams will not be collected")
+    candidates = []
+    for stream in graph.streams.values():
+      if (self._IsAbandonedStream(stream) and
+          self._IsEligible(stream.name, stream.createTime)):
+        candidates.append(GcCandidate(KIND_STREAM, stream.name,
+                                      stream.createTime,
+                                      "stream %s" % stream.state))
+    doomed = {candidate.name for candidate in candidates}
+
+    for cp in graph.connection_profiles.values():
+      if (graph.GetReferrers(cp.name) <= doomed and
+          self._IsEligible(cp.name, cp.createTime)):
+        candidates.append(GcCandidate(KIND_CONNECTION_PROFILE, cp.name,
+                                      cp.createTime, "unreferenced"))
+        doomed.add(cp.name)
+
+    for pc in graph.private_connections.values():
+      if (graph.GetReferrers(pc.name) <= doomed and
+          self._IsEligible(pc.name, pc.createTime)):
+        candidates.append(GcCandidate(KIND_PRIVATE_CONNECTION, pc.name,
+                                      pc.createTime, "unreferenced"))
+
+    for operation in graph.operations:
+      target = _OperationTarget(operation)
+      create_time = _OperationCreateTime(operation)
+      if target and self._IsEligible(target, create_time):
+        candidates.append(GcCandidate(
+            KIND_OPERATION, operation.name, create_time,
+            "finished" if operation.done else "stale"))
+
+    return candidates
+
+  def _Delete(self, candidate):
+    manager = self.manager
+    if candidate.kind == KIND_STREAM:
+      manager._DeleteStream(candidate.name)  # pylint: disable=protected-access
+    elif candidate.kind == KIND_CONNECTION_PROFILE:
+      manager._DeleteConnectionProfile(candidate.name, ignore_errors=False)  # pylint: disable=protected-access
+    elif candidate.kind == KIND_PRIVATE_CONNECTION:
+      manager._DeletePrivateConnection(candidate.name)  # pylint: disable=protected-access
+    elif candidate.reason == "stale":
+      manager._CancelOperation(candidate.name)  # pylint: disable=protected-access
+    else:
+      manager._DeleteOperation(candidate.name)  # pylint: disable=protected-access
+
+  def _TryDelete(self, candidate):
+    try:
+      self._Delete(candidate)
+      return None
+    except datastream.HttpError as e:
+      if e.status_code == 404:
+        return None
+      return e
+    except Exception as e:  # pylint: disable=broad-except
+      return e
+
+  def DeleteCandidates(self, candidates, report):
+    """Delete candidates kind by kind, each kind concurrently in batches."""
+    with concurrent.futures.ThreadPoolExecutor(
+        max_workers=self.max_workers) as pool:
+      for kind in _DELETE_ORDER:
+        of_kind = [c for c in candidates if c.kind == kind]
+        for start in range(0, len(of_kind), self.batch_size):
+          batch = of_kind[start:start + self.batch_size]
+          for candidate, error in zip(batch, pool.map(self._TryDelete, batch)):
+            if error is None:
+              report.deleted.append(candidate)
+            else:
+              report.failures.append((candidate, error))
+
+  def Collect(self, dry_run=True):
+    """Find orphans and, unless dry_run is set, delete them.
+
+    Returns:
+      A GcReport of the candidates, deletions and failures.
+    """
+    candidates = self.FindOrphans(self.BuildReferenceGraph())
+    report = GcReport(candidates, dry_run)
+    if not dry_run:
+      self.DeleteCandidates(candidates, report)
+    return report
@@ -0,0 +1,155 @@
+"""Tests for google3.experimental.dhercher.datastream_utils.resource_gc."""
+
+import mock
+
+from google3.experimental.dhercher.datastream_utils import cloud_datastream_resource_manager
+from google3.experimental.dhercher.datastream_utils import resource_gc
+from google3.experimental.dhercher.datastream_utils import resource_ledger
+from google3.google.cloud.datastream import datastream
+from google3.testing.pybase import googletest
+
+_PARENT = "projects/123/locations/us-central1"
+_OLD = "2021-01-01T00:00:00.5Z"
+_NEW = "2021-01-10T00:30:00Z"
+_NOW = resource_gc.ParseTimestamp("2021-01-10T01:00:00Z")
+
+_STATE = datastream.Stream.StateValueValuesEnum
+
+
+def _Stream(name, state, source, create_time=_OLD):
+  return datastream.Stream(
+      name=_PARENT + "/streams/" + name, state=state, createTime=create_time,
+      sourceConfig=datastream.SourceConfig(
+          sourceConnectionProfileName=_PARENT + "/connectionProfiles/" +
+          source))
+
+
+def _Cp(name, private_connection=None, create_time=_OLD):
+  return datastream.ConnectionProfile(
+      name=_PARENT + "/connectionProfiles/" + name, createTime=create_time,
+      privateConnectivity=datastream.PrivateConnectivity(
+          privateConnectionName=private_connection)
+      if private_connection else None)
+
+
+def _Operation(name, target, done):
+  return datastream.Operation(
+      name=_PARENT + "/operations/" + name, done=done,
+      metadata=datastream.encoding.PyValueToMessage(
+          datastream.Operation.MetadataValue,
+          {"createTime": _OLD, "target": target}))
+
+
+class GarbageCollectorTest(googletest.TestCase):
+
+  def setUp(self):
+    super().setUp()
+    pc_name = _PARENT + "/privateConnections/ora-pc"
+    self.manager = mock.MagicMock()
+    self.manager._ListAllStreams.return_value = [
+        _Stream("ora-live", _STATE.RUNNING, "ora-cp-live"),
+        _Stream("ora-failed", _STATE.FAILED, "ora-cp-failed"),
+        _Stream("ora-paused", _STATE.PAUSED, "ora-cp-live"),
+        _Stream("ora-created", _STATE.CREATED, "ora-cp-live"),
+        _Stream("ora-untracked", _STATE.FAILED, "ora-cp-live"),
+        _Stream("other-failed", _STATE.FAILED, "ora-cp-other"),
+    ]
+    self.manager._ListAllConnectionProfiles.return_value = [
+        _Cp("ora-cp-live"),
+        _Cp("ora-cp-failed", private_connection=pc_name),
+        _Cp("ora-cp-other"),
+        _Cp("ora-cp-unused"),
+        _Cp("ora-cp-recent", create_time=_NEW),
+        _Cp("keep-me"),
+    ]
+    self.manager._ListAllPrivateConnections.return_value = [
+        datastream.PrivateConnection(name=pc_name, createTime=_OLD)]
+    self.manager._ListAllOperations.return_value = [
+        _Operation("op-1", _PARENT + "/streams/ora-failed", done=False),
+        _Operation("op-2", _PARENT + "/connectionProfiles/ora-cp-x", True),
+        _Operation("op-3", _PARENT + "/streams/keep", done=False),
+    ]
+    ledger = resource_ledger.ResourceLedger(":memory:")
+    for name in ("ora-failed", "ora-paused", "ora-created", "other-failed"):
+      ledger.Record(_PARENT + "/streams/" + name, resource_ledger.KIND_STREAM,
+                    resource_ledger.STATE_CREATED, run_id=name)
+    self.collector = resource_gc.GarbageCollector(
+        self.manager, prefixes=("ora",), min_age=3600, clock=lambda: _NOW,
+        ledger=ledger)
+
+  def test_parse_timestamp(self):
+    self.assertEqual(resource_gc.ParseTimestamp("1970-01-01T00:01:00.25Z"),
+                     60.25)
+    self.assertIsNone(resource_gc.ParseTimestamp(None))
+
+  def test_find_orphans(self):
+    report = self.collector.Collect(dry_run=True)
+
+    names = [(c.kind, c.name.rsplit("/", 1)[-1]) for c in report.candidates]
+    self.assertEqual(names, [
+        ("stream", "ora-failed"),
+        ("connectionProfile", "ora-cp-failed"),
+        ("connectionProfile", "ora-cp-unused"),
+        ("privateConnection", "ora-pc"),
+        ("operation", "op-1"),
+        ("operation", "op-2"),
+    ])
+    self.manager._DeleteStream.assert_not_called()
+    self.manager._DeleteConnectionProfile.assert_not_called()
+
+  def test_delete_orphans(self):
+    error = datastream.HttpError({"status": 500}, b"", "url")
+    self.manager._DeleteConnectionProfile.side_effect = [
+        datastream.Operation(done=True),
+        error,
+    ]
+    self.collector.batch_size = 1
+
+    report = self.collector.Collect(dry_run=False)
+
+    self.manager._DeleteStream.assert_called_once_with(
+        _PARENT + "/streams/ora-failed")
+    self.manager._DeletePrivateConnection.assert_called_once_with(
+        _PARENT + "/privateConnections/ora-pc")
+    self.manager._CancelOperation.assert_called_once_with(
+        _PARENT + "/operations/op-1")
+    self.manager._DeleteOperation.assert_called_once_with(
+        _PARENT + "/operations/op-2")
+    self.assertLen(report.deleted, 5)
+    self.assertLen(report.failures, 1)
+    self.assertTrue(report.failures[0][0].name.endswith("ora-cp-unused"))
+    self.assertIs(report.failures[0][1], error)
+
+  def test_failed_delete_operations_are_failures(self):
+    client_mock = mock.MagicMock()
+    client_mock.projects_locations_connectionProfiles.Delete.return_value = (
+        datastream.Operation(
+            done=True, name="operations/op",
+            error=datastream.Status(code=9, message="profile is in use")))
+    ledger = resource_ledger.ResourceLedger(":memory:")
+    manager = cloud_datastream_resource_manager.CloudDatastreamResourceManager(
+        123, "bucket-name", client=client_mock, ledger=ledger)
+    name = _PARENT + "/connectionProfiles/ora-cp-unused"
+    ledger.Record(name, resource_ledger.KIND_CONNECTION_PROFILE,
+                  resource_ledger.STATE_CREATED)
+    candidate = resource_gc.GcCandidate(resource_gc.KIND_CONNECTION_PROFILE,
+                                        name)
+    report = resource_gc.GcReport([candidate], dry_run=False)
+
+    resource_gc.GarbageCollector(manager, ledger=ledger).DeleteCandidates(
+        [candidate], report)
+
+    self.assertEmpty(report.deleted)
+    self.assertLen(report.failures, 1)
+    self.assertIn("profile is in use", str(report.failures[0][1]))
+    self.assertEqual(ledger.Get(name).state, resource_ledger.STATE_DELETING)
+
+  def test_streams_need_a_ledger(self):
+    self.collector.ledger = None
+    report = self.collector.Collect(dry_run=True)
+    self.assertNotIn(resource_gc.KIND_STREAM,
+                     [c.kind for c in report.candidates])
+
+
+if __name__ == "__main__":
+  googletest.main()
@@ -0,0 +1,165 @@
+"""A local ledger of the Datastream resources created by a resource manager.
+
+Every resource is recorded before its create call is sent, so a crashed
+process never leaves behind resources the ledger does not know about.
+TearDown, resume and garbage collection read resource names straight from
+the ledger instead of listing the whole project.
+"""
+
+import sqlite3
+import threading
+import time
+
+KIND_CONNECTION_PROFILE = "connectionProfile"
+KIND_STREAM = "stream"
+KIND_PRIVATE_CONNECTION = "privateConnection"
+
+STATE_CREATING = "CREATING"
+STATE_CREATED = "CREATED"
+STATE_FAILED = "FAILED"
+STATE_DELETING = "DELETING"
+STATE_DELETED = "DELETED"
+
+# Resources in these states may still exist in Datastream.
+LIVE_STATES = (STATE_CREATING, STATE_CREATED, STATE_FAILED, STATE_DELETING)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS resources (
+  name TEXT PRIMARY KEY,
+  kind TEXT NOT NULL,
+  run_id TEXT,
+  operation_name TEXT,
+  state TEXT NOT NULL,
+  created_at REAL NOT NULL,
+  updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS resources_run_id ON resources (run_id);
+"""
+
+
+def GetOperationState(operation):
+  """Return the ledger state matching a create Operation."""
+  if operation.error:
+    return STATE_FAILED
+  if operation.done:
+    return STATE_CREATED
+  return STATE_CREATING
+
+
+def GetDeleteOperationState(operation):
+  """Return the ledger state matching a delete Operation.
+
+  A failed or unfinished delete leaves the resource live as DELETING.
+  """
+  if operation.done and not operation.error:
+    return STATE_DELETED
+  return STATE_DELETING
+
+
+class LedgerEntry(object):
+  """One resource recorded in the ledger."""
+
+  __slots__ = ("name", "kind", "run_id", "operation_name", "state",
+               "created_at", "updated_at")
+
+  def __init__(self, name, kind, run_id, operation_name, state, created_at,
+               updated_at):
+    self.name = name
+    self.kind = kind
+    self.run_id = run_id
+    self.operation_name = operation_name
+    self.state = state
+    self.created_at = created_at
+    self.updated_at = updated_at
+
+  def __repr__(self):
+    return "LedgerEntry(%r, %s, %s)" % (self.name, self.kind, self.state)
+
+
+class ResourceLedger(object):
+  """A SQLite backed record of created resources, safe to share by threads."""
+
+  def __init__(self, path, clock=None):
+    """Initialize the ResourceLedger.
+
+    Args:
+      path: The SQLite database file, or ":memory:" for a temporary ledger.
+      clock: A function returning the current time in seconds.
+    """
+    self.path = path
+    self._clock = clock or time.time
+    self._lock = threading.Lock()
+    self._conn = sqlite3.connect(path, check_same_thread=False)
+    with self._lock, self._conn:
+      self._conn.executescript(_SCHEMA)
+
+  def Close(self):
+    with self._lock:
+      self._conn.close()
+
+  def Record(self, name, kind, state, run_id=None, operation_name=None):
+    """Insert or update a resource.
+
+    An existing entry keeps its creation time, run and operation name unless
+    new values are supplied.
+    """
+    now = self._clock()
+    with self._lock, self._conn:
+      self._conn.execute(
+          "INSERT INTO resources (name, kind, run_id, operation_name, state,"
+          " created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)"
+          " ON CONFLICT(name) DO UPDATE SET"
+          " kind = excluded.kind,"
+          " run_id = COALESCE(excluded.run_id, run_id),"
+          " operation_name = COALESCE(excluded.operation_name, operation_name),"
+          " state = excluded.state,"
+          " updated_at = excluded.updated_at",
+          (name, kind, run_id, operation_name, state, now, now))
+
+  def Get(self, name):
+    """Return the LedgerEntry for a resource name, or None."""
+    with self._lock:
+      row = self._conn.execute(
+          "SELECT name, kind, run_id, operation_name, state, created_at,"
+          " updated_at FROM resources WHERE name = ?", (name,)).fetchone()
+    return LedgerEntry(*row) if row else None
+
+  def GetResources(self, run_id=None, kind=None, states=None):
+    """Return the LedgerEntries matching every supplied filter.
+
+    Args:
+      run_id: Only return resources created by this run.
+      kind: Only return resources of this kind.
+      states: Only return resources in one of these states.
+    Returns:
+      A list of LedgerEntry ordered by creation time.
+    """
+    query = ("SELECT name, kind, run_id, operation_name, state, created_at,"
+             " updated_at FROM resources WHERE 1 = 1")
+    params = []
+    if run_id is not None:
+      query += " AND run_id = ?"
+      params.append(run_id)
+    if kind is not None:
+      query += " AND kind = ?"
+      params.append(kind)
+    if states:
+      query += " AND state IN (%s)" % ", ".join("?" * len(states))
+      params.extend(states)
+    query += " ORDER BY created_at, name"
+
+    with self._lock:
+      rows = self._conn.execute(query, params).fetchall()
+    return [LedgerEntry(*row) for row in rows]
+
+  def GetLiveResources(self, run_id=None, kind=None):
+    return self.GetResources(run_id=run_id, kind=kind, states=LIVE_STATES)
+
+  def GetRunIds(self):
+    """Return the runs which still have live resources."""
+    with self._lock:
+      rows = self._conn.execute(
+          "SELECT DISTINCT run_id FROM resources WHERE state IN (%s)"
+          " AND run_id IS NOT NULL ORDER BY run_id"
+          % ", ".join("?" * len(LIVE_STATES)), LIVE_STATES).fetchall()
+    return [row[0] for row in rows]
@@ -0,0 +1,65 @@
+"""Tests for google3.experimental.dhercher.datastream_utils.resource_ledger."""
+
+import os
+
+from google3.experimental.dhercher.datastream_utils import resource_ledger
+from google3.google.cloud.datastream import datastream
+from google3.testing.pybase import googletest
+
+
+class ResourceLedgerTest(googletest.TestCase):
+
+  def test_record_and_update(self):
+    ledger = resource_ledger.ResourceLedger(":memory:")
+    ledger.Record("cp/a", resource_ledger.KIND_CONNECTION_PROFILE,
+                  resource_ledger.STATE_CREATING, run_id="run-1",
+                  operation_name="operations/1")
+    ledger.Record("cp/a", resource_ledger.KIND_CONNECTION_PROFILE,
+                  resource_ledger.STATE_CREATED)
+
+    entry = ledger.Get("cp/a")
+    self.assertEqual(entry.state, resource_ledger.STATE_CREATED)
+    self.assertEqual(entry.run_id, "run-1")
+    self.assertEqual(entry.operation_name, "operations/1")
+    self.assertIsNone(ledger.Get("cp/missing"))
+
+  def test_live_resources_by_run(self):
+    ledger = resource_ledger.ResourceLedger(":memory:")
+    ledger.Record("s/1", resource_ledger.KIND_STREAM,
+                  resource_ledger.STATE_CREATED, run_id="run-1")
+    ledger.Record("s/2", resource_ledger.KIND_STREAM,
+                  resource_ledger.STATE_DELETED, run_id="run-1")
+    ledger.Record("s/3", resource_ledger.KIND_STREAM,
+                  resource_ledger.STATE_FAILED, run_id="run-2")
+
+    self.assertEqual([e.name for e in ledger.GetLiveResources("run-1")],
+                     ["s/1"])
+    self.assertEqual(ledger.GetRunIds(), ["run-1", "run-2"])
+
+  def test_operation_states(self):
+    self.assertEqual(
+        resource_ledger.GetOperationState(datastream.Operation(done=True)),
+        resource_ledger.STATE_CREATED)
+    self.assertEqual(
+        resource_ledger.GetDeleteOperationState(
+            datastream.Operation(done=True)),
+        resource_ledger.STATE_DELETED)
+    self.assertEqual(
+        resource_ledger.GetDeleteOperationState(
+            datastream.Operation(done=False)),
+        resource_ledger.STATE_DELETING)
+
+  def test_survives_reopen(self):
+    path = os.path.join(self.create_tempdir().full_path, "ledger.db")
+    ledger = resource_ledger.ResourceLedger(path)
+    ledger.Record("s/1", resource_ledger.KIND_STREAM,
+                  resource_ledger.STATE_CREATING, run_id="run-1")
+    ledger.Close()
+
+    reopened = resource_ledger.ResourceLedger(path)
+    self.assertEqual(reopened.Get("s/1").state,
+                     resource_ledger.STATE_CREATING)
+
+
+if __name__ == "__main__":
+  googletest.main()
@@ -8,9 +8,21 @@ from typing import Any, Sequence
 from absl import app
 from absl import flags
 
+import api_rate_limiter
 import cloud_datastream_resource_manager
-
-flags.DEFINE_enum("action", "list", ["create", "tear-down", "list"],
+import compact_inventory
+import connection_profile_registry
+import cutover
+import multi_scope_manager
+import resource_gc
+import resource_ledger
+import stream_inventory
+import stream_maintenance
+import stream_snapshot
+
+flags.DEFINE_enum("action", "list",
+                  ["create", "tear-down", "list", "resume", "gc", "pause",
+                   "unpause", "cutover", "export", "import"],
                   "Datastream Action to Run.")
 flags.DEFINE_string("project-number", None,
                     "The GCP Project Number to be used",
@@ -46,6 +58,56 @@ flags.DEFINE_string("schema-names", None,
                     "Names of the schemas to include in Stream")
 flags.DEFINE_string("table-names", None,
                     "Names of the tables to include in Stream")
+flags.DEFINE_float("api-qps", None,
+                   "Max sustained Datastream API requests per second")
+flags.DEFINE_string("ledger-path", None,
+                    "SQLite file recording created resources for teardown "
+                    "and crash recovery")
+flags.DEFINE_string("run-id", None,
+                    "Suffixed stream name of the run to resume, defaults to "
+                    "--stream-prefix")
+flags.DEFINE_string("cp-registry-path", None,
+                    "SQLite file of connection profiles shared between "
+                    "streams with matching settings")
+flags.DEFINE_string("scopes", None,
+                    "project:region pairs to list or tear down in parallel, "
+                    "eg. 123:us-central1,456:europe-west1")
+flags.DEFINE_enum("output-format", stream_inventory.OUTPUT_FORMAT_TABLE,
+                  [stream_inventory.OUTPUT_FORMAT_TABLE,
+                   stream_inventory.OUTPUT_FORMAT_JSON],
+                  "Output format of the list action.")
+flags.DEFINE_string("objects-csv-path", None,
+                    "CSV file the list action writes every stream object "
+                    "to, one column per field")
+flags.DEFINE_boolean("purge-gcs", False,
+                     "Whether tear-down also deletes the stream's GCS data")
+flags.DEFINE_string("purge-checkpoint-path", None,
+                    "File recording GCS purge progress, used to resume an "
+                    "interrupted purge")
+flags.DEFINE_float("gc-min-age-hours", 24,
+                   "Minimum age of resources deleted by the gc action")
+flags.DEFINE_integer("drain-timeout", 30 * 60,
+                     "Seconds the pause action waits for streams to drain")
+flags.DEFINE_float("cutover-max-lag", cutover.DEFAULT_MAX_LAG,
+                   "Replication lag in seconds under which the cutover "
+                   "write freeze starts")
+flags.DEFINE_string("cutover-lag-command", None,
+                    "Shell command printing the replication lag in seconds")
+flags.DEFINE_string("cutover-freeze-command", None,
+                    "Shell command signalling the application write freeze")
+flags.DEFINE_string("cutover-watermark-command", None,
+                    "Shell command exiting 0 once the downstream apply has "
+                    "reached the final watermark")
+flags.DEFINE_string("cutover-validate-command", None,
+                    "Shell command validating the stream's tables, with "
+                    "{tables} replaced by a comma separated list")
+flags.DEFINE_string("paused-streams-path", "paused_streams.json",
+                    "File recording the streams paused by the pause action, "
+                    "which unpause resumes")
+flags.DEFINE_string("snapshot-path", "stream_snapshot.json",
+                    "File written by the export action and read by import")
+flags.DEFINE_boolean("dry-run", True,
+                     "Only report what the gc action would delete")
 
 
 def _get_flag(field: str) -> Any:
@@ -81,6 +143,33 @@ def main(unused_argv: Sequence[str] = None) -> None:
   else:
     allowed_tables = []
 
+  api_qps = _get_flag("api-qps")
+  rate_limiter = (
+      api_rate_limiter.TokenBucketRateLimiter(qps=api_qps) if api_qps else None)
+
+  scopes = _get_flag("scopes")
+  if scopes and action in ("list", "tear-down"):
+    multi_manager = multi_scope_manager.MultiScopeResourceManager(
+        multi_scope_manager.ParseScopes(scopes),
+        stream_name=stream_prefix,
+        source_cp_name=cp_source_prefix,
+        target_cp_name=cp_gcs_prefix,
+        add_uid_suffix=False,
+        rate_limiter=rate_limiter,
+    )
+    if action == "list":
+      multi_manager.LogStreamStatus()
+    else:
+      multi_manager.TearDown().LogFailures()
+    return
+
+  ledger_path = _get_flag("ledger-path")
+  ledger = resource_ledger.ResourceLedger(ledger_path) if ledger_path else None
+  cp_registry_path = _get_flag("cp-registry-path")
+  cp_registry = (
+      connection_profile_registry.ConnectionProfileRegistry(cp_registry_path)
+      if cp_registry_path else None)
+
   manager = cloud_datastream_resource_manager.CloudDatastreamResourceManager(
       project_number=project_number,
       gcs_bucket_name=gcs_bucket,
@@ -92,15 +181,65 @@ def main(unused_argv: Sequence[str] = None) -> None:
       allowed_tables=allowed_tables,
       add_uid_suffix=False,
       private_connection_name=_get_flag("private-connection"),
+      rate_limiter=rate_limiter,
+      ledger=ledger,
+      cp_registry=cp_registry,
   )
   print(manager.Describe())
 
   if action == "create":
     manager.SetUp()
   elif action == "tear-down":
-    manager.TearDown()
+    manager.TearDown(purge_gcs=_get_flag("purge-gcs"),
+                     purge_checkpoint_path=_get_flag("purge-checkpoint-path"))
   elif action == "list":
-    manager.ListStreams()
+    objects_csv_path = _get_flag("objects-csv-path")
+    inventory = compact_inventory.Inventory() if objects_csv_path else None
+    print(stream_inventory.FormatInventory(
+        stream_inventory.CollectInventory(manager, inventory=inventory),
+        output_format=_get_flag("output-format")))
+    if inventory:
+      inventory.WriteCsv(objects_csv_path,
+                         inventory.GetStreamObjectColumns())
+  elif action == "resume":
+    manager.Resume(_get_flag("run-id") or manager.stream_name)
+  elif action == "gc":
+    collector = resource_gc.GarbageCollector(
+        manager, min_age=_get_flag("gc-min-age-hours") * 60 * 60)
+    collector.Collect(dry_run=_get_flag("dry-run")).LogSummary()
+  elif action in ("pause", "unpause"):
+    maintenance = stream_maintenance.StreamMaintenance(
+        manager, drain_timeout=_get_flag("drain-timeout"),
+        paused_path=_get_flag("paused-streams-path"))
+    if action == "pause":
+      maintenance.Pause().LogSummary()
+    else:
+      maintenance.Resume().LogSummary()
+  elif action == "cutover":
+    commands = {name: _get_flag("cutover-%s-command" % name)
+                for name in ("lag", "freeze", "watermark", "validate")}
+    orchestrator = cutover.CutoverOrchestrator(
+        manager,
+        lag_fn=(cutover.CommandOutputFloat(commands["lag"])
+                if commands["lag"] else None),
+        freeze_fn=(cutover.CommandSucceeds(commands["freeze"])
+                   if commands["freeze"] else None),
+        watermark_fn=(cutover.CommandSucceeds(commands["watermark"])
+                      if commands["watermark"] else None),
+        validate_fn=(cutover.CommandWithTables(commands["validate"])
+                     if commands["validate"] else None),
+        max_lag=_get_flag("cutover-max-lag"))
+    report = orchestrator.Run()
+    report.LogSummary()
+    if not report.succeeded:
+      raise SystemExit(1)
+  elif action == "export":
+    stream_snapshot.WriteSnapshot(_get_flag("snapshot-path"),
+                                  stream_snapshot.ExportSnapshot(manager))
+  elif action == "import":
+    stream_snapshot.ImportSnapshot(
+        manager, stream_snapshot.ReadSnapshot(_get_flag("snapshot-path")),
+        password=_get_flag("oracle-password"))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,160 @@
+"""Collect the status of many Datastream streams in parallel."""
+
+import concurrent.futures
+import json
+import logging
+
+try:
+  from google3.experimental.dhercher.datastream_utils import compact_inventory  # pylint: disable=g-import-not-at-top
+except ModuleNotFoundError:
+  import compact_inventory  # pytype: disable=import-error  pylint: disable=g-import-not-at-top
+
+DEFAULT_MAX_WORKERS = 16
+
+OUTPUT_FORMAT_TABLE = "table"
+OUTPUT_FORMAT_JSON = "json"
+
+_TABLE_COLUMNS = (
+    ("Stream", "name"),
+    ("State", "state"),
+    ("Objects", "object_count"),
+    ("Objects in Error", "objects_in_error_count"),
+    ("Errors", "error_count"),
+)
+
+
+class StreamStatus(object):
+  """A flat summary of a stream, its errors and its objects."""
+
+  __slots__ = ("name", "state", "source_connection_profile",
+               "destination_connection_profile", "errors", "object_count",
+               "objects_in_error", "collection_error")
+
+  def __init__(self, name, state=None, source_connection_profile=None,
+               destination_connection_profile=None):
+    self.name = name
+    self.state = state
+    self.source_connection_profile = source_connection_profile
+    self.destination_connection_profile = destination_connection_profile
+    self.errors = []
+    self.object_count = None
+    self.objects_in_error = []
+    self.collection_error = None
+
+  @property
+  def error_count(self):
+    return len(self.errors)
+
+  @property
+  def objects_in_error_count(self):
+    return len(self.objects_in_error)
+
+  def ToDict(self):
+    return {
+        "name": self.name,
+        "state": self.state,
+        "sourceConnectionProfile": self.source_connection_profile,
+        "destinationConnectionProfile": self.destination_connection_profile,
+        "errors": [{"reason": error.reason, "message": error.message}
+                   for error in self.errors],
+        "objectCount": self.object_count,
+        "objectsInError": self.objects_in_error,
+        "collectionError": self.collection_error,
+    }
+
+
+def CollectStreamStatus(manager, stream, inventory=None):
+  """Fetch errors and object counts for one stream.
+
+  Args:
+    manager: The CloudDatastreamResourceManager used for API calls.
+    stream: A compact_inventory.StreamRecord.
+    inventory: An optional compact_inventory.Inventory which also keeps a
+        record of every stream object.
+  Returns:
+    A StreamStatus. Failures are recorded on it rather than raised.
+  """
+  status = StreamStatus(
+      stream.name,
+      state=stream.state,
+      source_connection_profile=stream.sourceConnectionProfileName,
+      destination_connection_profile=stream.destinationConnectionProfileName)
+  try:
+    status.errors = manager._FetchErrors(stream.name)  # pylint: disable=protected-access
+
+    status.object_count = 0
+    page_token = None
+    while True:
+      response = manager._ListStreamObjects(  # pylint: disable=protected-access
+          stream.name, page_token=page_token, use_fast_decode=True,
+          page_size=1000)
+      if inventory is not None:
+        inventory.AddStreamObjects(response.streamObjects, stream.name)
+      for stream_object in response.streamObjects:
+        status.object_count += 1
+        if stream_object.errors:
+          status.objects_in_error.append(stream_object.displayName)
+      page_token = response.nextPageToken
+      if not page_token:
+        break
+  except Exception as e:  # pylint: disable=broad-except
+    logging.exception("Unable to collect status for stream %r", stream.name)
+    status.collection_error = str(e)
+  return status
+
+
+def CollectInventory(manager, max_workers=None, inventory=None):
+  """Return a StreamStatus for every stream matching the manager's prefix.
+
+  Streams are listed once and kept as compact records, then their errors
+  and objects are fetched in parallel.
+
+  Args:
+    manager: The CloudDatastreamResourceManager used for API calls.
+    max_workers: The maximum number of streams fetched concurrently.
+    inventory: An optional compact_inventory.Inventory to fill with the
+        streams and their objects.
+  """
+  if inventory is None:
+    inventory = compact_inventory.Inventory()
+    object_inventory = None
+  else:
+    object_inventory = inventory
+  streams = inventory.AddStreams(
+      stream for stream in manager._ListAllStreams()  # pylint: disable=protected-access
+      if manager._stream_name in stream.name)  # pylint: disable=protected-access
+  if not streams:
+    return []
+
+  workers = min(max_workers or DEFAULT_MAX_WORKERS, len(streams))
+  with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+    return list(pool.map(
+        lambda stream: CollectStreamStatus(manager, stream, object_inventory),
+        streams))
+
+
+def FormatTable(statuses):
+  """Return the statuses as an aligned text table."""
+  rows = [[header for header, _ in _TABLE_COLUMNS]]
+  for status in statuses:
+    rows.append([
+        "" if getattr(status, field) is None else str(getattr(status, field))
+        for _, field in _TABLE_COLUMNS])
+
+  widths = [max(len(row[i]) for row in rows) for i in range(len(rows[0]))]
+  return "\n".join(
+      "  ".join(value.ljust(width) for value, width in zip(row, widths))
+      .rstrip()
+      for row in rows)
+
+
+def FormatJsonLines(statuses):
+  """Return the statuses as one JSON document per line."""
+  return "\n".join(json.dumps(status.ToDict(), sort_keys=True)
+                   for status in statuses)
+
+
+def FormatInventory(statuses, output_format=None):
+  if output_format == OUTPUT_FORMAT_JSON:
+    return FormatJsonLines(statuses)
+  return FormatTable(statuses)
@@ -0,0 +1,110 @@
+"""Tests for google3.experimental.dhercher.datastream_utils.stream_inventory."""
+
+import json
+
+import mock
+
+from google3.experimental.dhercher.datastream_utils import compact_inventory
+from google3.experimental.dhercher.datastream_utils import stream_inventory
+from google3.google.cloud.datastream import datastream
+from google3.testing.pybase import googletest
+
+
+def _Stream(name, errors=()):
+  return datastream.Stream(
+      name=name,
+      state=datastream.Stream.StateValueValuesEnum.RUNNING,
+      errors=list(errors),
+      sourceConfig=datastream.SourceConfig(
+          sourceConnectionProfileName="cp/source"),
+      destinationConfig=datastream.DestinationConfig(
+          destinationConnectionProfileName="cp/target"))
+
+
+class StreamInventoryTest(googletest.TestCase):
+
+  def _Manager(self, streams):
+    manager = mock.MagicMock()
+    manager._stream_name = "ora"
+    manager._ListAllStreams.return_value = streams
+    manager._FetchErrors.return_value = [
+        datastream.Error(reason="FETCHED", message="fetched error")]
+
+    def _list_objects(stream_name, page_token=None, **unused_kwargs):
+      if page_token is None:
+        return datastream.ListStreamObjectsResponse(
+            streamObjects=[
+                datastream.StreamObject(displayName="HR.EMPLOYEES"),
+                datastream.StreamObject(
+                    displayName="HR.JOBS",
+                    errors=[datastream.Error(reason="BAD")])],
+            nextPageToken="page-2")
+      return datastream.ListStreamObjectsResponse(
+          streamObjects=[datastream.StreamObject(displayName="HR.REGIONS")])
+
+    manager._ListStreamObjects.side_effect = _list_objects
+    return manager
+
+  def test_collect_inventory(self):
+    manager = self._Manager([
+        _Stream("streams/ora-1",
+                errors=[datastream.Error(reason="STREAM", message="m")]),
+        _Stream("streams/other")])
+
+    statuses = stream_inventory.CollectInventory(manager, max_workers=4)
+
+    self.assertLen(statuses, 1)
+    status = statuses[0]
+    self.assertEqual(status.name, "streams/ora-1")
+    self.assertEqual(status.state, "RUNNING")
+    self.assertEqual(status.source_connection_profile, "cp/source")
+    self.assertEqual([e.reason for e in status.errors], ["FETCHED"])
+    self.assertEqual(status.object_count, 3)
+    self.assertEqual(status.objects_in_error, ["HR.JOBS"])
+    self.assertIsNone(status.collection_error)
+    manager._ListStreamObjects.assert_called_with(
+        "streams/ora-1", page_token="page-2", use_fast_decode=True,
+        page_size=1000)
+
+  def test_collect_inventory_keeps_compact_records(self):
+    manager = self._Manager([_Stream("streams/ora-1")])
+    inventory = compact_inventory.Inventory()
+
+    stream_inventory.CollectInventory(manager, inventory=inventory)
+
+    self.assertEqual([s.name for s in inventory.streams], ["streams/ora-1"])
+    self.assertEqual([o.displayName for o in inventory.stream_objects],
+                     ["HR.EMPLOYEES", "HR.JOBS", "HR.REGIONS"])
+    self.assertTrue(all(o.stream == "streams/ora-1"
+                        for o in inventory.stream_objects))
+
+  def test_collection_error_is_recorded(self):
+    manager = self._Manager([_Stream("streams/ora-1")])
+    manager._FetchErrors.side_effect = ValueError("boom")
+
+    statuses = stream_inventory.CollectInventory(manager)
+
+    self.assertEqual(statuses[0].collection_error, "boom")
+    self.assertIsNone(statuses[0].object_count)
+
+  def test_format(self):
+    status = stream_inventory.StreamStatus("streams/ora-1", state="RUNNING")
+    status.object_count = 12
+    status.objects_in_error = ["HR.JOBS"]
+
+    table = stream_inventory.FormatInventory([status]).splitlines()
+    self.assertEqual(table[0].split(),
+                     ["Stream", "State", "Objects", "Objects", "in", "Error",
+                      "Errors"])
+    self.assertEqual(table[1].split(),
+                     ["streams/ora-1", "RUNNING", "12", "1", "0"])
+
+    lines = stream_inventory.FormatInventory(
+        [status], output_format=stream_inventory.OUTPUT_FORMAT_JSON)
+    record = json.loads(lines)
+    self.assertEqual(record["objectCount"], 12)
+    self.assertEqual(record["objectsInError"], ["HR.JOBS"])
+
+
+if __name__ == "__main__":
+  googletest.main()
@@ -0,0 +1,254 @@
+"""Pause streams for a maintenance window and resume them afterwards.
+
+Pausing a stream moves it to DRAINING while Datastream writes the events it
+has already read to GCS, then to PAUSED. StreamMaintenance pauses a set of
+streams in parallel, polls them until every one has drained, and resumes them
+in parallel, so the window only lasts as long as the slowest drain. Only
+the streams a pause moved out of RUNNING are resumed, and they can be
+recorded in a file so a later process resumes exactly those.
+"""
+
+import concurrent.futures
+import contextlib
+import json
+import logging
+import os
+import time
+
+try:
+  from google3.google.cloud.datastream import datastream  # pylint: disable=g-import-not-at-top
+except ModuleNotFoundError:
+  import datastream  # pytype: disable=import-error  pylint: disable=g-import-not-at-top
+
+
+DEFAULT_MAX_WORKERS = 16
+DEFAULT_POLL_INTERVAL = 5
+DEFAULT_DRAIN_TIMEOUT = 30 * 60
+
+_STATE = datastream.Stream.StateValueValuesEnum
+
+# Only streams in these states are paused, and later resumed.
+_RUNNING_STATES = frozenset((_STATE.RUNNING, _STATE.STARTING))
+
+# A stream in one of these states is no longer writing events.
+_SETTLED_STATES = frozenset((_STATE.PAUSED, _STATE.FAILED,
+                             _STATE.FAILED_PERMANENTLY))
+
+
+class DrainStatus(object):
+  """The progress of pausing or resuming one stream."""
+
+  __slots__ = ("name", "state", "started_at", "settled_at", "error")
+
+  def __init__(self, name, started_at=None):
+    self.name = name
+    self.state = None
+    self.started_at = started_at
+    self.settled_at = None
+    self.error = None
+
+  @property
+  def settled(self):
+    return self.settled_at is not None or self.error is not None
+
+  @property
+  def drain_seconds(self):
+    if self.started_at is None or self.settled_at is None:
+      return None
+    return self.settled_at - self.started_at
+
+  def __repr__(self):
+    return "DrainStatus(%r, %s)" % (self.name, self.state)
+
+
+class MaintenanceReport(object):
+  """The per-stream outcome of a pause or resume."""
+
+  def __init__(self, statuses):
+    self.statuses = statuses
+
+  @property
+  def in_flight(self):
+    """Return the streams still draining buffered events."""
+    return [status for status in self.statuses if not status.settled]
+
+  @property
+  def failures(self):
+    return [status for status in self.statuses if status.error is not None]
+
+  def LogSummary(self):
+    for status in self.statuses:
+      logging.info("%s\t%s\tdrain_seconds=%s%s", status.name, status.state,
+                   status.drain_seconds,
+                   "\terror=%s" % status.error if status.error else "")
+    logging.info("%d streams, %d still draining, %d failed",
+                 len(self.statuses), len(self.in_flight), len(self.failures))
+
+
+class StreamMaintenance(object):
+  """Drain-aware pause and resume of many streams."""
+
+  def __init__(self, manager, stream_names=None, max_workers=None,
+               poll_interval=None, drain_timeout=None, clock=None,
+               sleep=None, paused_path=None):
+    """Initialize the StreamMaintenance.
+
+    Args:
+      manager: The CloudDatastreamResourceManager used for API calls.
+      stream_names: Full names of the streams to manage, defaults to every
+          stream matching the manager's stream prefix.
+      max_workers: The maximum number of streams updated concurrently.
+      poll_interval: Seconds between checks of draining streams.
+      drain_timeout: Seconds to wait for every stream to finish draining.
+      clock: A function returning the current time in seconds.
+      sleep: A function sleeping for a number of seconds.
+      paused_path: An optional JSON file recording the streams Pause
+          paused, read by Resume in a later process.
+    """
+    self.manager = manager
+    self._stream_names = list(stream_names) if stream_names else None
+    self.max_workers = max_workers or DEFAULT_MAX_WORKERS
+    self.poll_interval = (
+        DEFAULT_POLL_INTERVAL if poll_interval is None else poll_interval)
+    self.drain_timeout = (
+        DEFAULT_DRAIN_TIMEOUT if drain_timeout is None else drain_timeout)
+    self._clock = clock or time.time
+    self._sleep = sleep or time.sleep
+    self.paused_path = paused_path
+    self._paused_names = None
+
+  def GetStreamNames(self):
+    if self._stream_names is None:
+      self._stream_names = [
+          stream.name for stream in self.manager._ListAllStreams()  # pylint: disable=protected-access
+          if self.manager._stream_name in stream.name]  # pylint: disable=protected-access
+    return self._stream_names
+
+  def GetPausedNames(self):
+    """Return the streams paused by Pause, in this or an earlier process."""
+    if (self._paused_names is None and self.paused_path and
+        os.path.exists(self.paused_path)):
+      with open(self.paused_path) as paused_file:
+        self._paused_names = json.load(paused_file)
+    return self._paused_names or []
+
+  def _SavePausedNames(self, names):
+    self._paused_names = names
+    if not self.paused_path:
+      return
+    temp_path = self.paused_path + ".tmp"
+    with open(temp_path, "w") as paused_file:
+      json.dump(names, paused_file)
+    os.replace(temp_path, self.paused_path)
+
+  def _IsRunning(self, name):
+    try:
+      state = self.manager._GetStream(name).state  # pylint: disable=protected-access
+    except datastream.HttpError:
+      # Let the pause request report the error.
+      return True
+    if state not in _RUNNING_STATES:
+      logging.info("Not pausing %s in state %s", name, state)
+      return False
+    return True
+
+  def _Map(self, func, items):
+    if not items:
+      return []
+    workers = min(self.max_workers, len(items))
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+      return list(pool.map(func, items))
+
+  def _SetState(self, status, state):
+    """Request a state change, recording any error on the status."""
+    try:
+      response = self.manager._UpdateStreamState(status.name, state)  # pylint: disable=protected-access
+      if response.error:
+        status.error = response.error.message or str(response.error)
+    except datastream.HttpError as e:
+      status.error = str(e)
+    return status
+
+  def _Refresh(self, status):
+    try:
+      status.state = self.manager._GetStream(status.name).state  # pylint: disable=protected-access
+    except datastream.HttpError as e:
+      status.error = str(e)
+      return status
+    if status.state in _SETTLED_STATES:
+      status.settled_at = self._clock()
+    return status
+
+  def WaitForDrain(self, statuses):
+    """Poll streams until none is draining or the timeout passes.
+
+    Returns:
+      A MaintenanceReport; its in_flight streams are still draining.
+    """
+    report = MaintenanceReport(statuses)
+    deadline = self._clock() + self.drain_timeout
+    while True:
+      self._Map(self._Refresh, report.in_flight)
+      in_flight = report.in_flight
+      if not in_flight:
+        return report
+
+      logging.info("%d of %d streams still draining: %s", len(in_flight),
+                   len(statuses), ", ".join(s.name for s in in_flight))
+      if self._clock() >= deadline:
+        logging.warning("Timed out waiting for %d streams to drain",
+                        len(in_flight))
+        return report
+      self._sleep(self.poll_interval)
+
+  def Pause(self):
+    """Pause every running stream in parallel and wait until all have drained.
+
+    The streams paused without error are recorded for Resume.
+    """
+    names = self.GetStreamNames()
+    running = [name for name, is_running
+               in zip(names, self._Map(self._IsRunning, names)) if is_running]
+    now = self._clock()
+    statuses = [DrainStatus(name, started_at=now) for name in running]
+    self._Map(lambda status: self._SetState(status, _STATE.PAUSED), statuses)
+    self._SavePausedNames(sorted(set(self.GetPausedNames()) | {
+        status.name for status in statuses if status.error is None}))
+    return self.WaitForDrain(statuses)
+
+  def Resume(self):
+    """Set the streams recorded by Pause back to RUNNING in parallel.
+
+    Streams that fail to resume stay recorded, so a retry resumes them.
+    """
+    now = self._clock()
+    statuses = [DrainStatus(name, started_at=now)
+                for name in self.GetPausedNames()]
+    if not statuses:
+      logging.warning("No paused streams recorded, nothing to resume")
+
+    def _Resume(status):
+      self._SetState(status, _STATE.RUNNING)
+      if status.error is None:
+        status.state = _STATE.RUNNING
+        status.settled_at = self._clock()
+      return status
+
+    self._Map(_Resume, statuses)
+    self._SavePausedNames(
+        [status.name for status in statuses if status.error is not None])
+    return MaintenanceReport(statuses)
+
+  @contextlib.contextmanager
+  def Window(self):
+    """Pause and drain all streams, yield, then resume the paused ones.
+
+    Streams that did not finish draining are still resumed, so events are
+    never left behind, and the caller can check report.in_flight before
+    starting work that needs every stream idle.
+    """
+    report = self.Pause()
+    try:
+      yield report
+    finally:
+      self.Resume().LogSummary()
@@ -0,0 +1,104 @@
+"""Tests for google3.experimental.dhercher.datastream_utils.stream_maintenance."""
+
+import os
+
+import mock
+
+from google3.experimental.dhercher.datastream_utils import stream_maintenance
+from google3.google.cloud.datastream import datastream
+from google3.testing.pybase import googletest
+
+_STATE = datastream.Stream.StateValueValuesEnum
+
+
+class FakeClock(object):
+
+  def __init__(self):
+    self.now = 0.0
+
+  def __call__(self):
+    return self.now
+
+  def Sleep(self, seconds):
+    self.now += seconds
+
+
+class StreamMaintenanceTest(googletest.TestCase):
+
+  def setUp(self):
+    super().setUp()
+    self.clock = FakeClock()
+    self.manager = mock.MagicMock()
+    self.manager._UpdateStreamState.return_value = datastream.Operation(
+        done=True)
+    # streams/a drains after one poll, streams/b after three.
+    self.states = {
+        "streams/a": [_STATE.RUNNING, _STATE.DRAINING, _STATE.PAUSED],
+        "streams/b": [_STATE.RUNNING, _STATE.DRAINING, _STATE.DRAINING,
+                      _STATE.DRAINING, _STATE.PAUSED],
+    }
+
+    def _get(name):
+      states = self.states[name]
+      return datastream.Stream(
+          name=name, state=states.pop(0) if len(states) > 1 else states[0])
+
+    self.manager._GetStream.side_effect = _get
+
+  def _Maintenance(self, stream_names=("streams/a", "streams/b"), **kwargs):
+    return stream_maintenance.StreamMaintenance(
+        self.manager, stream_names=stream_names,
+        poll_interval=10, clock=self.clock, sleep=self.clock.Sleep, **kwargs)
+
+  def test_pause_waits_for_drain(self):
+    report = self._Maintenance().Pause()
+
+    self.assertEmpty(report.in_flight)
+    self.assertEqual([s.state for s in report.statuses],
+                     [_STATE.PAUSED, _STATE.PAUSED])
+    self.assertEqual([s.drain_seconds for s in report.statuses], [10, 30])
+    self.manager._UpdateStreamState.assert_has_calls([
+        mock.call("streams/a", _STATE.PAUSED),
+        mock.call("streams/b", _STATE.PAUSED)], any_order=True)
+
+  def test_pause_reports_in_flight_on_timeout(self):
+    report = self._Maintenance(drain_timeout=15).Pause()
+
+    self.assertEqual([s.name for s in report.in_flight], ["streams/b"])
+    self.assertEqual(report.statuses[1].state, _STATE.DRAINING)
+
+  def test_resume_only_streams_paused_by_pause(self):
+    self.states["streams/c"] = [_STATE.PAUSED]
+    paused_path = os.path.join(self.create_tempdir().full_path, "paused.json")
+    self._Maintenance(paused_path=paused_path,
+                      stream_names=["streams/a", "streams/b",
+                                    "streams/c"]).Pause()
+    self.manager._UpdateStreamState.reset_mock()
+
+    # A later process resumes from the recorded streams.
+    report = self._Maintenance(paused_path=paused_path).Resume()
+
+    self.assertEqual([s.name for s in report.statuses],
+                     ["streams/a", "streams/b"])
+    self.assertEqual(self.manager._UpdateStreamState.call_count, 2)
+    self.assertEmpty(
+        self._Maintenance(paused_path=paused_path).GetPausedNames())
+
+  def test_window_resumes_paused_streams(self):
+    self.manager._UpdateStreamState.side_effect = [
+        datastream.Operation(done=True),
+        datastream.HttpError({"status": "404"}, b"", "url"),
+        datastream.Operation(done=True),
+    ]
+    maintenance = self._Maintenance(max_workers=1)
+
+    with maintenance.Window() as report:
+      self.assertLen(report.failures, 1)
+
+    self.manager._UpdateStreamState.assert_called_with(
+        "streams/a", _STATE.RUNNING)
+    self.assertEqual(self.manager._UpdateStreamState.call_count, 3)
+
+
+if __name__ == "__main__":
+  googletest.main()
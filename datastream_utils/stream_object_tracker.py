@@ -0,0 +1,178 @@
+"""Incremental change tracking for the objects in a Datastream stream."""
+
+import logging
+
+try:
+  from google3.google.cloud.datastream import datastream  # pylint: disable=g-import-not-at-top
+except ModuleNotFoundError:
+  import datastream  # pytype: disable=import-error  pylint: disable=g-import-not-at-top
+
+
+CHANGE_ADDED = "ADDED"
+CHANGE_UPDATED = "UPDATED"
+CHANGE_REMOVED = "REMOVED"
+
+# Server side filter used to list only objects updated since the last poll.
+DEFAULT_UPDATE_FILTER = 'update_time>="%s"'
+MAX_PAGE_SIZE = 1000
+
+# A filtered listing cannot see deleted objects, so fall back to a full
+# listing every so often to pick up removals.
+DEFAULT_FULL_SYNC_INTERVAL = 20
+
+
+def _NormalizeTimestamp(timestamp):
+  """Return an RFC 3339 UTC timestamp padded to nanoseconds.
+
+  Datastream trims trailing zeros from fractional seconds, so raw strings do
+  not sort correctly. Padding the fraction makes string order match time.
+  """
+  if not timestamp:
+    return ""
+  timestamp = timestamp.rstrip("Z")
+  seconds, _, fraction = timestamp.partition(".")
+  return "%s.%sZ" % (seconds, fraction.ljust(9, "0")[:9])
+
+
+def _ErrorKey(errors):
+  return tuple((error.reason, error.message, error.errorUuid)
+               for error in errors or ())
+
+
+class StreamObjectChange(object):
+  """A single added, updated or removed stream object."""
+
+  __slots__ = ("change_type", "name", "display_name", "update_time",
+               "errors", "previous_errors")
+
+  def __init__(self, change_type, name, display_name=None, update_time=None,
+               errors=(), previous_errors=()):
+    self.change_type = change_type
+    self.name = name
+    self.display_name = display_name
+    self.update_time = update_time
+    self.errors = errors
+    self.previous_errors = previous_errors
+
+  def __repr__(self):
+    return "StreamObjectChange(%s, %r, errors=%d)" % (
+        self.change_type, self.name, len(self.errors))
+
+
+class StreamObjectTracker(object):
+  """Track a stream's objects, fetching only what changed between polls.
+
+  The tracker keeps the last seen updateTime and errors for every object.
+  Each Poll lists objects updated since the newest updateTime already seen,
+  using a server side filter, and returns the differences. If the server
+  rejects the filter the tracker falls back to listing every object and
+  diffing locally.
+  """
+
+  def __init__(self, manager, stream_name=None, use_fast_decode=False,
+               full_sync_interval=None, update_filter=None):
+    """Initialize the StreamObjectTracker.
+
+    Args:
+      manager: The CloudDatastreamResourceManager used for API calls.
+      stream_name: The full stream name, defaults to the manager's stream.
+      use_fast_decode: Whether to decode listings into fast_decode records.
+      full_sync_interval: Polls between full listings, which also detect
+          removed objects. Zero disables periodic full listings.
+      update_filter: A filter template taking the last seen updateTime.
+    """
+    self.manager = manager
+    self.stream_name = stream_name or manager.full_stream_name
+    self.use_fast_decode = use_fast_decode
+    self.full_sync_interval = (
+        DEFAULT_FULL_SYNC_INTERVAL
+        if full_sync_interval is None else full_sync_interval)
+    self.update_filter = update_filter or DEFAULT_UPDATE_FILTER
+
+    self._objects = {}
+    self._high_water_mark = None
+    self._filter_supported = True
+    self._polls_since_full_sync = 0
+    self.api_calls = 0
+
+  @property
+  def objects(self):
+    """Return {name: (display name, updateTime, errors)} for known objects."""
+    return dict(self._objects)
+
+  def GetObjectsInError(self):
+    return sorted(name for name, (_, _, errors) in self._objects.items()
+                  if errors)
+
+  def _List(self, filter_expression):
+    page_token = None
+    while True:
+      response = self.manager._ListStreamObjects(  # pylint: disable=protected-access
+          self.stream_name, page_token=page_token,
+          use_fast_decode=self.use_fast_decode,
+          filter_expression=filter_expression, page_size=MAX_PAGE_SIZE)
+      self.api_calls += 1
+      for stream_object in response.streamObjects or ():
+        yield stream_object
+
+      page_token = response.nextPageToken
+      if not page_token:
+        return
+
+  def _ListChanged(self):
+    """Return (objects, is_full_listing) for this poll."""
+    full_sync_due = (
+        self.full_sync_interval and
+        self._polls_since_full_sync >= self.full_sync_interval)
+    if (self._high_water_mark is None or not self._filter_supported or
+        full_sync_due):
+      return list(self._List(None)), True
+
+    try:
+      return list(self._List(self.update_filter % self._high_water_mark)), False
+    except datastream.HttpError as e:
+      if e.status_code != 400:
+        raise
+      logging.warning("Stream object filter %r rejected, listing all objects",
+                      self.update_filter)
+      self._filter_supported = False
+      return list(self._List(None)), True
+
+  def Poll(self):
+    """Fetch changed objects and return a list of StreamObjectChange."""
+    stream_objects, is_full_listing = self._ListChanged()
+    if is_full_listing:
+      self._polls_since_full_sync = 0
+    else:
+      self._polls_since_full_sync += 1
+
+    changes = []
+    seen = set()
+    for stream_object in stream_objects:
+      name = stream_object.name
+      seen.add(name)
+      update_time = _NormalizeTimestamp(stream_object.updateTime)
+      errors = _ErrorKey(stream_object.errors)
+
+      previous = self._objects.get(name)
+      if previous is None:
+        changes.append(StreamObjectChange(
+            CHANGE_ADDED, name, stream_object.displayName,
+            stream_object.updateTime, errors))
+      elif previous[1] != update_time or previous[2] != errors:
+        changes.append(StreamObjectChange(
+            CHANGE_UPDATED, name, stream_object.displayName,
+            stream_object.updateTime, errors, previous[2]))
+
+      self._objects[name] = (stream_object.displayName, update_time, errors)
+      if update_time and (self._high_water_mark is None or
+                          update_time > self._high_water_mark):
+        self._high_water_mark = update_time
+
+    if is_full_listing:
+      for name in set(self._objects) - seen:
+        display_name, _, errors = self._objects.pop(name)
+        changes.append(StreamObjectChange(
+            CHANGE_REMOVED, name, display_name, previous_errors=errors))
+
+    return changes
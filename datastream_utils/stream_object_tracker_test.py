@@ -0,0 +1,93 @@
+"""Tests for google3.experimental.dhercher.datastream_utils.stream_object_tracker."""
+
+import mock
+
+from google3.experimental.dhercher.datastream_utils import stream_object_tracker
+from google3.google.cloud.datastream import datastream
+from google3.testing.pybase import googletest
+
+
+def _object(name, update_time, errors=None):
+  return datastream.StreamObject(
+      name=name, displayName=name.upper(), updateTime=update_time,
+      errors=[datastream.Error(reason=reason) for reason in errors or ()])
+
+
+def _page(stream_objects, next_page_token=None):
+  return datastream.ListStreamObjectsResponse(
+      streamObjects=stream_objects, nextPageToken=next_page_token)
+
+
+class StreamObjectTrackerTest(googletest.TestCase):
+
+  def setUp(self):
+    super().setUp()
+    self.manager = mock.MagicMock()
+    self.tracker = stream_object_tracker.StreamObjectTracker(
+        self.manager, stream_name="streams/s")
+
+  def test_first_poll_lists_everything(self):
+    self.manager._ListStreamObjects.side_effect = [
+        _page([_object("a", "2021-06-01T00:00:00Z")], "next"),
+        _page([_object("b", "2021-06-01T00:00:01.5Z", ["FAILED"])])]
+
+    changes = self.tracker.Poll()
+
+    self.assertEqual([c.change_type for c in changes], ["ADDED", "ADDED"])
+    self.assertEqual(self.tracker.api_calls, 2)
+    self.assertEqual(self.tracker.GetObjectsInError(), ["b"])
+    self.assertIsNone(
+        self.manager._ListStreamObjects.call_args[1]["filter_expression"])
+
+  def test_later_polls_filter_by_update_time(self):
+    self.manager._ListStreamObjects.side_effect = [
+        _page([_object("a", "2021-06-01T00:00:00Z"),
+               _object("b", "2021-06-01T00:00:01.5Z")]),
+        _page([_object("b", "2021-06-01T00:00:01.5Z"),
+               _object("c", "2021-06-01T00:00:03Z", ["FAILED"])])]
+
+    self.tracker.Poll()
+    changes = self.tracker.Poll()
+
+    self.assertEqual([(c.change_type, c.name) for c in changes],
+                     [("ADDED", "c")])
+    self.assertEqual(
+        self.manager._ListStreamObjects.call_args[1]["filter_expression"],
+        'update_time>="2021-06-01T00:00:01.500000000Z"')
+
+  def test_full_sync_detects_removals(self):
+    tracker = stream_object_tracker.StreamObjectTracker(
+        self.manager, stream_name="streams/s", full_sync_interval=1)
+    self.manager._ListStreamObjects.side_effect = [
+        _page([_object("a", "2021-06-01T00:00:00Z"),
+               _object("b", "2021-06-01T00:00:00Z")]),
+        _page([]),
+        _page([_object("a", "2021-06-01T00:00:05Z", ["FAILED"])])]
+
+    tracker.Poll()
+    self.assertEqual(tracker.Poll(), [])
+    changes = tracker.Poll()
+
+    self.assertEqual(sorted((c.change_type, c.name) for c in changes),
+                     [("REMOVED", "b"), ("UPDATED", "a")])
+
+  def test_rejected_filter_falls_back_to_full_listing(self):
+    rejected = datastream.HttpError({"status": "400"}, b"", "url")
+    self.manager._ListStreamObjects.side_effect = [
+        _page([_object("a", "2021-06-01T00:00:00Z")]),
+        rejected,
+        _page([]),
+        _page([])]
+
+    self.tracker.Poll()
+    changes = self.tracker.Poll()
+    self.tracker.Poll()
+
+    self.assertEqual([(c.change_type, c.name) for c in changes],
+                     [("REMOVED", "a")])
+    self.assertIsNone(
+        self.manager._ListStreamObjects.call_args[1]["filter_expression"])
+
+
+if __name__ == "__main__":
+  googletest.main()
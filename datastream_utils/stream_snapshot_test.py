@@ -0,0 +1,108 @@
+"""Tests for google3.experimental.dhercher.datastream_utils.stream_snapshot."""
+
+import os
+
+import mock
+
+from google3.experimental.dhercher.datastream_utils import stream_snapshot
+from google3.google.cloud.datastream import datastream
+from google3.testing.pybase import googletest
+
+_PARENT = "projects/123/locations/us-central1"
+
+
+class StreamSnapshotTest(googletest.TestCase):
+
+  def _ExportManager(self):
+    manager = mock.MagicMock()
+    manager.full_stream_name = _PARENT + "/streams/ora"
+    manager._GetStream.return_value = datastream.Stream(
+        name=_PARENT + "/streams/ora",
+        displayName="ora",
+        createTime="2021-01-01T00:00:00Z",
+        state=datastream.Stream.StateValueValuesEnum.RUNNING,
+        sourceConfig=datastream.SourceConfig(
+            sourceConnectionProfileName=_PARENT + "/connectionProfiles/src",
+            oracleSourceConfig=datastream.OracleSourceConfig(
+                allowlist=datastream.OracleRdbms(oracleSchemas=[
+                    datastream.OracleSchema(schemaName="HR")]))),
+        destinationConfig=datastream.DestinationConfig(
+            destinationConnectionProfileName=(
+                _PARENT + "/connectionProfiles/gcs"),
+            gcsDestinationConfig=datastream.GcsDestinationConfig(
+                fileRotationMb=4)),
+        backfillAll=datastream.BackfillAllStrategy())
+    manager._GetConnectionProfile.side_effect = lambda name: (
+        datastream.ConnectionProfile(
+            name=name,
+            displayName=name.rsplit("/", 1)[-1],
+            oracleProfile=datastream.OracleProfile(
+                hostname="10.0.0.1", port=1521, username="system",
+                databaseService="XE") if name.endswith("src") else None,
+            gcsProfile=datastream.GcsProfile(
+                bucketName="bucket", rootPath="/data/")
+            if name.endswith("gcs") else None))
+    return manager
+
+  def test_export_and_import(self):
+    snapshot = stream_snapshot.ExportSnapshot(self._ExportManager())
+
+    self.assertEqual(snapshot["version"], stream_snapshot.SNAPSHOT_VERSION)
+    self.assertEqual(snapshot["streamId"], "ora")
+    self.assertNotIn("state", snapshot["stream"])
+    self.assertNotIn("createTime", snapshot["stream"])
+    self.assertEqual(sorted(snapshot["connectionProfiles"]), ["gcs", "src"])
+
+    path = os.path.join(self.create_tempdir().full_path, "snapshot.json")
+    stream_snapshot.WriteSnapshot(path, snapshot)
+    snapshot = stream_snapshot.ReadSnapshot(path)
+
+    manager = mock.MagicMock()
+    manager.datastream_parent = "projects/456/locations/europe-west1"
+    done = datastream.Operation(done=True)
+    manager._CreateConnectionProfile.return_value = done
+    manager._CreateStreamFromMessage.return_value = done
+    manager._UpdateStreamState.return_value = done
+
+    stream_snapshot.ImportSnapshot(manager, snapshot, password="secret")
+
+    profiles = {call[0][0]: call[0][1]
+                for call in manager._CreateConnectionProfile.call_args_list}
+    self.assertEqual(profiles["src"].oracleProfile.password, "secret")
+    self.assertEqual(profiles["gcs"].gcsProfile.rootPath, "/data/")
+    self.assertNotIn("password", snapshot["connectionProfiles"]["src"][
+        "oracleProfile"])
+
+    stream_id, stream = manager._CreateStreamFromMessage.call_args[0]
+    self.assertEqual(stream_id, "ora")
+    self.assertEqual(
+        stream.sourceConfig.sourceConnectionProfileName,
+        "projects/456/locations/europe-west1/connectionProfiles/src")
+    self.assertEqual(
+        stream.sourceConfig.oracleSourceConfig.allowlist.oracleSchemas[0]
+        .schemaName, "HR")
+    self.assertIsNotNone(stream.backfillAll)
+    manager._UpdateStreamState.assert_called_once_with(
+        "projects/456/locations/europe-west1/streams/ora",
+        datastream.Stream.StateValueValuesEnum.RUNNING)
+
+  def test_failed_start_raises(self):
+    snapshot = stream_snapshot.ExportSnapshot(self._ExportManager())
+    manager = mock.MagicMock()
+    manager.datastream_parent = "projects/456/locations/europe-west1"
+    done = datastream.Operation(done=True)
+    manager._CreateConnectionProfile.return_value = done
+    manager._CreateStreamFromMessage.return_value = done
+    manager._UpdateStreamState.return_value = datastream.Operation(
+        done=True, error=datastream.Status(message="cannot reach source"))
+
+    with self.assertRaisesRegex(ValueError, "Unable to start stream 'ora'"):
+      stream_snapshot.ImportSnapshot(manager, snapshot)
+
+  def test_rejects_unknown_version(self):
+    with self.assertRaises(ValueError):
+      stream_snapshot.ImportSnapshot(mock.MagicMock(), {"version": 99})
+
+
+if __name__ == "__main__":
+  googletest.main()
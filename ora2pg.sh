@@ -21,61 +21,87 @@ then
 elif [ "$1" == "run" ]
 then
 	# Clear Out Old Reesults
-	rm ora2pg/data/output.sql
+	rm -f ora2pg/data/output.sql
 
-	# Create New Ora2PG Data
-	CURR_DIR=$(pwd)
-	for ORACLE_TYPE in ${ORACLE_TYPES}
-	do
-		if [ "${ORACLE_SCHEMAS}" == "" ]
-		then
-			echo "Ora2PG: ${ORACLE_TYPE}_output.sql"
-			docker run  \
-				-v ${CURR_DIR}/ora2pg/config:/config \
-				-v ${CURR_DIR}/ora2pg/data:/data \
-				${DOCKER_ORA2PG} ora2pg --type ${ORACLE_TYPE} --out ${ORACLE_TYPE}_output.sql \
-            --source ${ORACLE_DSN} --user ${ORACLE_USER} \
-            --password ${ORACLE_PASSWORD} --forceowner ${DATABASE_USER}
-			sudo chown -R $USER:$USER .
-			sed -i '/CREATE TABLE/a \\trowid bigint GENERATED BY DEFAULT AS IDENTITY,' ora2pg/data/${ORACLE_TYPE}_output.sql
-			cat ora2pg/data/${ORACLE_TYPE}_output.sql >> ora2pg/data/output.sql
+	# Reclaim files left by older root-owned containers
+	sudo chown -R $USER:$USER ora2pg/data
 
-			# If a table does not have a PK, add rowid
-			CREATED_TABLES=$(grep 'CREATE TABLE' ora2pg/data/${ORACLE_TYPE}_output.sql | awk '{print $3;}')
-			for CREATED_TABLE in ${CREATED_TABLES}
-			do
-				PK=$(grep "ALTER TABLE ${CREATED_TABLE} ADD PRIMARY KEY" ora2pg/data/${ORACLE_TYPE}_output.sql)
-				if [ "${PK}" == "" ]
-				then
-					echo "ALTER TABLE ${CREATED_TABLE} ADD PRIMARY KEY (rowid);" >> ora2pg/data/output.sql
-				fi
-			done
-		else
-			for ORACLE_SCHEMA in ${ORACLE_SCHEMAS}
-			do
-				echo "Ora2PG: ${ORACLE_SCHEMA}.${ORACLE_TYPE}_output.sql"
-				docker run  \
-					-v ${CURR_DIR}/ora2pg/config:/config \
-					-v ${CURR_DIR}/ora2pg/data:/data \
-					${DOCKER_ORA2PG} ora2pg --type ${ORACLE_TYPE} --namespace ${ORACLE_SCHEMA} \
-					--out ${ORACLE_TYPE}_${ORACLE_SCHEMA}_output.sql
-				sudo chown -R $USER:$USER .
-				sed -i '/CREATE TABLE/a \\trowid bigint GENERATED BY DEFAULT AS IDENTITY,' ora2pg/data/${ORACLE_TYPE}_${ORACLE_SCHEMA}_output.sql
-				cat ora2pg/data/${ORACLE_TYPE}_${ORACLE_SCHEMA}_output.sql >> ora2pg/data/output.sql
+	# Create New Ora2PG Data, running the type/schema jobs in parallel
+	python3 ora2pg_utils/runner.py --action run \
+		--data-dir ora2pg/data --config-dir ora2pg/config \
+		--max-workers ${ORA2PG_WORKERS} \
+		${ORA2PG_USE_WORKERS:+--use-workers}
+elif [ "$1" == "narrow-types" ]
+then
+	# Narrow numeric columns of output.sql by Oracle metadata and sampled values
+	python3 ora2pg_utils/runner.py --action narrow-types \
+		--data-dir ora2pg/data --config-dir ora2pg/config \
+		--sample-percent ${ORA2PG_SAMPLE_PERCENT} \
+		${ORA2PG_ALLOW_FLOAT:+--allow-float}
+elif [ "$1" == "start-workers" ] || [ "$1" == "stop-workers" ]
+then
+	python3 ora2pg_utils/runner.py --action $1 \
+		--data-dir ora2pg/data --config-dir ora2pg/config \
+		--max-workers ${ORA2PG_WORKERS}
+elif [ "$1" == "diff" ]
+then
+	# Work out the changes from the live database to output.sql
+	python3 ora2pg_utils/runner.py --action diff --data-dir ora2pg/data \
+		${ORA2PG_ALLOW_DATA_LOSS:+--allow-data-loss}
+elif [ "$1" == "deploy-diff" ]
+then
+  gsutil cp ora2pg/data/migration.sql ${GCS_BUCKET}/resources/ora2pg/migration.sql
 
-				# If a table does not have a PK, add rowid
-				CREATED_TABLES=$(grep 'CREATE TABLE' ora2pg/data/${ORACLE_TYPE}_${ORACLE_SCHEMA}_output.sql | awk '{print $3;}')
-				for CREATED_TABLE in ${CREATED_TABLES}
-				do
-					PK=$(grep "ALTER TABLE ${CREATED_TABLE} ADD PRIMARY KEY" ora2pg/data/${ORACLE_TYPE}_${ORACLE_SCHEMA}_output.sql)
-					if [ "${PK}" == "" ]
-					then
-						echo "ALTER TABLE ${CREATED_TABLE} ADD PRIMARY KEY (rowid);" >> ora2pg/data/output.sql
-					fi
-				done
-			done
-		fi
-	done
+  # Apply only the schema changes in CloudSQL, keeping replicated data
+  gcloud sql import sql \
+    ${CLOUD_SQL} ${GCS_BUCKET}/resources/ora2pg/migration.sql \
+    --user=${DATABASE_USER} --project=${PROJECT_ID} --database=postgres --quiet
+elif [ "$1" == "deploy-changes" ]
+then
+	# Apply only the DDL artifacts changed since the last deployment
+	python3 ora2pg_utils/runner.py --action artifacts --data-dir ora2pg/data
+	python3 ora2pg_utils/runner.py --action plan-deploy --data-dir ora2pg/data \
+		${ORA2PG_ALLOW_DATA_LOSS:+--allow-data-loss}
+	if [ -s ora2pg/data/deploy.sql ]
+	then
+		gsutil cp ora2pg/data/deploy.sql ${GCS_BUCKET}/resources/ora2pg/deploy.sql
+		gcloud sql import sql \
+			${CLOUD_SQL} ${GCS_BUCKET}/resources/ora2pg/deploy.sql \
+			--user=${DATABASE_USER} --project=${PROJECT_ID} --database=postgres --quiet \
+			&& python3 ora2pg_utils/runner.py --action mark-deployed --data-dir ora2pg/data
+	else
+		echo "No DDL artifacts changed since the last deployment"
+	fi
+elif [ "$1" == "deploy-pre-data" ]
+then
+	# Create tables and their replication keys only
+	python3 ora2pg_utils/runner.py --action split-phases --data-dir ora2pg/data
+	gsutil cp ora2pg/data/pre_data.sql ${GCS_BUCKET}/resources/ora2pg/pre_data.sql
+	gcloud sql import sql \
+		${CLOUD_SQL} ${GCS_BUCKET}/resources/ora2pg/pre_data.sql \
+		--user=${DATABASE_USER} --project=${PROJECT_ID} --database=postgres --quiet
+elif [ "$1" == "deploy-post-data" ]
+then
+	# Add indexes and constraints once the backfill has finished
+	python3 ora2pg_utils/runner.py --action wait-backfill --data-dir ora2pg/data \
+		--backfill-done-command "${ORA2PG_BACKFILL_DONE_COMMAND}" || exit 1
+	gsutil cp ora2pg/data/post_data.sql ${GCS_BUCKET}/resources/ora2pg/post_data.sql
+	gcloud sql import sql \
+		${CLOUD_SQL} ${GCS_BUCKET}/resources/ora2pg/post_data.sql \
+		--user=${DATABASE_USER} --project=${PROJECT_ID} --database=postgres --quiet
+elif [ "$1" == "apply-post-data" ]
+then
+	# Build indexes and constraints in parallel once the backfill has finished
+	python3 ora2pg_utils/runner.py --action wait-backfill --data-dir ora2pg/data \
+		--backfill-done-command "${ORA2PG_BACKFILL_DONE_COMMAND}" || exit 1
+	python3 ora2pg_utils/runner.py --action post-data --data-dir ora2pg/data \
+		--connections ${ORA2PG_POST_DATA_CONNECTIONS} \
+		--maintenance-work-mem ${ORA2PG_MAINTENANCE_WORK_MEM} --concurrently
+elif [ "$1" == "apply" ]
+then
+	# Apply output.sql directly, applying schemas in parallel transactions
+	python3 ora2pg_utils/runner.py --action apply --data-dir ora2pg/data \
+		--connections ${ORA2PG_APPLY_CONNECTIONS}
 elif [ "$1" == "deploy" ]
 then
   # Deploy to GCS
@@ -0,0 +1,74 @@
+"""Keep converted ora2pg outputs for reuse while their source is unchanged.
+
+The cache directory holds a copy of each job's raw output and a manifest
+recording the fingerprint it was converted at. Restoring copies the output
+back into the data directory when the fingerprint still matches, so the job
+does not need to run again.
+"""
+
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+
+MANIFEST_FILE = "manifest.json"
+
+
+class ConversionCache(object):
+  """Cached job outputs keyed by job name and source fingerprint.
+
+  Safe to use from several threads.
+  """
+
+  def __init__(self, cache_dir, clock=None):
+    self.cache_dir = cache_dir
+    self._clock = clock or time.time
+    self._lock = threading.Lock()
+    os.makedirs(cache_dir, exist_ok=True)
+    self._manifest_path = os.path.join(cache_dir, MANIFEST_FILE)
+    self.entries = {}
+    if os.path.exists(self._manifest_path):
+      with open(self._manifest_path) as manifest_file:
+        self.entries = json.load(manifest_file)
+
+  def _SaveManifest(self):
+    temp_path = self._manifest_path + ".tmp"
+    with open(temp_path, "w") as manifest_file:
+      json.dump(self.entries, manifest_file, indent=2, sort_keys=True)
+    os.replace(temp_path, self._manifest_path)
+
+  def _CachePath(self, job):
+    return os.path.join(self.cache_dir, job.output_file)
+
+  def Lookup(self, job, fingerprint=None):
+    """Return whether a job's output is cached.
+
+    Args:
+      job: The ora2pg_orchestrator.Ora2pgJob.
+      fingerprint: The fingerprint the cached output must have been
+          converted at, or None to accept any cached output.
+    """
+    entry = self.entries.get(job.name)
+    if not entry or not os.path.exists(self._CachePath(job)):
+      return False
+    return fingerprint is None or entry["fingerprint"] == fingerprint
+
+  def Restore(self, job, data_dir, fingerprint=None):
+    """Copy a cached output into data_dir, returning whether it was cached."""
+    if not self.Lookup(job, fingerprint):
+      return False
+    shutil.copyfile(self._CachePath(job),
+                    os.path.join(data_dir, job.output_file))
+    logging.info("Ora2PG: %s reused from cache", job.output_file)
+    return True
+
+  def Store(self, job, data_dir, fingerprint=None):
+    """Cache a job's output, converted at fingerprint."""
+    shutil.copyfile(os.path.join(data_dir, job.output_file),
+                    self._CachePath(job))
+    with self._lock:
+      self.entries[job.name] = {"fingerprint": fingerprint,
+                                "stored_at": self._clock()}
+      self._SaveManifest()
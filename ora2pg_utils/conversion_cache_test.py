@@ -0,0 +1,54 @@
+"""Tests for google3.experimental.dhercher.ora2pg_utils.conversion_cache."""
+
+import os
+
+from google3.experimental.dhercher.ora2pg_utils import conversion_cache
+from google3.experimental.dhercher.ora2pg_utils import ora2pg_orchestrator
+from google3.testing.pybase import googletest
+
+
+class ConversionCacheTest(googletest.TestCase):
+
+  def setUp(self):
+    super().setUp()
+    self.data_dir = self.create_tempdir().full_path
+    self.cache_dir = os.path.join(self.create_tempdir().full_path, "cache")
+    self.job = ora2pg_orchestrator.Ora2pgJob("TABLE", "HR")
+    self._Write("CREATE TABLE hr.jobs (id int);\n")
+
+  def _Write(self, sql):
+    with open(os.path.join(self.data_dir, self.job.output_file), "w") as f:
+      f.write(sql)
+
+  def _Read(self):
+    with open(os.path.join(self.data_dir, self.job.output_file)) as f:
+      return f.read()
+
+  def test_restore_matching_fingerprint(self):
+    conversion_cache.ConversionCache(self.cache_dir).Store(
+        self.job, self.data_dir, "fp-1")
+    self._Write("")
+
+    # A new instance reads the manifest written by the first.
+    cache = conversion_cache.ConversionCache(self.cache_dir)
+    self.assertFalse(cache.Restore(self.job, self.data_dir, "fp-2"))
+    self.assertEqual(self._Read(), "")
+    self.assertTrue(cache.Restore(self.job, self.data_dir, "fp-1"))
+    self.assertEqual(self._Read(), "CREATE TABLE hr.jobs (id int);\n")
+
+  def test_restore_any_fingerprint(self):
+    cache = conversion_cache.ConversionCache(self.cache_dir)
+    self.assertFalse(cache.Restore(self.job, self.data_dir))
+    cache.Store(self.job, self.data_dir, None)
+    self.assertTrue(cache.Restore(self.job, self.data_dir))
+    self.assertFalse(cache.Lookup(self.job, "fp-1"))
+
+  def test_missing_cached_file(self):
+    cache = conversion_cache.ConversionCache(self.cache_dir)
+    cache.Store(self.job, self.data_dir, "fp-1")
+    os.remove(os.path.join(self.cache_dir, self.job.output_file))
+    self.assertFalse(cache.Lookup(self.job, "fp-1"))
+
+
+if __name__ == "__main__":
+  googletest.main()
@@ -0,0 +1,201 @@
+"""Split converted DDL into pre-data and post-data files.
+
+Creating every index and foreign key before replication starts makes each
+backfilled row pay for index maintenance and constraint checks. Instead the
+pre-data file holds what must exist while rows arrive: schemas, tables,
+sequences, views and the keys CDC upserts match on (the primary key, or the
+unique keys of a table without one). The post-data file holds the rest:
+secondary indexes, foreign keys, check and exclusion constraints, and the
+comments on them. It is applied once the backfill has finished, when
+building each index is a single sorted pass over the loaded table.
+
+Table constraints declared inside CREATE TABLE are moved to ALTER TABLE
+statements in the post-data file; column constraints stay in CREATE TABLE.
+"""
+
+import logging
+import re
+import time
+
+try:
+  from google3.experimental.dhercher.ora2pg_utils import ddl_model  # pylint: disable=g-import-not-at-top
+  from google3.experimental.dhercher.ora2pg_utils import ddl_parser  # pylint: disable=g-import-not-at-top
+except ModuleNotFoundError:
+  import ddl_model  # pytype: disable=import-error  pylint: disable=g-import-not-at-top
+  import ddl_parser  # pytype: disable=import-error  pylint: disable=g-import-not-at-top
+
+PRE_DATA_FILE = "pre_data.sql"
+POST_DATA_FILE = "post_data.sql"
+DEFAULT_POLL_INTERVAL = 60
+
+_POST_DATA_KINDS = (ddl_model.FOREIGN_KEY, ddl_model.CHECK, ddl_model.EXCLUDE)
+_POST_DATA_COMMENT_RE = re.compile(r"\s*COMMENT\s+ON\s+(?:INDEX|CONSTRAINT)\b",
+                                   re.I)
+_SET_RE = re.compile(r"\s*SET\s", re.I)
+_TABLE_CONSTRAINT_RE = re.compile(
+    r"\s*(?:CONSTRAINT\s+%s\s+)?(PRIMARY\s+KEY|UNIQUE|FOREIGN\s+KEY|CHECK|"
+    r"EXCLUDE)\b" % ddl_parser.IDENTIFIER, re.I | re.S)
+
+
+def _Kind(text):
+  return re.sub(r"\s+", " ", text.upper())
+
+
+def _SplitCreateTable(statement, match):
+  """Return (CREATE TABLE without post-data constraints, moved elements)."""
+  start = match.end() - 1
+  end = ddl_parser.FindClosingParen(statement, start)
+  kept, moved = [], []
+  for element in ddl_parser.SplitTopLevel(statement[start + 1:end]):
+    constraint = _TABLE_CONSTRAINT_RE.match(ddl_parser.StripQuotedKeepLength(
+        element))
+    if constraint and _Kind(constraint.group(1)) in _POST_DATA_KINDS:
+      moved.append(element.strip())
+    else:
+      kept.append(element)
+  if not moved:
+    return statement, []
+  body = ",".join(kept).rstrip()
+  return statement[:start + 1] + body + "\n" + statement[end:], moved
+
+
+class PhaseSplit(object):
+  """The statements of the pre-data and post-data files."""
+
+  def __init__(self):
+    self.pre_data = []
+    self.post_data = []
+    self._post_data_settings = {}
+
+  def AddPreData(self, statement):
+    self.pre_data.append(statement)
+
+  def AddPostData(self, statement, settings):
+    """Add a post-data statement, repeating any SET it depends on.
+
+    Args:
+      statement: The statement text.
+      settings: {setting statement kind: SET statement} in effect where the
+          statement appeared in the input.
+    """
+    for key, setting in settings.items():
+      if self._post_data_settings.get(key) != setting:
+        self.post_data.append(setting)
+        self._post_data_settings[key] = setting
+    self.post_data.append(statement)
+
+  @staticmethod
+  def _Join(statements):
+    text = "".join(s if s.startswith("\n") else "\n" + s for s in statements)
+    return text.lstrip("\n") + "\n" if text else ""
+
+  @property
+  def pre_data_sql(self):
+    return self._Join(self.pre_data)
+
+  @property
+  def post_data_sql(self):
+    return self._Join(self.post_data)
+
+
+def SplitPhases(statements):
+  """Return the PhaseSplit of a list of statements from SplitStatements."""
+  statements = list(statements)
+  catalog = ddl_model.ParseDdl(statements)
+  tables_with_primary_key = {
+      name for name, table in catalog.tables.items()
+      if table.GetConstraints(ddl_model.PRIMARY_KEY)}
+
+  split = PhaseSplit()
+  schema = None
+  # The SET statements in effect, keyed by their setting.
+  settings = {}
+  for statement in statements:
+    blanked = ddl_parser.StripQuoted(statement)
+    if not blanked.strip():
+      split.AddPreData(statement)
+      continue
+
+    search_path = ddl_parser.SEARCH_PATH_RE.match(statement)
+    if search_path:
+      schema = ddl_parser.ParseName(search_path.group("schema"))[0]
+    if _SET_RE.match(blanked):
+      setting = re.match(r"\s*SET\s+(?:SESSION\s+|LOCAL\s+)?(\w+)", blanked,
+                         re.I)
+      settings[setting.group(1).lower() if setting else statement] = (
+          statement.strip())
+      split.AddPreData(statement)
+      continue
+
+    create = ddl_parser.CREATE_TABLE_RE.match(statement)
+    if create:
+      table_statement, moved = _SplitCreateTable(statement, create)
+      split.AddPreData(table_statement)
+      name = ddl_parser.FormatName(ddl_parser.QualifyName(
+          ddl_parser.ParseName(create.group("name")), schema))
+      for element in moved:
+        split.AddPostData("ALTER TABLE %s ADD %s;" % (name, element), settings)
+      continue
+
+    alter = ddl_parser.ALTER_TABLE_ADD_RE.match(statement)
+    if alter:
+      table = ddl_parser.QualifyName(ddl_parser.ParseName(alter.group("name")),
+                                     schema)
+      kind = _Kind(_TABLE_CONSTRAINT_RE.match(alter.group("definition"))
+                   .group(1))
+      if kind == ddl_model.PRIMARY_KEY or (
+          kind == ddl_model.UNIQUE and table not in tables_with_primary_key):
+        split.AddPreData(statement)
+      else:
+        split.AddPostData(statement, settings)
+      continue
+
+    index = ddl_parser.CREATE_INDEX_RE.match(statement)
+    if index:
+      table = ddl_parser.QualifyName(ddl_parser.ParseName(index.group("table")),
+                                     schema)
+      if index.group("unique") and table not in tables_with_primary_key:
+        split.AddPreData(statement)
+      else:
+        split.AddPostData(statement, settings)
+      continue
+
+    if _POST_DATA_COMMENT_RE.match(blanked):
+      split.AddPostData(statement, settings)
+    else:
+      split.AddPreData(statement)
+  return split
+
+
+def WritePhases(ddl_path, pre_data_path, post_data_path):
+  """Split a DDL file into pre-data and post-data files."""
+  with open(ddl_path) as ddl_file:
+    split = SplitPhases(ddl_parser.SplitStatements(ddl_file))
+  with open(pre_data_path, "w") as pre_data_file:
+    pre_data_file.write(split.pre_data_sql)
+  with open(post_data_path, "w") as post_data_file:
+    post_data_file.write(split.post_data_sql)
+  logging.info("Split DDL into %d pre-data and %d post-data statements",
+               len(split.pre_data), len(split.post_data))
+  return split
+
+
+def WaitUntil(check, poll_interval=None, timeout=None, clock=None,
+              sleep=None):
+  """Poll check() until it returns True; return False on timeout.
+
+  Args:
+    check: A callable, eg. reporting whether the backfill has finished.
+    poll_interval: Seconds between checks.
+    timeout: Seconds to wait, or None to wait indefinitely.
+    clock: A time.time replacement, for tests.
+    sleep: A time.sleep replacement, for tests.
+  """
+  clock = clock or time.time
+  sleep = sleep or time.sleep
+  deadline = None if timeout is None else clock() + timeout
+  while not check():
+    if deadline is not None and clock() >= deadline:
+      return False
+    sleep(poll_interval or DEFAULT_POLL_INTERVAL)
+  return True
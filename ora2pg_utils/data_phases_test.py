@@ -0,0 +1,101 @@
+"""Tests for google3.experimental.dhercher.ora2pg_utils.data_phases."""
+
+import os
+
+from google3.experimental.dhercher.ora2pg_utils import data_phases
+from google3.experimental.dhercher.ora2pg_utils import ddl_parser
+from google3.testing.pybase import googletest
+
+_DDL = """SET client_encoding TO 'UTF8';
+SET search_path = hr,public;
+CREATE TABLE jobs (
+\tid numeric(10) NOT NULL,
+\ttitle varchar(35),
+\tCONSTRAINT jobs_title_ck CHECK (title <> ''),
+\tPRIMARY KEY (id)
+) ;
+CREATE TABLE emp (
+\tid bigint NOT NULL,
+\temail varchar(80),
+\tjob_id numeric(10)
+) ;
+ALTER TABLE emp ADD UNIQUE (email);
+ALTER TABLE emp ADD CONSTRAINT emp_job_fk FOREIGN KEY (job_id) REFERENCES jobs(id);
+CREATE INDEX emp_job_idx ON emp (job_id);
+COMMENT ON INDEX emp_job_idx IS 'By job';
+ALTER TABLE emp ADD PRIMARY KEY (id);
+COMMENT ON TABLE emp IS 'Employees';
+SET search_path = payroll,public;
+CREATE TABLE pay (id int, emp_id bigint) ;
+CREATE UNIQUE INDEX pay_idx ON pay (id);
+CREATE INDEX pay_emp_idx ON pay (emp_id);
+"""
+
+
+def _Split(sql):
+  return data_phases.SplitPhases(
+      ddl_parser.SplitStatements(sql.splitlines(True)))
+
+
+class SplitPhasesTest(googletest.TestCase):
+
+  def setUp(self):
+    super().setUp()
+    self.split = _Split(_DDL)
+
+  def test_pre_data(self):
+    pre_data = self.split.pre_data_sql
+    self.assertIn("CREATE TABLE jobs (", pre_data)
+    self.assertIn("\tPRIMARY KEY (id)\n) ;", pre_data)
+    self.assertNotIn("CHECK", pre_data)
+    self.assertIn("ALTER TABLE emp ADD PRIMARY KEY (id);", pre_data)
+    self.assertIn("COMMENT ON TABLE emp", pre_data)
+    # The only key of a table without a primary key is needed by CDC.
+    self.assertIn("CREATE UNIQUE INDEX pay_idx", pre_data)
+    self.assertNotIn("emp_job_idx", pre_data)
+    self.assertNotIn("FOREIGN KEY", pre_data)
+    self.assertNotIn("ADD UNIQUE", pre_data)
+
+  def test_post_data(self):
+    self.assertEqual(self.split.post_data_sql, """SET client_encoding TO 'UTF8';
+SET search_path = hr,public;
+ALTER TABLE hr.jobs ADD CONSTRAINT jobs_title_ck CHECK (title <> '');
+ALTER TABLE emp ADD UNIQUE (email);
+ALTER TABLE emp ADD CONSTRAINT emp_job_fk FOREIGN KEY (job_id) REFERENCES jobs(id);
+CREATE INDEX emp_job_idx ON emp (job_id);
+COMMENT ON INDEX emp_job_idx IS 'By job';
+SET search_path = payroll,public;
+CREATE INDEX pay_emp_idx ON pay (emp_id);
+""")
+
+  def test_write_phases(self):
+    directory = self.create_tempdir().full_path
+    ddl_path = os.path.join(directory, "output.sql")
+    with open(ddl_path, "w") as ddl_file:
+      ddl_file.write(_DDL)
+    pre_path = os.path.join(directory, data_phases.PRE_DATA_FILE)
+    post_path = os.path.join(directory, data_phases.POST_DATA_FILE)
+    data_phases.WritePhases(ddl_path, pre_path, post_path)
+    with open(post_path) as post_data_file:
+      self.assertEqual(post_data_file.read(), self.split.post_data_sql)
+
+
+class WaitUntilTest(googletest.TestCase):
+
+  def test_waits_for_check(self):
+    now = [0]
+    results = iter([False, False, True])
+    self.assertTrue(data_phases.WaitUntil(
+        lambda: next(results), poll_interval=10, clock=lambda: now[0],
+        sleep=lambda seconds: now.__setitem__(0, now[0] + seconds)))
+    self.assertEqual(now[0], 20)
+
+  def test_timeout(self):
+    now = [0]
+    self.assertFalse(data_phases.WaitUntil(
+        lambda: False, poll_interval=10, timeout=25, clock=lambda: now[0],
+        sleep=lambda seconds: now.__setitem__(0, now[0] + seconds)))
+
+
+if __name__ == "__main__":
+  googletest.main()
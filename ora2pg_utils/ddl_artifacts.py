@@ -0,0 +1,380 @@
+"""Split converted DDL into one artifact per object, for incremental deploys.
+
+Each table, constraint, foreign key and index in output.sql is written to its
+own file under the artifact directory, and a manifest records each file's
+content hash:
+
+  ARTIFACT_DIR/manifest.json           {path: {kind, name, table, hash}}
+  ARTIFACT_DIR/tables/hr.jobs.sql      CREATE TABLE, with inline constraints
+  ARTIFACT_DIR/constraints/...         ALTER TABLE ADD PRIMARY KEY/UNIQUE/...
+  ARTIFACT_DIR/foreign_keys/...        ALTER TABLE ADD FOREIGN KEY
+  ARTIFACT_DIR/indexes/hr.jobs_idx.sql CREATE INDEX
+  ARTIFACT_DIR/sequences/hr.jobs_seq.sql CREATE SEQUENCE
+  ARTIFACT_DIR/functions/hr.raise.sql  CREATE FUNCTION or PROCEDURE
+  ARTIFACT_DIR/views/hr.emp_v.sql      CREATE VIEW or MATERIALIZED VIEW
+  ARTIFACT_DIR/other/hr.sql            everything else, in order
+  ARTIFACT_DIR/deployed/               the artifacts as last deployed
+
+A deployment plan only reads the artifacts whose hash differs from the
+deployed manifest. Changed tables, constraints and indexes are diffed
+against their deployed version with schema_differ, so a changed table is
+altered rather than created again, and removed artifacts become drops.
+Changed sequences are created if missing and then altered, and changed views
+and functions are created or replaced. Of a changed other file only the
+statements which are new are run; removed comments, grants and triggers, and
+removed functions, are not reverted but listed commented out in the plan.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+
+try:
+  from google3.experimental.dhercher.ora2pg_utils import ddl_model  # pylint: disable=g-import-not-at-top
+  from google3.experimental.dhercher.ora2pg_utils import ddl_parser  # pylint: disable=g-import-not-at-top
+  from google3.experimental.dhercher.ora2pg_utils import schema_differ  # pylint: disable=g-import-not-at-top
+except ModuleNotFoundError:
+  import ddl_model  # pytype: disable=import-error  pylint: disable=g-import-not-at-top
+  import ddl_parser  # pytype: disable=import-error  pylint: disable=g-import-not-at-top
+  import schema_differ  # pytype: disable=import-error  pylint: disable=g-import-not-at-top
+
+ARTIFACT_DIR = "artifacts"
+MANIFEST_FILE = "manifest.json"
+DEPLOYED_DIR = "deployed"
+
+TABLES = "tables"
+CONSTRAINTS = "constraints"
+FOREIGN_KEYS = "foreign_keys"
+INDEXES = "indexes"
+SEQUENCES = "sequences"
+FUNCTIONS = "functions"
+VIEWS = "views"
+OTHER = "other"
+# The order artifacts are applied in.
+KINDS = (SEQUENCES, TABLES, CONSTRAINTS, INDEXES, FOREIGN_KEYS, FUNCTIONS,
+         VIEWS, OTHER)
+# The kinds modeled by ddl_model and diffed by schema_differ.
+_MODEL_KINDS = (TABLES, CONSTRAINTS, INDEXES, FOREIGN_KEYS)
+# CREATE_OBJECT_RE kinds with their own artifacts.
+_OBJECT_KINDS = {
+    "SEQUENCE": SEQUENCES,
+    "FUNCTION": FUNCTIONS,
+    "PROCEDURE": FUNCTIONS,
+    "VIEW": VIEWS,
+    "MATERIALIZED VIEW": VIEWS,
+}
+
+
+class Artifact(object):
+  """The DDL of one object."""
+
+  __slots__ = ("kind", "name", "table", "sql")
+
+  def __init__(self, kind, name, sql, table=None):
+    """Initialize the Artifact.
+
+    Args:
+      kind: One of KINDS.
+      name: The artifact name, unique within its kind.
+      sql: The statements creating the object.
+      table: The path of the table artifact the object belongs to.
+    """
+    self.kind = kind
+    self.name = name
+    self.table = table
+    self.sql = sql
+
+  @property
+  def path(self):
+    return "%s/%s.sql" % (self.kind, self.name)
+
+  @property
+  def digest(self):
+    return hashlib.sha256(self.sql.encode("utf-8")).hexdigest()
+
+
+def _FileName(parts):
+  return ".".join(parts).replace("/", "_")
+
+
+def _Sql(search_path, statement):
+  search_path = (ddl_parser.QuoteIdentifier(search_path) + ",public"
+                 if search_path and search_path != "public" else "public")
+  return "SET search_path = %s;\n%s\n" % (search_path, statement.strip())
+
+
+def _ObjectKind(statement):
+  """Return the CREATE_OBJECT_RE match and kind of an object statement."""
+  create = ddl_parser.CREATE_OBJECT_RE.match(statement)
+  if not create:
+    return None, None
+  return create, " ".join(create.group("kind").upper().split())
+
+
+def _ReadStatements(path):
+  """Return the search_path and the other statements of an artifact file."""
+  search_path = None
+  statements = []
+  with open(path) as artifact_file:
+    for statement in ddl_parser.SplitStatements(artifact_file):
+      set_search_path = ddl_parser.SEARCH_PATH_RE.match(statement)
+      if set_search_path:
+        search_path = ddl_parser.ParseName(
+            set_search_path.group("schema"))[0]
+      elif ddl_parser.StripQuoted(statement).strip():
+        statements.append(statement.strip())
+  return search_path, statements
+
+
+def _AlterSequence(create):
+  """Return ALTER SEQUENCE setting the options of a CREATE SEQUENCE match."""
+  options = create.string[create.end("name"):].strip().rstrip(";").strip()
+  if not options:
+    return None
+  return "ALTER SEQUENCE %s %s;" % (create.group("name"), options)
+
+
+def _ConstraintName(constraint):
+  if constraint.name:
+    return _FileName(constraint.table[:-1] + (constraint.name,))
+  # Name unnamed constraints by their definition, so the name is stable.
+  return _FileName(constraint.table + (
+      hashlib.sha256(constraint.key.encode("utf-8")).hexdigest()[:12],))
+
+
+def SplitCatalog(catalog):
+  """Return the Artifacts of a ddl_model.Catalog, in KINDS order."""
+  artifacts = []
+  for name, table in catalog.tables.items():
+    schema = name[0] if len(name) > 1 else None
+    table_artifact = Artifact(TABLES, _FileName(name),
+                              _Sql(table.search_path, table.statement))
+    artifacts.append(table_artifact)
+    for constraint in table.constraints:
+      if constraint.statement is None:
+        continue  # Declared in the CREATE TABLE.
+      artifacts.append(Artifact(
+          FOREIGN_KEYS if constraint.kind == ddl_model.FOREIGN_KEY
+          else CONSTRAINTS, _ConstraintName(constraint),
+          _Sql(schema, constraint.statement), table=table_artifact.path))
+
+  for name, index in catalog.indexes.items():
+    if index.name is None:
+      name = index.table + (hashlib.sha256(
+          repr(index.key).encode("utf-8")).hexdigest()[:12],)
+    table = catalog.tables.get(index.table)
+    artifacts.append(Artifact(
+        INDEXES, _FileName(name),
+        _Sql(index.table[0] if len(index.table) > 1 else None,
+             index.statement),
+        table="%s/%s.sql" % (TABLES, _FileName(index.table)) if table
+        else None))
+
+  objects = {}
+  other = {}
+  for search_path, statement in catalog.other_statements:
+    if ddl_parser.SEARCH_PATH_RE.match(statement):
+      continue
+    if not ddl_parser.StripQuoted(statement).strip():
+      continue
+    create, kind = _ObjectKind(statement)
+    if kind in _OBJECT_KINDS:
+      name = ddl_parser.QualifyName(
+          ddl_parser.ParseName(create.group("name")), search_path)
+      # Overloaded functions share an artifact.
+      objects.setdefault((_OBJECT_KINDS[kind], _FileName(name)),
+                         (search_path, []))[1].append(statement.strip())
+    else:
+      other.setdefault(search_path, []).append(statement.strip())
+  for (kind, name), (search_path, statements) in objects.items():
+    artifacts.append(Artifact(kind, name, _Sql(search_path,
+                                               "\n".join(statements))))
+  for search_path, statements in other.items():
+    artifacts.append(Artifact(OTHER, search_path or "public", _Sql(
+        search_path, "\n".join(statements))))
+
+  artifacts.sort(key=lambda artifact: KINDS.index(artifact.kind))
+  return artifacts
+
+
+def _ReadManifest(directory):
+  try:
+    with open(os.path.join(directory, MANIFEST_FILE)) as manifest_file:
+      return json.load(manifest_file)
+  except FileNotFoundError:
+    return {}
+
+
+def _WriteManifest(directory, manifest):
+  path = os.path.join(directory, MANIFEST_FILE)
+  with open(path + ".tmp", "w") as manifest_file:
+    json.dump(manifest, manifest_file, indent=2, sort_keys=True)
+  os.replace(path + ".tmp", path)
+
+
+class ArtifactStore(object):
+  """The artifacts of the latest conversion and of the last deployment."""
+
+  def __init__(self, artifact_dir):
+    self.artifact_dir = artifact_dir
+    self.deployed_dir = os.path.join(artifact_dir, DEPLOYED_DIR)
+
+  def Write(self, artifacts):
+    """Write the artifacts and their manifest, replacing any older ones.
+
+    Files whose content is unchanged are left alone.
+    """
+    manifest = {}
+    for artifact in artifacts:
+      manifest[artifact.path] = {"kind": artifact.kind, "name": artifact.name,
+                                 "table": artifact.table,
+                                 "hash": artifact.digest}
+    old_manifest = _ReadManifest(self.artifact_dir)
+    for artifact in artifacts:
+      full_path = os.path.join(self.artifact_dir, artifact.path)
+      if (old_manifest.get(artifact.path, {}).get("hash") == artifact.digest
+          and os.path.exists(full_path)):
+        continue
+      os.makedirs(os.path.dirname(full_path), exist_ok=True)
+      with open(full_path, "w") as artifact_file:
+        artifact_file.write(artifact.sql)
+    for path in set(old_manifest) - set(manifest):
+      try:
+        os.remove(os.path.join(self.artifact_dir, path))
+      except FileNotFoundError:
+        pass
+    os.makedirs(self.artifact_dir, exist_ok=True)
+    _WriteManifest(self.artifact_dir, manifest)
+    return manifest
+
+  def ChangedPaths(self):
+    """Return the artifacts added, changed or removed since deployment."""
+    current = _ReadManifest(self.artifact_dir)
+    deployed = _ReadManifest(self.deployed_dir)
+    return sorted(
+        path for path in set(current) | set(deployed)
+        if current.get(path, {}).get("hash") !=
+        deployed.get(path, {}).get("hash"))
+
+  def _LoadCatalog(self, directory, paths):
+    """Return a Catalog of the model artifacts among paths in directory."""
+    manifest = _ReadManifest(directory)
+    selected = set()
+    for path in paths:
+      entry = manifest.get(path)
+      if not entry or entry["kind"] not in _MODEL_KINDS:
+        continue
+      selected.add(path)
+      # Constraints are only modeled next to their table.
+      if entry["table"] in manifest:
+        selected.add(entry["table"])
+    lines = []
+    for path in sorted(selected,
+                       key=lambda p: (KINDS.index(manifest[p]["kind"]), p)):
+      with open(os.path.join(directory, path)) as artifact_file:
+        lines.extend(artifact_file)
+    return ddl_model.ParseDdl(ddl_parser.SplitStatements(lines))
+
+  def PlanDeployment(self, allow_data_loss=False):
+    """Return the SQL applying the changed artifacts, or "" for none.
+
+    Args:
+      allow_data_loss: Whether to drop tables, columns and sequences whose
+          artifacts were removed or changed, rather than commenting the
+          drops out.
+    """
+    paths = self.ChangedPaths()
+    if not paths:
+      return ""
+    logging.info("%d changed DDL artifacts", len(paths))
+    current = _ReadManifest(self.artifact_dir)
+    previous = _ReadManifest(self.deployed_dir)
+    entries = {path: current.get(path) or previous[path] for path in paths}
+    # A constraint or index added or removed is compared next to its table on
+    # both sides, or the table would look added or removed too.
+    loaded = set(paths) | {entries[path]["table"] for path in paths
+                           if entries[path].get("table")}
+    desired = self._LoadCatalog(self.artifact_dir, loaded)
+    deployed = self._LoadCatalog(self.deployed_dir, loaded)
+    # Removed artifacts are dropped even when nothing else in their schema
+    # changed.
+    desired.schemas |= deployed.schemas
+    diff = schema_differ.DiffCatalogs(desired, deployed)
+
+    changes = list(diff.changes)
+    for path in sorted(paths,
+                       key=lambda p: (KINDS.index(entries[p]["kind"]), p)):
+      if entries[path]["kind"] not in _MODEL_KINDS:
+        changes.extend(self._PlanObject(path, entries[path]["kind"],
+                                        path in current, path in previous))
+    diff = schema_differ.SchemaDiff(changes, diff.skipped)
+    diff.LogSummary()
+    return diff.ToSql(allow_data_loss=allow_data_loss)
+
+  def _PlanObject(self, path, kind, is_current, was_deployed):
+    """Return the schema_differ.Changes deploying a non-model artifact.
+
+    Args:
+      path: The artifact path.
+      kind: SEQUENCES, FUNCTIONS, VIEWS or OTHER.
+      is_current: Whether the artifact is in the latest conversion.
+      was_deployed: Whether the artifact was deployed before.
+    """
+    phase = (schema_differ.PHASE_CREATE_SEQUENCE if kind == SEQUENCES
+             else schema_differ.PHASE_OTHER)
+    search_path, statements = (
+        _ReadStatements(os.path.join(self.artifact_dir, path))
+        if is_current else (None, []))
+    old_search_path, old_statements = (
+        _ReadStatements(os.path.join(self.deployed_dir, path))
+        if was_deployed else (None, []))
+    search_path = search_path or old_search_path or "public"
+
+    changes = []
+    for statement in statements:
+      if kind == OTHER and statement in old_statements:
+        continue  # Unchanged, and maybe not safe to run again.
+      changes.append(schema_differ.Change(
+          phase, ddl_model.RerunnableStatement(statement) or statement,
+          "Deploy %s" % path, search_path=search_path))
+      create, _ = _ObjectKind(statement)
+      if kind == SEQUENCES and was_deployed and _AlterSequence(create):
+        changes.append(schema_differ.Change(
+            phase, _AlterSequence(create), "Update %s" % path,
+            search_path=search_path))
+
+    if kind in (SEQUENCES, VIEWS) and not is_current:
+      for statement in old_statements:
+        create, object_kind = _ObjectKind(statement)
+        # Dropping a sequence loses its current value.
+        changes.append(schema_differ.Change(
+            phase, "DROP %s IF EXISTS %s;" % (object_kind,
+                                              create.group("name")),
+            "Drop removed %s" % path, destructive=kind == SEQUENCES,
+            search_path=search_path))
+    elif kind == OTHER or not is_current:
+      # Changed objects were replaced above; removed functions and other
+      # statements have no safe inverse.
+      for statement in old_statements:
+        if statement not in statements:
+          logging.warning("Not reverting a statement removed from %s", path)
+          changes.append(schema_differ.Change(
+              phase, "\n".join("-- " + line
+                               for line in statement.splitlines()),
+              "Removed from %s, not reverted" % path))
+    return changes
+
+  def MarkDeployed(self):
+    """Record the current artifacts as deployed."""
+    if os.path.exists(self.deployed_dir):
+      shutil.rmtree(self.deployed_dir)
+    shutil.copytree(self.artifact_dir, self.deployed_dir,
+                    ignore=shutil.ignore_patterns(DEPLOYED_DIR))
+
+
+def WriteArtifacts(ddl_path, artifact_dir):
+  """Split a DDL file into artifacts, returning the manifest."""
+  artifacts = SplitCatalog(ddl_model.ParseFile(ddl_path))
+  return ArtifactStore(artifact_dir).Write(artifacts)
@@ -0,0 +1,168 @@
+"""Tests for google3.experimental.dhercher.ora2pg_utils.ddl_artifacts."""
+
+import json
+import os
+
+from google3.experimental.dhercher.ora2pg_utils import ddl_artifacts
+from google3.testing.pybase import googletest
+
+_DDL = """SET search_path = hr,public;
+CREATE TABLE jobs (
+\tid numeric(10) NOT NULL,
+\ttitle varchar(35)
+) ;
+CREATE TABLE emp (
+\tid bigint NOT NULL,
+\tjob_id numeric(10)
+) ;
+ALTER TABLE jobs ADD PRIMARY KEY (id);
+ALTER TABLE emp ADD CONSTRAINT emp_pk PRIMARY KEY (id);
+ALTER TABLE emp ADD CONSTRAINT emp_job_fk FOREIGN KEY (job_id) REFERENCES jobs(id);
+CREATE INDEX emp_job_idx ON emp (job_id);
+COMMENT ON TABLE emp IS 'Employees';
+"""
+
+
+class DdlArtifactsTest(googletest.TestCase):
+
+  def setUp(self):
+    super().setUp()
+    self.data_dir = self.create_tempdir().full_path
+    self.ddl_path = os.path.join(self.data_dir, "output.sql")
+    self.artifact_dir = os.path.join(self.data_dir, "artifacts")
+    self.store = ddl_artifacts.ArtifactStore(self.artifact_dir)
+
+  def _Split(self, ddl):
+    with open(self.ddl_path, "w") as ddl_file:
+      ddl_file.write(ddl)
+    return ddl_artifacts.WriteArtifacts(self.ddl_path, self.artifact_dir)
+
+  def _ReadArtifact(self, path):
+    with open(os.path.join(self.artifact_dir, path)) as artifact_file:
+      return artifact_file.read()
+
+  def test_one_artifact_per_object(self):
+    manifest = self._Split(_DDL)
+    pk_path = [path for path in manifest
+               if path.startswith("constraints/hr.jobs.")][0]
+    self.assertCountEqual(manifest, [
+        "tables/hr.jobs.sql", "tables/hr.emp.sql", pk_path,
+        "constraints/hr.emp_pk.sql", "foreign_keys/hr.emp_job_fk.sql",
+        "indexes/hr.emp_job_idx.sql", "other/hr.sql"])
+    self.assertEqual(manifest["foreign_keys/hr.emp_job_fk.sql"]["table"],
+                     "tables/hr.emp.sql")
+    self.assertEqual(
+        self._ReadArtifact("indexes/hr.emp_job_idx.sql"),
+        "SET search_path = hr,public;\n"
+        "CREATE INDEX emp_job_idx ON emp (job_id);\n")
+    with open(os.path.join(self.artifact_dir, "manifest.json")) as f:
+      self.assertEqual(json.load(f), manifest)
+
+  def test_first_deployment_creates_everything(self):
+    self._Split(_DDL)
+    sql = self.store.PlanDeployment()
+    self.assertIn("CREATE SCHEMA IF NOT EXISTS hr;", sql)
+    for expected in ("CREATE TABLE jobs", "ADD PRIMARY KEY (id)",
+                     "CREATE INDEX emp_job_idx", "FOREIGN KEY (job_id)",
+                     "COMMENT ON TABLE emp"):
+      self.assertIn(expected, sql)
+    self.assertLess(sql.index("CREATE INDEX"), sql.index("FOREIGN KEY"))
+
+  def test_only_changed_artifacts_are_deployed(self):
+    self._Split(_DDL)
+    self.store.MarkDeployed()
+    self.assertEqual(self.store.ChangedPaths(), [])
+    self.assertEqual(self.store.PlanDeployment(), "")
+
+    self._Split(_DDL.replace("title varchar(35)", "title varchar(80)")
+                .replace("CREATE INDEX emp_job_idx ON emp (job_id);\n", ""))
+    self.assertEqual(self.store.ChangedPaths(),
+                     ["indexes/hr.emp_job_idx.sql", "tables/hr.jobs.sql"])
+    self.assertFalse(os.path.exists(os.path.join(
+        self.artifact_dir, "indexes/hr.emp_job_idx.sql")))
+    sql = self.store.PlanDeployment()
+    self.assertIn("ALTER TABLE hr.jobs ALTER COLUMN title TYPE varchar(80)",
+                  sql)
+    self.assertIn("DROP INDEX hr.emp_job_idx;", sql)
+    self.assertNotIn("CREATE TABLE", sql)
+    self.assertNotIn("DROP TABLE", sql)
+    self.assertNotIn("PRIMARY KEY", sql)
+    self.assertNotIn("COMMENT", sql)
+
+  def test_changed_constraint_is_replaced(self):
+    self._Split(_DDL)
+    self.store.MarkDeployed()
+    self._Split(_DDL.replace("REFERENCES jobs(id);",
+                             "REFERENCES jobs(id) ON DELETE CASCADE;"))
+    sql = self.store.PlanDeployment()
+    self.assertIn("ALTER TABLE hr.emp DROP CONSTRAINT emp_job_fk;", sql)
+    self.assertIn("ON DELETE CASCADE;", sql)
+    self.assertNotIn("ALTER COLUMN", sql)
+
+  def test_fallback_primary_key_is_replaced(self):
+    self._Split(_DDL.replace("ADD PRIMARY KEY (id)", "ADD PRIMARY KEY (rowid)")
+                .replace("CREATE INDEX emp_job_idx", "CREATE INDEX"))
+    self.store.MarkDeployed()
+    self._Split(_DDL.replace("CREATE INDEX emp_job_idx ON emp (job_id);\n",
+                             ""))
+    sql = self.store.PlanDeployment()
+    self.assertIn("ALTER TABLE hr.jobs DROP CONSTRAINT jobs_pkey;", sql)
+    self.assertIn("ALTER TABLE hr.jobs ADD PRIMARY KEY (id);", sql)
+    self.assertIn("DROP INDEX hr.emp_job_id_idx;", sql)
+    self.assertNotIn("DROP TABLE", sql)
+
+  def test_removed_table_is_dropped_only_when_allowed(self):
+    self._Split(_DDL)
+    self.store.MarkDeployed()
+    self._Split(_DDL.replace("CREATE TABLE emp", "CREATE TABLE staff"))
+    self.assertIn("-- DROP TABLE hr.emp;", self.store.PlanDeployment())
+    self.assertIn("\nDROP TABLE hr.emp;",
+                  self.store.PlanDeployment(allow_data_loss=True))
+
+  def test_sequences_views_and_functions(self):
+    ddl = _DDL + (
+        "CREATE SEQUENCE emp_seq INCREMENT 1 START 1;\n"
+        "CREATE VIEW emp_v AS SELECT id FROM emp;\n"
+        "CREATE FUNCTION raise() RETURNS int AS $$ SELECT 1 $$ LANGUAGE sql;\n"
+        "GRANT SELECT ON emp TO app;\n")
+    manifest = self._Split(ddl)
+    self.assertContainsSubset(
+        ["sequences/hr.emp_seq.sql", "views/hr.emp_v.sql",
+         "functions/hr.raise.sql", "other/hr.sql"], manifest)
+    sql = self.store.PlanDeployment()
+    self.assertLess(sql.index("CREATE SCHEMA IF NOT EXISTS hr;"),
+                    sql.index("CREATE SEQUENCE IF NOT EXISTS emp_seq"))
+    self.assertLess(sql.index("CREATE SEQUENCE IF NOT EXISTS emp_seq"),
+                    sql.index("CREATE TABLE jobs"))
+    self.assertIn("CREATE OR REPLACE VIEW emp_v", sql)
+    self.assertIn("CREATE OR REPLACE FUNCTION raise()", sql)
+    self.assertNotIn("ALTER SEQUENCE", sql)
+    self.store.MarkDeployed()
+
+    self._Split(ddl.replace("INCREMENT 1", "INCREMENT 5")
+                .replace("CREATE VIEW emp_v AS SELECT id FROM emp;\n", "")
+                .replace("COMMENT ON TABLE emp IS 'Employees';\n", "")
+                .replace("TO app;", "TO app;\nGRANT INSERT ON emp TO app;"))
+    sql = self.store.PlanDeployment()
+    self.assertIn("\nCREATE SEQUENCE IF NOT EXISTS emp_seq INCREMENT 5 START 1;"
+                  "\n", sql)
+    self.assertIn("\nALTER SEQUENCE emp_seq INCREMENT 5 START 1;\n", sql)
+    self.assertIn("\nDROP VIEW IF EXISTS emp_v;\n", sql)
+    self.assertIn("\nGRANT INSERT ON emp TO app;\n", sql)
+    self.assertIn("\n-- COMMENT ON TABLE emp IS 'Employees';\n", sql)
+    self.assertNotIn("GRANT SELECT", sql)
+    self.assertNotIn("FUNCTION", sql)
+    self.assertNotIn("CREATE TABLE", sql)
+
+  def test_removed_sequence_is_dropped_only_when_allowed(self):
+    self._Split(_DDL + "CREATE SEQUENCE emp_seq;\n")
+    self.store.MarkDeployed()
+    self._Split(_DDL)
+    self.assertIn("-- DROP SEQUENCE IF EXISTS emp_seq;",
+                  self.store.PlanDeployment())
+    self.assertIn("\nDROP SEQUENCE IF EXISTS emp_seq;",
+                  self.store.PlanDeployment(allow_data_loss=True))
+
+
+if __name__ == "__main__":
+  googletest.main()
@@ -0,0 +1,653 @@
+"""A model of the tables, constraints and indexes in converted DDL.
+
+ParseDdl reads ora2pg output into a Catalog of schemas, tables (with their
+columns and constraints) and indexes, keeping each object's statement so it
+can be written out again. Statements the model does not cover, such as views,
+sequences, comments and grants, are kept in order as other statements.
+
+Objects are compared by a normalized key rather than their text: names are
+qualified with the search_path in effect, types are reduced to the form
+format_type() returns, and constraint and index definitions drop the
+whitespace, casts, parentheses and default clauses PostgreSQL adds or omits
+when it prints them back from the catalog.
+"""
+
+import collections
+import re
+
+try:
+  from google3.experimental.dhercher.ora2pg_utils import ddl_parser  # pylint: disable=g-import-not-at-top
+except ModuleNotFoundError:
+  import ddl_parser  # pytype: disable=import-error  pylint: disable=g-import-not-at-top
+
+
+PRIMARY_KEY = "PRIMARY KEY"
+UNIQUE = "UNIQUE"
+FOREIGN_KEY = "FOREIGN KEY"
+CHECK = "CHECK"
+EXCLUDE = "EXCLUDE"
+
+# The labels PostgreSQL ends the names of unnamed constraints with.
+_NAME_LABELS = {PRIMARY_KEY: "pkey", UNIQUE: "key", FOREIGN_KEY: "fkey",
+                CHECK: "check", EXCLUDE: "excl"}
+# Constraints backed by an index, whose name is also the index's.
+_INDEX_KINDS = (PRIMARY_KEY, UNIQUE, EXCLUDE)
+
+IDENTITY_ALWAYS = "a"
+IDENTITY_BY_DEFAULT = "d"
+
+_TYPE_ALIASES = {
+    "int": "integer", "int4": "integer", "int8": "bigint",
+    "int2": "smallint", "float8": "double precision", "float": "double precision",
+    "float4": "real", "bool": "boolean", "decimal": "numeric",
+    "varchar": "character varying", "char": "character", "bpchar": "character",
+    "timestamptz": "timestamp with time zone", "timetz": "time with time zone",
+}
+_COLUMN_KEYWORD_RE = re.compile(
+    r"\b(?:NOT\s+NULL|NULL|DEFAULT|CONSTRAINT|PRIMARY\s+KEY|UNIQUE|CHECK|"
+    r"REFERENCES|GENERATED|COLLATE)\b", re.I)
+_TABLE_CONSTRAINT_RE = re.compile(
+    r"\s*(?:CONSTRAINT\s+(?P<name>%s)\s+)?"
+    r"(?P<kind>PRIMARY\s+KEY|UNIQUE|FOREIGN\s+KEY|CHECK|EXCLUDE)\b" %
+    ddl_parser.IDENTIFIER, re.I | re.S)
+_IDENTITY_RE = re.compile(
+    r"\bGENERATED\s+(ALWAYS|BY\s+DEFAULT)\s+AS\s+IDENTITY\b", re.I)
+_REFERENCES_RE = re.compile(r"\bREFERENCES\s+(%s)" % ddl_parser.NAME,
+                            re.I)
+_CAST_RE = re.compile(r"::\s*[a-z_][a-z_ ]*(?:\(\s*\d+(?:\s*,\s*\d+)?\s*\))?"
+                      r"(?:\[\])?")
+_DEFAULT_CLAUSES_RE = re.compile(
+    r"\b(?:on\s+(?:delete|update)\s+no\s+action|match\s+simple|"
+    r"not\s+deferrable|initially\s+immediate|using\s+btree)\b")
+_QUOTED_IDENTIFIER_RE = re.compile(r'"((?:[^"]|"")*)"')
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NAME_RE = re.compile(r"\s*(%s)\s*" % ddl_parser.NAME, re.S)
+_TRAILING_CASTS_RE = re.compile(
+    r"(?:::\s*%s(?:\s*\([\d\s,]*\))?(?:\[\])?\s*)*\Z" % ddl_parser.NAME,
+    re.S)
+# A name in a CHECK expression, with what follows it.
+_CHECK_NAME_RE = re.compile(
+    r"(?<![\w$#.\"])(%s)(?P<call>\s*[('])?" % ddl_parser.NAME, re.S)
+_CHECK_CAST_RE = re.compile(
+    r"::\s*%s(?:\s+(?:varying|precision|with(?:out)?\s+time\s+zone))?" %
+    ddl_parser.NAME, re.I | re.S)
+# Keywords of CHECK expressions which are not reserved words.
+_CHECK_KEYWORDS = frozenset(("between", "escape", "exists", "interval"))
+
+
+def NormalizeType(data_type):
+  """Return a type as PostgreSQL's format_type() would print it."""
+  text = re.sub(r"\s+", " ", data_type.strip().lower())
+  text = re.sub(r"\s*\(\s*", "(", text)
+  text = re.sub(r"\s*,\s*", ",", text)
+  text = re.sub(r"\s*\)", ")", text)
+  match = re.match(r"([a-z_][a-z0-9_ ]*?)(\(.*?\))?((?: [a-z ]+)?)(\[\])?\Z", text)
+  if not match:
+    return text
+  base, modifier, suffix, array = match.groups()
+  base = _TYPE_ALIASES.get(base, base)
+  modifier = modifier or ""
+  suffix = suffix or ""
+  if base == "character" and not modifier:
+    modifier = "(1)"
+  if base == "numeric" and modifier and "," not in modifier:
+    modifier = modifier[:-1] + ",0)"
+  if base in ("timestamp", "time"):
+    suffix = suffix or " without time zone"
+  return base + modifier + suffix + (array or "")
+
+
+def NormalizeDefinition(text, schema=None):
+  """Return a comparison key for a constraint, index or default definition.
+
+  Args:
+    text: The definition, eg. "FOREIGN KEY (a) REFERENCES t(b)".
+    schema: The schema unqualified referenced tables belong to.
+  """
+  if schema:
+    text = _REFERENCES_RE.sub(
+        lambda match: "REFERENCES " + ddl_parser.FormatName(
+            ddl_parser.QualifyName(ddl_parser.ParseName(match.group(1)),
+                                   schema)), text)
+  # Keep literals and identifiers which need quotes out of the lower casing.
+  saved = []
+
+  def _Save(value):
+    saved.append(value)
+    return "\0%d\0" % (len(saved) - 1)
+
+  text = _STRING_RE.sub(lambda match: _Save(match.group()), text)
+  text = _QUOTED_IDENTIFIER_RE.sub(
+      lambda match: _Save(ddl_parser.QuoteIdentifier(
+          match.group(1).replace('""', '"'))), text)
+  text = _CAST_RE.sub("", text.lower())
+  text = _DEFAULT_CLAUSES_RE.sub("", text)
+  text = re.sub(r"[\s()]+", "", text)
+  return re.sub(r"\0(\d+)\0", lambda match: saved[int(match.group(1))], text)
+
+
+def _ExpressionName(text):
+  """Return the name PostgreSQL gives an index expression's column."""
+  text = text.strip()
+  while (text.startswith("(") and
+         ddl_parser.FindClosingParen(text, 0) == len(text) - 1):
+    text = text[1:-1].strip()
+  match = _NAME_RE.match(text)
+  if not match:
+    return "expr"
+  name = ddl_parser.ParseName(match.group(1))[-1]
+  rest = text[match.end():]
+  if rest.startswith("("):
+    end = ddl_parser.FindClosingParen(text, match.end())
+    if end < 0:
+      return "expr"
+    if name == "cast":
+      # CAST (x AS type) is named after x, as x::type is.
+      arguments = text[match.end() + 1:end]
+      as_match = re.search(r"\bAS\b",
+                           ddl_parser.StripQuotedKeepLength(arguments), re.I)
+      name = _ExpressionName(arguments[:as_match.start()] if as_match
+                             else arguments)
+    rest = text[end + 1:]
+  return name if _TRAILING_CASTS_RE.match(rest) else "expr"
+
+
+def _ElementName(element):
+  """Return the name PostgreSQL gives the column of an index element."""
+  text = element.strip()
+  if text.startswith("("):
+    return _ExpressionName(text[1:ddl_parser.FindClosingParen(text, 0)])
+  match = _NAME_RE.match(text)
+  if not match:
+    return "expr"
+  if text[match.end():].startswith("("):
+    # A function call, followed by the element's collation, operator class
+    # or ordering.
+    return _ExpressionName(
+        text[:ddl_parser.FindClosingParen(text, match.end()) + 1])
+  return ddl_parser.ParseName(match.group(1))[-1]
+
+
+def _ElementNames(definition):
+  """Return the column names PostgreSQL puts in an unnamed index's name.
+
+  Args:
+    definition: The definition, from its parenthesized column list on, eg.
+        "(a, lower(b)) INCLUDE (c)" or "UNIQUE (a)".
+  """
+  start = definition.index("(")
+  end = ddl_parser.FindClosingParen(definition, start)
+  elements = ddl_parser.SplitTopLevel(definition[start + 1:end])
+  include = re.match(r"\s*INCLUDE\s*\(", definition[end + 1:], re.I)
+  if include:
+    start = end + include.end()
+    elements += ddl_parser.SplitTopLevel(
+        definition[start + 1:ddl_parser.FindClosingParen(definition, start)])
+  names = []
+  for element in elements:
+    base = name = _ElementName(element)
+    number = 0
+    while name in names:
+      number += 1
+      name = "%s%d" % (base, number)
+    names.append(name)
+  return tuple(names)
+
+
+def _CheckColumns(definition):
+  """Return the column an unnamed CHECK constraint is named after, if any.
+
+  PostgreSQL names the constraint after its column only when the expression
+  references exactly one.
+  """
+  text = _CHECK_CAST_RE.sub("", _STRING_RE.sub("''", definition))
+  text = text[text.index("("):]
+  columns = set()
+  for match in _CHECK_NAME_RE.finditer(text):
+    if match.group("call"):
+      # A function call, or the type of a literal such as DATE '2000-01-01'.
+      continue
+    parts = ddl_parser.ParseName(match.group(1))
+    if not match.group(1).startswith('"') and (
+        parts[-1] in ddl_parser.RESERVED_WORDS or
+        parts[-1] in _CHECK_KEYWORDS):
+      continue
+    columns.add(parts[-1])
+  return tuple(columns) if len(columns) == 1 else ()
+
+
+class Column(object):
+  """A table column."""
+
+  __slots__ = ("name", "data_type", "not_null", "default", "identity")
+
+  def __init__(self, name, data_type, not_null=False, default=None,
+               identity=None):
+    self.name = name
+    self.data_type = data_type
+    self.not_null = not_null
+    self.default = default
+    self.identity = identity
+
+  @property
+  def type_key(self):
+    return NormalizeType(self.data_type)
+
+  @property
+  def default_key(self):
+    return NormalizeDefinition(self.default) if self.default else None
+
+  def Definition(self):
+    """Return the column definition as used by ADD COLUMN."""
+    parts = [ddl_parser.QuoteIdentifier(self.name), self.data_type]
+    if self.identity:
+      parts.append("GENERATED %s AS IDENTITY" % (
+          "ALWAYS" if self.identity == IDENTITY_ALWAYS else "BY DEFAULT"))
+    elif self.default:
+      parts.append("DEFAULT " + self.default)
+    if self.not_null:
+      parts.append("NOT NULL")
+    return " ".join(parts)
+
+
+class Constraint(object):
+  """A table constraint, declared in CREATE TABLE or by ALTER TABLE ADD."""
+
+  __slots__ = ("table", "name", "kind", "definition", "key", "statement",
+               "default_name")
+
+  def __init__(self, table, name, kind, definition, schema=None,
+               statement=None):
+    """Initialize the Constraint.
+
+    Args:
+      table: The qualified table name tuple.
+      name: The constraint name, or None when it was not named.
+      kind: One of PRIMARY_KEY, UNIQUE, FOREIGN_KEY, CHECK or EXCLUDE.
+      definition: The definition, eg. "PRIMARY KEY (id)".
+      schema: The schema unqualified referenced tables belong to.
+      statement: The ALTER TABLE statement adding it, or None when it is
+          declared in its CREATE TABLE.
+    """
+    self.table = table
+    self.name = name
+    self.kind = kind
+    self.definition = definition
+    self.key = NormalizeDefinition(definition, schema)
+    self.statement = statement
+    # The name PostgreSQL chose for it when it was not named.
+    self.default_name = None
+
+  def DefaultName(self, number=0):
+    """Return the name PostgreSQL gives the constraint when it is unnamed.
+
+    Args:
+      number: Added to the label, as PostgreSQL does when the name without
+          it is taken.
+    """
+    if self.kind == PRIMARY_KEY:
+      columns = ()
+    elif self.kind == CHECK:
+      columns = _CheckColumns(self.definition)
+    else:
+      columns = _ElementNames(self.definition)
+    return ddl_parser.MakeObjectName(
+        self.table[-1], columns,
+        "%s%s" % (_NAME_LABELS[self.kind], number or ""))
+
+  def GetName(self):
+    return self.name or self.default_name or self.DefaultName()
+
+  def AddStatement(self):
+    constraint = ("CONSTRAINT %s " % ddl_parser.QuoteIdentifier(self.name)
+                  if self.name else "")
+    return "ALTER TABLE %s ADD %s%s;" % (ddl_parser.FormatName(self.table),
+                                         constraint, self.definition)
+
+  def DropStatement(self):
+    return "ALTER TABLE %s DROP CONSTRAINT %s;" % (
+        ddl_parser.FormatName(self.table),
+        ddl_parser.QuoteIdentifier(self.GetName()))
+
+
+class Index(object):
+  """An index which does not back a constraint."""
+
+  __slots__ = ("name", "table", "unique", "method", "definition", "key",
+               "statement", "default_name")
+
+  def __init__(self, name, table, unique, method, definition, schema=None,
+               statement=None):
+    self.name = name
+    self.table = table
+    self.unique = unique
+    self.method = (method or "btree").lower()
+    self.definition = definition
+    self.key = (table, unique, self.method,
+                NormalizeDefinition(definition, schema))
+    self.statement = statement
+    # The name PostgreSQL chose for it when it was not named.
+    self.default_name = None
+
+  def DefaultName(self, number=0):
+    """Return the name PostgreSQL gives the index when it is unnamed."""
+    return ddl_parser.MakeObjectName(self.table[-1],
+                                     _ElementNames(self.definition),
+                                     "idx%s" % (number or ""))
+
+  def GetName(self):
+    return self.name or self.default_name or self.DefaultName()
+
+  def CreateStatement(self, concurrently=False):
+    return "CREATE %sINDEX %s%sON %s USING %s %s;" % (
+        "UNIQUE " if self.unique else "",
+        "CONCURRENTLY " if concurrently else "",
+        ddl_parser.QuoteIdentifier(self.name) + " " if self.name else "",
+        ddl_parser.FormatName(self.table), self.method, self.definition)
+
+  def DropStatement(self):
+    schema = self.table[:-1]
+    return "DROP INDEX %s;" % ddl_parser.FormatName(
+        schema + (self.GetName(),))
+
+
+class Table(object):
+  """A table with its columns and constraints."""
+
+  __slots__ = ("name", "columns", "constraints", "statement", "search_path")
+
+  def __init__(self, name, statement=None, search_path=None):
+    self.name = name
+    self.columns = collections.OrderedDict()
+    self.constraints = []
+    self.statement = statement
+    self.search_path = search_path
+
+  @property
+  def schema(self):
+    return self.name[0] if len(self.name) > 1 else None
+
+  def GetConstraints(self, kind):
+    return [c for c in self.constraints if c.kind == kind]
+
+
+class Catalog(object):
+  """The schemas, tables and indexes of a database or of converted DDL."""
+
+  def __init__(self):
+    self.schemas = set()
+    self.tables = collections.OrderedDict()
+    self.indexes = collections.OrderedDict()
+    # (search_path, statement) for statements outside the model, in order.
+    self.other_statements = []
+
+  def AddTable(self, table):
+    self.tables[table.name] = table
+    if table.schema:
+      self.schemas.add(table.schema)
+
+  def GetConstraints(self):
+    for table in self.tables.values():
+      for constraint in table.constraints:
+        yield constraint
+
+
+def _SetPrimaryKeyNotNull(table, definition):
+  """Mark the columns of a PRIMARY KEY definition NOT NULL, as PG does."""
+  start = definition.index("(")
+  columns = definition[start + 1:ddl_parser.FindClosingParen(definition, start)]
+  for name in ddl_parser.SplitTopLevel(columns):
+    column = table.columns.get(ddl_parser.ParseName(name.strip())[0])
+    if column:
+      column.not_null = True
+
+
+def FindColumnType(element):
+  """Return (name, start, end) of the data type in a column definition.
+
+  Args:
+    element: One element of a CREATE TABLE body, from SplitTopLevel.
+
+  Returns:
+    The column name and the offsets of its data type in element, or None
+    when element is a table constraint or LIKE clause.
+  """
+  if (_TABLE_CONSTRAINT_RE.match(element) or
+      re.match(r"\s*LIKE\b", element, re.I)):
+    return None
+  match = re.match(r"\s*(%s)\s+" % ddl_parser.IDENTIFIER, element, re.S)
+  if not match:
+    return None
+  keyword = _COLUMN_KEYWORD_RE.search(
+      ddl_parser.StripQuotedKeepLength(element), match.end())
+  end = keyword.start() if keyword else len(element)
+  end = match.end() + len(element[match.end():end].rstrip())
+  return ddl_parser.ParseName(match.group(1))[0], match.end(), end
+
+
+def _ParseColumn(text, table_name, schema):
+  """Return (Column, [inline Constraints]) for a column definition."""
+  name, start, end = FindColumnType(text)
+  data_type = text[start:end]
+  clauses = text[end:].strip()
+  blanked = ddl_parser.StripQuotedKeepLength(clauses)
+
+  column = Column(name, data_type)
+  column.not_null = bool(re.search(r"\bNOT\s+NULL\b", blanked, re.I))
+  identity = _IDENTITY_RE.search(blanked)
+  if identity:
+    column.identity = (IDENTITY_ALWAYS if identity.group(1).upper() == "ALWAYS"
+                       else IDENTITY_BY_DEFAULT)
+    column.not_null = True
+  default = re.search(r"\bDEFAULT\b", blanked, re.I)
+  if default:
+    end = _COLUMN_KEYWORD_RE.search(blanked, default.end())
+    column.default = clauses[default.end():end.start() if end else None
+                             ].strip()
+
+  constraints = []
+  quoted_name = ddl_parser.QuoteIdentifier(name)
+  for match in re.finditer(
+      r"(?:\bCONSTRAINT\s+(%s)\s+)?\b(PRIMARY\s+KEY|UNIQUE|CHECK|REFERENCES)\b"
+      % ddl_parser.IDENTIFIER, blanked, re.I):
+    constraint_name = (ddl_parser.ParseName(clauses[match.start(1):match.end(1)])
+                       [0] if match.group(1) else None)
+    kind = re.sub(r"\s+", " ", match.group(2).upper())
+    if kind == PRIMARY_KEY:
+      column.not_null = True
+      definition = "PRIMARY KEY (%s)" % quoted_name
+    elif kind == UNIQUE:
+      definition = "UNIQUE (%s)" % quoted_name
+    elif kind == CHECK:
+      start = clauses.index("(", match.end(2))
+      definition = "CHECK " + clauses[start:ddl_parser.FindClosingParen(
+          clauses, start) + 1]
+    else:
+      kind = FOREIGN_KEY
+      end = _COLUMN_KEYWORD_RE.search(blanked, match.end(2))
+      references = clauses[match.start(2):end.start() if end else None]
+      definition = "FOREIGN KEY (%s) %s" % (quoted_name, references.strip())
+    constraints.append(Constraint(table_name, constraint_name, kind,
+                                  definition, schema))
+  return column, constraints
+
+
+def ParseCreateTable(statement, match, schema=None):
+  """Return the Table created by a statement matching CREATE_TABLE_RE."""
+  name = ddl_parser.QualifyName(ddl_parser.ParseName(match.group("name")),
+                                schema)
+  table = Table(name, statement=statement, search_path=schema)
+  start = match.end() - 1
+  body = statement[start + 1:ddl_parser.FindClosingParen(statement, start)]
+  for element in ddl_parser.SplitTopLevel(body):
+    if not ddl_parser.StripQuoted(element).strip():
+      continue
+    constraint = _TABLE_CONSTRAINT_RE.match(element)
+    if constraint:
+      table.constraints.append(Constraint(
+          name,
+          (ddl_parser.ParseName(constraint.group("name"))[0]
+           if constraint.group("name") else None),
+          re.sub(r"\s+", " ", constraint.group("kind").upper()),
+          element[constraint.start("kind"):].strip(), schema))
+    elif re.match(r"\s*LIKE\b", element, re.I):
+      continue
+    else:
+      column, constraints = _ParseColumn(element, name, schema)
+      table.columns[column.name] = column
+      table.constraints.extend(constraints)
+  for constraint in table.GetConstraints(PRIMARY_KEY):
+    _SetPrimaryKeyNotNull(table, constraint.definition)
+  return table
+
+
+def _TakenNames(obj, name):
+  """Return the keys of the names a constraint or index named name takes."""
+  relation = obj.table[:-1] + (name,)
+  if isinstance(obj, Index):
+    return [relation]
+  # Constraint names are kept per table, and a constraint backed by an index
+  # also takes the index's name in the schema.
+  if obj.kind in _INDEX_KINDS:
+    return [(obj.table, name), relation]
+  return [(obj.table, name)]
+
+
+def _UsedNames(catalog):
+  """Return the keys of the names taken by the objects in a catalog."""
+  used = set(catalog.tables)
+  for constraint in catalog.GetConstraints():
+    used.update(_TakenNames(constraint, constraint.GetName()))
+  for index in catalog.indexes.values():
+    used.update(_TakenNames(index, index.GetName()))
+  return used
+
+
+def _ChooseName(obj, used):
+  """Return the name of a constraint or index, choosing it as PostgreSQL does.
+
+  An unnamed object gets the first of its default names which is not taken,
+  as its default_name.
+
+  Args:
+    obj: The Constraint or Index.
+    used: The keys of the names taken so far, which its name is added to.
+  """
+  name = obj.name
+  if not name:
+    number = 0
+    while any(key in used
+              for key in _TakenNames(obj, obj.DefaultName(number))):
+      number += 1
+    name = obj.default_name = obj.DefaultName(number)
+  used.update(_TakenNames(obj, name))
+  return name
+
+
+def RerunnableStatement(statement):
+  """Return a statement in a form which succeeds when its object exists.
+
+  Views, functions and procedures are created or replaced, sequences and
+  materialized views are created if they do not exist, and comments, grants,
+  ownership changes and settings are returned unchanged. Schemas are created
+  if they do not exist.
+
+  Returns:
+    The statement to run, or None when it has no form which can safely run
+    again, eg. CREATE TRIGGER or DROP.
+  """
+  create = ddl_parser.CREATE_OBJECT_RE.match(statement)
+  if create:
+    kind = re.sub(r"\s+", " ", create.group("kind").upper())
+    if kind in ("VIEW", "FUNCTION", "PROCEDURE"):
+      if create.group("replace"):
+        return statement
+      return (statement[:create.start("kind")] + "OR REPLACE " +
+              statement[create.start("kind"):])
+    if kind in ("SEQUENCE", "MATERIALIZED VIEW"):
+      if create.group("if_not_exists"):
+        return statement
+      return (statement[:create.start("name")] + "IF NOT EXISTS " +
+              statement[create.start("name"):])
+    return None
+  create_schema = ddl_parser.CREATE_SCHEMA_RE.match(statement)
+  if create_schema:
+    if re.search(r"\bIF\s+NOT\s+EXISTS\b",
+                 statement[:create_schema.start("name")], re.I):
+      return statement
+    return (statement[:create_schema.start("name")] + "IF NOT EXISTS " +
+            statement[create_schema.start("name"):])
+  if ddl_parser.RERUNNABLE_RE.match(statement):
+    return statement
+  return None
+
+
+def ParseDdl(statements, catalog=None):
+  """Return a Catalog of the objects created by DDL statements.
+
+  Args:
+    statements: An iterable of statement texts from SplitStatements.
+    catalog: A Catalog to add to, eg. one shared by several files.
+  """
+  catalog = catalog or Catalog()
+  used = _UsedNames(catalog)
+  schema = None
+  for statement in statements:
+    if not ddl_parser.StripQuoted(statement).strip():
+      continue
+    create = ddl_parser.CREATE_TABLE_RE.match(statement)
+    if create:
+      table = ParseCreateTable(statement, create, schema)
+      catalog.AddTable(table)
+      used.add(table.name)
+      for constraint in table.constraints:
+        _ChooseName(constraint, used)
+      continue
+
+    alter = ddl_parser.ALTER_TABLE_ADD_RE.match(statement)
+    if alter:
+      table_name = ddl_parser.QualifyName(
+          ddl_parser.ParseName(alter.group("name")), schema)
+      table = catalog.tables.get(table_name)
+      if table:
+        definition = alter.group("definition")
+        kind = re.match(r"PRIMARY\s+KEY|UNIQUE|FOREIGN\s+KEY|CHECK|EXCLUDE",
+                        definition, re.I).group()
+        kind = re.sub(r"\s+", " ", kind.upper())
+        constraint = Constraint(
+            table_name,
+            (ddl_parser.ParseName(alter.group("constraint"))[0]
+             if alter.group("constraint") else None),
+            kind, definition, schema, statement=statement)
+        table.constraints.append(constraint)
+        _ChooseName(constraint, used)
+        if kind == PRIMARY_KEY:
+          _SetPrimaryKeyNotNull(table, definition)
+        continue
+
+    index = ddl_parser.CREATE_INDEX_RE.match(statement)
+    if index:
+      table_name = ddl_parser.QualifyName(
+          ddl_parser.ParseName(index.group("table")), schema)
+      name = (ddl_parser.ParseName(index.group("name"))[0]
+              if index.group("name") else None)
+      new_index = Index(
+          name, table_name, bool(index.group("unique")), index.group("method"),
+          index.group("definition"), schema, statement=statement)
+      catalog.indexes[table_name[:-1] + (_ChooseName(new_index, used),)] = (
+          new_index)
+      continue
+
+    create_schema = ddl_parser.CREATE_SCHEMA_RE.match(statement)
+    if create_schema:
+      catalog.schemas.add(ddl_parser.ParseName(create_schema.group("name"))[0])
+    search_path = ddl_parser.SEARCH_PATH_RE.match(statement)
+    if search_path:
+      schema = ddl_parser.ParseName(search_path.group("schema"))[0]
+    catalog.other_statements.append((schema, statement))
+  return catalog
+
+
+def ParseFile(path, catalog=None):
+  with open(path) as ddl_file:
+    return ParseDdl(ddl_parser.SplitStatements(ddl_file), catalog)
@@ -0,0 +1,165 @@
+"""Tests for google3.experimental.dhercher.ora2pg_utils.ddl_model."""
+
+from google3.experimental.dhercher.ora2pg_utils import ddl_model
+from google3.experimental.dhercher.ora2pg_utils import ddl_parser
+from google3.testing.pybase import googletest
+
+_DDL = """SET client_encoding TO 'UTF8';
+CREATE SCHEMA IF NOT EXISTS hr;
+SET search_path = hr,public;
+
+CREATE TABLE jobs (
+\tid numeric(10) NOT NULL,
+\ttitle varchar(35) DEFAULT 'none',
+\t"Order" int CONSTRAINT jobs_order_ck CHECK ("Order" > 0),
+\tPRIMARY KEY (id)
+) ;
+CREATE TABLE emp (
+\tid bigint GENERATED ALWAYS AS IDENTITY,
+\tjob_id numeric(10) REFERENCES jobs(id),
+\thired timestamp
+) ;
+ALTER TABLE emp ADD CONSTRAINT emp_pk PRIMARY KEY (id);
+CREATE INDEX emp_hired_idx ON emp (hired);
+COMMENT ON TABLE emp IS 'Employees';
+"""
+
+
+def _Parse(sql):
+  return ddl_model.ParseDdl(ddl_parser.SplitStatements(sql.splitlines(True)))
+
+
+class NormalizeTest(googletest.TestCase):
+
+  def test_normalize_type(self):
+    self.assertEqual(ddl_model.NormalizeType("VARCHAR( 35 )"),
+                     "character varying(35)")
+    self.assertEqual(ddl_model.NormalizeType("numeric(10, 2)"),
+                     "numeric(10,2)")
+    self.assertEqual(ddl_model.NormalizeType("timestamp"),
+                     "timestamp without time zone")
+    self.assertEqual(ddl_model.NormalizeType("char"), "character(1)")
+    self.assertEqual(ddl_model.NormalizeType("numeric(10)"), "numeric(10,0)")
+    self.assertEqual(ddl_model.NormalizeType("int8[]"), "bigint[]")
+
+  def test_normalize_definition_matches_catalog_form(self):
+    self.assertEqual(
+        ddl_model.NormalizeDefinition("FOREIGN KEY (job_id) REFERENCES jobs(id)",
+                                      "hr"),
+        ddl_model.NormalizeDefinition(
+            "FOREIGN KEY (job_id) REFERENCES hr.jobs(id) MATCH SIMPLE "
+            "ON DELETE NO ACTION"))
+    self.assertEqual(
+        ddl_model.NormalizeDefinition("CHECK (title <> 'A B')"),
+        ddl_model.NormalizeDefinition(
+            "CHECK (((title)::text <> 'A B'::text))"))
+
+  def test_normalize_definition_keeps_case_of_quoted_parts(self):
+    self.assertNotEqual(ddl_model.NormalizeDefinition('UNIQUE ("Id")'),
+                        ddl_model.NormalizeDefinition("UNIQUE (id)"))
+    self.assertNotEqual(ddl_model.NormalizeDefinition("CHECK (a = 'X')"),
+                        ddl_model.NormalizeDefinition("CHECK (a = 'x')"))
+
+  def test_find_column_type(self):
+    element = '\n\t"Order" numeric(10, 2) DEFAULT 0 NOT NULL'
+    name, start, end = ddl_model.FindColumnType(element)
+    self.assertEqual((name, element[start:end]), ("Order", "numeric(10, 2)"))
+    self.assertIsNone(ddl_model.FindColumnType(" PRIMARY KEY (id)"))
+    self.assertIsNone(ddl_model.FindColumnType(" CONSTRAINT c CHECK (a > 0)"))
+
+  def test_rerunnable_statement(self):
+    rerunnable = ddl_model.RerunnableStatement
+    self.assertEqual(rerunnable("CREATE VIEW v AS SELECT 1;"),
+                     "CREATE OR REPLACE VIEW v AS SELECT 1;")
+    self.assertEqual(
+        rerunnable("CREATE OR REPLACE FUNCTION f() RETURNS int AS $$ $$;"),
+        "CREATE OR REPLACE FUNCTION f() RETURNS int AS $$ $$;")
+    self.assertEqual(rerunnable("CREATE SEQUENCE hr.s START 1;"),
+                     "CREATE SEQUENCE IF NOT EXISTS hr.s START 1;")
+    self.assertEqual(rerunnable("COMMENT ON TABLE t IS 'x';"),
+                     "COMMENT ON TABLE t IS 'x';")
+    self.assertEqual(rerunnable("ALTER VIEW v OWNER TO hr;"),
+                     "ALTER VIEW v OWNER TO hr;")
+    self.assertIsNone(rerunnable("CREATE TRIGGER t BEFORE INSERT ON t;"))
+    self.assertIsNone(rerunnable("DROP VIEW v;"))
+
+
+class ParseDdlTest(googletest.TestCase):
+
+  def setUp(self):
+    super().setUp()
+    self.catalog = _Parse(_DDL)
+
+  def test_tables_and_columns(self):
+    self.assertEqual(list(self.catalog.tables),
+                     [("hr", "jobs"), ("hr", "emp")])
+    self.assertEqual(self.catalog.schemas, {"hr"})
+    jobs = self.catalog.tables[("hr", "jobs")]
+    self.assertEqual(list(jobs.columns), ["id", "title", "Order"])
+    self.assertTrue(jobs.columns["id"].not_null)
+    self.assertEqual(jobs.columns["title"].data_type, "varchar(35)")
+    self.assertEqual(jobs.columns["title"].default, "'none'")
+    self.assertEqual(jobs.search_path, "hr")
+
+  def test_identity(self):
+    column = self.catalog.tables[("hr", "emp")].columns["id"]
+    self.assertEqual(column.identity, ddl_model.IDENTITY_ALWAYS)
+    self.assertEqual(column.Definition(),
+                     "id bigint GENERATED ALWAYS AS IDENTITY NOT NULL")
+
+  def test_primary_key_columns_are_not_null(self):
+    catalog = _Parse("CREATE TABLE t (a int, b int);\n"
+                     "ALTER TABLE t ADD PRIMARY KEY (a);\n")
+    columns = catalog.tables[("t",)].columns
+    self.assertTrue(columns["a"].not_null)
+    self.assertFalse(columns["b"].not_null)
+
+  def test_constraints(self):
+    jobs = self.catalog.tables[("hr", "jobs")]
+    self.assertEqual([(c.name, c.kind) for c in jobs.constraints],
+                     [("jobs_order_ck", ddl_model.CHECK),
+                      (None, ddl_model.PRIMARY_KEY)])
+    emp = self.catalog.tables[("hr", "emp")]
+    foreign_key, primary_key = emp.constraints
+    self.assertEqual(foreign_key.definition,
+                     "FOREIGN KEY (job_id) REFERENCES jobs(id)")
+    self.assertIsNone(foreign_key.statement)
+    self.assertEqual(primary_key.AddStatement(),
+                     "ALTER TABLE hr.emp ADD CONSTRAINT emp_pk "
+                     "PRIMARY KEY (id);")
+    self.assertIsNotNone(primary_key.statement)
+
+  def test_unnamed_objects_get_postgresql_names(self):
+    catalog = _Parse(
+        "CREATE TABLE t (a int UNIQUE, b int CHECK (b > 0), c date,\n"
+        "  CHECK (a < b), UNIQUE (a), CHECK (c > DATE '2000-01-01'));\n"
+        "ALTER TABLE t ADD PRIMARY KEY (a);\n"
+        "CREATE INDEX ON t (a, lower(b::text) DESC) INCLUDE (c);\n"
+        "CREATE INDEX ON t ((a + b));\n"
+        "CREATE INDEX ON t ((a + b));\n")
+    table = catalog.tables[("t",)]
+    self.assertEqual([c.GetName() for c in table.constraints],
+                     ["t_a_key", "t_b_check", "t_check", "t_a_key1",
+                      "t_c_check", "t_pkey"])
+    self.assertEqual(list(catalog.indexes),
+                     [("t_a_lower_c_idx",), ("t_expr_idx",), ("t_expr_idx1",)])
+    self.assertEqual(table.constraints[-1].DropStatement(),
+                     "ALTER TABLE t DROP CONSTRAINT t_pkey;")
+    self.assertEqual(catalog.indexes[("t_expr_idx1",)].DropStatement(),
+                     "DROP INDEX t_expr_idx1;")
+
+  def test_indexes_and_other_statements(self):
+    index = self.catalog.indexes[("hr", "emp_hired_idx")]
+    self.assertEqual(index.table, ("hr", "emp"))
+    self.assertEqual(index.CreateStatement(concurrently=True),
+                     "CREATE INDEX CONCURRENTLY emp_hired_idx ON hr.emp "
+                     "USING btree (hired);")
+    self.assertEqual(index.DropStatement(), "DROP INDEX hr.emp_hired_idx;")
+    self.assertEqual(
+        [(path, statement.strip().split()[0])
+         for path, statement in self.catalog.other_statements],
+        [(None, "SET"), (None, "CREATE"), ("hr", "SET"), ("hr", "COMMENT")])
+
+
+if __name__ == "__main__":
+  googletest.main()
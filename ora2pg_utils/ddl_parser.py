@@ -0,0 +1,242 @@
+"""Split converted DDL into statements and read the names they act on.
+
+SplitStatements reads SQL a line at a time and yields each statement's exact
+text, so a file can be rewritten statement by statement without holding it in
+memory, and joining the statements gives back the input unchanged. Semicolons
+inside string literals, quoted identifiers, comments and dollar quoted bodies
+do not end a statement, and psql meta-commands such as "\\set" end at the
+end of their line.
+
+Names are compared as tuples of their parts, folding unquoted parts to lower
+case as PostgreSQL does, so "HR.Jobs", hr.jobs and "hr"."jobs" are the same
+table.
+"""
+
+import re
+
+IDENTIFIER = r'(?:"(?:[^"]|"")*"|[A-Za-z_][\w$#]*)'
+NAME = r"%s(?:\s*\.\s*%s)*" % (IDENTIFIER, IDENTIFIER)
+# Whitespace and comments ahead of a statement's first keyword.
+_LEADING = r"\A(?:\s+|--[^\n]*(?:\n|\Z)|/\*.*?\*/)*"
+
+_TOKEN_RE = re.compile(r"""'|"|--|/\*|\$(?:[A-Za-z_]\w*)?\$|;""")
+_IDENTIFIER_RE = re.compile(IDENTIFIER)
+_PLAIN_IDENTIFIER_RE = re.compile(r"[a-z_][a-z0-9_$]*\Z")
+_QUOTED_RE = re.compile(r"""'(?:[^']|'')*'|"(?:[^"]|"")*"|--[^\n]*|/\*.*?\*/""",
+                        re.S)
+
+CREATE_TABLE_RE = re.compile(
+    _LEADING + r"CREATE\s+(?:(?:GLOBAL|LOCAL)\s+)?"
+    r"(?:(?:TEMPORARY|TEMP|UNLOGGED)\s+)?TABLE\s+(?:IF\s+NOT\s+EXISTS\s+)?"
+    r"(?P<name>%s)\s*\(" % NAME, re.I | re.S)
+ALTER_TABLE_PK_RE = re.compile(
+    _LEADING + r"ALTER\s+TABLE\s+(?:IF\s+EXISTS\s+)?(?:ONLY\s+)?"
+    r"(?P<name>%s)\s+ADD\s+(?:CONSTRAINT\s+%s\s+)?PRIMARY\s+KEY\b" %
+    (NAME, IDENTIFIER), re.I | re.S)
+ALTER_TABLE_ADD_RE = re.compile(
+    _LEADING + r"ALTER\s+TABLE\s+(?:IF\s+EXISTS\s+)?(?:ONLY\s+)?"
+    r"(?P<name>%s)\s+ADD\s+(?:CONSTRAINT\s+(?P<constraint>%s)\s+)?"
+    r"(?P<definition>(?:PRIMARY\s+KEY|UNIQUE|FOREIGN\s+KEY|CHECK|EXCLUDE)\b"
+    r".*?)\s*;?\s*\Z" % (NAME, IDENTIFIER), re.I | re.S)
+CREATE_INDEX_RE = re.compile(
+    _LEADING + r"CREATE\s+(?P<unique>UNIQUE\s+)?INDEX\s+"
+    r"(?P<concurrently>CONCURRENTLY\s+)?(?:IF\s+NOT\s+EXISTS\s+)?"
+    r"(?:(?P<name>%s)\s+)?ON\s+(?:ONLY\s+)?(?P<table>%s)\s*"
+    r"(?:USING\s+(?P<method>\w+)\s*)?(?P<definition>\(.*?)\s*;?\s*\Z" %
+    (IDENTIFIER, NAME), re.I | re.S)
+CREATE_SCHEMA_RE = re.compile(
+    _LEADING + r"CREATE\s+SCHEMA\s+(?:IF\s+NOT\s+EXISTS\s+)?"
+    r"(?P<name>%s)" % IDENTIFIER, re.I | re.S)
+SEARCH_PATH_RE = re.compile(
+    _LEADING + r"SET\s+(?:SESSION\s+|LOCAL\s+)?search_path\s*(?:=|TO)\s*"
+    r"(?P<schema>%s)" % IDENTIFIER, re.I | re.S)
+PRIMARY_KEY_RE = re.compile(r"\bPRIMARY\s+KEY\b", re.I)
+CREATE_OBJECT_RE = re.compile(
+    _LEADING + r"CREATE\s+(?P<replace>OR\s+REPLACE\s+)?"
+    r"(?P<kind>SEQUENCE|(?:MATERIALIZED\s+)?VIEW|FUNCTION|PROCEDURE|TRIGGER|"
+    r"TYPE)\s+(?P<if_not_exists>IF\s+NOT\s+EXISTS\s+)?(?P<name>%s)" % NAME,
+    re.I | re.S)
+# Statements which succeed however often they are run.
+RERUNNABLE_RE = re.compile(
+    _LEADING + r"(?:(?:COMMENT\s+ON|GRANT|REVOKE|SET)\b|"
+    r"ALTER\s[^;]*\bOWNER\s+TO\b|\\)", re.I | re.S)
+
+# PostgreSQL keywords which must be quoted when used as a column name.
+RESERVED_WORDS = frozenset("""
+    all analyse analyze and any array as asc asymmetric authorization binary
+    both case cast check collate collation column concurrently constraint
+    create cross current_catalog current_date current_role current_schema
+    current_time current_timestamp current_user default deferrable desc
+    distinct do else end except false fetch for foreign freeze from full grant
+    group having ilike in initially inner intersect into is isnull join lateral
+    leading left like limit localtime localtimestamp natural not notnull null
+    offset on only or order outer overlaps placing primary references
+    returning right select session_user similar some symmetric table
+    tablesample then to trailing true union unique user using variadic
+    verbose when where window with""".split())
+# PostgreSQL truncates longer identifiers.
+MAX_NAME_LENGTH = 63
+
+
+def SplitStatements(lines):
+  """Yield the text of each statement in an iterable of lines.
+
+  Each statement runs to its terminating semicolon, and the whitespace and
+  comments that follow it start the next statement. Any trailing text
+  without a semicolon is yielded last.
+  """
+  buffer = []
+  has_content = False
+  state = None
+  for line in lines:
+    if state is None and not has_content and line.lstrip().startswith("\\"):
+      buffer.append(line)
+      yield "".join(buffer)
+      buffer = []
+      continue
+    if state is None and not _TOKEN_RE.search(line):
+      # Most lines of a table definition need no further scanning.
+      has_content = has_content or bool(line.strip())
+      buffer.append(line)
+      continue
+
+    start = 0
+    pos = 0
+    while pos < len(line):
+      if state is None:
+        match = _TOKEN_RE.search(line, pos)
+        if not match:
+          if line[pos:].strip():
+            has_content = True
+          break
+        if line[pos:match.start()].strip():
+          has_content = True
+        token = match.group()
+        pos = match.end()
+        if token == "--":
+          break
+        elif token == ";":
+          buffer.append(line[start:pos])
+          yield "".join(buffer)
+          buffer = []
+          start = pos
+          has_content = False
+        else:
+          if token != "/*":
+            has_content = True
+          state = token
+      else:
+        end = "*/" if state == "/*" else state
+        found = line.find(end, pos)
+        if found < 0:
+          break
+        pos = found + len(end)
+        state = None
+    if start < len(line):
+      buffer.append(line[start:])
+
+  if buffer:
+    yield "".join(buffer)
+
+
+def StripQuoted(text):
+  """Return text with literals, quoted identifiers and comments blanked."""
+  return _QUOTED_RE.sub(" ", text)
+
+
+def ParseName(text):
+  """Return the normalized parts of a possibly qualified, quoted name."""
+  parts = []
+  for part in _IDENTIFIER_RE.findall(text):
+    if part.startswith('"'):
+      parts.append(part[1:-1].replace('""', '"'))
+    else:
+      parts.append(part.lower())
+  return tuple(parts)
+
+
+def CompactName(text):
+  """Return a name as written, without whitespace around its dots."""
+  return ".".join(_IDENTIFIER_RE.findall(text))
+
+
+def QuoteIdentifier(part):
+  if _PLAIN_IDENTIFIER_RE.match(part) and part not in RESERVED_WORDS:
+    return part
+  return '"%s"' % part.replace('"', '""')
+
+
+def FormatName(parts):
+  return ".".join(QuoteIdentifier(part) for part in parts)
+
+
+def QualifyName(parts, schema):
+  """Add the schema to an unqualified name when a schema is known."""
+  if len(parts) == 1 and schema:
+    return (schema,) + parts
+  return parts
+
+
+def MakeObjectName(name, columns, label):
+  """Return the name PostgreSQL makes for an object it names itself.
+
+  As makeObjectName() does, the columns are joined with underscores, and the
+  longer of the name and the joined columns is shortened until
+  name_columns_label fits in MAX_NAME_LENGTH characters.
+
+  Args:
+    name: The table name.
+    columns: The column names PostgreSQL puts in the name, possibly none.
+    label: The label ending the name, eg. "pkey" or "idx1".
+  """
+  addition = ""
+  for column in columns:
+    addition += ("_" if addition else "") + column[:MAX_NAME_LENGTH]
+    if len(addition) > MAX_NAME_LENGTH:
+      break
+  available = MAX_NAME_LENGTH - len(label) - 1 - (1 if addition else 0)
+  name_length, addition_length = len(name), len(addition)
+  while name_length + addition_length > available:
+    if name_length > addition_length:
+      name_length -= 1
+    else:
+      addition_length -= 1
+  parts = [name[:name_length], addition[:addition_length], label]
+  return "_".join(part for part in parts if part)
+
+
+def SplitTopLevel(text, separator=","):
+  """Split text on separators outside parentheses, quotes and comments."""
+  parts = []
+  depth = 0
+  start = 0
+  blanked = StripQuotedKeepLength(text)
+  for pos, char in enumerate(blanked):
+    if char == "(":
+      depth += 1
+    elif char == ")":
+      depth -= 1
+    elif char == separator and depth == 0:
+      parts.append(text[start:pos])
+      start = pos + 1
+  parts.append(text[start:])
+  return parts
+
+
+def StripQuotedKeepLength(text):
+  """Return text with quoted parts blanked, keeping every offset the same."""
+  return _QUOTED_RE.sub(lambda match: " " * len(match.group()), text)
+
+
+def FindClosingParen(text, start):
+  """Return the offset of the ")" closing the "(" at text[start]."""
+  blanked = StripQuotedKeepLength(text)
+  depth = 0
+  for pos in range(start, len(blanked)):
+    if blanked[pos] == "(":
+      depth += 1
+    elif blanked[pos] == ")":
+      depth -= 1
+      if depth == 0:
+        return pos
+  return -1
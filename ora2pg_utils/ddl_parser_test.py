@@ -0,0 +1,119 @@
+"""Tests for google3.experimental.dhercher.ora2pg_utils.ddl_parser."""
+
+from google3.experimental.dhercher.ora2pg_utils import ddl_parser
+from google3.testing.pybase import googletest
+
+
+def _Split(sql):
+  return list(ddl_parser.SplitStatements(sql.splitlines(True)))
+
+
+class SplitStatementsTest(googletest.TestCase):
+
+  def test_split_is_lossless(self):
+    sql = ("SET client_encoding TO 'UTF8';\n\n"
+           "CREATE TABLE a (\n\tid int\n) ;\n"
+           "-- trailing comment\n")
+    statements = _Split(sql)
+    self.assertEqual("".join(statements), sql)
+    self.assertLen(statements, 3)
+    self.assertEqual(statements[1], "\n\nCREATE TABLE a (\n\tid int\n) ;")
+
+  def test_semicolons_in_quotes_and_comments(self):
+    sql = ("INSERT INTO t VALUES ('a;b', 'it''s;');\n"
+           'CREATE TABLE "x;y" (id int); -- not; here\n'
+           "/* a; b\n c; */ SELECT 1;\n"
+           "CREATE FUNCTION f() RETURNS int AS $body$ SELECT 1; $body$ "
+           "LANGUAGE sql;\n")
+    statements = _Split(sql)
+    self.assertEqual("".join(statements), sql)
+    self.assertLen(statements, 5)
+    self.assertIn("$body$ LANGUAGE sql;", statements[3])
+
+  def test_psql_meta_commands(self):
+    statements = _Split("\\set ON_ERROR_STOP ON\nSELECT 1;\n")
+    self.assertEqual(statements, ["\\set ON_ERROR_STOP ON\n", "SELECT 1;",
+                                  "\n"])
+
+  def test_statements_on_one_line(self):
+    self.assertEqual(_Split("SELECT 1; SELECT 2;"),
+                     ["SELECT 1;", " SELECT 2;"])
+
+
+class NamesTest(googletest.TestCase):
+
+  def test_parse_name(self):
+    self.assertEqual(ddl_parser.ParseName("HR.Jobs"), ("hr", "jobs"))
+    self.assertEqual(ddl_parser.ParseName('"HR" . "My ""T"""'),
+                     ("HR", 'My "T"'))
+
+  def test_format_name(self):
+    self.assertEqual(ddl_parser.FormatName(("hr", "My T")), 'hr."My T"')
+    self.assertEqual(ddl_parser.CompactName('hr .\n "My T"'), 'hr."My T"')
+
+  def test_create_table_re(self):
+    match = ddl_parser.CREATE_TABLE_RE.match(
+        '\n-- comment\nCREATE UNLOGGED TABLE IF NOT EXISTS\n  hr."Jobs"\n(')
+    self.assertEqual(ddl_parser.ParseName(match.group("name")), ("hr", "Jobs"))
+    self.assertIsNone(ddl_parser.CREATE_TABLE_RE.match(
+        "CREATE TABLE p1 PARTITION OF p FOR VALUES IN (1);"))
+
+  def test_alter_table_pk_re(self):
+    for sql in ("ALTER TABLE hr.jobs ADD PRIMARY KEY (id);",
+                "ALTER TABLE ONLY hr.jobs ADD CONSTRAINT jobs_pk "
+                "PRIMARY KEY (id);"):
+      match = ddl_parser.ALTER_TABLE_PK_RE.match(sql)
+      self.assertEqual(ddl_parser.ParseName(match.group("name")),
+                       ("hr", "jobs"))
+    self.assertIsNone(ddl_parser.ALTER_TABLE_PK_RE.match(
+        "ALTER TABLE hr.jobs ADD UNIQUE (id);"))
+
+  def test_alter_table_add_re(self):
+    match = ddl_parser.ALTER_TABLE_ADD_RE.match(
+        "ALTER TABLE hr.emp ADD CONSTRAINT emp_fk FOREIGN KEY (job_id) "
+        "REFERENCES jobs(id) ON DELETE CASCADE ;\n")
+    self.assertEqual(match.group("constraint"), "emp_fk")
+    self.assertEqual(match.group("definition"),
+                     "FOREIGN KEY (job_id) REFERENCES jobs(id) "
+                     "ON DELETE CASCADE")
+
+  def test_create_index_re(self):
+    match = ddl_parser.CREATE_INDEX_RE.match(
+        "CREATE UNIQUE INDEX CONCURRENTLY emp_idx ON hr.emp USING btree "
+        "(lower(name), id) WHERE id > 0;")
+    self.assertTrue(match.group("unique"))
+    self.assertTrue(match.group("concurrently"))
+    self.assertEqual(match.group("name"), "emp_idx")
+    self.assertEqual(match.group("table"), "hr.emp")
+    self.assertEqual(match.group("method"), "btree")
+    self.assertEqual(match.group("definition"), "(lower(name), id) WHERE id > 0")
+
+  def test_quote_identifier(self):
+    self.assertEqual(ddl_parser.QuoteIdentifier("id"), "id")
+    self.assertEqual(ddl_parser.QuoteIdentifier("order"), '"order"')
+    self.assertEqual(ddl_parser.QuoteIdentifier("Id"), '"Id"')
+
+  def test_make_object_name(self):
+    self.assertEqual(ddl_parser.MakeObjectName("jobs", (), "pkey"),
+                     "jobs_pkey")
+    self.assertEqual(ddl_parser.MakeObjectName("jobs", ("a", "b"), "key1"),
+                     "jobs_a_b_key1")
+    name = ddl_parser.MakeObjectName("t" * 40, ("c" * 20,), "idx")
+    self.assertEqual(name, "t" * 38 + "_" + "c" * 20 + "_idx")
+    self.assertLen(name, ddl_parser.MAX_NAME_LENGTH)
+
+
+class SplitTopLevelTest(googletest.TestCase):
+
+  def test_split_top_level(self):
+    self.assertEqual(
+        ddl_parser.SplitTopLevel("a numeric(10,2), b text DEFAULT 'x,y', c"),
+        ["a numeric(10,2)", " b text DEFAULT 'x,y'", " c"])
+
+  def test_find_closing_paren(self):
+    text = "t (a int CHECK (a > 0), b text DEFAULT ')') tail"
+    self.assertEqual(text[ddl_parser.FindClosingParen(text, 2) + 1:], " tail")
+
+
+if __name__ == "__main__":
+  googletest.main()
@@ -0,0 +1,112 @@
+"""Add rowid identity columns and fallback primary keys to converted DDL.
+
+Datastream to PostgreSQL replication needs a key on every table, so each
+CREATE TABLE gets a rowid identity column, and every table without a primary
+key gets "ALTER TABLE t ADD PRIMARY KEY (rowid)" at the end of the output.
+
+The input is read once, a statement at a time, and written straight to the
+output while an index of created tables and primary keys is kept, so the
+cost grows with the size of the input rather than tables x file size. Tables
+are matched by their normalized name, so quoted, qualified and multi-line
+names are handled, and primary keys declared inline or with ALTER TABLE both
+count. Tables which already have a rowid column are left unchanged, so the
+output can be processed again safely.
+"""
+
+import re
+
+try:
+  from google3.experimental.dhercher.ora2pg_utils import ddl_parser  # pylint: disable=g-import-not-at-top
+except ModuleNotFoundError:
+  import ddl_parser  # pytype: disable=import-error  pylint: disable=g-import-not-at-top
+
+
+ROWID_COLUMN = "\trowid bigint GENERATED BY DEFAULT AS IDENTITY"
+PK_FALLBACK = "ALTER TABLE %s ADD PRIMARY KEY (rowid);\n"
+
+_ROWID_RE = re.compile(r"[(,]\s*rowid\s", re.I)
+
+
+class TableIndex(object):
+  """The tables created in DDL and which of them have a primary key."""
+
+  def __init__(self):
+    # {normalized name: name as written, qualified by the search_path}
+    self.tables = {}
+    self.primary_keys = set()
+    self.statements = 0
+
+  @property
+  def tables_without_primary_key(self):
+    return [name for key, name in self.tables.items()
+            if key not in self.primary_keys]
+
+  def GetFallbackStatements(self):
+    return [PK_FALLBACK % name for name in self.tables_without_primary_key]
+
+
+def _InjectRowid(statement, column_list_start):
+  """Return the statement with rowid as the first column of its column list."""
+  rest = statement[column_list_start:]
+  separator = "" if rest.lstrip().startswith(")") else ","
+  newline = re.match(r"[ \t]*\r?\n", rest)
+  if newline:
+    position = column_list_start + newline.end()
+    column = ROWID_COLUMN + separator + "\n"
+  else:
+    position = column_list_start
+    column = "\n" + ROWID_COLUMN + separator + "\n"
+  return statement[:position] + column + statement[position:]
+
+
+def ProcessStatements(statements, output, add_rowid=True, index=None):
+  """Write statements to output with rowid columns, and return a TableIndex.
+
+  Args:
+    statements: An iterable of statement texts from SplitStatements.
+    output: A file-like object the processed statements are written to.
+    add_rowid: Whether to add the rowid column to created tables.
+    index: A TableIndex to add to, eg. one shared by several files.
+  """
+  index = index or TableIndex()
+  schema = None
+  for statement in statements:
+    index.statements += 1
+    create = ddl_parser.CREATE_TABLE_RE.match(statement)
+    if create:
+      parts = ddl_parser.ParseName(create.group("name"))
+      display = ddl_parser.CompactName(create.group("name"))
+      if len(parts) == 1 and schema:
+        display = ddl_parser.QuoteIdentifier(schema) + "." + display
+      key = ddl_parser.QualifyName(parts, schema)
+      index.tables.setdefault(key, display)
+
+      body = ddl_parser.StripQuoted(statement[create.end() - 1:])
+      if ddl_parser.PRIMARY_KEY_RE.search(body):
+        index.primary_keys.add(key)
+      if add_rowid and not _ROWID_RE.search(body):
+        statement = _InjectRowid(statement, create.end())
+    else:
+      alter = ddl_parser.ALTER_TABLE_PK_RE.match(statement)
+      if alter:
+        index.primary_keys.add(ddl_parser.QualifyName(
+            ddl_parser.ParseName(alter.group("name")), schema))
+      else:
+        search_path = ddl_parser.SEARCH_PATH_RE.match(statement)
+        if search_path:
+          schema = ddl_parser.ParseName(search_path.group("schema"))[0]
+    output.write(statement)
+  return index
+
+
+def ProcessDdl(lines, output, add_rowid=True):
+  """Process DDL lines, then write the fallback primary keys to output."""
+  index = ProcessStatements(ddl_parser.SplitStatements(lines), output,
+                            add_rowid=add_rowid)
+  output.writelines(index.GetFallbackStatements())
+  return index
+
+
+def ProcessFile(path, output, add_rowid=True):
+  with open(path) as ddl_file:
+    return ProcessDdl(ddl_file, output, add_rowid=add_rowid)
@@ -0,0 +1,88 @@
+"""Benchmark the streaming DDL post-processor against the per-table search.
+
+Builds synthetic ora2pg TABLE output and reports the time taken to add rowid
+columns and fallback primary keys, both by searching the whole file once per
+created table as ora2pg.sh did, and with ddl_postprocessor.
+"""
+
+import argparse
+import io
+import time
+
+import ddl_postprocessor
+
+
+def _ParseArgs(argv=None):
+  parser = argparse.ArgumentParser(description=__doc__)
+  parser.add_argument("--tables", type=int, default=50000,
+                      help="Tables in the synthetic DDL")
+  parser.add_argument("--columns", type=int, default=10,
+                      help="Columns per table")
+  parser.add_argument("--pk-ratio", type=float, default=0.5,
+                      help="Fraction of tables with a primary key")
+  parser.add_argument("--legacy-tables", type=int, default=5000,
+                      help="Largest table count the per-table search is "
+                      "timed on, as it grows with tables x file size")
+  return parser.parse_args(argv)
+
+
+def _SyntheticDdl(tables, columns, pk_ratio):
+  lines = []
+  pk_every = int(1 / pk_ratio) if pk_ratio else 0
+  for t in range(tables):
+    lines.append("CREATE TABLE schema_%d.table_%d (\n" % (t % 40, t))
+    for c in range(columns):
+      lines.append("\tcolumn_%d varchar(255)%s\n" %
+                   (c, "," if c < columns - 1 else ""))
+    lines.append(") ;\n")
+    if pk_every and t % pk_every == 0:
+      lines.append("ALTER TABLE schema_%d.table_%d ADD PRIMARY KEY "
+                   "(column_0);\n" % (t % 40, t))
+  return lines
+
+
+def _LegacyProcess(lines):
+  """Add rowid columns, then search the file for each table's PK."""
+  output = []
+  tables = []
+  for line in lines:
+    output.append(line)
+    if "CREATE TABLE" in line:
+      output.append(ddl_postprocessor.ROWID_COLUMN + ",\n")
+      tables.append(line.split()[2])
+  sql = "".join(output)
+  return sql + "".join(
+      ddl_postprocessor.PK_FALLBACK % table for table in tables
+      if "ALTER TABLE %s ADD PRIMARY KEY" % table not in sql)
+
+
+def _Time(func):
+  start = time.perf_counter()
+  func()
+  return time.perf_counter() - start
+
+
+def main(argv=None):
+  args = _ParseArgs(argv)
+  lines = _SyntheticDdl(args.tables, args.columns, args.pk_ratio)
+  size = sum(len(line) for line in lines) / (1024 * 1024)
+  streaming = _Time(
+      lambda: ddl_postprocessor.ProcessDdl(iter(lines), io.StringIO()))
+
+  legacy_tables = min(args.tables, args.legacy_tables)
+  legacy_lines = _SyntheticDdl(legacy_tables, args.columns, args.pk_ratio)
+  legacy = _Time(lambda: _LegacyProcess(legacy_lines))
+  # The per-table search grows with tables x file size.
+  legacy_estimate = legacy * (args.tables / legacy_tables) ** 2
+
+  print("%d tables, %.1f MiB of DDL" % (args.tables, size))
+  print("  %-22s %10.2fs" % ("streaming", streaming))
+  print("  %-22s %10.2fs (measured on %d tables)" %
+        ("per-table search", legacy, legacy_tables))
+  if legacy_tables < args.tables:
+    print("  %-22s %10.2fs" % ("per-table search est.", legacy_estimate))
+  print("  speedup %.0fx" % (legacy_estimate / streaming))
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,80 @@
+"""Tests for google3.experimental.dhercher.ora2pg_utils.ddl_postprocessor."""
+
+import io
+
+from google3.experimental.dhercher.ora2pg_utils import ddl_postprocessor
+from google3.testing.pybase import googletest
+
+
+def _Process(sql):
+  output = io.StringIO()
+  index = ddl_postprocessor.ProcessDdl(sql.splitlines(True), output)
+  return output.getvalue(), index
+
+
+class DdlPostProcessorTest(googletest.TestCase):
+
+  def test_adds_rowid_and_pk_fallback(self):
+    output, index = _Process(
+        "CREATE TABLE hr.jobs (\n\tjob_id varchar(10) NOT NULL\n) ;\n")
+    self.assertEqual(output, (
+        "CREATE TABLE hr.jobs (\n"
+        "\trowid bigint GENERATED BY DEFAULT AS IDENTITY,\n"
+        "\tjob_id varchar(10) NOT NULL\n) ;\n"
+        "ALTER TABLE hr.jobs ADD PRIMARY KEY (rowid);\n"))
+    self.assertEqual(index.tables_without_primary_key, ["hr.jobs"])
+
+  def test_existing_primary_keys(self):
+    output, index = _Process(
+        "ALTER TABLE HR.JOBS ADD PRIMARY KEY (job_id);\n"
+        "CREATE TABLE hr.jobs (job_id int);\n"
+        "CREATE TABLE hr.regions (id int, CONSTRAINT r_pk PRIMARY KEY (id));\n"
+        "CREATE TABLE hr.countries (id int);\n"
+        "ALTER TABLE ONLY hr.countries ADD CONSTRAINT c_pk PRIMARY KEY (id);\n")
+    self.assertEmpty(index.tables_without_primary_key)
+    self.assertNotIn("(rowid)", output)
+    self.assertEqual(output.count("rowid bigint"), 3)
+
+  def test_quoted_and_multi_line_names(self):
+    output, index = _Process(
+        'CREATE TABLE "HR"\n  ."Job History" (id int);\n'
+        'CREATE TABLE hr."Jobs" (id int);\n'
+        "ALTER TABLE hr.jobs ADD PRIMARY KEY (id);\n")
+    self.assertEqual(index.tables_without_primary_key,
+                     ['"HR"."Job History"', 'hr."Jobs"'])
+    self.assertTrue(output.endswith(
+        'ALTER TABLE "HR"."Job History" ADD PRIMARY KEY (rowid);\n'
+        'ALTER TABLE hr."Jobs" ADD PRIMARY KEY (rowid);\n'))
+
+  def test_primary_key_text_in_comments_is_ignored(self):
+    _, index = _Process(
+        "CREATE TABLE t (id int); -- PRIMARY KEY added later\n"
+        "COMMENT ON TABLE t IS 'ALTER TABLE t ADD PRIMARY KEY';\n")
+    self.assertEqual(index.tables_without_primary_key, ["t"])
+
+  def test_search_path_qualifies_names(self):
+    output, index = _Process(
+        "SET search_path = hr,public;\n"
+        "CREATE TABLE jobs (id int);\n"
+        "ALTER TABLE hr.jobs ADD PRIMARY KEY (id);\n"
+        "CREATE TABLE regions (id int);\n")
+    self.assertEqual(index.tables_without_primary_key, ["hr.regions"])
+    self.assertIn("ALTER TABLE hr.regions ADD PRIMARY KEY (rowid);", output)
+
+  def test_single_line_and_empty_tables(self):
+    output, _ = _Process("CREATE TABLE a (id int);\nCREATE TABLE b ();\n")
+    self.assertIn("CREATE TABLE a (\n"
+                  "\trowid bigint GENERATED BY DEFAULT AS IDENTITY,\n"
+                  "id int);", output)
+    self.assertIn("CREATE TABLE b (\n"
+                  "\trowid bigint GENERATED BY DEFAULT AS IDENTITY\n);", output)
+
+  def test_processing_twice_is_unchanged(self):
+    sql = "CREATE TABLE hr.jobs (\n\tid int\n) ;\n"
+    once, _ = _Process(sql)
+    twice, _ = _Process(once)
+    self.assertEqual(once, twice)
+
+
+if __name__ == "__main__":
+  googletest.main()
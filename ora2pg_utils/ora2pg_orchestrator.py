@@ -0,0 +1,237 @@
+"""Run ora2pg conversions for many Oracle object types and schemas at once.
+
+Each type/schema pair is an independent ora2pg job with its own output file
+and log. Jobs run on a bounded pool of workers, and their outputs are merged
+into output.sql in the same type-then-schema order ora2pg.sh used, so the
+merged file does not depend on which job finished first.
+"""
+
+import concurrent.futures
+import logging
+import os
+import subprocess
+import time
+
+try:
+  from google3.experimental.dhercher.ora2pg_utils import ddl_postprocessor  # pylint: disable=g-import-not-at-top
+except ModuleNotFoundError:
+  import ddl_postprocessor  # pytype: disable=import-error  pylint: disable=g-import-not-at-top
+
+DEFAULT_MAX_WORKERS = 4
+OUTPUT_FILE = "output.sql"
+LOG_DIR = "logs"
+
+
+class Ora2pgJob(object):
+  """One ora2pg run for an Oracle object type, optionally in one schema."""
+
+  __slots__ = ("oracle_type", "schema")
+
+  def __init__(self, oracle_type, schema=None):
+    self.oracle_type = oracle_type
+    self.schema = schema
+
+  @property
+  def name(self):
+    if self.schema:
+      return "%s_%s" % (self.oracle_type, self.schema)
+    return self.oracle_type
+
+  @property
+  def output_file(self):
+    return "%s_output.sql" % self.name
+
+  @property
+  def log_file(self):
+    return os.path.join(LOG_DIR, "%s.log" % self.name)
+
+  def __repr__(self):
+    return "Ora2pgJob(%s)" % self.name
+
+
+class JobResult(object):
+  """The outcome and duration of an Ora2pgJob."""
+
+  __slots__ = ("job", "returncode", "duration", "error", "cached")
+
+  def __init__(self, job, returncode=None, duration=None, error=None,
+               cached=False):
+    self.job = job
+    self.returncode = returncode
+    self.duration = duration
+    self.error = error
+    self.cached = cached
+
+  @property
+  def succeeded(self):
+    return self.error is None and self.returncode == 0
+
+
+def BuildJobs(oracle_types, schemas=None):
+  """Return the jobs for every type, and every schema when any are given."""
+  if not schemas:
+    return [Ora2pgJob(oracle_type) for oracle_type in oracle_types]
+  return [Ora2pgJob(oracle_type, schema)
+          for oracle_type in oracle_types for schema in schemas]
+
+
+class Ora2pgOrchestrator(object):
+  """Run ora2pg jobs in parallel and merge their output."""
+
+  def __init__(self,
+               data_dir,
+               command_prefix=None,
+               source=None,
+               user=None,
+               password=None,
+               force_owner=None,
+               max_workers=None,
+               cache=None,
+               worker_pool=None,
+               run_command=None,
+               clock=None):
+    """Initialize the Ora2pgOrchestrator.
+
+    Args:
+      data_dir: The local directory ora2pg writes its output files to.
+      command_prefix: Arguments placed before the ora2pg command, eg. a
+          "docker run ... image" invocation.
+      source: The Oracle DSN, defaults to the one in ora2pg.conf.
+      user: The Oracle user, defaults to the one in ora2pg.conf.
+      password: The Oracle password, defaults to the one in ora2pg.conf.
+      force_owner: The PostgreSQL owner of the converted objects.
+      max_workers: The maximum number of ora2pg jobs run at once.
+      cache: An optional ConversionCache of earlier job outputs.
+      worker_pool: An optional started WorkerPool the jobs are run on,
+          instead of running one command per job.
+      run_command: A function like subprocess.run, used to run each job.
+      clock: A function returning the current time in seconds.
+    """
+    self.data_dir = data_dir
+    self.command_prefix = list(command_prefix or ())
+    self.source = source
+    self.user = user
+    self.password = password
+    self.force_owner = force_owner
+    self.max_workers = max_workers or DEFAULT_MAX_WORKERS
+    self.cache = cache
+    self.worker_pool = worker_pool
+    self._run_command = run_command or subprocess.run
+    self._clock = clock or time.time
+
+  def BuildCommand(self, job):
+    command = self.command_prefix + [
+        "ora2pg", "--type", job.oracle_type, "--out", job.output_file]
+    if job.schema:
+      command += ["--namespace", job.schema]
+    for flag, value in (("--source", self.source), ("--user", self.user),
+                        ("--password", self.password),
+                        ("--forceowner", self.force_owner)):
+      if value:
+        command += [flag, value]
+    return command
+
+  def RunJob(self, job):
+    """Run one job, writing its stdout and stderr to the job's log file."""
+    log_path = os.path.join(self.data_dir, job.log_file)
+    os.makedirs(os.path.dirname(log_path), exist_ok=True)
+    start = self._clock()
+    result = JobResult(job)
+    try:
+      if self.worker_pool:
+        result.returncode, result.error = self.worker_pool.Execute(job)
+      else:
+        with open(log_path, "w") as log_file:
+          result.returncode = self._run_command(
+              self.BuildCommand(job), stdout=log_file,
+              stderr=subprocess.STDOUT).returncode
+    except OSError as e:
+      result.error = str(e)
+    result.duration = self._clock() - start
+
+    if result.succeeded:
+      logging.info("Ora2PG: %s finished in %.1fs", job.output_file,
+                   result.duration)
+    else:
+      logging.error("Ora2PG: %s failed (%s), see %s", job.output_file,
+                    result.error or "exit %s" % result.returncode, log_path)
+    return result
+
+  def Run(self, jobs):
+    """Run jobs on the worker pool and return their results in job order."""
+    if not jobs:
+      return []
+    workers = min(self.max_workers, len(jobs))
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+      return list(pool.map(self.RunJob, jobs))
+
+  def MergeOutputs(self, results):
+    """Write the successful outputs, in job order, to output.sql.
+
+    Each output is streamed through the DDL post-processor on its way into
+    output.sql, and the raw job outputs are left as ora2pg wrote them.
+    """
+    output_path = os.path.join(self.data_dir, OUTPUT_FILE)
+    with open(output_path, "w") as output:
+      for result in results:
+        if not result.succeeded:
+          continue
+        job_path = os.path.join(self.data_dir, result.job.output_file)
+        if not os.path.exists(job_path):
+          logging.warning("Ora2PG: %s produced no output", result.job.name)
+          continue
+        ddl_postprocessor.ProcessFile(job_path, output)
+    return output_path
+
+  def _RestoreFromCache(self, job, fingerprints, refresh_schemas):
+    if not self.cache:
+      return False
+    if refresh_schemas is not None:
+      # Only the schemas being iterated on are converted again.
+      return (job.schema not in refresh_schemas and
+              self.cache.Restore(job, self.data_dir))
+    fingerprint = fingerprints.get(job.name)
+    return (fingerprint is not None and
+            self.cache.Restore(job, self.data_dir, fingerprint))
+
+  def RunAndMerge(self, jobs, fingerprints=None, refresh_schemas=None):
+    """Run every job, merge the outputs and log a duration report.
+
+    Args:
+      jobs: The Ora2pgJobs, in the order their outputs are merged.
+      fingerprints: {job name: source fingerprint}; jobs whose cached
+          output has the same fingerprint are not run again.
+      refresh_schemas: Optional schemas to convert again whatever their
+          fingerprint, reusing any cached output for every other schema.
+    Returns:
+      The JobResults in job order.
+    """
+    start = self._clock()
+    fingerprints = fingerprints or {}
+    results = {}
+    for job in jobs:
+      if self._RestoreFromCache(job, fingerprints, refresh_schemas):
+        results[job.name] = JobResult(job, returncode=0, duration=0,
+                                      cached=True)
+
+    for result in self.Run([job for job in jobs if job.name not in results]):
+      results[result.job.name] = result
+      if self.cache and result.succeeded and os.path.exists(
+          os.path.join(self.data_dir, result.job.output_file)):
+        self.cache.Store(result.job, self.data_dir,
+                         fingerprints.get(result.job.name))
+
+    results = [results[job.name] for job in jobs]
+    self.MergeOutputs(results)
+    LogReport(results, self._clock() - start)
+    return results
+
+
+def LogReport(results, total_duration):
+  for result in sorted(results, key=lambda r: r.duration or 0, reverse=True):
+    logging.info("%-40s %8.1fs %s", result.job.name, result.duration or 0,
+                 "cached" if result.cached else
+                 "ok" if result.succeeded else "FAILED")
+  logging.info("%d jobs in %.1fs, %d cached, %d failed", len(results),
+               total_duration, len([r for r in results if r.cached]),
+               len([r for r in results if not r.succeeded]))
@@ -0,0 +1,198 @@
+"""Tests for google3.experimental.dhercher.ora2pg_utils.ora2pg_orchestrator."""
+
+import os
+import threading
+import time
+
+import mock
+
+from google3.experimental.dhercher.ora2pg_utils import conversion_cache
+from google3.experimental.dhercher.ora2pg_utils import ora2pg_orchestrator
+from google3.testing.pybase import googletest
+
+
+_TABLE_SQL = """CREATE TABLE %(table)s (
+\tid bigint NOT NULL
+) ;
+"""
+
+_PK_SQL = "ALTER TABLE %(table)s ADD PRIMARY KEY (id);\n"
+
+
+class FakeOra2pg(object):
+  """Writes each job's output file as ora2pg would, tracking concurrency."""
+
+  def __init__(self, data_dir, outputs=None, failing=(), delay=0):
+    self.data_dir = data_dir
+    self.outputs = outputs or {}
+    self.failing = failing
+    self.delay = delay
+    self.running = 0
+    self.max_running = 0
+    self.commands = []
+    self._lock = threading.Lock()
+
+  def __call__(self, command, stdout=None, stderr=None):
+    with self._lock:
+      self.commands.append(command)
+      self.running += 1
+      self.max_running = max(self.max_running, self.running)
+    time.sleep(self.delay)
+    output_file = command[command.index("--out") + 1]
+    stdout.write("converting %s\n" % output_file)
+    with self._lock:
+      self.running -= 1
+    if output_file in self.failing:
+      return mock.Mock(returncode=1)
+    with open(os.path.join(self.data_dir, output_file), "w") as f:
+      f.write(self.outputs.get(output_file, ""))
+    return mock.Mock(returncode=0)
+
+
+class Ora2pgOrchestratorTest(googletest.TestCase):
+
+  def setUp(self):
+    super().setUp()
+    self.data_dir = self.create_tempdir().full_path
+
+  def _Read(self, file_name):
+    with open(os.path.join(self.data_dir, file_name)) as f:
+      return f.read()
+
+  def test_build_jobs(self):
+    jobs = ora2pg_orchestrator.BuildJobs(["TABLE", "VIEW"], ["HR", "OE"])
+    self.assertEqual([job.output_file for job in jobs],
+                     ["TABLE_HR_output.sql", "TABLE_OE_output.sql",
+                      "VIEW_HR_output.sql", "VIEW_OE_output.sql"])
+    jobs = ora2pg_orchestrator.BuildJobs(["TABLE"])
+    self.assertEqual([job.output_file for job in jobs], ["TABLE_output.sql"])
+
+  def test_build_command(self):
+    orchestrator = ora2pg_orchestrator.Ora2pgOrchestrator(
+        self.data_dir, command_prefix=["docker", "run", "ora2pg"],
+        source="dbi:Oracle:host=h", user="system", password="pw",
+        force_owner="postgres")
+    command = orchestrator.BuildCommand(
+        ora2pg_orchestrator.Ora2pgJob("TABLE", "HR"))
+    self.assertEqual(command, [
+        "docker", "run", "ora2pg", "ora2pg", "--type", "TABLE", "--out",
+        "TABLE_HR_output.sql", "--namespace", "HR",
+        "--source", "dbi:Oracle:host=h", "--user", "system",
+        "--password", "pw", "--forceowner", "postgres"])
+
+  def test_runs_jobs_in_parallel_with_bounded_workers(self):
+    fake = FakeOra2pg(self.data_dir, delay=0.05)
+    orchestrator = ora2pg_orchestrator.Ora2pgOrchestrator(
+        self.data_dir, max_workers=3, run_command=fake)
+    jobs = ora2pg_orchestrator.BuildJobs(["TABLE"], ["S%d" % i
+                                                     for i in range(9)])
+
+    results = orchestrator.Run(jobs)
+
+    self.assertLen(results, 9)
+    self.assertTrue(all(result.succeeded for result in results))
+    self.assertEqual([result.job for result in results], jobs)
+    self.assertGreater(fake.max_running, 1)
+    self.assertLessEqual(fake.max_running, 3)
+    self.assertIn("converting TABLE_S0_output.sql",
+                  self._Read(os.path.join("logs", "TABLE_S0.log")))
+
+  def test_merge_is_in_job_order_with_pk_fallbacks(self):
+    outputs = {
+        "TABLE_HR_output.sql": (_TABLE_SQL % {"table": "hr.jobs"} +
+                                _PK_SQL % {"table": "hr.jobs"}),
+        "TABLE_OE_output.sql": _TABLE_SQL % {"table": "oe.orders"},
+    }
+    fake = FakeOra2pg(self.data_dir, outputs=outputs)
+    orchestrator = ora2pg_orchestrator.Ora2pgOrchestrator(
+        self.data_dir, max_workers=2, run_command=fake)
+    jobs = ora2pg_orchestrator.BuildJobs(["TABLE"], ["HR", "OE"])
+    results = orchestrator.Run(jobs)
+    orchestrator.MergeOutputs(results)
+
+    merged = self._Read(ora2pg_orchestrator.OUTPUT_FILE)
+    self.assertLess(merged.index("hr.jobs"), merged.index("oe.orders"))
+    self.assertEqual(merged.count("rowid bigint GENERATED BY DEFAULT"), 2)
+    self.assertNotIn("ALTER TABLE hr.jobs ADD PRIMARY KEY (rowid)", merged)
+    self.assertTrue(merged.endswith(
+        "ALTER TABLE oe.orders ADD PRIMARY KEY (rowid);\n"))
+    self.assertNotIn("rowid", self._Read("TABLE_OE_output.sql"))
+
+  def test_failed_jobs_are_reported_and_skipped(self):
+    outputs = {"TABLE_HR_output.sql": _TABLE_SQL % {"table": "hr.jobs"}}
+    fake = FakeOra2pg(self.data_dir, outputs=outputs,
+                      failing=("TABLE_OE_output.sql",))
+    clock = mock.Mock(side_effect=range(100))
+    orchestrator = ora2pg_orchestrator.Ora2pgOrchestrator(
+        self.data_dir, max_workers=1, run_command=fake, clock=clock)
+
+    results = orchestrator.RunAndMerge(
+        ora2pg_orchestrator.BuildJobs(["TABLE"], ["HR", "OE"]))
+
+    self.assertEqual([result.succeeded for result in results], [True, False])
+    self.assertEqual(results[1].returncode, 1)
+    self.assertTrue(all(result.duration == 1 for result in results))
+    self.assertNotIn("oe.orders",
+                     self._Read(ora2pg_orchestrator.OUTPUT_FILE))
+
+  def test_missing_executable_is_a_failed_job(self):
+    orchestrator = ora2pg_orchestrator.Ora2pgOrchestrator(
+        self.data_dir, run_command=mock.Mock(side_effect=OSError("no docker")))
+    result = orchestrator.RunJob(ora2pg_orchestrator.Ora2pgJob("TABLE"))
+    self.assertFalse(result.succeeded)
+    self.assertEqual(result.error, "no docker")
+
+  def test_unchanged_schemas_are_reused_from_cache(self):
+    outputs = {"TABLE_HR_output.sql": _TABLE_SQL % {"table": "hr.jobs"},
+               "TABLE_OE_output.sql": _TABLE_SQL % {"table": "oe.orders"}}
+    cache = conversion_cache.ConversionCache(
+        os.path.join(self.data_dir, "cache"))
+    jobs = ora2pg_orchestrator.BuildJobs(["TABLE"], ["HR", "OE"])
+    fingerprints = {"TABLE_HR": "hr-1", "TABLE_OE": "oe-1"}
+    ora2pg_orchestrator.Ora2pgOrchestrator(
+        self.data_dir, cache=cache,
+        run_command=FakeOra2pg(self.data_dir, outputs=outputs)).RunAndMerge(
+            jobs, fingerprints=fingerprints)
+
+    fake = FakeOra2pg(self.data_dir, outputs=outputs)
+    fingerprints["TABLE_OE"] = "oe-2"
+    results = ora2pg_orchestrator.Ora2pgOrchestrator(
+        self.data_dir, cache=cache, run_command=fake).RunAndMerge(
+            jobs, fingerprints=fingerprints)
+
+    self.assertEqual([result.cached for result in results], [True, False])
+    self.assertLen(fake.commands, 1)
+    self.assertIn("TABLE_OE_output.sql", fake.commands[0])
+    merged = self._Read(ora2pg_orchestrator.OUTPUT_FILE)
+    self.assertIn("hr.jobs", merged)
+    self.assertIn("oe.orders", merged)
+
+  def test_refresh_schemas_reuses_every_other_schema(self):
+    cache = conversion_cache.ConversionCache(
+        os.path.join(self.data_dir, "cache"))
+    jobs = ora2pg_orchestrator.BuildJobs(["TABLE"], ["HR", "OE"])
+    ora2pg_orchestrator.Ora2pgOrchestrator(
+        self.data_dir, cache=cache,
+        run_command=FakeOra2pg(self.data_dir)).RunAndMerge(jobs)
+
+    fake = FakeOra2pg(self.data_dir)
+    results = ora2pg_orchestrator.Ora2pgOrchestrator(
+        self.data_dir, cache=cache, run_command=fake).RunAndMerge(
+            jobs, refresh_schemas={"HR"})
+
+    self.assertEqual([result.cached for result in results], [False, True])
+    self.assertLen(fake.commands, 1)
+
+  def test_jobs_without_fingerprint_always_run(self):
+    cache = conversion_cache.ConversionCache(
+        os.path.join(self.data_dir, "cache"))
+    jobs = ora2pg_orchestrator.BuildJobs(["TABLE"])
+    for _ in range(2):
+      fake = FakeOra2pg(self.data_dir)
+      ora2pg_orchestrator.Ora2pgOrchestrator(
+          self.data_dir, cache=cache, run_command=fake).RunAndMerge(jobs)
+      self.assertLen(fake.commands, 1)
+
+
+if __name__ == "__main__":
+  googletest.main()
@@ -0,0 +1,161 @@
+#!/usr/bin/perl
+# Copyright 2020 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# A long-lived ora2pg worker taking jobs from the file queue described in
+# ora2pg_worker_pool.py. Ora2Pg is loaded once, and Oracle sessions are kept
+# open between jobs, so each job costs only its own export.
+#
+# Usage: ora2pg_worker.pl QUEUE_DIR DATA_DIR WORKER_ID
+# The connection settings come from ORA2PG_SOURCE, ORA2PG_USER,
+# ORA2PG_PASSWORD and ORA2PG_FORCE_OWNER, or ora2pg.conf when unset.
+
+use strict;
+use warnings;
+
+# Ora2Pg exits on fatal errors; fail the job instead of the worker.
+BEGIN {
+  *CORE::GLOBAL::exit = sub { die {exit_code => defined $_[0] ? $_[0] : 0} };
+}
+
+use File::Spec;
+use JSON::PP;
+use POSIX ();
+use Time::HiRes qw(sleep);
+use Ora2Pg;
+
+my ($queue_dir, $data_dir, $worker_id) = @ARGV;
+die "Usage: $0 QUEUE_DIR DATA_DIR WORKER_ID\n" unless defined $worker_id;
+my $config = $ENV{ORA2PG_CONFIG} || '/config/ora2pg.conf';
+my $poll_interval = $ENV{ORA2PG_POLL_INTERVAL} || 0.02;
+my $json = JSON::PP->new->canonical;
+
+# Reuse one Oracle session per DSN and user across jobs.
+my %sessions;
+my $real_disconnect;
+if ($ENV{ORA2PG_REUSE_SESSION} // 1 and eval { require DBI; 1 }) {
+  no warnings 'redefine';
+  my $real_connect = \&DBI::connect;
+  $real_disconnect = \&DBI::db::disconnect;
+  *DBI::connect = sub {
+    my ($class, $dsn, $user) = @_;
+    my $key = join("\0", $dsn // '', $user // '');
+    my $dbh = $sessions{$key};
+    return $dbh if $dbh and $dbh->ping;
+    $dbh = $real_connect->(@_);
+    $sessions{$key} = $dbh if $dbh;
+    return $dbh;
+  };
+  *DBI::db::disconnect = sub { 1 };
+}
+
+sub write_json {
+  my ($path, $value) = @_;
+  open(my $fh, '>', "$path.tmp") or die "Unable to write $path: $!";
+  print $fh $json->encode($value);
+  close($fh);
+  rename("$path.tmp", $path) or die "Unable to rename $path: $!";
+}
+
+sub claim {
+  opendir(my $dh, "$queue_dir/pending") or return;
+  my @jobs = sort grep { /\.json$/ } readdir($dh);
+  closedir($dh);
+  for my $file (@jobs) {
+    my $running = "$queue_dir/running/$worker_id-$file";
+    next unless rename("$queue_dir/pending/$file", $running);
+    open(my $fh, '<', $running) or next;
+    local $/;
+    my $job = $json->decode(<$fh>);
+    close($fh);
+    return ($file, $running, $job);
+  }
+  return;
+}
+
+sub run_job {
+  my ($job) = @_;
+  my $log = File::Spec->catfile($data_dir, $job->{log});
+  open(my $log_fh, '>', $log) or return (1, "Unable to open $log: $!");
+  open(my $stdout, '>&', \*STDOUT);
+  open(my $stderr, '>&', \*STDERR);
+  open(STDOUT, '>&', $log_fh);
+  open(STDERR, '>&', $log_fh);
+
+  my %options = (config => $config, type => $job->{type},
+                 output => $job->{output}, output_dir => $data_dir);
+  $options{schema} = $job->{schema} if $job->{schema};
+  $options{datasource} = $ENV{ORA2PG_SOURCE} if $ENV{ORA2PG_SOURCE};
+  $options{user} = $ENV{ORA2PG_USER} if $ENV{ORA2PG_USER};
+  $options{password} = $ENV{ORA2PG_PASSWORD} if $ENV{ORA2PG_PASSWORD};
+  $options{force_owner} = $ENV{ORA2PG_FORCE_OWNER}
+      if $ENV{ORA2PG_FORCE_OWNER};
+
+  my ($returncode, $error) = (0, undef);
+  eval {
+    my $schema = Ora2Pg->new(%options);
+    $schema->export_schema();
+    1;
+  } or do {
+    my $failure = $@;
+    if (ref $failure eq 'HASH' and exists $failure->{exit_code}) {
+      $returncode = $failure->{exit_code};
+    } else {
+      ($returncode, $error) = (1, "$failure");
+      print STDERR $error;
+    }
+  };
+
+  open(STDOUT, '>&', $stdout);
+  open(STDERR, '>&', $stderr);
+  close($log_fh);
+  return ($returncode, $error);
+}
+
+# A child process rewrites the heartbeat every second, so it stays fresh
+# while a long job runs and goes stale as soon as the worker dies.
+my $heartbeat = "$queue_dir/workers/$worker_id";
+my $worker_pid = $$;
+write_json($heartbeat, {pid => $worker_pid, time => Time::HiRes::time()});
+my $heartbeat_pid = fork();
+die "Unable to fork the heartbeat process: $!\n"
+    unless defined $heartbeat_pid;
+if ($heartbeat_pid == 0) {
+  while (getppid() == $worker_pid) {
+    write_json($heartbeat, {pid => $worker_pid, time => Time::HiRes::time()});
+    sleep(1);
+  }
+  POSIX::_exit(0);
+}
+
+until (-e "$queue_dir/stop") {
+  my ($file, $running, $job) = claim();
+  unless ($job) {
+    sleep($poll_interval);
+    next;
+  }
+  my $start = Time::HiRes::time();
+  my ($returncode, $error) = run_job($job);
+  write_json("$queue_dir/done/$file", {
+      id => $job->{id}, worker => $worker_id, returncode => $returncode,
+      error => $error, duration => Time::HiRes::time() - $start});
+  unlink($running);
+}
+
+kill('TERM', $heartbeat_pid);
+waitpid($heartbeat_pid, 0);
+unlink($heartbeat);
+if ($real_disconnect) {
+  $real_disconnect->($_) for grep { $_ } values %sessions;
+}
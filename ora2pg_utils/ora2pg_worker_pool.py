@@ -0,0 +1,281 @@
+"""Run ora2pg jobs on long-lived workers instead of one container per job.
+
+Starting a container, compiling Ora2Pg and opening an Oracle session costs
+seconds per job, which dominates runs over many small schemas. Workers
+(ora2pg_worker.pl in the Ora2PG image) stay up between jobs instead, keeping
+Ora2Pg loaded and their Oracle sessions open, and take jobs from a file queue
+on the shared data volume:
+
+  QUEUE_DIR/pending/ID.json   submitted jobs, claimed by renaming them
+  QUEUE_DIR/running/W-ID.json jobs claimed by worker W
+  QUEUE_DIR/done/ID.json      results, with the job's exit code
+  QUEUE_DIR/workers/W         heartbeats, rewritten every second, even
+                              while W runs a job
+  QUEUE_DIR/stop              asks every worker to exit
+
+Renaming a file is atomic on one file system, so each job is claimed by
+exactly one worker, and workers can run in separate containers. A job
+whose worker stops heartbeating before it finishes fails instead of being
+waited on forever.
+"""
+
+import json
+import logging
+import os
+import subprocess
+import threading
+import time
+import uuid
+
+DEFAULT_POLL_INTERVAL = 0.02
+DEFAULT_HEARTBEAT_TIMEOUT = 10
+DEFAULT_JOB_TIMEOUT = 6 * 60 * 60
+WORKER_SCRIPT = "/usr/local/bin/ora2pg_worker.pl"
+WORKER_NAME = "ora2pg-worker-%d"
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+WORKERS = "workers"
+STOP = "stop"
+
+
+class FileJobQueue(object):
+  """The job queue shared between the orchestrator and the workers."""
+
+  def __init__(self, queue_dir, poll_interval=None, clock=None, sleep=None):
+    self.queue_dir = queue_dir
+    self.poll_interval = poll_interval or DEFAULT_POLL_INTERVAL
+    self._clock = clock or time.time
+    self._sleep = sleep or time.sleep
+    for directory in (PENDING, RUNNING, DONE, WORKERS):
+      os.makedirs(os.path.join(queue_dir, directory), exist_ok=True)
+
+  def _Path(self, *parts):
+    return os.path.join(self.queue_dir, *parts)
+
+  def _WriteJson(self, path, value):
+    temp_path = path + ".tmp"
+    with open(temp_path, "w") as json_file:
+      json.dump(value, json_file)
+    os.replace(temp_path, path)
+
+  def Submit(self, payload):
+    """Queue a job and return its id."""
+    job_id = "%d-%s" % (self._clock() * 1000, uuid.uuid4().hex[:8])
+    self._WriteJson(self._Path(PENDING, job_id + ".json"),
+                    dict(payload, id=job_id))
+    return job_id
+
+  def Claim(self, worker_id):
+    """Claim the oldest pending job, returning its payload or None."""
+    for file_name in sorted(os.listdir(self._Path(PENDING))):
+      if not file_name.endswith(".json"):
+        continue
+      running = self._Path(RUNNING, "%s-%s" % (worker_id, file_name))
+      try:
+        os.rename(self._Path(PENDING, file_name), running)
+      except FileNotFoundError:
+        continue  # Claimed by another worker.
+      with open(running) as job_file:
+        return json.load(job_file)
+    return None
+
+  def Complete(self, worker_id, job_id, returncode, error=None,
+               duration=None):
+    self._WriteJson(self._Path(DONE, job_id + ".json"), {
+        "id": job_id, "worker": worker_id, "returncode": returncode,
+        "error": error, "duration": duration})
+    try:
+      os.remove(self._Path(RUNNING, "%s-%s.json" % (worker_id, job_id)))
+    except FileNotFoundError:
+      pass
+
+  def ClaimedBy(self, job_id):
+    """Return the id of the worker running a job, or None."""
+    suffix = "-%s.json" % job_id
+    for file_name in os.listdir(self._Path(RUNNING)):
+      if file_name.endswith(suffix):
+        return file_name[:-len(suffix)]
+    return None
+
+  def _FailAbandoned(self, job_id, heartbeat_timeout):
+    """Fail a job whose worker stopped heartbeating, returning its result."""
+    worker_id = self.ClaimedBy(job_id)
+    if worker_id is None or self.IsLive(worker_id, heartbeat_timeout):
+      return None
+    self.Complete(worker_id, job_id, None,
+                  "Worker %s stopped while running the job" % worker_id)
+    return worker_id
+
+  def WaitForResult(self, job_id, timeout=None, heartbeat_timeout=None):
+    """Wait for a job's result and return it, or None on timeout.
+
+    A job claimed by a worker without a heartbeat in heartbeat_timeout
+    seconds fails with returncode None.
+    """
+    path = self._Path(DONE, job_id + ".json")
+    deadline = None if timeout is None else self._clock() + timeout
+    next_check = self._clock()
+    while not os.path.exists(path):
+      now = self._clock()
+      if deadline is not None and now >= deadline:
+        return None
+      if now >= next_check:
+        next_check = now + 1
+        if self._FailAbandoned(job_id, heartbeat_timeout):
+          continue
+      self._sleep(self.poll_interval)
+    with open(path) as result_file:
+      result = json.load(result_file)
+    os.remove(path)
+    return result
+
+  def Heartbeat(self, worker_id):
+    self._WriteJson(self._Path(WORKERS, worker_id),
+                    {"pid": os.getpid(), "time": self._clock()})
+
+  def IsLive(self, worker_id, timeout=None):
+    """Return whether a worker has a recent heartbeat."""
+    timeout = timeout or DEFAULT_HEARTBEAT_TIMEOUT
+    try:
+      with open(self._Path(WORKERS, worker_id)) as heartbeat_file:
+        heartbeat = json.load(heartbeat_file)
+    except (OSError, ValueError):
+      return False
+    return self._clock() - heartbeat["time"] <= timeout
+
+  def LiveWorkers(self, timeout=None):
+    """Return the ids of workers with a recent heartbeat."""
+    return [worker_id for worker_id in sorted(os.listdir(self._Path(WORKERS)))
+            if not worker_id.endswith(".tmp") and
+            self.IsLive(worker_id, timeout)]
+
+  def RequestStop(self):
+    open(self._Path(STOP), "w").close()
+
+  def ClearStop(self):
+    try:
+      os.remove(self._Path(STOP))
+    except FileNotFoundError:
+      pass
+
+  @property
+  def stop_requested(self):
+    return os.path.exists(self._Path(STOP))
+
+
+class ThreadWorker(threading.Thread):
+  """An in-process worker, running each job with a function.
+
+  This follows the same protocol as ora2pg_worker.pl, for tests and for
+  running jobs through any other callable.
+  """
+
+  def __init__(self, queue, worker_id, run_fn):
+    super(ThreadWorker, self).__init__(name=worker_id, daemon=True)
+    self.queue = queue
+    self.worker_id = worker_id
+    self.run_fn = run_fn
+
+  def _Heartbeat(self):
+    while not self.queue.stop_requested:
+      self.queue.Heartbeat(self.worker_id)
+      time.sleep(1)
+
+  def run(self):
+    threading.Thread(target=self._Heartbeat, daemon=True).start()
+    while not self.queue.stop_requested:
+      payload = self.queue.Claim(self.worker_id)
+      if payload is None:
+        time.sleep(self.queue.poll_interval)
+        continue
+      start = time.time()
+      try:
+        returncode, error = self.run_fn(payload), None
+      except Exception as e:  # pylint: disable=broad-except
+        returncode, error = 1, str(e)
+      self.queue.Complete(self.worker_id, payload["id"], returncode, error,
+                          time.time() - start)
+
+
+def DockerWorkerCommand(image, config_dir, data_dir, worker_index,
+                        queue_dir="/data/queue"):
+  """Return the docker run arguments starting one detached worker.
+
+  The Oracle connection settings are passed by name from the environment
+  (ORA2PG_SOURCE, ORA2PG_USER, ORA2PG_PASSWORD, ORA2PG_FORCE_OWNER), so
+  they do not appear on the command line.
+  """
+  command = ["docker", "run", "-d", "--rm",
+             "--name", WORKER_NAME % worker_index,
+             "--user", "%d:%d" % (os.getuid(), os.getgid()),
+             "-v", "%s:/config" % os.path.abspath(config_dir),
+             "-v", "%s:/data" % os.path.abspath(data_dir)]
+  for name in ("ORA2PG_SOURCE", "ORA2PG_USER", "ORA2PG_PASSWORD",
+               "ORA2PG_FORCE_OWNER"):
+    command += ["-e", name]
+  return command + [image, "perl", WORKER_SCRIPT, queue_dir, "/data",
+                    WORKER_NAME % worker_index]
+
+
+class WorkerPool(object):
+  """Start and stop workers, and run ora2pg jobs on them."""
+
+  def __init__(self, queue, size, start_worker=None, job_timeout=None,
+               heartbeat_timeout=None):
+    """Initialize the WorkerPool.
+
+    Args:
+      queue: The FileJobQueue the workers read.
+      size: The number of workers.
+      start_worker: A function starting worker number i, eg. running a
+          DockerWorkerCommand.
+      job_timeout: Seconds a job may wait for its result before failing,
+          or None to wait as long as its worker keeps heartbeating.
+      heartbeat_timeout: Seconds without a heartbeat after which a worker
+          is considered dead and its job fails.
+    """
+    self.queue = queue
+    self.size = size
+    self.start_worker = start_worker
+    self.job_timeout = job_timeout
+    self.heartbeat_timeout = heartbeat_timeout
+
+  def Start(self, wait_timeout=None):
+    """Start any missing workers and wait for their heartbeats."""
+    self.queue.ClearStop()
+    live = self.queue.LiveWorkers()
+    for index in range(self.size):
+      if WORKER_NAME % index not in live:
+        self.start_worker(index)
+    deadline = time.time() + (wait_timeout or DEFAULT_HEARTBEAT_TIMEOUT * 3)
+    while len(self.queue.LiveWorkers()) < self.size:
+      if time.time() >= deadline:
+        raise RuntimeError("Only %d of %d ora2pg workers started" %
+                           (len(self.queue.LiveWorkers()), self.size))
+      time.sleep(self.queue.poll_interval)
+    logging.info("Ora2PG: %d warm workers ready", self.size)
+
+  def Stop(self):
+    self.queue.RequestStop()
+
+  def Execute(self, job):
+    """Run an Ora2pgJob on the workers and return (returncode, error)."""
+    job_id = self.queue.Submit({
+        "type": job.oracle_type, "schema": job.schema,
+        "output": job.output_file, "log": job.log_file})
+    result = self.queue.WaitForResult(
+        job_id, timeout=self.job_timeout,
+        heartbeat_timeout=self.heartbeat_timeout)
+    if result is None:
+      return None, "No ora2pg worker finished %s in time" % job.name
+    return result["returncode"], result["error"]
+
+
+def StartDockerWorker(image, config_dir, data_dir):
+  """Return a start_worker function for WorkerPool running docker."""
+  def _Start(index):
+    subprocess.run(DockerWorkerCommand(image, config_dir, data_dir, index),
+                   check=True, stdout=subprocess.DEVNULL)
+  return _Start
@@ -0,0 +1,191 @@
+"""Tests for google3.experimental.dhercher.ora2pg_utils.ora2pg_worker_pool."""
+
+import os
+import shutil
+import subprocess
+import threading
+
+from google3.experimental.dhercher.ora2pg_utils import ora2pg_orchestrator
+from google3.experimental.dhercher.ora2pg_utils import ora2pg_worker_pool
+from google3.testing.pybase import googletest
+
+
+# Stands in for Ora2Pg.pm when running ora2pg_worker.pl.
+_FAKE_ORA2PG = r"""
+package Ora2Pg;
+sub new { my ($class, %options) = @_; return bless {%options}, $class; }
+sub export_schema {
+  my ($self) = @_;
+  die "namespace is not an Ora2Pg option\n" if exists $self->{namespace};
+  print "exporting $self->{type} $self->{schema}\n";
+  exit(2) if $self->{schema} eq 'BAD';
+  die "no such schema\n" if $self->{schema} eq 'MISSING';
+  sleep(3) if $self->{schema} eq 'SLOW';
+  open(my $fh, '>', "$self->{output_dir}/$self->{output}");
+  print $fh "CREATE TABLE $self->{schema}.t (id int);\n";
+  close($fh);
+}
+1;
+"""
+
+
+class FileJobQueueTest(googletest.TestCase):
+
+  def setUp(self):
+    super().setUp()
+    self.queue = ora2pg_worker_pool.FileJobQueue(
+        self.create_tempdir().full_path)
+
+  def test_each_job_is_claimed_once(self):
+    job_ids = [self.queue.Submit({"n": i}) for i in range(20)]
+    claimed = []
+    lock = threading.Lock()
+
+    def _Claim(worker_id):
+      while True:
+        payload = self.queue.Claim(worker_id)
+        if payload is None:
+          return
+        with lock:
+          claimed.append(payload["id"])
+
+    threads = [threading.Thread(target=_Claim, args=("w%d" % i,))
+               for i in range(4)]
+    for thread in threads:
+      thread.start()
+    for thread in threads:
+      thread.join()
+    self.assertCountEqual(claimed, job_ids)
+
+  def test_result_round_trip(self):
+    job_id = self.queue.Submit({"type": "TABLE"})
+    payload = self.queue.Claim("w0")
+    self.assertEqual(payload["type"], "TABLE")
+    self.queue.Complete("w0", job_id, 0, duration=0.1)
+    self.assertEqual(self.queue.WaitForResult(job_id)["returncode"], 0)
+    self.assertEmpty(os.listdir(os.path.join(self.queue.queue_dir,
+                                             ora2pg_worker_pool.RUNNING)))
+
+  def test_wait_times_out(self):
+    self.assertIsNone(self.queue.WaitForResult("missing", timeout=0.05))
+
+  def test_live_workers(self):
+    self.queue.Heartbeat("w0")
+    self.assertEqual(self.queue.LiveWorkers(), ["w0"])
+    self.assertEmpty(self.queue.LiveWorkers(timeout=-1))
+
+  def test_job_of_dead_worker_fails(self):
+    job_id = self.queue.Submit({"type": "TABLE"})
+    self.queue.Heartbeat("w0")
+    self.queue.Claim("w0")
+    self.assertEqual(self.queue.ClaimedBy(job_id), "w0")
+
+    result = self.queue.WaitForResult(job_id, heartbeat_timeout=-1)
+
+    self.assertIsNone(result["returncode"])
+    self.assertIn("w0 stopped", result["error"])
+    self.assertIsNone(self.queue.ClaimedBy(job_id))
+
+
+class WorkerPoolTest(googletest.TestCase):
+
+  def setUp(self):
+    super().setUp()
+    self.data_dir = self.create_tempdir().full_path
+    self.queue = ora2pg_worker_pool.FileJobQueue(
+        os.path.join(self.data_dir, "queue"))
+    self.runs = []
+
+  def _RunJob(self, payload):
+    self.runs.append(payload)
+    with open(os.path.join(self.data_dir, payload["output"]), "w") as f:
+      f.write("CREATE TABLE %s.t (id int);\n" % payload["schema"])
+    return 3 if payload["schema"] == "BAD" else 0
+
+  def _StartThreadWorker(self, index):
+    ora2pg_worker_pool.ThreadWorker(
+        self.queue, ora2pg_worker_pool.WORKER_NAME % index,
+        self._RunJob).start()
+
+  def test_orchestrator_runs_jobs_on_workers(self):
+    pool = ora2pg_worker_pool.WorkerPool(
+        self.queue, 2, start_worker=self._StartThreadWorker)
+    pool.Start()
+    self.addCleanup(pool.Stop)
+
+    orchestrator = ora2pg_orchestrator.Ora2pgOrchestrator(
+        self.data_dir, max_workers=2, worker_pool=pool)
+    results = orchestrator.RunAndMerge(
+        ora2pg_orchestrator.BuildJobs(["TABLE"], ["HR", "BAD", "OE"]))
+
+    self.assertEqual([result.returncode for result in results], [0, 3, 0])
+    self.assertLen(self.runs, 3)
+    with open(os.path.join(self.data_dir,
+                           ora2pg_orchestrator.OUTPUT_FILE)) as f:
+      merged = f.read()
+    self.assertIn("HR.t", merged)
+    self.assertNotIn("BAD.t", merged)
+
+  def test_start_skips_live_workers(self):
+    started = []
+    self.queue.Heartbeat("ora2pg-worker-0")
+
+    def _Start(index):
+      started.append(index)
+      self.queue.Heartbeat(ora2pg_worker_pool.WORKER_NAME % index)
+
+    ora2pg_worker_pool.WorkerPool(self.queue, 2, start_worker=_Start).Start()
+    self.assertEqual(started, [1])
+
+  def test_docker_worker_command_hides_credentials(self):
+    command = ora2pg_worker_pool.DockerWorkerCommand(
+        "ora2pg", "/config", "/data", 3)
+    self.assertIn("ora2pg-worker-3", command)
+    self.assertIn("ORA2PG_PASSWORD", command)
+    self.assertEmpty([arg for arg in command if "=" in arg])
+    self.assertEqual(command[-4:], [
+        ora2pg_worker_pool.WORKER_SCRIPT, "/data/queue", "/data",
+        "ora2pg-worker-3"])
+
+
+class PerlWorkerTest(googletest.TestCase):
+
+  def setUp(self):
+    super().setUp()
+    if not shutil.which("perl"):
+      self.skipTest("perl is not installed")
+    self.lib_dir = self.create_tempdir().full_path
+    with open(os.path.join(self.lib_dir, "Ora2Pg.pm"), "w") as f:
+      f.write(_FAKE_ORA2PG)
+    self.data_dir = self.create_tempdir().full_path
+    os.makedirs(os.path.join(self.data_dir, "logs"))
+    self.queue = ora2pg_worker_pool.FileJobQueue(
+        os.path.join(self.data_dir, "queue"))
+
+  def test_perl_worker_protocol(self):
+    script = os.path.join(os.path.dirname(ora2pg_worker_pool.__file__),
+                          "ora2pg_worker.pl")
+    env = dict(os.environ, PERL5LIB=self.lib_dir, ORA2PG_REUSE_SESSION="0")
+    process = subprocess.Popen(
+        ["perl", script, self.queue.queue_dir, self.data_dir, "w0"], env=env)
+    self.addCleanup(process.wait, 10)
+    self.addCleanup(self.queue.RequestStop)
+
+    pool = ora2pg_worker_pool.WorkerPool(self.queue, 1, job_timeout=20,
+                                         heartbeat_timeout=2)
+    results = [pool.Execute(ora2pg_orchestrator.Ora2pgJob("TABLE", schema))
+               for schema in ("HR", "BAD", "MISSING", "SLOW")]
+
+    self.assertEqual(results[0], (0, None))
+    self.assertEqual(results[1], (2, None))
+    self.assertEqual(results[2], (1, "no such schema\n"))
+    # The heartbeat stays fresh while a job outlasts the heartbeat timeout.
+    self.assertEqual(results[3], (0, None))
+    with open(os.path.join(self.data_dir, "TABLE_HR_output.sql")) as f:
+      self.assertEqual(f.read(), "CREATE TABLE HR.t (id int);\n")
+    with open(os.path.join(self.data_dir, "logs", "TABLE_HR.log")) as f:
+      self.assertEqual(f.read(), "exporting TABLE HR\n")
+
+
+if __name__ == "__main__":
+  googletest.main()
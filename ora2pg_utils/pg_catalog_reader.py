@@ -0,0 +1,144 @@
+"""Read the tables, constraints and indexes of a live PostgreSQL database.
+
+The reader fills the same ddl_model.Catalog ParseDdl builds from converted
+DDL, using pg_catalog so types, defaults and definitions come back in the
+form PostgreSQL prints them. Connections use psycopg2, which is only needed
+by the tools that talk to PostgreSQL.
+"""
+
+try:
+  import psycopg2  # pylint: disable=g-import-not-at-top
+except ImportError:
+  psycopg2 = None
+
+try:
+  from google3.experimental.dhercher.ora2pg_utils import ddl_model  # pylint: disable=g-import-not-at-top
+except ModuleNotFoundError:
+  import ddl_model  # pytype: disable=import-error  pylint: disable=g-import-not-at-top
+
+
+_TABLES_QUERY = """
+SELECT n.nspname, c.relname
+FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace
+WHERE c.relkind IN ('r', 'p') AND n.nspname = ANY(%s)
+ORDER BY 1, 2
+"""
+
+_COLUMNS_QUERY = """
+SELECT n.nspname, c.relname, a.attname,
+       format_type(a.atttypid, a.atttypmod), a.attnotnull,
+       pg_get_expr(d.adbin, d.adrelid), a.attidentity
+FROM pg_attribute a
+JOIN pg_class c ON c.oid = a.attrelid
+JOIN pg_namespace n ON n.oid = c.relnamespace
+LEFT JOIN pg_attrdef d ON d.adrelid = a.attrelid AND d.adnum = a.attnum
+WHERE c.relkind IN ('r', 'p') AND n.nspname = ANY(%s)
+  AND a.attnum > 0 AND NOT a.attisdropped
+ORDER BY 1, 2, a.attnum
+"""
+
+_CONSTRAINTS_QUERY = """
+SELECT n.nspname, c.relname, k.conname, k.contype,
+       pg_get_constraintdef(k.oid)
+FROM pg_constraint k
+JOIN pg_class c ON c.oid = k.conrelid
+JOIN pg_namespace n ON n.oid = c.relnamespace
+WHERE n.nspname = ANY(%s)
+ORDER BY 1, 2, 3
+"""
+
+# Indexes backing a constraint are managed through the constraint.
+_INDEXES_QUERY = """
+SELECT n.nspname, t.relname, i.relname, x.indisunique, am.amname,
+       pg_get_indexdef(x.indexrelid)
+FROM pg_index x
+JOIN pg_class i ON i.oid = x.indexrelid
+JOIN pg_class t ON t.oid = x.indrelid
+JOIN pg_namespace n ON n.oid = t.relnamespace
+JOIN pg_am am ON am.oid = i.relam
+WHERE n.nspname = ANY(%s)
+  AND NOT EXISTS (SELECT 1 FROM pg_constraint k
+                  WHERE k.conindid = x.indexrelid)
+ORDER BY 1, 2, 3
+"""
+
+_SCHEMAS_QUERY = "SELECT nspname FROM pg_namespace WHERE nspname = ANY(%s)"
+
+_TABLE_SIZES_QUERY = """
+SELECT n.nspname, c.relname, pg_table_size(c.oid)
+FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace
+WHERE c.relkind IN ('r', 'p') AND n.nspname = ANY(%s)
+"""
+
+_CONSTRAINT_KINDS = {
+    "p": ddl_model.PRIMARY_KEY,
+    "u": ddl_model.UNIQUE,
+    "f": ddl_model.FOREIGN_KEY,
+    "c": ddl_model.CHECK,
+    "x": ddl_model.EXCLUDE,
+}
+
+
+def Connect(dsn):
+  """Return a psycopg2 connection, eg. for "host=h user=u dbname=d"."""
+  if psycopg2 is None:
+    raise ImportError("psycopg2 is required to connect to PostgreSQL: "
+                      "pip install psycopg2-binary")
+  return psycopg2.connect(dsn)
+
+
+def _IndexDefinition(indexdef):
+  """Return the column list and anything after it from pg_get_indexdef."""
+  return indexdef[indexdef.index("(", indexdef.index(" USING ")):]
+
+
+def ReadCatalog(connection, schemas):
+  """Return a ddl_model.Catalog of the tables and indexes in schemas.
+
+  Args:
+    connection: A DB-API connection to PostgreSQL, eg. from Connect.
+    schemas: The schema names to read.
+  """
+  schemas = sorted(schemas)
+  catalog = ddl_model.Catalog()
+  with connection.cursor() as cursor:
+    # Print every name fully qualified.
+    cursor.execute("SET search_path = pg_catalog")
+
+    cursor.execute(_SCHEMAS_QUERY, (schemas,))
+    catalog.schemas.update(row[0] for row in cursor.fetchall())
+
+    cursor.execute(_TABLES_QUERY, (schemas,))
+    for schema, table in cursor.fetchall():
+      catalog.AddTable(ddl_model.Table((schema, table)))
+
+    cursor.execute(_COLUMNS_QUERY, (schemas,))
+    for schema, table, name, data_type, not_null, default, identity in (
+        cursor.fetchall()):
+      catalog.tables[(schema, table)].columns[name] = ddl_model.Column(
+          name, data_type, not_null=not_null, default=default,
+          identity=identity or None)
+
+    cursor.execute(_CONSTRAINTS_QUERY, (schemas,))
+    for schema, table, name, kind, definition in cursor.fetchall():
+      if (schema, table) in catalog.tables and kind in _CONSTRAINT_KINDS:
+        catalog.tables[(schema, table)].constraints.append(
+            ddl_model.Constraint((schema, table), name,
+                                 _CONSTRAINT_KINDS[kind], definition))
+
+    cursor.execute(_INDEXES_QUERY, (schemas,))
+    for schema, table, name, unique, method, indexdef in cursor.fetchall():
+      catalog.indexes[(schema, name)] = ddl_model.Index(
+          name, (schema, table), unique, method, _IndexDefinition(indexdef))
+    connection.rollback()
+  return catalog
+
+
+def ReadTableSizes(connection, schemas):
+  """Return {(schema, table): size in bytes} for the tables in schemas."""
+  with connection.cursor() as cursor:
+    cursor.execute(_TABLE_SIZES_QUERY, (sorted(schemas),))
+    sizes = {(schema, table): size
+             for schema, table, size in cursor.fetchall()}
+  connection.rollback()
+  return sizes
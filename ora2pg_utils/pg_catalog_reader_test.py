@@ -0,0 +1,109 @@
+"""Tests for google3.experimental.dhercher.ora2pg_utils.pg_catalog_reader."""
+
+import mock
+
+from google3.experimental.dhercher.ora2pg_utils import ddl_model
+from google3.experimental.dhercher.ora2pg_utils import pg_catalog_reader
+from google3.testing.pybase import googletest
+
+
+class FakeCursor(object):
+  """A cursor returning canned rows for each catalog query."""
+
+  def __init__(self, rows):
+    self.rows = rows
+    self.executed = []
+    self._result = []
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *unused_args):
+    return False
+
+  def execute(self, query, params=None):
+    self.executed.append((query, params))
+    self._result = []
+    for marker, rows in self.rows.items():
+      if marker in query:
+        self._result = rows
+
+  def fetchall(self):
+    return self._result
+
+
+class FakeConnection(object):
+
+  def __init__(self, rows):
+    self.cursor_ = FakeCursor(rows)
+    self.rollback = mock.Mock()
+
+  def cursor(self):
+    return self.cursor_
+
+
+# Rows keyed by a fragment of the query returning them.
+CATALOG_ROWS = {
+    "FROM pg_namespace WHERE": [("hr",)],
+    "c.relkind IN ('r', 'p') AND n.nspname = ANY(%s)\nORDER BY 1, 2\n": [
+        ("hr", "jobs"), ("hr", "emp")],
+    "FROM pg_attribute": [
+        ("hr", "jobs", "id", "numeric(10,0)", True, None, ""),
+        ("hr", "jobs", "title", "character varying(35)", False,
+         "'none'::character varying", ""),
+        ("hr", "emp", "id", "bigint", True, None, "a"),
+        ("hr", "emp", "job_id", "numeric(10,0)", False, None, ""),
+    ],
+    "FROM pg_constraint k\n": [
+        ("hr", "jobs", "jobs_pkey", "p", "PRIMARY KEY (id)"),
+        ("hr", "emp", "emp_job_id_fkey", "f",
+         "FOREIGN KEY (job_id) REFERENCES hr.jobs(id)"),
+        ("hr", "emp", "emp_trigger", "t", "TRIGGER"),
+    ],
+    "FROM pg_index": [
+        ("hr", "emp", "emp_job_idx", False, "btree",
+         "CREATE INDEX emp_job_idx ON hr.emp USING btree (job_id)"),
+    ],
+}
+
+
+class ReadCatalogTest(googletest.TestCase):
+
+  def test_read_catalog(self):
+    connection = FakeConnection(CATALOG_ROWS)
+    catalog = pg_catalog_reader.ReadCatalog(connection, {"hr"})
+
+    self.assertEqual(catalog.schemas, {"hr"})
+    self.assertEqual(list(catalog.tables), [("hr", "jobs"), ("hr", "emp")])
+    title = catalog.tables[("hr", "jobs")].columns["title"]
+    self.assertEqual(title.data_type, "character varying(35)")
+    self.assertEqual(title.default_key,
+                     ddl_model.NormalizeDefinition("'none'"))
+    emp = catalog.tables[("hr", "emp")]
+    self.assertEqual(emp.columns["id"].identity, ddl_model.IDENTITY_ALWAYS)
+    self.assertIsNone(emp.columns["job_id"].identity)
+    self.assertEqual([(c.name, c.kind) for c in emp.constraints],
+                     [("emp_job_id_fkey", ddl_model.FOREIGN_KEY)])
+    index = catalog.indexes[("hr", "emp_job_idx")]
+    self.assertEqual((index.table, index.method, index.definition),
+                     (("hr", "emp"), "btree", "(job_id)"))
+
+    executed = connection.cursor_.executed
+    self.assertEqual(executed[0][0], "SET search_path = pg_catalog")
+    self.assertEqual(executed[1][1], (["hr"],))
+    connection.rollback.assert_called_once()
+
+  def test_read_table_sizes(self):
+    connection = FakeConnection({"pg_table_size": [("hr", "emp", 8192)]})
+    self.assertEqual(pg_catalog_reader.ReadTableSizes(connection, ["hr"]),
+                     {("hr", "emp"): 8192})
+    connection.rollback.assert_called_once()
+
+  def test_connect_needs_psycopg2(self):
+    with mock.patch.object(pg_catalog_reader, "psycopg2", None):
+      with self.assertRaises(ImportError):
+        pg_catalog_reader.Connect("dbname=postgres")
+
+
+if __name__ == "__main__":
+  googletest.main()
@@ -0,0 +1,580 @@
+"""Build post-data indexes and constraints over several connections at once.
+
+Applying post_data.sql one statement at a time leaves the database building
+a single index while the others wait. The executor parses the statements
+into tasks, and runs them on a pool of PostgreSQL sessions, each with its
+own maintenance_work_mem:
+
+- Tasks whose locks would conflict are not run together: ALTER TABLE and
+  concurrent index builds on a table run one at a time, while ordinary
+  index builds share it. A foreign key also locks the table it references.
+- A foreign key waits for the primary and unique keys of the table it
+  references, and a comment waits for the object it describes. Tasks which
+  depend on a failed task are skipped.
+- Among the runnable tasks the largest tables go first, so the longest
+  builds do not start last.
+
+While replication is writing to the tables, nothing is built under a lock
+which blocks writes for the length of a build:
+
+- Indexes are built with CREATE INDEX CONCURRENTLY.
+- Primary and unique keys are built as a unique index, concurrently, which
+  ALTER TABLE ... ADD CONSTRAINT ... USING INDEX then turns into the key.
+- Foreign keys and check constraints are added NOT VALID, and checked
+  against the existing rows by ALTER TABLE ... VALIDATE CONSTRAINT.
+
+An index left behind by a failed concurrent build, or a constraint which
+failed its validation, is dropped so the statement can be run again.
+"""
+
+import logging
+import re
+import threading
+import time
+
+try:
+  from google3.experimental.dhercher.ora2pg_utils import ddl_parser  # pylint: disable=g-import-not-at-top
+except ModuleNotFoundError:
+  import ddl_parser  # pytype: disable=import-error  pylint: disable=g-import-not-at-top
+
+DEFAULT_CONNECTIONS = 4
+DEFAULT_MAINTENANCE_WORK_MEM = "1GB"
+
+INDEX = "index"
+KEY = "key"  # PRIMARY KEY or UNIQUE, which foreign keys depend on.
+CONSTRAINT = "constraint"
+FOREIGN_KEY = "foreign_key"
+OTHER = "other"
+# Runnable tasks of earlier kinds are started first.
+_KIND_ORDER = {KEY: 0, INDEX: 0, CONSTRAINT: 0, FOREIGN_KEY: 1, OTHER: 2}
+
+_SET_RE = re.compile(r"\s*SET\s+(?:SESSION\s+|LOCAL\s+)?(\w+)", re.I)
+_REFERENCES_RE = re.compile(r"\bREFERENCES\s+(%s)" % ddl_parser.NAME, re.I)
+_COMMENT_ON_INDEX_RE = re.compile(r"\s*COMMENT\s+ON\s+INDEX\s+(%s)" %
+                                  ddl_parser.NAME, re.I)
+_COMMENT_ON_CONSTRAINT_RE = re.compile(
+    r"\s*COMMENT\s+ON\s+CONSTRAINT\s+%s\s+ON\s+(?:DOMAIN\s+)?(%s)" %
+    (ddl_parser.IDENTIFIER, ddl_parser.NAME), re.I)
+_INDEX_KEYWORD_RE = re.compile(r"\bINDEX\s+", re.I)
+_NOT_VALID_RE = re.compile(r"\bNOT\s+VALID\b", re.I)
+_KEY_RE = re.compile(r"(?:PRIMARY\s+KEY|UNIQUE)\s*\Z", re.I)
+# The clauses of a key which ADD CONSTRAINT ... USING INDEX cannot take are
+# moved to the index.
+_KEY_CLAUSE_RE = re.compile(
+    r"\s*(?:(?P<index>(?:INCLUDE|WITH)\s*)\(|"
+    r"USING\s+INDEX\s+TABLESPACE\s+(?P<tablespace>%s)|"
+    r"(?P<constraint>(?:NOT\s+)?DEFERRABLE|"
+    r"INITIALLY\s+(?:DEFERRED|IMMEDIATE)))" % ddl_parser.IDENTIFIER, re.I)
+
+
+class PostDataTask(object):
+  """One post-data statement and what it needs to run."""
+
+  def __init__(self, index, statement, kind, table=None, name=None,
+               settings=None):
+    """Initialize the PostDataTask.
+
+    Args:
+      index: The statement's position in the input.
+      statement: The statement text.
+      kind: One of INDEX, KEY, CONSTRAINT, FOREIGN_KEY or OTHER.
+      table: The qualified name tuple of the table it builds on.
+      name: The qualified name tuple of the index it creates.
+      settings: The SET statements in effect where it appeared.
+    """
+    self.index = index
+    self.statement = statement.strip()
+    self.kind = kind
+    self.table = table
+    self.name = name
+    self.settings = tuple(settings or ())
+    # [(statement, statement undoing it when it fails)], run in order.
+    self.steps = [(self.statement, None)]
+    self.unique = False
+    self.references = None
+    # {table: whether the task needs it to itself}
+    self.locks = {}
+    self.depends_on = set()
+    # OTHER statements with no known target wait for every other task.
+    self.barrier = False
+
+  def __repr__(self):
+    return "<PostDataTask %d %s %s>" % (self.index, self.kind,
+                                        self.Describe())
+
+  def Describe(self):
+    target = self.name or self.table
+    return "%s %s" % (self.kind, ddl_parser.FormatName(target)
+                      if target else self.statement.split("\n")[0][:60])
+
+
+def _Qualify(text, schema):
+  return ddl_parser.QualifyName(ddl_parser.ParseName(text), schema)
+
+
+def _Concurrently(statement):
+  """Return a CREATE INDEX statement which builds the index concurrently."""
+  match = _INDEX_KEYWORD_RE.search(ddl_parser.StripQuotedKeepLength(statement))
+  return statement[:match.end()] + "CONCURRENTLY " + statement[match.end():]
+
+
+def _ChooseName(table, columns, suffix, used):
+  """Return PostgreSQL's name for an unnamed constraint, unless it is taken.
+
+  Args:
+    table: The qualified name tuple of the constraint's table.
+    columns: The column names PostgreSQL puts in the name.
+    suffix: "pkey", "key", "fkey" or "check".
+    used: The qualified name tuples taken so far, which the name is added to.
+  """
+  number = 0
+  while True:
+    name = ddl_parser.MakeObjectName(table[-1], columns,
+                                     "%s%s" % (suffix, number or ""))
+    if table[:-1] + (name,) not in used:
+      used.add(table[:-1] + (name,))
+      return name
+    number += 1
+
+
+def _ParseColumns(text):
+  return tuple(ddl_parser.ParseName(column)[-1]
+               for column in ddl_parser.SplitTopLevel(text)
+               if ddl_parser.ParseName(column))
+
+
+def _ValidateLaterSteps(statement, alter, table_text, name):
+  """Return the steps adding a constraint NOT VALID, then validating it."""
+  start, end = alter.span("definition")
+  constraint = ("" if alter.group("constraint") else
+                "CONSTRAINT %s " % ddl_parser.QuoteIdentifier(name))
+  add = "%s %s%s NOT VALID;" % (statement[:start].strip(), constraint,
+                                statement[start:end])
+  quoted = ddl_parser.QuoteIdentifier(name)
+  return [(add, None),
+          ("ALTER TABLE %s VALIDATE CONSTRAINT %s;" % (table_text, quoted),
+           "ALTER TABLE %s DROP CONSTRAINT IF EXISTS %s;" % (table_text,
+                                                             quoted))]
+
+
+def _UsingIndexSteps(alter, table, table_text, constraint, used):
+  """Return the steps building a key on a concurrently built unique index.
+
+  Returns None for keys the unique index cannot express, eg. UNIQUE NULLS
+  NOT DISTINCT.
+  """
+  definition = alter.group("definition")
+  blanked = ddl_parser.StripQuotedKeepLength(definition)
+  start = blanked.find("(")
+  end = ddl_parser.FindClosingParen(definition, start) if start >= 0 else -1
+  if end < 0 or not _KEY_RE.match(blanked[:start]):
+    return None
+  index_clauses = []
+  tablespace = ""
+  constraint_clauses = []
+  pos = end + 1
+  while blanked[pos:].strip():
+    clause = _KEY_CLAUSE_RE.match(definition, pos)
+    if not clause:
+      return None
+    pos = clause.end()
+    if clause.group("index"):
+      close = ddl_parser.FindClosingParen(definition, pos - 1)
+      if close < 0:
+        return None
+      index_clauses.append(definition[clause.start("index"):close + 1])
+      pos = close + 1
+    elif clause.group("tablespace"):
+      tablespace = " TABLESPACE " + clause.group("tablespace")
+    else:
+      constraint_clauses.append(clause.group("constraint"))
+
+  primary = blanked[:start].strip().upper().startswith("PRIMARY")
+  name = constraint or _ChooseName(
+      table, () if primary else _ParseColumns(definition[start + 1:end]),
+      "pkey" if primary else "key", used)
+  quoted = ddl_parser.QuoteIdentifier(name)
+  drop = "DROP INDEX CONCURRENTLY IF EXISTS %s" % ddl_parser.FormatName(
+      table[:-1] + (name,))
+  create = "CREATE UNIQUE INDEX CONCURRENTLY %s ON %s %s%s%s;" % (
+      quoted, table_text, definition[start:end + 1],
+      "".join(" " + clause for clause in index_clauses), tablespace)
+  add = "ALTER TABLE %s ADD CONSTRAINT %s %s USING INDEX %s%s;" % (
+      table_text, quoted, "PRIMARY KEY" if primary else "UNIQUE", quoted,
+      "".join(" " + clause for clause in constraint_clauses))
+  # The index is not the key's until the ALTER TABLE succeeds.
+  return [(create, drop), (add, drop)]
+
+
+def _OnlineSteps(statement, alter, table, used):
+  """Return the steps adding a constraint without blocking writes, or None.
+
+  Args:
+    statement: The ALTER TABLE ... ADD statement.
+    alter: Its ddl_parser.ALTER_TABLE_ADD_RE match.
+    table: The qualified name tuple of its table.
+    used: The qualified name tuples of the indexes and constraints so far.
+  """
+  definition = alter.group("definition")
+  kind = re.match(r"(\w+)", definition).group(1).upper()
+  table_text = ddl_parser.CompactName(alter.group("name"))
+  constraint = (ddl_parser.ParseName(alter.group("constraint"))[0]
+                if alter.group("constraint") else None)
+  if kind in ("PRIMARY", "UNIQUE"):
+    return _UsingIndexSteps(alter, table, table_text, constraint, used)
+  if kind not in ("FOREIGN", "CHECK") or _NOT_VALID_RE.search(
+      ddl_parser.StripQuoted(definition)):
+    return None
+  if not constraint:
+    columns = ()
+    if kind == "FOREIGN":
+      blanked = ddl_parser.StripQuotedKeepLength(definition)
+      start = blanked.find("(")
+      end = ddl_parser.FindClosingParen(definition, start)
+      columns = _ParseColumns(definition[start + 1:end])
+    constraint = _ChooseName(table, columns,
+                             "fkey" if kind == "FOREIGN" else "check", used)
+  return _ValidateLaterSteps(statement, alter, table_text, constraint)
+
+
+def ParseTasks(statements, concurrently=False):
+  """Return the PostDataTasks of statements from SplitStatements.
+
+  Args:
+    statements: The post-data statement texts.
+    concurrently: Whether to build indexes and constraints without blocking
+        writes to their tables.
+  """
+  tasks = []
+  settings = {}
+  schema = None
+  # Index and constraint names, which generated constraint names avoid.
+  used = set()
+  for statement in statements:
+    blanked = ddl_parser.StripQuoted(statement)
+    if not blanked.strip():
+      continue
+    setting = _SET_RE.match(blanked)
+    if setting:
+      settings[setting.group(1).lower()] = statement.strip()
+      search_path = ddl_parser.SEARCH_PATH_RE.match(statement)
+      if search_path:
+        schema = ddl_parser.ParseName(search_path.group("schema"))[0]
+      continue
+
+    current = list(settings.values())
+    index = ddl_parser.CREATE_INDEX_RE.match(statement)
+    alter = ddl_parser.ALTER_TABLE_ADD_RE.match(statement)
+    if index:
+      table = _Qualify(index.group("table"), schema)
+      name = (table[:-1] + ddl_parser.ParseName(index.group("name"))
+              if index.group("name") else None)
+      build_concurrently = concurrently or bool(index.group("concurrently"))
+      if concurrently and not index.group("concurrently"):
+        statement = _Concurrently(statement)
+      task = PostDataTask(len(tasks), statement, INDEX, table, name, current)
+      if name:
+        used.add(name)
+      if build_concurrently and name:
+        # A failed concurrent build leaves an invalid index behind.
+        task.steps = [(task.statement, "DROP INDEX CONCURRENTLY IF EXISTS %s" %
+                       ddl_parser.FormatName(name))]
+      # Concurrent builds of one table conflict with each other.
+      task.locks[table] = build_concurrently
+      task.unique = bool(index.group("unique"))
+    elif alter:
+      table = _Qualify(alter.group("name"), schema)
+      definition = alter.group("definition")
+      kind = re.match(r"(\w+)", definition).group(1).upper()
+      if alter.group("constraint"):
+        used.add(table[:-1] + ddl_parser.ParseName(alter.group("constraint")))
+      if kind == "FOREIGN":
+        task = PostDataTask(len(tasks), statement, FOREIGN_KEY, table,
+                            settings=current)
+        references = _REFERENCES_RE.search(
+            ddl_parser.StripQuotedKeepLength(definition))
+        if references:
+          task.references = _Qualify(
+              definition[references.start(1):references.end(1)], schema)
+          task.locks[task.references] = True
+      else:
+        task = PostDataTask(
+            len(tasks), statement,
+            KEY if kind in ("PRIMARY", "UNIQUE") else CONSTRAINT, table,
+            settings=current)
+      task.locks[table] = True
+      if concurrently:
+        task.steps = (_OnlineSteps(statement, alter, table, used) or
+                      task.steps)
+    else:
+      task = PostDataTask(len(tasks), statement, OTHER, settings=current)
+      comment_index = _COMMENT_ON_INDEX_RE.match(blanked)
+      comment_constraint = _COMMENT_ON_CONSTRAINT_RE.match(blanked)
+      if comment_index:
+        task.name = _Qualify(statement[comment_index.start(1):
+                                       comment_index.end(1)], schema)
+      elif comment_constraint:
+        task.table = _Qualify(statement[comment_constraint.start(1):
+                                        comment_constraint.end(1)], schema)
+      else:
+        task.barrier = True
+    tasks.append(task)
+  _AddDependencies(tasks)
+  return tasks
+
+
+def _AddDependencies(tasks):
+  keys = {}
+  indexes = {}
+  constraints = {}
+  for task in tasks:
+    if task.kind == KEY or (task.kind == INDEX and task.unique):
+      keys.setdefault(task.table, []).append(task)
+    if task.kind == INDEX and task.name:
+      indexes[task.name] = task
+    if task.kind in (KEY, CONSTRAINT, FOREIGN_KEY):
+      constraints.setdefault(task.table, []).append(task)
+
+  for task in tasks:
+    if task.kind == FOREIGN_KEY and task.references:
+      task.depends_on.update(keys.get(task.references, ()))
+    elif task.kind == OTHER and task.name in indexes:
+      task.depends_on.add(indexes[task.name])
+    elif task.kind == OTHER and task.table:
+      task.depends_on.update(constraints.get(task.table, ()))
+    task.depends_on.discard(task)
+
+
+class TaskResult(object):
+  """The outcome of one task."""
+
+  __slots__ = ("task", "duration", "error", "skipped")
+
+  def __init__(self, task, duration=0.0, error=None, skipped=False):
+    self.task = task
+    self.duration = duration
+    self.error = error
+    self.skipped = skipped
+
+  @property
+  def succeeded(self):
+    return self.error is None and not self.skipped
+
+
+class PostDataReport(object):
+  """The results and timings of a post-data run."""
+
+  def __init__(self, results, wall_seconds):
+    self.results = sorted(results, key=lambda result: result.task.index)
+    self.wall_seconds = wall_seconds
+
+  @property
+  def succeeded(self):
+    return all(result.succeeded for result in self.results)
+
+  @property
+  def failed(self):
+    return [result for result in self.results if result.error is not None]
+
+  @property
+  def skipped(self):
+    return [result for result in self.results if result.skipped]
+
+  def LogSummary(self, slowest=10):
+    busy = sum(result.duration for result in self.results)
+    logging.info(
+        "Post-data: %d statements in %.1fs (%.1fs of builds), %d failed, "
+        "%d skipped", len(self.results), self.wall_seconds, busy,
+        len(self.failed), len(self.skipped))
+    for result in sorted(self.results, key=lambda r: -r.duration)[:slowest]:
+      if result.duration:
+        logging.info("  %7.1fs %s", result.duration, result.task.Describe())
+    for result in self.failed:
+      logging.error("FAILED %s: %s", result.task.Describe(), result.error)
+    for result in self.skipped:
+      logging.warning("SKIPPED %s: a statement it depends on failed",
+                      result.task.Describe())
+
+
+class PostDataExecutor(object):
+  """Run PostDataTasks over a pool of PostgreSQL connections."""
+
+  def __init__(self, connect, connections=None, maintenance_work_mem=None,
+               table_sizes=None, clock=None):
+    """Initialize the PostDataExecutor.
+
+    Args:
+      connect: A function returning a new DB-API connection.
+      connections: The number of sessions to build on at once.
+      maintenance_work_mem: The maintenance_work_mem of each session, eg.
+          "2GB", or None to keep the server default.
+      table_sizes: {table name tuple: bytes}, from
+          pg_catalog_reader.ReadTableSizes.
+      clock: A time.time replacement, for tests.
+    """
+    self.connect = connect
+    self.connections = connections or DEFAULT_CONNECTIONS
+    self.maintenance_work_mem = maintenance_work_mem
+    self.table_sizes = table_sizes or {}
+    self._clock = clock or time.time
+
+  def _Priority(self, task):
+    return (_KIND_ORDER[task.kind], -self.table_sizes.get(task.table, 0),
+            task.index)
+
+  def _OpenSession(self):
+    connection = self.connect()
+    # CREATE INDEX CONCURRENTLY cannot run in a transaction block.
+    connection.autocommit = True
+    if self.maintenance_work_mem:
+      with connection.cursor() as cursor:
+        cursor.execute("SET maintenance_work_mem = %s",
+                       (self.maintenance_work_mem,))
+    return connection
+
+  def _Execute(self, connection, session_settings, task):
+    with connection.cursor() as cursor:
+      for setting in task.settings:
+        key = _SET_RE.match(setting).group(1).lower()
+        if session_settings.get(key) != setting:
+          cursor.execute(setting)
+          session_settings[key] = setting
+      for statement, undo in task.steps:
+        try:
+          cursor.execute(statement)
+        except Exception:
+          if undo:
+            cursor.execute(undo)
+          raise
+
+  def Run(self, tasks):
+    """Run the tasks and return a PostDataReport."""
+    start = self._clock()
+    state = _Scheduler(tasks, self._Priority)
+    threads = [threading.Thread(target=self._Worker, args=(state,),
+                                name="post-data-%d" % i, daemon=True)
+               for i in range(min(self.connections, len(tasks)))]
+    for thread in threads:
+      thread.start()
+    for thread in threads:
+      thread.join()
+    state.FailPending("No post-data session could be opened")
+    return PostDataReport(state.results, self._clock() - start)
+
+  def _Worker(self, state):
+    try:
+      connection = self._OpenSession()
+    except Exception:  # pylint: disable=broad-except
+      # The other sessions carry on with the tasks.
+      logging.exception("Unable to open a post-data session")
+      return
+    session_settings = {}
+    try:
+      while True:
+        task = state.Next()
+        if task is None:
+          return
+        task_start = self._clock()
+        error = None
+        try:
+          self._Execute(connection, session_settings, task)
+        except Exception as e:  # pylint: disable=broad-except
+          error = str(e).strip() or repr(e)
+        state.Finish(TaskResult(task, self._clock() - task_start, error))
+    finally:
+      connection.close()
+
+
+class _Scheduler(object):
+  """The shared state of the executor's workers."""
+
+  def __init__(self, tasks, priority):
+    self._pending = sorted(tasks, key=priority)
+    self._total = len(tasks)
+    self._condition = threading.Condition()
+    self._running = set()
+    self._shared = {}
+    self._exclusive = set()
+    self._done = set()
+    self._failed = set()
+    self._unfinished_non_barrier = sum(1 for t in tasks if not t.barrier)
+    self.results = []
+
+  def _CanLock(self, task):
+    for table, exclusive in task.locks.items():
+      if table in self._exclusive:
+        return False
+      if exclusive and self._shared.get(table):
+        return False
+    return True
+
+  def _IsReady(self, task):
+    if task.barrier and self._unfinished_non_barrier:
+      return False
+    return task.depends_on <= self._done and self._CanLock(task)
+
+  def _SkipFailedDependents(self):
+    skipped = True
+    while skipped:
+      skipped = False
+      for task in list(self._pending):
+        if task.depends_on & self._failed:
+          self._pending.remove(task)
+          self._Record(TaskResult(task, skipped=True))
+          skipped = True
+
+  def _Record(self, result):
+    task = result.task
+    self.results.append(result)
+    (self._done if result.succeeded else self._failed).add(task)
+    if not task.barrier:
+      self._unfinished_non_barrier -= 1
+    logging.info("[%d/%d] %s %s in %.1fs", len(self.results), self._total,
+                 "built" if result.succeeded else
+                 "skipped" if result.skipped else "FAILED",
+                 task.Describe(), result.duration)
+
+  def Next(self):
+    """Wait for and claim the next runnable task, or None when done."""
+    with self._condition:
+      while True:
+        if not self._pending:
+          self._condition.notify_all()
+          return None
+        for task in self._pending:
+          if self._IsReady(task):
+            self._pending.remove(task)
+            self._running.add(task)
+            for table, exclusive in task.locks.items():
+              if exclusive:
+                self._exclusive.add(table)
+              else:
+                self._shared[table] = self._shared.get(table, 0) + 1
+            return task
+        if not self._running:
+          # Nothing can become ready, eg. dependencies on missing tasks.
+          for task in self._pending:
+            self._Record(TaskResult(task, skipped=True))
+          self._pending = []
+          continue
+        self._condition.wait()
+
+  def Finish(self, result):
+    with self._condition:
+      task = result.task
+      self._running.discard(task)
+      for table, exclusive in task.locks.items():
+        if exclusive:
+          self._exclusive.discard(table)
+        else:
+          self._shared[table] -= 1
+      self._Record(result)
+      self._SkipFailedDependents()
+      self._condition.notify_all()
+
+  def FailPending(self, error):
+    """Fail any tasks left when every worker has exited."""
+    with self._condition:
+      for task in self._pending:
+        self._Record(TaskResult(task, error=error))
+      self._pending = []
@@ -0,0 +1,267 @@
+"""Tests for google3.experimental.dhercher.ora2pg_utils.post_data_executor."""
+
+import os
+import threading
+import time
+
+from google3.experimental.dhercher.ora2pg_utils import ddl_parser
+from google3.experimental.dhercher.ora2pg_utils import pg_catalog_reader
+from google3.experimental.dhercher.ora2pg_utils import post_data_executor
+from google3.testing.pybase import googletest
+
+_POST_DATA = """SET search_path = hr,public;
+ALTER TABLE emp ADD CONSTRAINT emp_job_fk FOREIGN KEY (job_id) REFERENCES jobs(id);
+CREATE INDEX emp_job_idx ON emp (job_id);
+CREATE INDEX emp_name_idx ON emp (name);
+ALTER TABLE jobs ADD UNIQUE (id);
+CREATE INDEX jobs_title_idx ON jobs (title);
+COMMENT ON INDEX emp_job_idx IS 'By job';
+ALTER TABLE emp ADD CONSTRAINT emp_ck CHECK (id > 0);
+"""
+
+
+def _Tasks(sql, concurrently=False):
+  return post_data_executor.ParseTasks(
+      ddl_parser.SplitStatements(sql.splitlines(True)), concurrently)
+
+
+class FakeDatabase(object):
+  """Records statements and checks that conflicting ones never overlap."""
+
+  def __init__(self, fail=(), delay=0.01):
+    self.fail = fail
+    self.delay = delay
+    self.lock = threading.Lock()
+    self.executed = []
+    self.active = []
+    self.overlaps = []
+    self.max_active = 0
+    self.sessions = []
+
+  def Connect(self):
+    connection = FakeConnection(self)
+    self.sessions.append(connection)
+    return connection
+
+
+class FakeConnection(object):
+
+  def __init__(self, database):
+    self.database = database
+    self.autocommit = False
+    self.closed = False
+
+  def cursor(self):
+    return FakeCursor(self)
+
+  def close(self):
+    self.closed = True
+
+
+class FakeCursor(object):
+
+  def __init__(self, connection):
+    self.connection = connection
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *unused_args):
+    return False
+
+  def execute(self, statement, params=None):
+    database = self.connection.database
+    with database.lock:
+      database.executed.append((self.connection, statement, params))
+    if statement.startswith("SET"):
+      return
+    table = statement.split(" ON ")[-1].split()[0] if "INDEX" in statement \
+        else statement.split()[2]
+    with database.lock:
+      if "ALTER" in statement and any(t == table for t, _ in database.active):
+        database.overlaps.append(statement)
+      database.active.append((table, statement))
+      database.max_active = max(database.max_active, len(database.active))
+    time.sleep(database.delay)
+    with database.lock:
+      database.active.remove((table, statement))
+    if any(text in statement for text in database.fail):
+      raise RuntimeError("failed: " + statement)
+
+
+def _Statements(database):
+  return [statement for _, statement, _ in database.executed
+          if not statement.startswith(("SET", "DROP"))]
+
+
+class ParseTasksTest(googletest.TestCase):
+
+  def test_kinds_and_dependencies(self):
+    tasks = _Tasks(_POST_DATA)
+    self.assertEqual([task.kind for task in tasks], [
+        post_data_executor.FOREIGN_KEY, post_data_executor.INDEX,
+        post_data_executor.INDEX, post_data_executor.KEY,
+        post_data_executor.INDEX, post_data_executor.OTHER,
+        post_data_executor.CONSTRAINT])
+    foreign_key, emp_job_idx, _, jobs_key, _, comment, _ = tasks
+    self.assertEqual(foreign_key.table, ("hr", "emp"))
+    self.assertEqual(foreign_key.references, ("hr", "jobs"))
+    self.assertEqual(foreign_key.depends_on, {jobs_key})
+    self.assertEqual(foreign_key.locks, {("hr", "emp"): True,
+                                         ("hr", "jobs"): True})
+    self.assertEqual(emp_job_idx.name, ("hr", "emp_job_idx"))
+    self.assertEqual(emp_job_idx.locks, {("hr", "emp"): False})
+    self.assertEqual(comment.depends_on, {emp_job_idx})
+    self.assertEqual(comment.settings, ("SET search_path = hr,public;",))
+
+  def test_concurrently(self):
+    tasks = _Tasks("/* INDEX */ CREATE UNIQUE INDEX i ON t (a);\n"
+                   'CREATE INDEX CONCURRENTLY "Index" ON t (b);\n',
+                   concurrently=True)
+    self.assertEqual(
+        [task.statement for task in tasks],
+        ["/* INDEX */ CREATE UNIQUE INDEX CONCURRENTLY i ON t (a);",
+         'CREATE INDEX CONCURRENTLY "Index" ON t (b);'])
+    self.assertTrue(all(task.locks[("t",)] for task in tasks))
+
+  def test_concurrently_keys_and_constraints(self):
+    tasks = _Tasks(_POST_DATA + "ALTER TABLE jobs ADD CONSTRAINT jobs_pk "
+                   "PRIMARY KEY (id) USING INDEX TABLESPACE fast DEFERRABLE;\n"
+                   "ALTER TABLE emp ADD CHECK (name <> '');\n"
+                   "ALTER TABLE emp ADD UNIQUE NULLS NOT DISTINCT (name);\n",
+                   concurrently=True)
+    steps = {task.index: task.steps for task in tasks}
+    self.assertEqual(steps[0], [
+        ("ALTER TABLE emp ADD CONSTRAINT emp_job_fk FOREIGN KEY (job_id) "
+         "REFERENCES jobs(id) NOT VALID;", None),
+        ("ALTER TABLE emp VALIDATE CONSTRAINT emp_job_fk;",
+         "ALTER TABLE emp DROP CONSTRAINT IF EXISTS emp_job_fk;")])
+    drop = "DROP INDEX CONCURRENTLY IF EXISTS hr.jobs_id_key"
+    self.assertEqual(steps[3], [
+        ("CREATE UNIQUE INDEX CONCURRENTLY jobs_id_key ON jobs (id);", drop),
+        ("ALTER TABLE jobs ADD CONSTRAINT jobs_id_key UNIQUE "
+         "USING INDEX jobs_id_key;", drop)])
+    self.assertEqual(steps[6][0][0],
+                     "ALTER TABLE emp ADD CONSTRAINT emp_ck CHECK (id > 0) "
+                     "NOT VALID;")
+    self.assertEqual(
+        [statement for statement, _ in steps[7]],
+        ["CREATE UNIQUE INDEX CONCURRENTLY jobs_pk ON jobs (id) "
+         "TABLESPACE fast;",
+         "ALTER TABLE jobs ADD CONSTRAINT jobs_pk PRIMARY KEY "
+         "USING INDEX jobs_pk DEFERRABLE;"])
+    self.assertEqual(steps[8][0][0],
+                     "ALTER TABLE emp ADD CONSTRAINT emp_check "
+                     "CHECK (name <> '') NOT VALID;")
+    # Left as written, as the unique index cannot express it.
+    self.assertEqual(steps[9], [(tasks[9].statement, None)])
+    self.assertEqual(_Tasks(_POST_DATA)[0].steps,
+                     [(tasks[0].statement, None)])
+
+
+class PostDataExecutorTest(googletest.TestCase):
+
+  def test_largest_tables_first_and_dependencies(self):
+    database = FakeDatabase(delay=0)
+    executor = post_data_executor.PostDataExecutor(
+        database.Connect, connections=1,
+        table_sizes={("hr", "emp"): 100, ("hr", "jobs"): 10})
+    report = executor.Run(_Tasks(_POST_DATA))
+
+    self.assertTrue(report.succeeded)
+    self.assertEqual(_Statements(database), [
+        "CREATE INDEX emp_job_idx ON emp (job_id);",
+        "CREATE INDEX emp_name_idx ON emp (name);",
+        "ALTER TABLE emp ADD CONSTRAINT emp_ck CHECK (id > 0);",
+        "ALTER TABLE jobs ADD UNIQUE (id);",
+        "CREATE INDEX jobs_title_idx ON jobs (title);",
+        "ALTER TABLE emp ADD CONSTRAINT emp_job_fk FOREIGN KEY (job_id) "
+        "REFERENCES jobs(id);",
+        "COMMENT ON INDEX emp_job_idx IS 'By job';",
+    ])
+    # The search_path is set once per session.
+    setup = [statement for _, statement, _ in database.executed
+             if statement.startswith("SET")]
+    self.assertEqual(setup, ["SET search_path = hr,public;"])
+    self.assertTrue(database.sessions[0].autocommit)
+    self.assertTrue(database.sessions[0].closed)
+
+  def test_parallel_sessions_do_not_conflict(self):
+    database = FakeDatabase()
+    executor = post_data_executor.PostDataExecutor(
+        database.Connect, connections=4, maintenance_work_mem="2GB")
+    report = executor.Run(_Tasks(_POST_DATA))
+
+    self.assertTrue(report.succeeded)
+    self.assertLen(database.sessions, 4)
+    self.assertGreater(database.max_active, 1)
+    self.assertEmpty(database.overlaps)
+    self.assertIn(("SET maintenance_work_mem = %s", ("2GB",)),
+                  [(s, p) for _, s, p in database.executed])
+    statements = _Statements(database)
+    self.assertLess(statements.index("ALTER TABLE jobs ADD UNIQUE (id);"),
+                    [i for i, s in enumerate(statements)
+                     if "emp_job_fk" in s][0])
+
+  def test_failures_skip_dependents_only(self):
+    database = FakeDatabase(fail=["USING INDEX jobs_id_key", "emp_job_idx ON"],
+                            delay=0)
+    report = post_data_executor.PostDataExecutor(
+        database.Connect, connections=2).Run(
+            _Tasks(_POST_DATA, concurrently=True))
+
+    self.assertFalse(report.succeeded)
+    self.assertCountEqual(
+        [result.task.Describe() for result in report.failed],
+        ["key hr.jobs", "index hr.emp_job_idx"])
+    self.assertCountEqual(
+        [result.task.Describe() for result in report.skipped],
+        ["foreign_key hr.emp", "other hr.emp_job_idx"])
+    self.assertLen([r for r in report.results if r.succeeded], 3)
+    executed = [statement for _, statement, _ in database.executed]
+    self.assertIn("DROP INDEX CONCURRENTLY IF EXISTS hr.emp_job_idx", executed)
+    self.assertIn("DROP INDEX CONCURRENTLY IF EXISTS hr.jobs_id_key", executed)
+    self.assertIn("ALTER TABLE emp VALIDATE CONSTRAINT emp_ck;", executed)
+    report.LogSummary()
+
+  def test_no_sessions(self):
+    def _Connect():
+      raise RuntimeError("connection refused")
+    report = post_data_executor.PostDataExecutor(_Connect).Run(
+        _Tasks(_POST_DATA))
+    self.assertLen(report.failed, 7)
+
+
+class LocalPostgresTest(googletest.TestCase):
+  """Runs against the database in ORA2PG_TEST_DSN, when it is set."""
+
+  def setUp(self):
+    super().setUp()
+    self.dsn = os.environ.get("ORA2PG_TEST_DSN")
+    if not self.dsn or pg_catalog_reader.psycopg2 is None:
+      self.skipTest("ORA2PG_TEST_DSN and psycopg2 are needed")
+    connection = pg_catalog_reader.Connect(self.dsn)
+    connection.autocommit = True
+    with connection.cursor() as cursor:
+      cursor.execute("DROP SCHEMA IF EXISTS post_data_test CASCADE")
+      cursor.execute("CREATE SCHEMA post_data_test")
+      cursor.execute("SET search_path = post_data_test")
+      cursor.execute("CREATE TABLE jobs (id int, title text)")
+      cursor.execute("CREATE TABLE emp (id int, job_id int, name text)")
+      cursor.execute("INSERT INTO jobs SELECT i, 't' || i "
+                     "FROM generate_series(1, 1000) i")
+      cursor.execute("INSERT INTO emp SELECT i, i % 1000 + 1, 'n' || i "
+                     "FROM generate_series(1, 100000) i")
+    connection.close()
+
+  def test_build(self):
+    sql = _POST_DATA.replace("hr,public", "post_data_test,public")
+    report = post_data_executor.PostDataExecutor(
+        lambda: pg_catalog_reader.Connect(self.dsn), connections=3,
+        maintenance_work_mem="64MB").Run(_Tasks(sql, concurrently=True))
+    report.LogSummary()
+    self.assertTrue(report.succeeded)
+
+
+if __name__ == "__main__":
+  googletest.main()
@@ -0,0 +1,342 @@
+"""Run and post-process Ora2PG schema conversions.
+
+Utilities to convert Oracle schemas with Ora2PG via CLI. These run on the
+host next to ora2pg.sh and only need the standard library, as they drive the
+Ora2PG docker image rather than running inside it; the actions connecting to
+PostgreSQL (diff, post-data and apply) also need psycopg2.
+"""
+
+import argparse
+import logging
+import os
+import subprocess
+import sys
+
+import conversion_cache
+import data_phases
+import ddl_artifacts
+import ddl_model
+import ddl_parser
+import ora2pg_orchestrator
+import ora2pg_worker_pool
+import pg_catalog_reader
+import post_data_executor
+import schema_applier
+import schema_differ
+import schema_fingerprint
+import type_narrowing
+
+
+MIGRATION_FILE = "migration.sql"
+DEPLOY_FILE = "deploy.sql"
+
+
+def _Split(value):
+  return value.split() if value else []
+
+
+def _ParseArgs(argv):
+  parser = argparse.ArgumentParser(description=__doc__)
+  parser.add_argument("--action", default="run",
+                      choices=["run", "start-workers", "stop-workers",
+                               "diff", "artifacts", "plan-deploy",
+                               "mark-deployed", "split-phases",
+                               "wait-backfill", "post-data", "apply",
+                               "narrow-types"],
+                      help="Ora2PG Action to Run.")
+  parser.add_argument("--data-dir", default="ora2pg/data",
+                      help="Local directory Ora2PG writes its output to")
+  parser.add_argument("--config-dir", default="ora2pg/config",
+                      help="Local directory holding ora2pg.conf")
+  parser.add_argument("--docker-image", default=os.environ.get("DOCKER_ORA2PG"),
+                      help="Ora2PG docker image, or empty to run a local "
+                      "ora2pg binary")
+  parser.add_argument("--oracle-types", default=os.environ.get("ORACLE_TYPES"),
+                      help="Space separated Oracle object types to convert")
+  parser.add_argument("--oracle-schemas",
+                      default=os.environ.get("ORACLE_SCHEMAS"),
+                      help="Space separated Oracle schemas, blank for all")
+  parser.add_argument("--oracle-dsn", default=os.environ.get("ORACLE_DSN"),
+                      help="Oracle DSN, defaults to the one in ora2pg.conf")
+  parser.add_argument("--oracle-user", default=os.environ.get("ORACLE_USER"),
+                      help="Oracle user, defaults to the one in ora2pg.conf")
+  parser.add_argument("--oracle-password",
+                      default=os.environ.get("ORACLE_PASSWORD"),
+                      help="Oracle password, defaults to ora2pg.conf")
+  parser.add_argument("--force-owner", default=os.environ.get("DATABASE_USER"),
+                      help="PostgreSQL owner of the converted objects")
+  parser.add_argument("--max-workers", type=int,
+                      default=ora2pg_orchestrator.DEFAULT_MAX_WORKERS,
+                      help="Maximum number of Ora2PG jobs run at once")
+  parser.add_argument("--use-workers", action="store_true",
+                      default=bool(os.environ.get("ORA2PG_USE_WORKERS")),
+                      help="Run jobs on warm ora2pg workers, starting any "
+                      "which are not already running")
+  parser.add_argument("--job-timeout", type=float,
+                      default=ora2pg_worker_pool.DEFAULT_JOB_TIMEOUT,
+                      help="Seconds a job may run on a warm worker before "
+                      "it fails")
+  parser.add_argument("--cache-dir", default="ora2pg/data/cache",
+                      help="Directory of cached conversions, reused while "
+                      "their source schema is unchanged; empty to disable")
+  parser.add_argument("--refresh-schemas",
+                      default=os.environ.get("ORA2PG_REFRESH_SCHEMAS"),
+                      help="Space separated schemas to convert again, "
+                      "reusing cached output for every other schema")
+  parser.add_argument("--database-dsn", default=_DatabaseDsn(),
+                      help="libpq DSN of the PostgreSQL database to diff "
+                      "against, eg. \"host=h user=u dbname=postgres\"")
+  parser.add_argument("--allow-data-loss", action="store_true",
+                      help="Include DROP TABLE and DROP COLUMN in the "
+                      "migration instead of commenting them out")
+  parser.add_argument("--backfill-done-command",
+                      default=os.environ.get("ORA2PG_BACKFILL_DONE_COMMAND"),
+                      help="Shell command exiting with 0 once the stream's "
+                      "backfill has finished")
+  parser.add_argument("--backfill-timeout", type=float, default=None,
+                      help="Seconds to wait for the backfill, or unset to "
+                      "wait indefinitely")
+  parser.add_argument("--poll-interval", type=float,
+                      default=data_phases.DEFAULT_POLL_INTERVAL,
+                      help="Seconds between backfill checks")
+  parser.add_argument("--connections", type=int, default=None,
+                      help="PostgreSQL sessions applying DDL at once, "
+                      "defaults to %d for apply and %d for post-data" % (
+                          schema_applier.DEFAULT_CONNECTIONS,
+                          post_data_executor.DEFAULT_CONNECTIONS))
+  parser.add_argument("--maintenance-work-mem",
+                      default=post_data_executor.DEFAULT_MAINTENANCE_WORK_MEM,
+                      help="maintenance_work_mem of each post-data session")
+  parser.add_argument("--concurrently", action="store_true",
+                      help="Build indexes and constraints without blocking "
+                      "writes, for tables replication is writing to")
+  parser.add_argument("--sample-percent", type=float,
+                      default=type_narrowing.DEFAULT_SAMPLE_PERCENT,
+                      help="Percentage of each large Oracle table sampled "
+                      "to narrow its NUMBER columns")
+  parser.add_argument("--headroom", type=int,
+                      default=type_narrowing.DEFAULT_HEADROOM,
+                      help="How many times over sampled integer ranges must "
+                      "fit in the narrowed type")
+  parser.add_argument("--allow-float", action="store_true",
+                      help="Narrow NUMBER columns with fractional values to "
+                      "double precision, which is inexact")
+  return parser.parse_args(argv)
+
+
+def _DatabaseDsn():
+  """Return a DSN from the DATABASE_* settings used by the Makefile."""
+  parts = ["dbname=postgres"]
+  for key, name in (("host", "DATABASE_HOST"), ("user", "DATABASE_USER"),
+                    ("password", "DATABASE_PASSWORD")):
+    if os.environ.get(name):
+      parts.append("%s=%s" % (key, os.environ[name]))
+  return " ".join(parts)
+
+
+def DockerCommandPrefix(image, config_dir, data_dir):
+  """Return the docker run arguments for one Ora2PG container."""
+  return ["docker", "run", "--rm",
+          # Write the output as the current user, so no chown is needed.
+          "--user", "%d:%d" % (os.getuid(), os.getgid()),
+          "-v", "%s:/config" % os.path.abspath(config_dir),
+          "-v", "%s:/data" % os.path.abspath(data_dir),
+          image]
+
+
+def _ReadFingerprints(args, jobs, command_prefix):
+  """Return the job fingerprints, or {} when the catalog cannot be read."""
+  if not (args.oracle_dsn and args.oracle_user and args.oracle_password):
+    logging.warning("Oracle connection details are not set, converting "
+                    "every schema")
+    return {}
+  reader = schema_fingerprint.DbiCatalogReader(
+      args.oracle_dsn, args.oracle_user, args.oracle_password,
+      command_prefix=command_prefix)
+  try:
+    rows = reader.ReadCatalog(_Split(args.oracle_schemas))
+  except (OSError, subprocess.CalledProcessError):
+    logging.exception("Unable to fingerprint schemas, converting every "
+                      "schema")
+    return {}
+  config_hash = schema_fingerprint.HashConfig(
+      os.path.join(args.config_dir, "ora2pg.conf"))
+  return schema_fingerprint.ComputeFingerprints(jobs, rows, config_hash)
+
+
+def _WorkerPool(args):
+  """Return a WorkerPool of --max-workers workers on the data volume."""
+  # The workers read their connection settings from the environment.
+  for name, value in (("ORA2PG_SOURCE", args.oracle_dsn),
+                      ("ORA2PG_USER", args.oracle_user),
+                      ("ORA2PG_PASSWORD", args.oracle_password),
+                      ("ORA2PG_FORCE_OWNER", args.force_owner)):
+    if value:
+      os.environ[name] = value
+  queue = ora2pg_worker_pool.FileJobQueue(os.path.join(args.data_dir,
+                                                       "queue"))
+  return ora2pg_worker_pool.WorkerPool(
+      queue, args.max_workers,
+      start_worker=ora2pg_worker_pool.StartDockerWorker(
+          args.docker_image, args.config_dir, args.data_dir),
+      job_timeout=args.job_timeout)
+
+
+def _Diff(args):
+  """Write migration.sql converging the database on output.sql."""
+  desired = ddl_model.ParseFile(
+      os.path.join(args.data_dir, ora2pg_orchestrator.OUTPUT_FILE))
+  connection = pg_catalog_reader.Connect(args.database_dsn)
+  try:
+    live = pg_catalog_reader.ReadCatalog(connection, desired.schemas)
+  finally:
+    connection.close()
+  diff = schema_differ.DiffCatalogs(desired, live)
+  diff.LogSummary()
+  with open(os.path.join(args.data_dir, MIGRATION_FILE), "w") as output:
+    output.write(diff.ToSql(allow_data_loss=args.allow_data_loss))
+
+
+def _ApplyPostData(args):
+  """Build post_data.sql over --connections sessions."""
+  with open(os.path.join(args.data_dir, data_phases.POST_DATA_FILE)) as sql:
+    tasks = post_data_executor.ParseTasks(ddl_parser.SplitStatements(sql),
+                                          concurrently=args.concurrently)
+  connection = pg_catalog_reader.Connect(args.database_dsn)
+  try:
+    table_sizes = pg_catalog_reader.ReadTableSizes(
+        connection, {task.table[0] for task in tasks
+                     if task.table and len(task.table) > 1})
+  finally:
+    connection.close()
+  executor = post_data_executor.PostDataExecutor(
+      lambda: pg_catalog_reader.Connect(args.database_dsn),
+      connections=args.connections,
+      maintenance_work_mem=args.maintenance_work_mem,
+      table_sizes=table_sizes)
+  report = executor.Run(tasks)
+  report.LogSummary()
+  return report.succeeded
+
+
+def _NarrowTypes(args):
+  """Narrow the numeric columns of output.sql, writing the report."""
+  if not (args.oracle_dsn and args.oracle_user and args.oracle_password):
+    logging.error("--oracle-dsn, --oracle-user and --oracle-password are "
+                  "required")
+    return False
+  dbi_reader = schema_fingerprint.DbiCatalogReader(
+      args.oracle_dsn, args.oracle_user, args.oracle_password,
+      command_prefix=(DockerCommandPrefix(args.docker_image, args.config_dir,
+                                          args.data_dir)
+                      if args.docker_image else None))
+  reader = type_narrowing.SourceReader(dbi_reader,
+                                       sample_percent=args.sample_percent)
+  columns = reader.ReadColumns(_Split(args.oracle_schemas))
+  samples = reader.SampleColumns(columns)
+  type_narrowing.NarrowFile(
+      os.path.join(args.data_dir, ora2pg_orchestrator.OUTPUT_FILE),
+      os.path.join(args.data_dir, type_narrowing.REPORT_FILE), columns,
+      samples, allow_float=args.allow_float, headroom=args.headroom)
+  return True
+
+
+def _Apply(args):
+  """Apply output.sql directly, one transaction per schema."""
+  with open(os.path.join(args.data_dir,
+                         ora2pg_orchestrator.OUTPUT_FILE)) as sql:
+    units = schema_applier.BuildUnits(ddl_parser.SplitStatements(sql))
+  logging.info("Applying %d units over %d sessions", len(units),
+               args.connections or schema_applier.DEFAULT_CONNECTIONS)
+  applier = schema_applier.SchemaApplier(
+      lambda: pg_catalog_reader.Connect(args.database_dsn),
+      connections=args.connections)
+  report = applier.Apply(units)
+  report.LogSummary()
+  return report.succeeded
+
+
+def main(argv=None):
+  logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+  args = _ParseArgs(argv)
+
+  if args.action == "start-workers":
+    _WorkerPool(args).Start()
+  elif args.action == "stop-workers":
+    _WorkerPool(args).Stop()
+  elif args.action == "diff":
+    _Diff(args)
+  elif args.action == "artifacts":
+    manifest = ddl_artifacts.WriteArtifacts(
+        os.path.join(args.data_dir, ora2pg_orchestrator.OUTPUT_FILE),
+        os.path.join(args.data_dir, ddl_artifacts.ARTIFACT_DIR))
+    logging.info("Wrote %d DDL artifacts", len(manifest))
+  elif args.action == "plan-deploy":
+    store = ddl_artifacts.ArtifactStore(
+        os.path.join(args.data_dir, ddl_artifacts.ARTIFACT_DIR))
+    with open(os.path.join(args.data_dir, DEPLOY_FILE), "w") as output:
+      output.write(store.PlanDeployment(allow_data_loss=args.allow_data_loss))
+  elif args.action == "mark-deployed":
+    ddl_artifacts.ArtifactStore(
+        os.path.join(args.data_dir, ddl_artifacts.ARTIFACT_DIR)).MarkDeployed()
+  elif args.action == "split-phases":
+    data_phases.WritePhases(
+        os.path.join(args.data_dir, ora2pg_orchestrator.OUTPUT_FILE),
+        os.path.join(args.data_dir, data_phases.PRE_DATA_FILE),
+        os.path.join(args.data_dir, data_phases.POST_DATA_FILE))
+  elif args.action == "wait-backfill":
+    if not args.backfill_done_command:
+      logging.error("--backfill-done-command is required")
+      return 2
+    logging.info("Waiting for the backfill to finish")
+    if not data_phases.WaitUntil(
+        lambda: subprocess.run(args.backfill_done_command,
+                               shell=True).returncode == 0,
+        poll_interval=args.poll_interval, timeout=args.backfill_timeout):
+      logging.error("The backfill did not finish in %ss",
+                    args.backfill_timeout)
+      return 1
+  elif args.action == "post-data":
+    if not _ApplyPostData(args):
+      return 1
+  elif args.action == "apply":
+    if not _Apply(args):
+      return 1
+  elif args.action == "narrow-types":
+    if not _NarrowTypes(args):
+      return 1
+  elif args.action == "run":
+    jobs = ora2pg_orchestrator.BuildJobs(_Split(args.oracle_types),
+                                         _Split(args.oracle_schemas))
+    command_prefix = (
+        DockerCommandPrefix(args.docker_image, args.config_dir, args.data_dir)
+        if args.docker_image else None)
+    cache = (conversion_cache.ConversionCache(args.cache_dir)
+             if args.cache_dir else None)
+    refresh_schemas = set(_Split(args.refresh_schemas)) or None
+    fingerprints = (_ReadFingerprints(args, jobs, command_prefix)
+                    if cache and refresh_schemas is None else {})
+
+    worker_pool = _WorkerPool(args) if args.use_workers else None
+    if worker_pool:
+      worker_pool.Start()
+
+    orchestrator = ora2pg_orchestrator.Ora2pgOrchestrator(
+        args.data_dir,
+        command_prefix=command_prefix,
+        source=args.oracle_dsn,
+        user=args.oracle_user,
+        password=args.oracle_password,
+        force_owner=args.force_owner,
+        max_workers=args.max_workers,
+        cache=cache,
+        worker_pool=worker_pool)
+    results = orchestrator.RunAndMerge(jobs, fingerprints=fingerprints,
+                                       refresh_schemas=refresh_schemas)
+    if not all(result.succeeded for result in results):
+      return 1
+  return 0
+
+
+if __name__ == "__main__":
+  sys.exit(main())
@@ -0,0 +1,431 @@
+"""Apply converted DDL directly, one schema per PostgreSQL session.
+
+gcloud sql import runs output.sql serially through a single import. The
+applier instead groups the statements into a unit per schema, following the
+object each statement creates or alters (or the search_path in effect), and
+applies independent units in parallel, each in its own transaction:
+
+- Statements outside any schema, such as CREATE EXTENSION or CREATE ROLE,
+  form a unit applied before the others.
+- A unit naming objects of another schema waits for that schema's unit.
+  Foreign keys between schemas are applied last, after every unit, and
+  schemas which still depend on each other are applied as one unit.
+- Each statement runs under a savepoint, so a failing statement is rolled
+  back and reported while the rest of its unit is still applied.
+
+Statements which cannot run in a transaction block, such as CREATE INDEX
+CONCURRENTLY, run after their unit commits. psql meta commands are skipped.
+"""
+
+import collections
+import concurrent.futures
+import logging
+import re
+import threading
+import time
+
+try:
+  from google3.experimental.dhercher.ora2pg_utils import ddl_parser  # pylint: disable=g-import-not-at-top
+except ModuleNotFoundError:
+  import ddl_parser  # pytype: disable=import-error  pylint: disable=g-import-not-at-top
+
+DEFAULT_CONNECTIONS = 8
+# The unit of statements outside any schema.
+GLOBAL_UNIT = ""
+# The unit of foreign keys between schemas.
+CROSS_SCHEMA_UNIT = "(cross-schema foreign keys)"
+
+_SET_RE = re.compile(r"\s*SET\s+(?:SESSION\s+|LOCAL\s+)?(\w+)", re.I)
+_OBJECT_RE = re.compile(
+    r"\s*(?:CREATE(?:\s+OR\s+REPLACE)?(?:\s+(?:GLOBAL|LOCAL|TEMP|TEMPORARY|"
+    r"UNLOGGED|UNIQUE|MATERIALIZED|RECURSIVE))*\s+(?:TABLE|VIEW|SEQUENCE|"
+    r"FUNCTION|PROCEDURE|TYPE|DOMAIN|AGGREGATE)(?:\s+IF\s+NOT\s+EXISTS)?|"
+    r"ALTER\s+(?:TABLE|SEQUENCE|VIEW|MATERIALIZED\s+VIEW|FUNCTION|PROCEDURE|"
+    r"TYPE|DOMAIN)(?:\s+IF\s+EXISTS)?(?:\s+ONLY)?|"
+    r"COMMENT\s+ON\s+(?:TABLE|VIEW|SEQUENCE|FUNCTION|PROCEDURE|TYPE|INDEX|"
+    r"MATERIALIZED\s+VIEW)|"
+    r"(?:GRANT|REVOKE)\s+.*?\bON\s+(?:TABLE\s+|SEQUENCE\s+|FUNCTION\s+)?)"
+    r"\s*(?P<name>%s)" % ddl_parser.NAME, re.I | re.S)
+_COMMENT_ON_COLUMN_RE = re.compile(
+    r"\s*COMMENT\s+ON\s+COLUMN\s+(?P<name>%s)" % ddl_parser.NAME, re.I | re.S)
+_SCHEMA_OBJECT_RE = re.compile(
+    r"\s*(?:(?:GRANT|REVOKE)\s+.*?\bON\s+SCHEMA|ALTER\s+SCHEMA|"
+    r"COMMENT\s+ON\s+SCHEMA)\s+(?P<name>%s)" % ddl_parser.IDENTIFIER,
+    re.I | re.S)
+_QUALIFIED_RE = re.compile(r"(%s)\s*\.\s*%s" % (ddl_parser.IDENTIFIER,
+                                                ddl_parser.IDENTIFIER))
+_FOREIGN_KEY_RE = re.compile(r"\bFOREIGN\s+KEY\b", re.I)
+# String literals and comments, leaving quoted identifiers in place.
+_LITERALS_RE = re.compile(r"'(?:[^']|'')*'|--[^\n]*|/\*.*?\*/", re.S)
+_NO_TRANSACTION_RE = re.compile(
+    r"\s*(?:CREATE\s+(?:UNIQUE\s+)?INDEX\s+CONCURRENTLY|"
+    r"DROP\s+INDEX\s+CONCURRENTLY|REINDEX\s+.*\bCONCURRENTLY|VACUUM|"
+    r"CREATE\s+DATABASE|ALTER\s+SYSTEM)\b", re.I | re.S)
+
+
+class ApplyStatement(object):
+  """A statement to apply, with the SET statements in effect for it."""
+
+  __slots__ = ("index", "statement", "settings", "line")
+
+  def __init__(self, index, statement, settings, line):
+    self.index = index
+    self.statement = statement.strip()
+    self.settings = tuple(settings)
+    # The input line the statement starts on, for error reports.
+    self.line = line
+
+  def Summary(self):
+    return re.sub(r"\s+", " ", self.statement)[:80]
+
+
+class ApplyUnit(object):
+  """Statements applied in order in one transaction."""
+
+  def __init__(self, name):
+    self.name = name
+    self.statements = []
+    self.depends_on = set()
+
+  def __repr__(self):
+    return "<ApplyUnit %r %d statements>" % (self.name, len(self.statements))
+
+
+def _BlankLiterals(text):
+  return _LITERALS_RE.sub(lambda match: " " * len(match.group()), text)
+
+
+def _StatementSchema(statement, blanked, search_path):
+  """Return the schema a statement belongs to, or None."""
+  create_schema = ddl_parser.CREATE_SCHEMA_RE.match(statement)
+  if create_schema:
+    return ddl_parser.ParseName(create_schema.group("name"))[0]
+  schema_object = _SCHEMA_OBJECT_RE.match(blanked)
+  if schema_object:
+    return ddl_parser.ParseName(statement[schema_object.start("name"):
+                                          schema_object.end("name")])[0]
+  for regex, parts in ((ddl_parser.CREATE_INDEX_RE, 2),
+                       (_COMMENT_ON_COLUMN_RE, 3), (_OBJECT_RE, 2)):
+    match = regex.match(blanked)
+    if match:
+      group = "table" if regex is ddl_parser.CREATE_INDEX_RE else "name"
+      name = ddl_parser.ParseName(statement[match.start(group):
+                                            match.end(group)])
+      if len(name) >= parts:
+        return name[0]
+      break
+  return search_path
+
+
+def _LineCounter():
+  line = [1]
+
+  def _Count(text):
+    start = line[0] + len(text) - len(text.lstrip("\n"))
+    line[0] += text.count("\n")
+    return start
+  return _Count
+
+
+def BuildUnits(statements):
+  """Return the ApplyUnits of statements from SplitStatements, in order.
+
+  Args:
+    statements: The statement texts of the converted DDL.
+  """
+  units = collections.OrderedDict()
+  units[GLOBAL_UNIT] = ApplyUnit(GLOBAL_UNIT)
+  cross_schema = ApplyUnit(CROSS_SCHEMA_UNIT)
+  settings = {}
+  search_path = None
+  count_lines = _LineCounter()
+  # (unit, statement, blanked text) to look for references in.
+  assigned = []
+  for statement in statements:
+    line = count_lines(statement)
+    blanked = _BlankLiterals(statement)
+    if not blanked.strip():
+      continue
+    if blanked.lstrip().startswith("\\"):
+      logging.warning("Skipping psql command on line %d: %s", line,
+                      statement.strip())
+      continue
+    setting = _SET_RE.match(blanked)
+    if setting:
+      settings[setting.group(1).lower()] = statement.strip()
+      match = ddl_parser.SEARCH_PATH_RE.match(statement)
+      if match:
+        search_path = ddl_parser.ParseName(match.group("schema"))[0]
+      continue
+
+    schema = _StatementSchema(statement, blanked, search_path) or GLOBAL_UNIT
+    unit = units.get(schema)
+    if unit is None:
+      unit = units[schema] = ApplyUnit(schema)
+    apply_statement = ApplyStatement(len(assigned), statement,
+                                     settings.values(), line)
+    assigned.append((unit, apply_statement, blanked))
+
+  for unit, apply_statement, blanked in assigned:
+    referenced = {ddl_parser.ParseName(match.group(1))[0]
+                  for match in _QUALIFIED_RE.finditer(blanked)}
+    referenced = {schema for schema in referenced
+                  if schema in units and schema != unit.name}
+    if referenced and _FOREIGN_KEY_RE.search(blanked):
+      cross_schema.statements.append(apply_statement)
+      continue
+    unit.statements.append(apply_statement)
+    unit.depends_on.update(referenced)
+
+  for unit in units.values():
+    if unit.name != GLOBAL_UNIT:
+      unit.depends_on.add(GLOBAL_UNIT)
+  result = _MergeCycles([unit for unit in units.values() if unit.statements])
+  if cross_schema.statements:
+    cross_schema.depends_on = {unit.name for unit in result}
+    result.append(cross_schema)
+  return result
+
+
+def _MergeCycles(units):
+  """Return units with each group of mutually dependent units merged."""
+  names = {unit.name: unit for unit in units}
+  for unit in units:
+    unit.depends_on &= set(names)
+  # Kosaraju's algorithm, without recursion.
+  order = []
+  visited = set()
+  for root in units:
+    if root.name in visited:
+      continue
+    visited.add(root.name)
+    stack = [(root.name, iter(sorted(root.depends_on)))]
+    while stack:
+      name, children = stack[-1]
+      child = next(children, None)
+      if child is None:
+        stack.pop()
+        order.append(name)
+      elif child not in visited:
+        visited.add(child)
+        stack.append((child, iter(sorted(names[child].depends_on))))
+  dependents = collections.defaultdict(set)
+  for unit in units:
+    for name in unit.depends_on:
+      dependents[name].add(unit.name)
+  component = {}
+  for root in reversed(order):
+    if root in component:
+      continue
+    stack = [root]
+    component[root] = root
+    while stack:
+      for name in dependents[stack.pop()]:
+        if name not in component:
+          component[name] = root
+          stack.append(name)
+
+  merged = collections.OrderedDict()
+  for unit in units:
+    members = sorted(name for name, root in component.items()
+                     if root == component[unit.name])
+    key = component[unit.name]
+    if key not in merged:
+      merged[key] = ApplyUnit(" + ".join(members) if len(members) > 1
+                              else unit.name)
+    merged[key].statements.extend(unit.statements)
+    merged[key].depends_on.update(component[name]
+                                  for name in unit.depends_on)
+  by_root = {key: unit for key, unit in merged.items()}
+  for key, unit in merged.items():
+    unit.statements.sort(key=lambda statement: statement.index)
+    unit.depends_on = {by_root[root].name for root in unit.depends_on
+                       if root != key}
+  return list(merged.values())
+
+
+class StatementError(object):
+  """A statement which failed, and why."""
+
+  __slots__ = ("unit", "statement", "error")
+
+  def __init__(self, unit, statement, error):
+    self.unit = unit
+    self.statement = statement
+    self.error = error
+
+
+class UnitResult(object):
+  """The outcome of applying one unit."""
+
+  def __init__(self, unit, applied=0, errors=None, duration=0.0, error=None):
+    self.unit = unit
+    self.applied = applied
+    self.errors = errors or []
+    self.duration = duration
+    # Set when the unit could not be applied at all, eg. no connection.
+    self.error = error
+
+
+class ApplyReport(object):
+  """The results of applying every unit."""
+
+  def __init__(self, results, wall_seconds):
+    self.results = results
+    self.wall_seconds = wall_seconds
+
+  @property
+  def errors(self):
+    return [error for result in self.results for error in result.errors]
+
+  @property
+  def succeeded(self):
+    return not self.errors and not any(r.error for r in self.results)
+
+  def LogSummary(self):
+    applied = sum(result.applied for result in self.results)
+    logging.info("Applied %d statements in %d units in %.1fs, %d failed",
+                 applied, len(self.results), self.wall_seconds,
+                 len(self.errors))
+    for result in sorted(self.results, key=lambda r: -r.duration):
+      logging.info("  %7.1fs %-30s %d statements, %d failed", result.duration,
+                   result.unit.name or "(global)", result.applied,
+                   len(result.errors))
+      if result.error:
+        logging.error("Unit %s was not applied: %s", result.unit.name,
+                      result.error)
+    for error in self.errors:
+      logging.error("Line %d (%s): %s\n  %s", error.statement.line,
+                    error.unit.name or "global", error.error,
+                    error.statement.Summary())
+
+
+class SchemaApplier(object):
+  """Apply ApplyUnits over a pool of PostgreSQL sessions."""
+
+  def __init__(self, connect, connections=None, clock=None):
+    """Initialize the SchemaApplier.
+
+    Args:
+      connect: A function returning a new DB-API connection.
+      connections: The number of units applied at once.
+      clock: A time.time replacement, for tests.
+    """
+    self.connect = connect
+    self.connections = connections or DEFAULT_CONNECTIONS
+    self._clock = clock or time.time
+    self._local = threading.local()
+    self._lock = threading.Lock()
+    self._sessions = []
+
+  def _Session(self):
+    connection = getattr(self._local, "connection", None)
+    if connection is None:
+      connection = self._local.connection = self.connect()
+      with self._lock:
+        self._sessions.append(connection)
+    return connection
+
+  def _ApplyUnit(self, unit):
+    start = self._clock()
+    result = UnitResult(unit)
+    try:
+      connection = self._Session()
+    except Exception as e:  # pylint: disable=broad-except
+      result.error = str(e).strip() or repr(e)
+      return result
+    try:
+      self._ApplyStatements(connection, unit, result)
+    except Exception as e:  # pylint: disable=broad-except
+      # The session is unusable, eg. it was disconnected.
+      logging.exception("Unable to apply %s", unit.name or "(global)")
+      result.error = str(e).strip() or repr(e)
+      self._local.connection = None
+      try:
+        connection.rollback()
+      except Exception:  # pylint: disable=broad-except
+        pass
+    result.duration = self._clock() - start
+    logging.info("Applied %s: %d statements, %d failed, %.1fs",
+                 unit.name or "(global)", result.applied, len(result.errors),
+                 result.duration)
+    return result
+
+  def _ApplyStatements(self, connection, unit, result):
+    connection.autocommit = False
+    deferred = []
+    session_settings = {}
+    with connection.cursor() as cursor:
+      # Start from the server defaults, whatever the last unit set.
+      cursor.execute("RESET ALL")
+      for statement in unit.statements:
+        self._ApplySettings(cursor, session_settings, statement)
+        if _NO_TRANSACTION_RE.match(_BlankLiterals(statement.statement)):
+          deferred.append(statement)
+          continue
+        cursor.execute("SAVEPOINT apply_statement")
+        try:
+          cursor.execute(statement.statement)
+        except Exception as e:  # pylint: disable=broad-except
+          cursor.execute("ROLLBACK TO SAVEPOINT apply_statement")
+          result.errors.append(StatementError(unit, statement,
+                                              str(e).strip() or repr(e)))
+        else:
+          cursor.execute("RELEASE SAVEPOINT apply_statement")
+          result.applied += 1
+    connection.commit()
+
+    if deferred:
+      connection.autocommit = True
+      with connection.cursor() as cursor:
+        for statement in deferred:
+          try:
+            cursor.execute(statement.statement)
+          except Exception as e:  # pylint: disable=broad-except
+            result.errors.append(StatementError(unit, statement,
+                                                str(e).strip() or repr(e)))
+          else:
+            result.applied += 1
+
+  @staticmethod
+  def _ApplySettings(cursor, session_settings, statement):
+    for setting in statement.settings:
+      key = _SET_RE.match(setting).group(1).lower()
+      if session_settings.get(key) != setting:
+        cursor.execute(setting)
+        session_settings[key] = setting
+
+  def Apply(self, units):
+    """Apply units, each once the units it depends on are applied.
+
+    Returns:
+      An ApplyReport; failing statements do not stop the other statements.
+    """
+    start = self._clock()
+    pending = list(units)
+    applied = set()
+    results = []
+    running = {}
+    try:
+      with concurrent.futures.ThreadPoolExecutor(self.connections) as pool:
+        while pending or running:
+          for unit in [u for u in pending if u.depends_on <= applied]:
+            pending.remove(unit)
+            running[pool.submit(self._ApplyUnit, unit)] = unit
+          if not running:
+            raise ValueError("Units depend on each other: %s" % pending)
+          finished, _ = concurrent.futures.wait(
+              running, return_when=concurrent.futures.FIRST_COMPLETED)
+          for future in finished:
+            unit = running.pop(future)
+            try:
+              results.append(future.result())
+            except Exception as e:  # pylint: disable=broad-except
+              logging.exception("Unable to apply %s", unit.name)
+              results.append(UnitResult(unit, error=str(e)))
+            applied.add(unit.name)
+    finally:
+      for connection in self._sessions:
+        connection.close()
+      self._sessions = []
+    return ApplyReport(results, self._clock() - start)
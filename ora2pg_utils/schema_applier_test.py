@@ -0,0 +1,185 @@
+"""Tests for google3.experimental.dhercher.ora2pg_utils.schema_applier."""
+
+import threading
+
+from google3.experimental.dhercher.ora2pg_utils import ddl_parser
+from google3.experimental.dhercher.ora2pg_utils import schema_applier
+from google3.testing.pybase import googletest
+
+_DDL = """SET client_encoding TO 'UTF8';
+CREATE EXTENSION IF NOT EXISTS pgcrypto;
+CREATE SCHEMA hr;
+CREATE SCHEMA payroll;
+SET search_path = hr,public;
+CREATE TABLE jobs (id int PRIMARY KEY);
+CREATE TABLE emp (id int PRIMARY KEY, job_id int);
+ALTER TABLE emp ADD FOREIGN KEY (job_id) REFERENCES jobs(id);
+SET search_path = payroll,public;
+CREATE TABLE pay (id int, emp_id int);
+ALTER TABLE pay ADD FOREIGN KEY (emp_id) REFERENCES hr.emp(id);
+CREATE VIEW pay_jobs AS SELECT j.id FROM hr.jobs j;
+CREATE TABLE "Audit"."Log" (id int);
+COMMENT ON COLUMN pay.id IS 'hr.x; is not a reference';
+\\set ON_ERROR_STOP ON
+"""
+
+
+def _Units(sql):
+  return schema_applier.BuildUnits(
+      ddl_parser.SplitStatements(sql.splitlines(True)))
+
+
+class BuildUnitsTest(googletest.TestCase):
+
+  def test_units(self):
+    units = {unit.name: unit for unit in _Units(_DDL)}
+    self.assertEqual(list(units), [schema_applier.GLOBAL_UNIT, "hr",
+                                   "payroll", "Audit",
+                                   schema_applier.CROSS_SCHEMA_UNIT])
+    self.assertEqual(
+        [s.statement for s in units[schema_applier.GLOBAL_UNIT].statements],
+        ["CREATE EXTENSION IF NOT EXISTS pgcrypto;"])
+    self.assertEqual([s.line for s in units["hr"].statements], [3, 6, 7, 8])
+    self.assertEqual(units["hr"].depends_on, {schema_applier.GLOBAL_UNIT})
+    # The view waits for hr; the foreign key waits for every unit.
+    self.assertEqual(units["payroll"].depends_on,
+                     {schema_applier.GLOBAL_UNIT, "hr"})
+    self.assertEqual(units["payroll"].statements[0].statement,
+                     "CREATE SCHEMA payroll;")
+    self.assertEqual(
+        units["payroll"].statements[1].settings,
+        ("SET client_encoding TO 'UTF8';", "SET search_path = payroll,public;"))
+    cross_schema = units[schema_applier.CROSS_SCHEMA_UNIT]
+    self.assertEqual([s.statement for s in cross_schema.statements],
+                     ["ALTER TABLE pay ADD FOREIGN KEY (emp_id) "
+                      "REFERENCES hr.emp(id);"])
+    self.assertEqual(cross_schema.depends_on, set(units) - {
+        schema_applier.CROSS_SCHEMA_UNIT})
+
+  def test_mutually_dependent_schemas_are_merged(self):
+    units = _Units("CREATE VIEW a.v AS SELECT * FROM b.t;\n"
+                   "CREATE VIEW b.t AS SELECT * FROM a.x;\n"
+                   "CREATE TABLE a.x (id int);\n"
+                   "CREATE VIEW c.v AS SELECT * FROM a.v;\n")
+    self.assertEqual([(unit.name, len(unit.statements)) for unit in units],
+                     [("a + b", 3), ("c", 1)])
+    self.assertEqual(units[1].depends_on, {"a + b"})
+    self.assertEqual([s.index for s in units[0].statements], [0, 1, 2])
+
+
+class FakeDatabase(object):
+
+  def __init__(self, fail=()):
+    self.fail = fail
+    self.lock = threading.Lock()
+    self.log = []
+    self.sessions = []
+
+  def Connect(self):
+    connection = FakeConnection(self, len(self.sessions))
+    self.sessions.append(connection)
+    return connection
+
+
+class FakeConnection(object):
+
+  def __init__(self, database, number):
+    self.database = database
+    self.number = number
+    self.autocommit = True
+    self.closed = False
+
+  def _Log(self, statement):
+    with self.database.lock:
+      self.database.log.append((self.number, self.autocommit, statement))
+
+  def cursor(self):
+    return FakeCursor(self)
+
+  def commit(self):
+    self._Log("COMMIT")
+
+  def rollback(self):
+    self._Log("ROLLBACK")
+
+  def close(self):
+    self.closed = True
+
+
+class FakeCursor(object):
+
+  def __init__(self, connection):
+    self.connection = connection
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *unused_args):
+    return False
+
+  def execute(self, statement):
+    self.connection._Log(statement)  # pylint: disable=protected-access
+    if any(text in statement for text in self.connection.database.fail):
+      raise RuntimeError('relation "x" does not exist')
+
+
+class SchemaApplierTest(googletest.TestCase):
+
+  def _Statements(self, database):
+    return [statement for _, _, statement in database.log]
+
+  def test_apply(self):
+    database = FakeDatabase(fail=["CREATE VIEW"])
+    report = schema_applier.SchemaApplier(
+        database.Connect, connections=3).Apply(_Units(_DDL))
+    report.LogSummary()
+
+    self.assertFalse(report.succeeded)
+    self.assertLen(report.errors, 1)
+    error = report.errors[0]
+    self.assertEqual((error.unit.name, error.statement.line),
+                     ("payroll", 12))
+    self.assertEqual(error.error, 'relation "x" does not exist')
+    self.assertEqual(sum(result.applied for result in report.results), 10)
+
+    statements = self._Statements(database)
+    # The failed statement is rolled back alone.
+    view = statements.index(
+        "CREATE VIEW pay_jobs AS SELECT j.id FROM hr.jobs j;")
+    self.assertEqual(statements[view - 1:view + 2], [
+        "SAVEPOINT apply_statement",
+        "CREATE VIEW pay_jobs AS SELECT j.id FROM hr.jobs j;",
+        "ROLLBACK TO SAVEPOINT apply_statement"])
+    # Units run after the units they depend on have committed.
+    self.assertLess(statements.index("CREATE TABLE jobs (id int PRIMARY KEY);"),
+                    statements.index("CREATE VIEW pay_jobs AS SELECT j.id "
+                                     "FROM hr.jobs j;"))
+    self.assertEqual(statements[-3:], [
+        "ALTER TABLE pay ADD FOREIGN KEY (emp_id) REFERENCES hr.emp(id);",
+        "RELEASE SAVEPOINT apply_statement", "COMMIT"])
+    self.assertTrue(all(not autocommit for _, autocommit, statement
+                        in database.log if "CREATE TABLE" in statement))
+    self.assertNotIn("\\set ON_ERROR_STOP ON", statements)
+    self.assertTrue(all(session.closed for session in database.sessions))
+
+  def test_statements_outside_transactions(self):
+    database = FakeDatabase()
+    units = _Units("CREATE TABLE hr.t (id int);\n"
+                   "CREATE INDEX CONCURRENTLY t_idx ON hr.t (id);\n")
+    report = schema_applier.SchemaApplier(database.Connect).Apply(units)
+    self.assertTrue(report.succeeded)
+    self.assertEqual(database.log[-2:], [
+        (0, False, "COMMIT"),
+        (0, True, "CREATE INDEX CONCURRENTLY t_idx ON hr.t (id);")])
+
+  def test_connection_failure(self):
+    def _Connect():
+      raise RuntimeError("connection refused")
+    report = schema_applier.SchemaApplier(_Connect).Apply(_Units(_DDL))
+    self.assertFalse(report.succeeded)
+    self.assertEqual({result.error for result in report.results},
+                     {"connection refused"})
+
+
+if __name__ == "__main__":
+  googletest.main()
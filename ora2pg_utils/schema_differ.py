@@ -0,0 +1,277 @@
+"""Work out the DDL that converges a live database on converted DDL.
+
+Instead of dropping a schema and importing output.sql again, which loses
+every replicated row, the differ compares the Catalog parsed from output.sql
+with the Catalog read from PostgreSQL and emits only the statements needed:
+new schemas, tables, columns, constraints and indexes; column type, null,
+default and identity changes; and drops of constraints and indexes which are
+no longer wanted. Constraints and indexes are matched by their definition,
+so one under another name is not rebuilt.
+
+Changes which lose data (dropping a table or column) are written out
+commented unless they are allowed explicitly. Only the schemas in the
+converted DDL are compared, and DROP SCHEMA is never emitted.
+
+Views, sequences, functions, comments and grants are not compared; they are
+emitted again in a form which succeeds when the object exists (CREATE OR
+REPLACE, CREATE SEQUENCE IF NOT EXISTS). Statements with no such form are
+listed, commented out, at the end of the migration to apply by hand.
+"""
+
+import logging
+
+try:
+  from google3.experimental.dhercher.ora2pg_utils import ddl_model  # pylint: disable=g-import-not-at-top
+  from google3.experimental.dhercher.ora2pg_utils import ddl_parser  # pylint: disable=g-import-not-at-top
+except ModuleNotFoundError:
+  import ddl_model  # pytype: disable=import-error  pylint: disable=g-import-not-at-top
+  import ddl_parser  # pytype: disable=import-error  pylint: disable=g-import-not-at-top
+
+
+# Changes are emitted in this order, so that each one can be applied: FKs
+# are dropped before the keys they reference and added after them.
+PHASE_CREATE_SCHEMA = 0
+PHASE_CREATE_SEQUENCE = 1
+PHASE_DROP_FOREIGN_KEY = 2
+PHASE_DROP_CONSTRAINT = 3
+PHASE_DROP_INDEX = 4
+PHASE_CREATE_TABLE = 5
+PHASE_ALTER_COLUMN = 6
+PHASE_ADD_CONSTRAINT = 7
+PHASE_CREATE_INDEX = 8
+PHASE_ADD_FOREIGN_KEY = 9
+PHASE_OTHER = 10
+PHASE_DROP_COLUMN = 11
+PHASE_DROP_TABLE = 12
+
+
+class Change(object):
+  """One statement of a migration and the reason it is needed."""
+
+  __slots__ = ("phase", "statement", "reason", "destructive", "search_path")
+
+  def __init__(self, phase, statement, reason, destructive=False,
+               search_path=None):
+    self.phase = phase
+    self.statement = statement.strip()
+    self.reason = reason
+    self.destructive = destructive
+    self.search_path = search_path
+
+
+class SchemaDiff(object):
+  """The changes converging a live database on converted DDL."""
+
+  def __init__(self, changes, skipped=None):
+    """Initialize the SchemaDiff.
+
+    Args:
+      changes: The Changes, applied in phase order.
+      skipped: (search_path, statement) of the converted DDL which could
+          not be emitted in a form that can run again.
+    """
+    self.changes = sorted(changes, key=lambda change: change.phase)
+    self.skipped = list(skipped or [])
+
+  @property
+  def destructive_changes(self):
+    return [change for change in self.changes if change.destructive]
+
+  def __bool__(self):
+    return bool(self.changes)
+
+  def ToSql(self, allow_data_loss=False):
+    """Return the migration script.
+
+    Args:
+      allow_data_loss: Whether to run changes which drop tables or columns;
+          otherwise they are written commented out.
+    """
+    lines = []
+    search_path = None
+    for change in self.changes:
+      # Statements from the converted DDL may name objects unqualified.
+      if change.search_path and change.search_path != search_path:
+        search_path = change.search_path
+        lines.append("SET search_path = %s,public;" %
+                     ddl_parser.QuoteIdentifier(search_path))
+      lines.append("-- %s" % change.reason)
+      if change.destructive and not allow_data_loss:
+        lines.extend("-- " + line for line in change.statement.splitlines())
+      else:
+        lines.append(change.statement)
+    if self.skipped:
+      lines.append("-- %d statements of the converted DDL cannot be run "
+                   "again safely; apply them by hand:" % len(self.skipped))
+    for search_path, statement in self.skipped:
+      lines.append("-- (search_path %s)" % (search_path or "public"))
+      lines.extend("-- " + line for line in statement.strip().splitlines())
+    return "\n".join(lines) + "\n" if lines else ""
+
+  def LogSummary(self):
+    logging.info("%d changes, %d of which drop data", len(self.changes),
+                 len(self.destructive_changes))
+    for change in self.changes:
+      logging.info("%s%s", "(data loss) " if change.destructive else "",
+                   change.reason)
+    if self.skipped:
+      logging.warning("%d statements cannot be run again and are listed, "
+                      "commented out, at the end of the migration",
+                      len(self.skipped))
+
+
+def _Name(parts):
+  return ddl_parser.FormatName(parts)
+
+
+def _DiffColumns(desired, live, changes):
+  table = _Name(desired.name)
+  for name, column in desired.columns.items():
+    quoted = ddl_parser.QuoteIdentifier(name)
+    existing = live.columns.get(name)
+    if existing is None:
+      changes.append(Change(
+          PHASE_ALTER_COLUMN,
+          "ALTER TABLE %s ADD COLUMN %s;" % (table, column.Definition()),
+          "Add column %s.%s" % (table, quoted)))
+      continue
+
+    alter = "ALTER TABLE %s ALTER COLUMN %s " % (table, quoted)
+    if column.type_key != existing.type_key:
+      changes.append(Change(
+          PHASE_ALTER_COLUMN,
+          alter + "TYPE %s USING %s::%s;" % (column.data_type, quoted,
+                                             column.data_type),
+          "Change %s.%s from %s to %s" % (table, quoted, existing.data_type,
+                                          column.data_type)))
+    if column.identity != existing.identity:
+      if existing.identity:
+        changes.append(Change(PHASE_ALTER_COLUMN,
+                              alter + "DROP IDENTITY IF EXISTS;",
+                              "Drop identity of %s.%s" % (table, quoted)))
+      if column.identity:
+        changes.append(Change(
+            PHASE_ALTER_COLUMN, alter + "ADD GENERATED %s AS IDENTITY;" % (
+                "ALWAYS" if column.identity == ddl_model.IDENTITY_ALWAYS
+                else "BY DEFAULT"),
+            "Make %s.%s an identity" % (table, quoted)))
+    elif not column.identity and column.default_key != existing.default_key:
+      if column.default:
+        changes.append(Change(PHASE_ALTER_COLUMN,
+                              alter + "SET DEFAULT %s;" % column.default,
+                              "Set the default of %s.%s" % (table, quoted)))
+      else:
+        changes.append(Change(PHASE_ALTER_COLUMN, alter + "DROP DEFAULT;",
+                              "Drop the default of %s.%s" % (table, quoted)))
+    if column.not_null != existing.not_null:
+      changes.append(Change(
+          PHASE_ALTER_COLUMN,
+          alter + ("SET NOT NULL;" if column.not_null else "DROP NOT NULL;"),
+          "%s NOT NULL on %s.%s" % ("Set" if column.not_null else "Drop",
+                                    table, quoted)))
+
+  for name in live.columns:
+    if name not in desired.columns:
+      changes.append(Change(
+          PHASE_DROP_COLUMN, "ALTER TABLE %s DROP COLUMN %s;" % (
+              table, ddl_parser.QuoteIdentifier(name)),
+          "Drop column %s.%s" % (table, ddl_parser.QuoteIdentifier(name)),
+          destructive=True))
+
+
+def _DiffConstraints(desired, live, changes):
+  live_keys = {(c.kind, c.key) for c in live.constraints}
+  desired_keys = {(c.kind, c.key) for c in desired.constraints}
+  for constraint in desired.constraints:
+    if (constraint.kind, constraint.key) not in live_keys:
+      changes.append(Change(
+          PHASE_ADD_FOREIGN_KEY if constraint.kind == ddl_model.FOREIGN_KEY
+          else PHASE_ADD_CONSTRAINT, constraint.AddStatement(),
+          "Add %s on %s" % (constraint.kind, _Name(constraint.table)),
+          search_path=desired.search_path))
+  for constraint in live.constraints:
+    if (constraint.kind, constraint.key) not in desired_keys:
+      changes.append(Change(
+          PHASE_DROP_FOREIGN_KEY if constraint.kind == ddl_model.FOREIGN_KEY
+          else PHASE_DROP_CONSTRAINT, constraint.DropStatement(),
+          "Drop %s %s on %s" % (constraint.kind, constraint.GetName(),
+                                _Name(constraint.table))))
+
+
+def _DiffIndexes(desired, live, changes):
+  live_keys = {index.key for index in live.indexes.values()}
+  desired_keys = {index.key for index in desired.indexes.values()}
+  for index in desired.indexes.values():
+    if index.key not in live_keys:
+      changes.append(Change(
+          PHASE_CREATE_INDEX, index.statement or index.CreateStatement(),
+          "Create index %s on %s" % (index.GetName(), _Name(index.table)),
+          search_path=index.table[0] if index.statement else None))
+  for index in live.indexes.values():
+    if index.key not in desired_keys and index.table[0] in desired.schemas:
+      changes.append(Change(
+          PHASE_DROP_INDEX, index.DropStatement(),
+          "Drop index %s on %s" % (index.GetName(), _Name(index.table))))
+
+
+def _ReemitOtherStatements(desired, changes):
+  """Emit the statements outside the model, returning those skipped."""
+  skipped = []
+  for search_path, statement in desired.other_statements:
+    if (not ddl_parser.StripQuoted(statement).strip() or
+        ddl_parser.SEARCH_PATH_RE.match(statement) or
+        ddl_parser.CREATE_SCHEMA_RE.match(statement)):
+      continue
+    rerunnable = ddl_model.RerunnableStatement(statement)
+    if rerunnable is None:
+      skipped.append((search_path, statement))
+      continue
+    create = ddl_parser.CREATE_OBJECT_RE.match(statement)
+    kind = " ".join(create.group("kind").upper().split()) if create else None
+    # Column defaults in CREATE TABLE may use a sequence.
+    changes.append(Change(
+        PHASE_CREATE_SEQUENCE if kind == "SEQUENCE" else PHASE_OTHER,
+        rerunnable,
+        "Create or replace %s %s" % (kind.lower(), create.group("name"))
+        if create else "Run again: %s" % " ".join(statement.split()[:3]),
+        search_path=search_path))
+  return skipped
+
+
+def DiffCatalogs(desired, live):
+  """Return the SchemaDiff converging live on desired.
+
+  Args:
+    desired: The ddl_model.Catalog parsed from the converted DDL.
+    live: The ddl_model.Catalog read from PostgreSQL for the same schemas.
+  """
+  changes = []
+  for schema in sorted(desired.schemas - live.schemas):
+    changes.append(Change(
+        PHASE_CREATE_SCHEMA,
+        "CREATE SCHEMA IF NOT EXISTS %s;" % ddl_parser.QuoteIdentifier(schema),
+        "Create schema %s" % schema))
+
+  for name, table in desired.tables.items():
+    existing = live.tables.get(name)
+    if existing is None:
+      changes.append(Change(PHASE_CREATE_TABLE, table.statement,
+                            "Create table %s" % _Name(name),
+                            search_path=table.search_path))
+      # Constraints declared in CREATE TABLE come with it.
+      existing = ddl_model.Table(name)
+      existing.columns = table.columns
+      existing.constraints = [c for c in table.constraints
+                              if c.statement is None]
+    else:
+      _DiffColumns(table, existing, changes)
+    _DiffConstraints(table, existing, changes)
+
+  for name in live.tables:
+    if name not in desired.tables and name[0] in desired.schemas:
+      changes.append(Change(PHASE_DROP_TABLE, "DROP TABLE %s;" % _Name(name),
+                            "Drop table %s" % _Name(name), destructive=True))
+
+  _DiffIndexes(desired, live, changes)
+  skipped = _ReemitOtherStatements(desired, changes)
+  return SchemaDiff(changes, skipped)
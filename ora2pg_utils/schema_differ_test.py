@@ -0,0 +1,150 @@
+"""Tests for google3.experimental.dhercher.ora2pg_utils.schema_differ."""
+
+from google3.experimental.dhercher.ora2pg_utils import ddl_model
+from google3.experimental.dhercher.ora2pg_utils import ddl_parser
+from google3.experimental.dhercher.ora2pg_utils import schema_differ
+from google3.testing.pybase import googletest
+
+_DESIRED = """SET search_path = hr,public;
+CREATE TABLE jobs (
+\tid numeric(10) NOT NULL,
+\ttitle varchar(35) DEFAULT 'none',
+\tPRIMARY KEY (id)
+) ;
+CREATE TABLE emp (
+\tid bigint GENERATED ALWAYS AS IDENTITY,
+\tjob_id numeric(10) REFERENCES jobs(id)
+) ;
+CREATE INDEX emp_job_idx ON emp (job_id);
+"""
+
+
+def _Parse(sql):
+  return ddl_model.ParseDdl(ddl_parser.SplitStatements(sql.splitlines(True)))
+
+
+def _LiveCatalog():
+  """Return the catalog PostgreSQL reports after importing _DESIRED."""
+  catalog = ddl_model.Catalog()
+  jobs = ddl_model.Table(("hr", "jobs"))
+  jobs.columns["id"] = ddl_model.Column("id", "numeric(10,0)", not_null=True)
+  jobs.columns["title"] = ddl_model.Column(
+      "title", "character varying(35)",
+      default="'none'::character varying")
+  jobs.constraints.append(ddl_model.Constraint(
+      ("hr", "jobs"), "jobs_pkey", ddl_model.PRIMARY_KEY, "PRIMARY KEY (id)"))
+  emp = ddl_model.Table(("hr", "emp"))
+  emp.columns["id"] = ddl_model.Column("id", "bigint", not_null=True,
+                                       identity=ddl_model.IDENTITY_ALWAYS)
+  emp.columns["job_id"] = ddl_model.Column("job_id", "numeric(10,0)")
+  emp.constraints.append(ddl_model.Constraint(
+      ("hr", "emp"), "emp_job_id_fkey", ddl_model.FOREIGN_KEY,
+      "FOREIGN KEY (job_id) REFERENCES hr.jobs(id)"))
+  catalog.AddTable(jobs)
+  catalog.AddTable(emp)
+  catalog.indexes[("hr", "emp_job_idx")] = ddl_model.Index(
+      "emp_job_idx", ("hr", "emp"), False, "btree", "(job_id)")
+  return catalog
+
+
+class DiffCatalogsTest(googletest.TestCase):
+
+  def _Diff(self, desired_sql, live=None):
+    return schema_differ.DiffCatalogs(_Parse(desired_sql),
+                                      live or _LiveCatalog())
+
+  def test_no_changes_against_catalog_form(self):
+    diff = self._Diff(_DESIRED)
+    self.assertFalse(diff)
+    self.assertEqual(diff.ToSql(), "")
+
+  def test_new_schema_and_table(self):
+    diff = self._Diff(_DESIRED, live=ddl_model.Catalog())
+    self.assertEqual([change.phase for change in diff.changes], [
+        schema_differ.PHASE_CREATE_SCHEMA, schema_differ.PHASE_CREATE_TABLE,
+        schema_differ.PHASE_CREATE_TABLE, schema_differ.PHASE_CREATE_INDEX])
+    sql = diff.ToSql()
+    self.assertStartsWith(sql, "-- Create schema hr\n"
+                          "CREATE SCHEMA IF NOT EXISTS hr;\n"
+                          "SET search_path = hr,public;\n")
+    self.assertIn("CREATE INDEX emp_job_idx ON emp (job_id);", sql)
+
+  def test_column_changes(self):
+    desired = _DESIRED.replace(
+        "\ttitle varchar(35) DEFAULT 'none',",
+        "\ttitle varchar(80) NOT NULL,\n\tgrade int DEFAULT 1,")
+    sql = self._Diff(desired).ToSql()
+    self.assertIn("ALTER TABLE hr.jobs ADD COLUMN grade int DEFAULT 1;", sql)
+    self.assertIn("ALTER TABLE hr.jobs ALTER COLUMN title TYPE varchar(80) "
+                  "USING title::varchar(80);", sql)
+    self.assertIn("ALTER TABLE hr.jobs ALTER COLUMN title DROP DEFAULT;", sql)
+    self.assertIn("ALTER TABLE hr.jobs ALTER COLUMN title SET NOT NULL;", sql)
+    self.assertNotIn("DROP COLUMN", sql)
+
+  def test_renamed_constraint_and_index_are_kept(self):
+    desired = (_DESIRED.replace("REFERENCES jobs(id)",
+                                "CONSTRAINT emp_jobs_fk REFERENCES jobs(id)")
+               .replace("emp_job_idx", "emp_job_id_idx"))
+    self.assertFalse(self._Diff(desired))
+
+  def test_changed_foreign_key_is_dropped_first(self):
+    desired = _DESIRED.replace(
+        "REFERENCES jobs(id)", "REFERENCES jobs(id) ON DELETE CASCADE")
+    changes = self._Diff(desired).changes
+    self.assertEqual([change.phase for change in changes],
+                     [schema_differ.PHASE_DROP_FOREIGN_KEY,
+                      schema_differ.PHASE_ADD_FOREIGN_KEY])
+    self.assertEqual(changes[0].statement,
+                     "ALTER TABLE hr.emp DROP CONSTRAINT emp_job_id_fkey;")
+    self.assertEqual(changes[1].statement,
+                     "ALTER TABLE hr.emp ADD FOREIGN KEY (job_id) "
+                     "REFERENCES jobs(id) ON DELETE CASCADE;")
+
+  def test_removed_index(self):
+    diff = self._Diff(_DESIRED.replace(
+        "CREATE INDEX emp_job_idx ON emp (job_id);\n", ""))
+    self.assertEqual([change.statement for change in diff.changes],
+                     ["DROP INDEX hr.emp_job_idx;"])
+
+  def test_data_loss_is_commented_unless_allowed(self):
+    desired = _DESIRED.replace("\ttitle varchar(35) DEFAULT 'none',\n", "")
+    live = _LiveCatalog()
+    live.AddTable(ddl_model.Table(("hr", "old")))
+    live.AddTable(ddl_model.Table(("payroll", "pay")))
+    diff = self._Diff(desired, live=live)
+
+    self.assertLen(diff.destructive_changes, 2)
+    sql = diff.ToSql()
+    self.assertIn("-- ALTER TABLE hr.jobs DROP COLUMN title;", sql)
+    self.assertIn("-- DROP TABLE hr.old;", sql)
+    self.assertNotIn("payroll", sql)
+    sql = diff.ToSql(allow_data_loss=True)
+    self.assertIn("\nALTER TABLE hr.jobs DROP COLUMN title;", sql)
+    self.assertIn("\nDROP TABLE hr.old;", sql)
+
+  def test_other_statements_are_emitted_again(self):
+    diff = self._Diff(
+        "CREATE SEQUENCE hr.emp_seq START 1;\n" + _DESIRED +
+        "CREATE VIEW emp_v AS SELECT id FROM emp;\n"
+        "COMMENT ON TABLE emp IS 'Employees';\n"
+        "CREATE TRIGGER emp_trg BEFORE INSERT ON emp\n"
+        "  FOR EACH ROW EXECUTE PROCEDURE emp_fn();\n")
+
+    self.assertEqual(
+        [(change.phase, change.statement) for change in diff.changes], [
+            (schema_differ.PHASE_CREATE_SEQUENCE,
+             "CREATE SEQUENCE IF NOT EXISTS hr.emp_seq START 1;"),
+            (schema_differ.PHASE_OTHER,
+             "CREATE OR REPLACE VIEW emp_v AS SELECT id FROM emp;"),
+            (schema_differ.PHASE_OTHER,
+             "COMMENT ON TABLE emp IS 'Employees';"),
+        ])
+    self.assertEqual(diff.changes[1].search_path, "hr")
+    sql = diff.ToSql()
+    self.assertIn("SET search_path = hr,public;\n", sql)
+    self.assertIn("apply them by hand:\n-- (search_path hr)\n"
+                  "-- CREATE TRIGGER emp_trg BEFORE INSERT ON emp\n", sql)
+
+
+if __name__ == "__main__":
+  googletest.main()
@@ -0,0 +1,147 @@
+"""Fingerprint the Oracle DDL behind each ora2pg job.
+
+One query against ALL_OBJECTS lists every object of the converted schemas
+with its LAST_DDL_TIME, which Oracle updates whenever the object's DDL
+changes. Each job's fingerprint hashes the rows of its schema and object
+types together with ora2pg.conf, so it changes exactly when the job's output
+could: the source objects changed, or the conversion settings did.
+
+The query runs through Perl DBI in the Ora2PG image, which already has
+DBD::Oracle installed, so no Oracle client is needed on the host.
+"""
+
+import collections
+import hashlib
+import re
+import subprocess
+
+# ora2pg export types and the ALL_OBJECTS types whose DDL they convert.
+# Types not listed here are fingerprinted over every object in the schema.
+OBJECT_TYPES = {
+    "TABLE": ("TABLE", "INDEX"),
+    "VIEW": ("VIEW",),
+    "MVIEW": ("MATERIALIZED VIEW",),
+    "SEQUENCE": ("SEQUENCE",),
+    "TRIGGER": ("TRIGGER",),
+    "FUNCTION": ("FUNCTION",),
+    "PROCEDURE": ("PROCEDURE",),
+    "PACKAGE": ("PACKAGE", "PACKAGE BODY"),
+    "TYPE": ("TYPE", "TYPE BODY"),
+    "SYNONYM": ("SYNONYM",),
+    "PARTITION": ("TABLE PARTITION", "TABLE SUBPARTITION"),
+}
+
+_SCHEMA_RE = re.compile(r"[A-Za-z0-9_$#]+\Z")
+
+# Runs queries over one session and prints each row as tab separated values,
+# after the index of the query it belongs to.
+_DBI_SCRIPT = r"""
+use DBI;
+my ($dsn, $user, $password, @queries) = @ARGV;
+my $dbh = DBI->connect($dsn, $user, $password, {RaiseError => 1});
+for my $i (0 .. $#queries) {
+  my $sth = $dbh->prepare($queries[$i]);
+  $sth->execute();
+  while (my @row = $sth->fetchrow_array()) {
+    print join("\t", $i, map { defined $_ ? $_ : "" } @row), "\n";
+  }
+}
+$dbh->disconnect();
+"""
+
+
+def OwnerCondition(schemas=None, column="owner"):
+  """Return the WHERE condition selecting schemas, or the user's own schema."""
+  if not schemas:
+    return "%s = USER" % column
+  for schema in schemas:
+    if not _SCHEMA_RE.match(schema):
+      raise ValueError("Invalid Oracle schema name %r" % schema)
+  return "%s IN (%s)" % (column, ", ".join(
+      "'%s'" % schema.upper() for schema in schemas))
+
+
+def BuildCatalogQuery(schemas=None):
+  """Return the ALL_OBJECTS query for schemas, or the user's own schema."""
+  return ("SELECT owner, object_type, object_name, "
+          "TO_CHAR(last_ddl_time, 'YYYY-MM-DD HH24:MI:SS') "
+          "FROM all_objects WHERE %s ORDER BY 1, 2, 3" %
+          OwnerCondition(schemas))
+
+
+class DbiCatalogReader(object):
+  """Read the Oracle catalog with Perl DBI, eg. inside the Ora2PG image."""
+
+  def __init__(self, source, user, password, command_prefix=None,
+               run_command=None):
+    """Initialize the DbiCatalogReader.
+
+    Args:
+      source: The Oracle DBI DSN.
+      user: The Oracle user.
+      password: The Oracle password.
+      command_prefix: Arguments placed before the perl command, eg. a
+          "docker run ... image" invocation.
+      run_command: A function like subprocess.run, used to run the query.
+    """
+    self.source = source
+    self.user = user
+    self.password = password
+    self.command_prefix = list(command_prefix or ())
+    self._run_command = run_command or subprocess.run
+
+  def Query(self, queries):
+    """Run queries in one session, returning the row tuples of each."""
+    command = self.command_prefix + [
+        "perl", "-e", _DBI_SCRIPT, self.source, self.user,
+        self.password] + list(queries)
+    output = self._run_command(command, check=True, stdout=subprocess.PIPE,
+                               universal_newlines=True).stdout
+    results = [[] for _ in queries]
+    for line in output.splitlines():
+      if line:
+        index, _, row = line.partition("\t")
+        results[int(index)].append(tuple(row.split("\t")))
+    return results
+
+  def ReadCatalog(self, schemas=None):
+    """Return (owner, object type, object name, DDL time) for each object."""
+    return self.Query([BuildCatalogQuery(schemas)])[0]
+
+
+def HashConfig(path):
+  """Return the hash of the ora2pg.conf every job is converted with."""
+  with open(path, "rb") as config_file:
+    return hashlib.sha256(config_file.read()).hexdigest()
+
+
+def JobFingerprint(job, rows, config_hash=""):
+  """Return the fingerprint of a job's source objects and settings.
+
+  Args:
+    job: The ora2pg_orchestrator.Ora2pgJob.
+    rows: The catalog rows from DbiCatalogReader.ReadCatalog, either all of
+        them or only those of the job's schema.
+    config_hash: The hash of ora2pg.conf, from HashConfig.
+  """
+  owner = job.schema.upper() if job.schema else None
+  object_types = OBJECT_TYPES.get(job.oracle_type.upper())
+  digest = hashlib.sha256()
+  digest.update(("%s\n%s\n" % (job.oracle_type, config_hash)).encode("utf-8"))
+  for row in sorted(rows):
+    if owner and row[0] != owner:
+      continue
+    if object_types and row[1] not in object_types:
+      continue
+    digest.update(("\t".join(row) + "\n").encode("utf-8"))
+  return digest.hexdigest()
+
+
+def ComputeFingerprints(jobs, rows, config_hash=""):
+  """Return {job name: fingerprint} for every job."""
+  rows_by_owner = collections.defaultdict(list)
+  for row in rows:
+    rows_by_owner[row[0]].append(row)
+  return {job.name: JobFingerprint(
+      job, rows_by_owner[job.schema.upper()] if job.schema else rows,
+      config_hash) for job in jobs}
@@ -0,0 +1,86 @@
+"""Tests for google3.experimental.dhercher.ora2pg_utils.schema_fingerprint."""
+
+import mock
+
+from google3.experimental.dhercher.ora2pg_utils import ora2pg_orchestrator
+from google3.experimental.dhercher.ora2pg_utils import schema_fingerprint
+from google3.testing.pybase import googletest
+
+
+_ROWS = [
+    ("HR", "TABLE", "JOBS", "2021-06-01 00:00:00"),
+    ("HR", "INDEX", "JOBS_PK", "2021-06-01 00:00:00"),
+    ("HR", "VIEW", "EMP_DETAILS", "2021-06-01 00:00:00"),
+    ("OE", "TABLE", "ORDERS", "2021-06-01 00:00:00"),
+]
+
+
+class SchemaFingerprintTest(googletest.TestCase):
+
+  def setUp(self):
+    super().setUp()
+    self.jobs = ora2pg_orchestrator.BuildJobs(["TABLE", "VIEW"], ["hr", "oe"])
+
+  def _Fingerprints(self, rows, config_hash="conf"):
+    return schema_fingerprint.ComputeFingerprints(self.jobs, rows, config_hash)
+
+  def test_only_changed_jobs_change(self):
+    before = self._Fingerprints(_ROWS)
+    rows = list(_ROWS)
+    rows[1] = ("HR", "INDEX", "JOBS_PK", "2021-07-01 00:00:00")
+    after = self._Fingerprints(rows)
+
+    changed = sorted(name for name in before if before[name] != after[name])
+    self.assertEqual(changed, ["TABLE_hr"])
+
+  def test_new_and_dropped_objects_change_the_job(self):
+    before = self._Fingerprints(_ROWS)
+    after = self._Fingerprints(_ROWS[:3] + [
+        ("OE", "TABLE", "ITEMS", "2021-06-01 00:00:00")])
+    self.assertNotEqual(before["TABLE_oe"], after["TABLE_oe"])
+    after = self._Fingerprints(_ROWS[:3])
+    self.assertNotEqual(before["TABLE_oe"], after["TABLE_oe"])
+    self.assertEqual(before["TABLE_hr"], after["TABLE_hr"])
+
+  def test_config_changes_every_job(self):
+    before = self._Fingerprints(_ROWS)
+    after = self._Fingerprints(_ROWS, config_hash="other")
+    self.assertTrue(all(before[name] != after[name] for name in before))
+
+  def test_catalog_query(self):
+    self.assertIn("owner IN ('HR', 'OE')",
+                  schema_fingerprint.BuildCatalogQuery(["hr", "OE"]))
+    self.assertIn("owner = USER", schema_fingerprint.BuildCatalogQuery())
+    with self.assertRaises(ValueError):
+      schema_fingerprint.BuildCatalogQuery(["hr'; DROP"])
+
+  def test_read_catalog(self):
+    run_command = mock.Mock(return_value=mock.Mock(
+        stdout="0\tHR\tTABLE\tJOBS\t2021-06-01 00:00:00\n"))
+    reader = schema_fingerprint.DbiCatalogReader(
+        "dbi:Oracle:host=h", "system", "pw", command_prefix=["docker", "run"],
+        run_command=run_command)
+
+    rows = reader.ReadCatalog(["hr"])
+
+    self.assertEqual(rows, [("HR", "TABLE", "JOBS", "2021-06-01 00:00:00")])
+    command = run_command.call_args[0][0]
+    self.assertEqual(command[:4], ["docker", "run", "perl", "-e"])
+    self.assertEqual(command[5:8], ["dbi:Oracle:host=h", "system", "pw"])
+
+
+  def test_query(self):
+    run_command = mock.Mock(return_value=mock.Mock(
+        stdout="0\tHR\t\n1\t1\t2\n1\t3\t4\n"))
+    reader = schema_fingerprint.DbiCatalogReader(
+        "dbi:Oracle:host=h", "system", "pw", run_command=run_command)
+
+    results = reader.Query(["SELECT 1", "SELECT 2", "SELECT 3"])
+
+    self.assertEqual(results, [[("HR", "")], [("1", "2"), ("3", "4")], []])
+    self.assertEqual(run_command.call_args[0][0][-3:],
+                     ["SELECT 1", "SELECT 2", "SELECT 3"])
+
+
+if __name__ == "__main__":
+  googletest.main()
@@ -0,0 +1,515 @@
+"""Narrow the numeric columns of converted DDL to integer and float types.
+
+ora2pg converts an Oracle NUMBER without a precision to numeric, which
+PostgreSQL stores and compares far more slowly than bigint, integer or double
+precision, both when replication writes rows and when queries read them. The
+advisor combines each NUMBER column's precision and scale from
+ALL_TAB_COLUMNS with its minimum, maximum and fractional values sampled from
+the source table, and rewrites the column types of output.sql:
+
+- NUMBER(p) becomes smallint, integer or bigint by its precision alone, as
+  no value can be any wider.
+- Other integer columns become integer or bigint when the sampled range,
+  times a headroom factor, fits in the type.
+- Columns with sampled fractional values become double precision only when
+  floats are allowed and no sampled value has more than 15 significant
+  digits. NUMBER(p,s) with a scale stays numeric, as it holds exact decimals.
+
+The columns on both sides of a foreign key are given the same type, or are
+all left unchanged. Every numeric column is written to a CSV report with the
+reason for its type.
+"""
+
+import collections
+import csv
+import decimal
+import logging
+import os
+import re
+import subprocess
+
+try:
+  from google3.experimental.dhercher.ora2pg_utils import ddl_model  # pylint: disable=g-import-not-at-top
+  from google3.experimental.dhercher.ora2pg_utils import ddl_parser  # pylint: disable=g-import-not-at-top
+  from google3.experimental.dhercher.ora2pg_utils import schema_fingerprint  # pylint: disable=g-import-not-at-top
+except ModuleNotFoundError:
+  import ddl_model  # pytype: disable=import-error  pylint: disable=g-import-not-at-top
+  import ddl_parser  # pytype: disable=import-error  pylint: disable=g-import-not-at-top
+  import schema_fingerprint  # pytype: disable=import-error  pylint: disable=g-import-not-at-top
+
+REPORT_FILE = "type_narrowing.csv"
+DEFAULT_SAMPLE_PERCENT = 1.0
+# Tables with fewer rows, by their optimizer statistics, are read in full.
+FULL_SCAN_ROWS = 100000
+# Sampled values must fit in a type this many times over.
+DEFAULT_HEADROOM = 1000
+# Tables sampled per perl invocation.
+TABLES_PER_BATCH = 50
+
+SMALLINT = "smallint"
+INTEGER = "integer"
+BIGINT = "bigint"
+DOUBLE_PRECISION = "double precision"
+# (type, the digits of any NUMBER(p) it holds, its largest value), narrowest
+# first.
+INTEGER_TYPES = ((SMALLINT, 4, 2**15 - 1), (INTEGER, 9, 2**31 - 1),
+                 (BIGINT, 18, 2**63 - 1))
+# The significant digits a double precision value keeps exactly.
+DOUBLE_DIGITS = 15
+
+_REPORT_FIELDS = ("table", "column", "oracle_type", "sampled_values",
+                  "minimum", "maximum", "fractional", "old_type", "new_type",
+                  "reason")
+_FOREIGN_KEY_RE = re.compile(
+    r"FOREIGN\s+KEY\s*\((?P<columns>[^)]*)\)\s*REFERENCES\s+(?P<table>%s)"
+    r"\s*(?:\((?P<referenced>[^)]*)\))?" % ddl_parser.NAME, re.I | re.S)
+
+
+class NumberColumn(object):
+  """The precision and scale of an Oracle NUMBER column."""
+
+  __slots__ = ("owner", "table", "column", "precision", "scale")
+
+  def __init__(self, owner, table, column, precision=None, scale=None):
+    self.owner = owner
+    self.table = table
+    self.column = column
+    self.precision = precision
+    self.scale = scale
+
+  @classmethod
+  def FromOracleColumn(cls, owner, table, oracle_column):
+    """Return the NumberColumn of a Datastream OracleColumn message."""
+    return cls(owner, table, oracle_column.columnName,
+               oracle_column.precision, oracle_column.scale)
+
+  @property
+  def key(self):
+    return (self.owner, self.table, self.column)
+
+  @property
+  def oracle_type(self):
+    if self.precision is None:
+      return "NUMBER" if self.scale is None else "NUMBER(*,%d)" % self.scale
+    return "NUMBER(%d,%d)" % (self.precision, self.scale or 0)
+
+
+class ColumnSample(object):
+  """The values sampled from one column."""
+
+  __slots__ = ("count", "minimum", "maximum", "fractional", "digits")
+
+  def __init__(self, count=0, minimum=None, maximum=None, fractional=False,
+               digits=0):
+    self.count = count
+    self.minimum = minimum
+    self.maximum = maximum
+    self.fractional = fractional
+    # The most significant digits of any sampled value.
+    self.digits = digits
+
+
+class Decision(object):
+  """The type chosen for one numeric column of the converted DDL."""
+
+  __slots__ = ("table", "column", "old_type", "new_type", "reason",
+               "metadata", "sample")
+
+  def __init__(self, table, column, old_type, new_type, reason, metadata=None,
+               sample=None):
+    self.table = table
+    self.column = column
+    self.old_type = old_type
+    # None when the column keeps its type.
+    self.new_type = new_type
+    self.reason = reason
+    self.metadata = metadata
+    self.sample = sample
+
+  @property
+  def type(self):
+    return self.new_type or ddl_model.NormalizeType(self.old_type)
+
+
+def _Identifier(name):
+  return '"%s"' % name.replace('"', '""')
+
+
+def _ToChar(expression):
+  # Independent of the session's NLS_NUMERIC_CHARACTERS.
+  return "TO_CHAR(%s, 'TM9', 'NLS_NUMERIC_CHARACTERS=''.,''')" % expression
+
+
+def BuildColumnsQuery(schemas=None):
+  """Return the query listing the NUMBER columns of the schemas' tables."""
+  return ("SELECT c.owner, c.table_name, c.column_name, c.data_precision, "
+          "c.data_scale, t.num_rows FROM all_tab_columns c JOIN all_tables t "
+          "ON t.owner = c.owner AND t.table_name = c.table_name "
+          "WHERE %s AND c.data_type = 'NUMBER' "
+          "ORDER BY c.owner, c.table_name, c.column_id" %
+          schema_fingerprint.OwnerCondition(schemas, column="c.owner"))
+
+
+def BuildSampleQuery(owner, table, columns, sample_percent=None):
+  """Return the query sampling the values of a table's columns.
+
+  Args:
+    owner: The Oracle owner of the table.
+    table: The Oracle table name.
+    columns: The column names, as in ALL_TAB_COLUMNS.
+    sample_percent: The percentage of rows sampled, or None for every row.
+
+  Returns:
+    A query returning one row with, for each column in order, the number of
+    values, the minimum, the maximum, 1 when any value is fractional and the
+    most significant digits of any value.
+  """
+  expressions = []
+  for column in columns:
+    name = _Identifier(column)
+    expressions.extend([
+        "COUNT(%s)" % name, _ToChar("MIN(%s)" % name),
+        _ToChar("MAX(%s)" % name),
+        "MAX(CASE WHEN %s <> TRUNC(%s) THEN 1 ELSE 0 END)" % (name, name),
+        "MAX(LENGTH(TRIM(BOTH '0' FROM REPLACE(%s, '.'))))" % _ToChar(
+            "ABS(%s)" % name)])
+  sample = (" SAMPLE (%s)" % sample_percent
+            if sample_percent and sample_percent < 100 else "")
+  return "SELECT %s FROM %s.%s%s" % (", ".join(expressions),
+                                     _Identifier(owner), _Identifier(table),
+                                     sample)
+
+
+def _Number(text, convert=decimal.Decimal):
+  return convert(text) if text not in ("", None) else None
+
+
+def ParseSampleRow(columns, row):
+  """Return {column: ColumnSample} from a row of BuildSampleQuery."""
+  samples = {}
+  for i, column in enumerate(columns):
+    count, minimum, maximum, fractional, digits = row[i * 5:i * 5 + 5]
+    samples[column] = ColumnSample(
+        _Number(count, int) or 0, _Number(minimum), _Number(maximum),
+        _Number(fractional, int) == 1, _Number(digits, int) or 0)
+  return samples
+
+
+class SourceReader(object):
+  """Read NUMBER columns and samples of their values from Oracle."""
+
+  def __init__(self, dbi_reader, sample_percent=None):
+    """Initialize the SourceReader.
+
+    Args:
+      dbi_reader: A schema_fingerprint.DbiCatalogReader.
+      sample_percent: The percentage of each table's rows sampled, or None
+          for every row.
+    """
+    self.dbi_reader = dbi_reader
+    self.sample_percent = sample_percent
+    # {(owner, table): rows}, from the optimizer statistics.
+    self.table_rows = {}
+
+  def ReadColumns(self, schemas=None):
+    """Return the NumberColumns of the schemas' tables."""
+    columns = []
+    for owner, table, column, precision, scale, rows in (
+        self.dbi_reader.Query([BuildColumnsQuery(schemas)])[0]):
+      columns.append(NumberColumn(owner, table, column,
+                                  _Number(precision, int), _Number(scale, int)))
+      if rows:
+        self.table_rows[(owner, table)] = int(rows)
+    return columns
+
+  def _SamplePercent(self, owner, table):
+    rows = self.table_rows.get((owner, table))
+    return None if rows is not None and rows < FULL_SCAN_ROWS else (
+        self.sample_percent)
+
+  def SampleColumns(self, columns):
+    """Return {NumberColumn.key: ColumnSample} for the columns.
+
+    Tables whose batch cannot be sampled are logged and left out.
+    """
+    by_table = collections.OrderedDict()
+    for column in columns:
+      by_table.setdefault((column.owner, column.table), []).append(
+          column.column)
+    tables = list(by_table.items())
+    samples = {}
+    for start in range(0, len(tables), TABLES_PER_BATCH):
+      batch = tables[start:start + TABLES_PER_BATCH]
+      queries = [BuildSampleQuery(owner, table, names,
+                                  self._SamplePercent(owner, table))
+                 for (owner, table), names in batch]
+      try:
+        results = self.dbi_reader.Query(queries)
+      except (OSError, subprocess.CalledProcessError):
+        logging.exception("Unable to sample %d tables from %s.%s",
+                          len(batch), *batch[0][0])
+        continue
+      for ((owner, table), names), rows in zip(batch, results):
+        if not rows:
+          continue
+        for name, sample in ParseSampleRow(names, rows[0]).items():
+          samples[(owner, table, name)] = sample
+    return samples
+
+
+def _SampledIntegerType(sample, headroom):
+  """Return the integer type holding the sampled range, or None."""
+  magnitude = max(abs(sample.minimum), abs(sample.maximum)) * headroom
+  for data_type, _, largest in INTEGER_TYPES[1:]:
+    if magnitude <= largest:
+      return data_type
+  return None
+
+
+def Advise(metadata, sample, allow_float=False, headroom=DEFAULT_HEADROOM):
+  """Return (the narrower type or None, the reason) for a NUMBER column.
+
+  Args:
+    metadata: The column's NumberColumn.
+    sample: Its ColumnSample, or None when it was not sampled.
+    allow_float: Whether columns with fractional values may become double
+        precision, which is inexact.
+    headroom: How many times over the sampled range must fit in an integer
+        type.
+  """
+  if metadata.scale is not None and metadata.scale > 0:
+    return None, "%s holds exact decimals" % metadata.oracle_type
+  if metadata.precision is not None and metadata.scale is not None:
+    # A negative scale rounds to tens, hundreds, ... to the left of the point.
+    digits = metadata.precision - metadata.scale
+    for data_type, type_digits, _ in INTEGER_TYPES:
+      if digits <= type_digits:
+        return data_type, "%s holds at most %d digits" % (
+            metadata.oracle_type, digits)
+
+  if sample is None:
+    return None, "not sampled"
+  if not sample.count:
+    return None, "no values sampled"
+  sampled = "%d sampled values in [%s, %s]" % (sample.count, sample.minimum,
+                                                sample.maximum)
+  if not sample.fractional:
+    data_type = _SampledIntegerType(sample, headroom)
+    if data_type:
+      return data_type, "%s, all integers, fit %dx over" % (sampled, headroom)
+    return None, "%s exceed bigint with %dx headroom" % (sampled, headroom)
+  if metadata.scale == 0:
+    return None, "%s holds integers" % metadata.oracle_type
+  if not allow_float:
+    return None, "%s include fractions and floats are not allowed" % sampled
+  if sample.digits > DOUBLE_DIGITS:
+    return None, "%s include values of %d significant digits" % (
+        sampled, sample.digits)
+  return DOUBLE_PRECISION, "%s with at most %d significant digits" % (
+      sampled, sample.digits)
+
+
+class _MetadataIndex(object):
+  """Find the NumberColumn of a converted column by its lowercase name."""
+
+  def __init__(self, columns):
+    self._columns = {}
+    self._unqualified = collections.defaultdict(list)
+    for column in columns:
+      key = (column.owner.lower(), column.table.lower(), column.column.lower())
+      self._columns[key] = column
+      self._unqualified[key[1:]].append(column)
+
+  def Get(self, table, column):
+    key = tuple(part.lower() for part in table[-2:]) + (column.lower(),)
+    if len(key) == 3 and key in self._columns:
+      return self._columns[key]
+    # The DDL is unqualified, or its schema was renamed with PG_SCHEMA.
+    candidates = self._unqualified.get(key[-2:], [])
+    return candidates[0] if len(candidates) == 1 else None
+
+
+def _IsNumeric(data_type):
+  return ddl_model.NormalizeType(data_type).startswith("numeric")
+
+
+def _ForeignKeyPairs(catalog):
+  """Yield ((table, column), (referenced table, column)) for each FK."""
+  for constraint in catalog.GetConstraints():
+    if constraint.kind != ddl_model.FOREIGN_KEY:
+      continue
+    match = _FOREIGN_KEY_RE.search(constraint.definition)
+    if not match:
+      continue
+    referenced_table = ddl_parser.QualifyName(
+        ddl_parser.ParseName(match.group("table")),
+        constraint.table[0] if len(constraint.table) > 1 else None)
+    if match.group("referenced"):
+      referenced = match.group("referenced")
+    else:
+      table = catalog.tables.get(referenced_table)
+      keys = table.GetConstraints(ddl_model.PRIMARY_KEY) if table else []
+      if not keys:
+        continue
+      definition = keys[0].definition
+      referenced = definition[definition.index("(") + 1:definition.rindex(")")]
+    columns = [ddl_parser.ParseName(name)[0]
+               for name in ddl_parser.SplitTopLevel(match.group("columns"))]
+    referenced = [ddl_parser.ParseName(name)[0]
+                  for name in ddl_parser.SplitTopLevel(referenced)]
+    for column, referenced_column in zip(columns, referenced):
+      yield ((constraint.table, column), (referenced_table, referenced_column))
+
+
+def _MatchForeignKeys(catalog, decisions):
+  """Give the columns joined by foreign keys the same type."""
+  parents = {}
+
+  def _Find(key):
+    while parents.setdefault(key, key) != key:
+      key = parents[key]
+    return key
+
+  for column, referenced in _ForeignKeyPairs(catalog):
+    parents[_Find(column)] = _Find(referenced)
+  groups = collections.defaultdict(list)
+  for key in parents:
+    groups[_Find(key)].append(key)
+
+  integer_order = [data_type for data_type, _, _ in INTEGER_TYPES]
+  for keys in groups.values():
+    types = {}
+    for table, column in keys:
+      decision = decisions.get((table, column))
+      existing = catalog.tables.get(table)
+      if decision:
+        types[(table, column)] = decision.type
+      elif existing and column in existing.columns:
+        types[(table, column)] = existing.columns[column].type_key
+    if len(set(types.values())) <= 1:
+      continue
+    names = ", ".join(sorted("%s.%s" % (ddl_parser.FormatName(table),
+                                        ddl_parser.QuoteIdentifier(column))
+                             for table, column in types))
+    if all(data_type in integer_order for data_type in types.values()):
+      widest = max(types.values(), key=integer_order.index)
+      for key in types:
+        decision = decisions.get(key)
+        if decision and decision.new_type != widest:
+          decision.new_type = widest
+          decision.reason += "; widened to %s to match %s" % (widest, names)
+    else:
+      for key in types:
+        decision = decisions.get(key)
+        if decision and decision.new_type:
+          decision.new_type = None
+          decision.reason += "; kept numeric to match %s" % names
+
+
+def PlanNarrowing(catalog, columns, samples, allow_float=False,
+                  headroom=DEFAULT_HEADROOM):
+  """Return a Decision for each numeric column of the converted DDL.
+
+  Args:
+    catalog: The ddl_model.Catalog of the converted DDL.
+    columns: The NumberColumns read from Oracle.
+    samples: {NumberColumn.key: ColumnSample}.
+    allow_float: Whether fractional columns may become double precision.
+    headroom: How many times over sampled ranges must fit integer types.
+  """
+  index = _MetadataIndex(columns)
+  decisions = collections.OrderedDict()
+  for name, table in catalog.tables.items():
+    for column in table.columns.values():
+      if not _IsNumeric(column.data_type):
+        continue
+      metadata = index.Get(name, column.name)
+      if metadata is None:
+        decisions[(name, column.name)] = Decision(
+            name, column.name, column.data_type, None,
+            "no Oracle NUMBER column found")
+        continue
+      sample = samples.get(metadata.key)
+      new_type, reason = Advise(metadata, sample, allow_float=allow_float,
+                                headroom=headroom)
+      decisions[(name, column.name)] = Decision(
+          name, column.name, column.data_type, new_type, reason, metadata,
+          sample)
+  _MatchForeignKeys(catalog, decisions)
+  return list(decisions.values())
+
+
+def _RewriteCreateTable(statement, match, types):
+  """Return a CREATE TABLE statement with the column types in types."""
+  start = match.end() - 1
+  end = ddl_parser.FindClosingParen(statement, start)
+  elements = []
+  for element in ddl_parser.SplitTopLevel(statement[start + 1:end]):
+    column = ddl_model.FindColumnType(element)
+    if column and column[0] in types:
+      name, type_start, type_end = column
+      element = element[:type_start] + types[name] + element[type_end:]
+    elements.append(element)
+  return statement[:start + 1] + ",".join(elements) + statement[end:]
+
+
+def RewriteStatements(statements, decisions):
+  """Yield statements with the column types changed by decisions."""
+  types = collections.defaultdict(dict)
+  for decision in decisions:
+    if decision.new_type:
+      types[decision.table][decision.column] = decision.new_type
+  schema = None
+  for statement in statements:
+    search_path = ddl_parser.SEARCH_PATH_RE.match(statement)
+    if search_path:
+      schema = ddl_parser.ParseName(search_path.group("schema"))[0]
+    create = ddl_parser.CREATE_TABLE_RE.match(statement)
+    if create:
+      name = ddl_parser.QualifyName(ddl_parser.ParseName(create.group("name")),
+                                    schema)
+      if name in types:
+        statement = _RewriteCreateTable(statement, create, types[name])
+    yield statement
+
+
+def WriteReport(decisions, path):
+  """Write the decisions as CSV, one row per numeric column."""
+  with open(path, "w", newline="") as report_file:
+    writer = csv.writer(report_file)
+    writer.writerow(_REPORT_FIELDS)
+    for decision in decisions:
+      sample = decision.sample or ColumnSample()
+      writer.writerow([
+          ddl_parser.FormatName(decision.table), decision.column,
+          decision.metadata.oracle_type if decision.metadata else "",
+          sample.count if decision.sample else "",
+          "" if sample.minimum is None else sample.minimum,
+          "" if sample.maximum is None else sample.maximum,
+          sample.fractional if decision.sample else "",
+          decision.old_type, decision.new_type or "", decision.reason])
+
+
+def NarrowFile(ddl_path, report_path, columns, samples, allow_float=False,
+               headroom=DEFAULT_HEADROOM):
+  """Rewrite the numeric column types of a DDL file in place.
+
+  Returns:
+    The Decisions, also written to report_path.
+  """
+  with open(ddl_path) as ddl_file:
+    statements = list(ddl_parser.SplitStatements(ddl_file))
+  decisions = PlanNarrowing(ddl_model.ParseDdl(statements), columns, samples,
+                            allow_float=allow_float, headroom=headroom)
+  with open(ddl_path + ".tmp", "w") as output:
+    output.writelines(RewriteStatements(statements, decisions))
+  os.replace(ddl_path + ".tmp", ddl_path)
+  WriteReport(decisions, report_path)
+
+  changed = collections.Counter(d.new_type for d in decisions if d.new_type)
+  logging.info("Narrowed %d of %d numeric columns: %s",
+               sum(changed.values()), len(decisions),
+               ", ".join("%d to %s" % (count, data_type)
+                         for data_type, count in changed.most_common()) or
+               "none")
+  return decisions
@@ -0,0 +1,195 @@
+"""Tests for google3.experimental.dhercher.ora2pg_utils.type_narrowing."""
+
+import csv
+import decimal
+import os
+import subprocess
+
+import mock
+
+from google3.experimental.dhercher.ora2pg_utils import ddl_model
+from google3.experimental.dhercher.ora2pg_utils import type_narrowing
+from google3.testing.pybase import googletest
+
+_DDL = """SET search_path = hr,public;
+CREATE TABLE jobs (
+\tjob_id numeric NOT NULL,
+\tmin_salary numeric(10,2),
+\tlevel numeric(3),
+\tPRIMARY KEY (job_id)
+) ;
+CREATE TABLE employees (
+\temployee_id numeric(10) NOT NULL,
+\tjob_id numeric,
+\tratio numeric DEFAULT 0.5,
+\tname varchar(20),
+\tunknown numeric
+) ;
+ALTER TABLE employees ADD FOREIGN KEY (job_id) REFERENCES jobs;
+"""
+
+_COLUMNS = [
+    type_narrowing.NumberColumn("HR", "JOBS", "JOB_ID"),
+    type_narrowing.NumberColumn("HR", "JOBS", "MIN_SALARY", 10, 2),
+    type_narrowing.NumberColumn("HR", "JOBS", "LEVEL", 3, 0),
+    type_narrowing.NumberColumn("HR", "EMPLOYEES", "EMPLOYEE_ID", 10, 0),
+    type_narrowing.NumberColumn("HR", "EMPLOYEES", "JOB_ID"),
+    type_narrowing.NumberColumn("HR", "EMPLOYEES", "RATIO"),
+]
+
+
+def _Sample(minimum, maximum, fractional=False, digits=1, count=10):
+  return type_narrowing.ColumnSample(count, decimal.Decimal(minimum),
+                                     decimal.Decimal(maximum), fractional,
+                                     digits)
+
+
+class AdviseTest(googletest.TestCase):
+
+  def _Advise(self, precision, scale, sample=None, **kwargs):
+    return type_narrowing.Advise(
+        type_narrowing.NumberColumn("HR", "T", "C", precision, scale), sample,
+        **kwargs)
+
+  def test_precision(self):
+    self.assertEqual(self._Advise(4, 0)[0], type_narrowing.SMALLINT)
+    self.assertEqual(self._Advise(9, 0)[0], type_narrowing.INTEGER)
+    self.assertEqual(self._Advise(18, 0)[0], type_narrowing.BIGINT)
+    self.assertEqual(self._Advise(5, -3)[0], type_narrowing.INTEGER)
+    self.assertEqual(self._Advise(10, 2, _Sample(1, 2)),
+                     (None, "NUMBER(10,2) holds exact decimals"))
+
+  def test_sampled_integers(self):
+    self.assertEqual(self._Advise(None, None, _Sample(-5, 2000000))[0],
+                     type_narrowing.INTEGER)
+    self.assertEqual(self._Advise(None, 0, _Sample(0, 3000000))[0],
+                     type_narrowing.BIGINT)
+    self.assertEqual(self._Advise(None, None, _Sample(0, 3000000),
+                                  headroom=1)[0], type_narrowing.INTEGER)
+    self.assertIsNone(self._Advise(38, 0, _Sample(0, 10**17))[0])
+    self.assertEqual(self._Advise(None, None), (None, "not sampled"))
+    self.assertEqual(self._Advise(None, None, _Sample(0, 0, count=0)),
+                     (None, "no values sampled"))
+
+  def test_sampled_fractions(self):
+    sample = _Sample("-1.5", "2.25", fractional=True, digits=3)
+    new_type, reason = self._Advise(None, None, sample)
+    self.assertIsNone(new_type)
+    self.assertIn("floats are not allowed", reason)
+    self.assertEqual(self._Advise(None, None, sample, allow_float=True)[0],
+                     type_narrowing.DOUBLE_PRECISION)
+    sample.digits = 20
+    self.assertIsNone(self._Advise(None, None, sample, allow_float=True)[0])
+
+
+class NarrowFileTest(googletest.TestCase):
+
+  def setUp(self):
+    super().setUp()
+    directory = self.create_tempdir().full_path
+    self.ddl_path = os.path.join(directory, "output.sql")
+    self.report_path = os.path.join(directory, type_narrowing.REPORT_FILE)
+    with open(self.ddl_path, "w") as ddl_file:
+      ddl_file.write(_DDL)
+    self.samples = {
+        ("HR", "JOBS", "JOB_ID"): _Sample(1, 100),
+        ("HR", "EMPLOYEES", "JOB_ID"): _Sample(1, 10**8),
+        ("HR", "EMPLOYEES", "RATIO"): _Sample("0", "0.75", fractional=True),
+    }
+
+  def test_narrow_file(self):
+    decisions = type_narrowing.NarrowFile(self.ddl_path, self.report_path,
+                                          _COLUMNS, self.samples,
+                                          allow_float=True)
+
+    types = {(d.table[-1], d.column): d.new_type for d in decisions}
+    self.assertEqual(types, {
+        ("jobs", "job_id"): "bigint",
+        ("jobs", "min_salary"): None,
+        ("jobs", "level"): "smallint",
+        ("employees", "employee_id"): "bigint",
+        ("employees", "job_id"): "bigint",
+        ("employees", "ratio"): "double precision",
+        ("employees", "unknown"): None,
+    })
+    jobs = [d for d in decisions if d.column == "job_id"][0]
+    self.assertIn("widened to bigint to match", jobs.reason)
+
+    catalog = ddl_model.ParseFile(self.ddl_path)
+    employees = catalog.tables[("hr", "employees")].columns
+    self.assertEqual(employees["ratio"].data_type, "double precision")
+    self.assertEqual(employees["ratio"].default, "0.5")
+    self.assertTrue(employees["employee_id"].not_null)
+    self.assertEqual(employees["unknown"].data_type, "numeric")
+    with open(self.ddl_path) as ddl_file:
+      self.assertIn("\tlevel smallint,\n", ddl_file.read())
+
+    with open(self.report_path) as report_file:
+      rows = list(csv.DictReader(report_file))
+    self.assertLen(rows, 7)
+    self.assertEqual(rows[0]["table"], "hr.jobs")
+    self.assertEqual(rows[0]["maximum"], "100")
+    self.assertEqual(rows[1]["oracle_type"], "NUMBER(10,2)")
+    self.assertEqual(rows[-1]["reason"], "no Oracle NUMBER column found")
+
+    # Narrowed columns are no longer numeric.
+    decisions = type_narrowing.NarrowFile(self.ddl_path, self.report_path,
+                                          _COLUMNS, self.samples,
+                                          allow_float=True)
+    self.assertEqual([d.column for d in decisions], ["min_salary", "unknown"])
+
+  def test_foreign_keys_keep_numeric(self):
+    del self.samples[("HR", "EMPLOYEES", "JOB_ID")]
+    decisions = type_narrowing.NarrowFile(self.ddl_path, self.report_path,
+                                          _COLUMNS, self.samples)
+    types = {(d.table[-1], d.column): d.new_type for d in decisions}
+    self.assertIsNone(types[("jobs", "job_id")])
+    self.assertIsNone(types[("employees", "ratio")])
+    with open(self.ddl_path) as ddl_file:
+      self.assertIn("\tjob_id numeric NOT NULL,\n", ddl_file.read())
+
+
+class SourceReaderTest(googletest.TestCase):
+
+  def test_sample_query(self):
+    query = type_narrowing.BuildSampleQuery("HR", "JOBS", ["JOB_ID"], 1.0)
+    self.assertStartsWith(query, 'SELECT COUNT("JOB_ID"), TO_CHAR(MIN(')
+    self.assertEndsWith(query, ' FROM "HR"."JOBS" SAMPLE (1.0)')
+    self.assertNotIn("SAMPLE",
+                     type_narrowing.BuildSampleQuery("HR", "JOBS", ["A"]))
+    self.assertIn("c.owner IN ('HR')",
+                  type_narrowing.BuildColumnsQuery(["hr"]))
+
+  def test_read_and_sample(self):
+    dbi_reader = mock.Mock()
+    dbi_reader.Query.side_effect = [
+        [[("HR", "JOBS", "JOB_ID", "", "", "10"),
+          ("HR", "JOBS", "LEVEL", "3", "0", "10"),
+          ("HR", "EMP", "ID", "", "0", "5000000")]],
+        [[("10", "1", "100", "0", "3", "10", "1", "5", "0", "1")],
+         [("20", "-2", ".5", "1", "1")]],
+    ]
+    reader = type_narrowing.SourceReader(dbi_reader, sample_percent=1.0)
+
+    columns = reader.ReadColumns(["hr"])
+    self.assertEqual([c.oracle_type for c in columns],
+                     ["NUMBER", "NUMBER(3,0)", "NUMBER(*,0)"])
+    samples = reader.SampleColumns(columns)
+
+    queries = dbi_reader.Query.call_args[0][0]
+    self.assertNotIn("SAMPLE", queries[0])
+    self.assertIn("SAMPLE (1.0)", queries[1])
+    self.assertEqual(samples[("HR", "JOBS", "JOB_ID")].maximum, 100)
+    self.assertEqual(samples[("HR", "EMP", "ID")].maximum,
+                     decimal.Decimal("0.5"))
+    self.assertTrue(samples[("HR", "EMP", "ID")].fractional)
+
+  def test_failed_batch(self):
+    dbi_reader = mock.Mock()
+    dbi_reader.Query.side_effect = subprocess.CalledProcessError(1, "perl")
+    reader = type_narrowing.SourceReader(dbi_reader)
+    self.assertEqual(reader.SampleColumns(_COLUMNS), {})
+
+
+if __name__ == "__main__":
+  googletest.main()